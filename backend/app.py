@@ -1,25 +1,62 @@
-from flask import Flask, jsonify, request, Response
+from flask import Flask, jsonify, request, Response, g
 from flask_cors import CORS
-from pymongo import MongoClient
-from datetime import datetime, time, timedelta
-from bson.decimal128 import Decimal128
+from datetime import date, datetime, time, timedelta
+from bson.objectid import ObjectId
+import os
 import subprocess
+import threading
 import logging
-from icalendar import Calendar, Event
+from time import perf_counter
+import base64
+import codecs
+import json
+import re
+from icalendar import Event
 from functools import wraps
+from businesscalendar import BusinessCalendar
+from occupancy import OccupancyIndex
+from feedcache import FeedCache
+from compression import compress_response
+from icswriter import build_calendar, stream_calendar
+from searchindex import build_search_keys, search_terms
+from facets import FACETS
+from fieldsets import parse_fields
+from jsonprovider import BSONJSONProvider
+from recurrence import WEEKDAY_CODES, closed_hour_rules, first_occurrence, holiday_dates
+from reservations import SlotUnavailable, slot_date, slot_times
+from repository import ARCHIVE_SCOPES, MongoRepository, QueryTimeout
+from sqlite_repository import SQLiteRepository
+from mongoconnection import MongoConnection
+from health import ReadinessCheck
+from requestlog import redact, setup_logging, should_sample
+from workflow import DEFAULT_BPMN, InvalidStatus, compile_bpmn
+from archiver import Archiver
+from scheduler import BenchScheduler, bench_minutes
+from catalog import Catalog
+from pricing import PricingEngine, QuoteError, apply_quote
+from events import EventBus, SlotWatcher, slot_event_data, stream as event_stream
+import metrics
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Log level and share of requests whose (redacted) body is logged
+LOG_LEVEL = logging.INFO
+LOG_BODY_SAMPLE_RATE = 0.01
+
+# Configure logging: JSON lines, written by a background thread (see requestlog.py)
+setup_logging(LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+# Serialize Decimal128, ObjectId and datetime values while encoding responses
+app.json = BSONJSONProvider(app)
+
 # Enable CORS with explicit configuration
 CORS(app, resources={
     r"/*": {
         "origins": "*",
-        "methods": ["GET", "POST", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
+        "methods": ["GET", "POST", "PATCH", "OPTIONS"],
+        "allow_headers": ["Content-Type", "Authorization"],
+        "expose_headers": ["ETag", "Last-Modified"]
     }
 })
 
@@ -44,6 +81,154 @@ FIXED_HOLIDAYS = [
     (12, 25),  # December 25th
     (12, 26)   # December 26th
 ]
+# Holidays that move with Easter, as days after Easter Sunday, e.g. -2 (Good
+# Friday), 1 (Easter Monday), 39 (Ascension Day), 50 (Whit Monday) or the
+# regional 60 (Corpus Christi)
+EASTER_HOLIDAYS = []
+# Vacations and one-off closures: (first day, last day[, reason]), both
+# included, e.g. ('2026-08-03', '2026-08-14', 'Summer vacation')
+CLOSURES = []
+
+# Slot occupancy index: days precomputed ahead and seconds until bookings
+# written by other worker processes are picked up by a rebuild
+OCCUPANCY_HORIZON_DAYS = 400
+OCCUPANCY_REFRESH_SECONDS = 300
+
+# Rendered /slots, /slots.ics, /calendar and /calendar.ics responses are
+# reused until a booking is written (by any worker process, see the
+# repository's booking_version) or they are older than this
+FEED_CACHE_SECONDS = 300
+
+# Stream .ics feeds event by event instead of building the whole Calendar first
+ICS_STREAMING = True
+
+# gzip/brotli compression of complete responses of these types from this
+# size on, for clients that accept it (see compression.py)
+COMPRESS_MIN_BYTES = 1024
+COMPRESS_MIMETYPES = ('application/json', 'text/calendar', 'text/csv', 'text/plain')
+
+# Server-side time budget for customer_search queries on /requests
+CUSTOMER_SEARCH_MAX_TIME_MS = 2000
+
+# /requests?count=estimate counts filtered results only up to this number
+COUNT_ESTIMATE_LIMIT = 1000
+
+# Create missing database indexes when the app starts
+ENSURE_INDEXES_ON_STARTUP = True
+
+# Build the status counters, /options facet counts and customer_search keys
+# of a database written by an older version when the app starts (see
+# Repository.backfill()); with False, run `python workflow.py
+# --rebuild-counts`, `python facets.py` and `python searchindex.py` instead
+BACKFILL_ON_STARTUP = True
+
+# Storage backend: 'mongodb' or 'sqlite' (single file, no database server;
+# see sqlite_repository.py); environment variables of the same name override
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mongodb')
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+MONGO_DB = os.environ.get('MONGO_DB', 'repair_shop')
+SQLITE_PATH = os.environ.get('SQLITE_PATH', 'repair_shop.db')
+
+# MongoDB client of each worker process, opened on first use (see
+# mongoconnection.py): connections per pool, milliseconds an idle connection
+# is kept, a socket may wait for an answer, connecting may take and a
+# request waits for a server or a free pooled connection before it fails
+MONGO_MAX_POOL_SIZE = 50
+MONGO_MIN_POOL_SIZE = 0
+MONGO_MAX_IDLE_TIME_MS = 60000
+MONGO_SOCKET_TIMEOUT_MS = 30000
+MONGO_CONNECT_TIMEOUT_MS = 2000
+MONGO_SERVER_SELECTION_TIMEOUT_MS = 3000
+MONGO_WAIT_QUEUE_TIMEOUT_MS = 2000
+MONGO_CLIENT_OPTIONS = {
+    'maxPoolSize': MONGO_MAX_POOL_SIZE,
+    'minPoolSize': MONGO_MIN_POOL_SIZE,
+    'maxIdleTimeMS': MONGO_MAX_IDLE_TIME_MS,
+    'socketTimeoutMS': MONGO_SOCKET_TIMEOUT_MS,
+    'connectTimeoutMS': MONGO_CONNECT_TIMEOUT_MS,
+    'serverSelectionTimeoutMS': MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    'waitQueueTimeoutMS': MONGO_WAIT_QUEUE_TIMEOUT_MS
+}
+
+# GET /readyz: time limit of the database ping and seconds its result is reused
+HEALTH_CHECK_TIMEOUT_MS = 500
+HEALTH_CHECK_CACHE_SECONDS = 1.0
+
+# Bookings per appointment slot and number of alternatives offered when a
+# slot is taken; reservations run in a transaction if MongoDB supports it
+# (True/False to force)
+SLOT_CAPACITY = 1
+ALTERNATIVE_SLOTS = 3
+RESERVATION_TRANSACTIONS = 'auto'
+
+# Device and repair catalog (see catalog.py): the CSV files, seconds between
+# checks whether they changed, and models GET /catalog/models returns by
+# default and at most
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+CATALOG_MODELS_CSV = os.path.join(DATA_DIR, 'smartphone_models.csv')
+CATALOG_REPAIRS_CSV = os.path.join(DATA_DIR, 'repairs_overview.csv')
+CATALOG_RELOAD_SECONDS = 5
+CATALOG_MODELS_LIMIT = 10
+CATALOG_MODELS_MAX_LIMIT = 100
+
+# Duration-aware scheduling (see scheduler.py): technicians or benches with
+# their own working hours (None: WORKING_HOURS) and candidate start times
+# GET /schedule returns by default and at most. An appointment books its
+# repairs' whole bench time (durations from the catalog) on one technician;
+# SLOT_CAPACITY should match the number of them
+TECHNICIANS = {
+    'bench-1': None,
+}
+SCHEDULE_CANDIDATES = 5
+SCHEDULE_MAX_CANDIDATES = 50
+
+# Server-side pricing (see pricing.py) on top of the catalog's 'Price in Euro':
+# multipliers per brand and per model ('Model' or 'Brand Model'), multipliers
+# by device age as (minimum years since release, multiplier) steps, and the
+# share taken off the total of several repairs (number of repairs -> share),
+# e.g. {2: 0.05, 3: 0.1}. After changing prices, `python pricing.py --requote`
+# re-prices the requests still waiting for a quote.
+PRICE_BRAND_MULTIPLIERS = {}
+PRICE_MODEL_MULTIPLIERS = {}
+PRICE_AGE_MULTIPLIERS = []
+COMBINED_REPAIR_DISCOUNTS = {}
+# POST /quotes/batch: items per request
+QUOTE_BATCH_MAX_ITEMS = 10000
+
+# POST /requests/bulk: items validated and inserted per chunk, items per
+# request, bytes read from the body at a time and largest single item (a
+# JSON array is decoded item by item, so only one item is held at a time)
+BULK_CHUNK_SIZE = 500
+BULK_MAX_ITEMS = 10000
+BULK_READ_BYTES = 64 * 1024
+BULK_MAX_ITEM_BYTES = 1024 * 1024
+
+# Repair workflow: states and allowed status transitions, compiled from this
+# BPMN file when the app starts (see workflow.py)
+WORKFLOW_BPMN = DEFAULT_BPMN
+
+# Statuses that end an appointment: PATCH /request/<id>/status to one of
+# these deletes the calendar entry and frees its slots and bench time
+APPOINTMENT_RELEASE_STATUSES = ('cancelled', 'rejected')
+
+# Auto-archive (see archiver.py): days a request stays feedback_received,
+# rejected or cancelled before it moves to archived_requests, requests moved
+# per batch, pause between batches, batches per run and seconds between runs
+# (None: no background thread, run archiver.py from cron instead)
+ARCHIVE_AFTER_DAYS = 90
+ARCHIVE_BATCH_SIZE = 500
+ARCHIVE_BATCH_PAUSE_SECONDS = 1.0
+ARCHIVE_MAX_BATCHES = 100
+AUTO_ARCHIVE_INTERVAL_SECONDS = 3600
+
+# GET /events (see events.py): slot changes come from a MongoDB change
+# stream, so every worker sees every booking (needs a replica set;
+# True/False, 'auto' asks the server once), or else from the bookings of
+# this process; events kept for reconnecting clients and seconds between
+# keep-alive comments
+SLOT_EVENTS_CHANGE_STREAM = 'auto'
+EVENT_BUFFER_SIZE = 1000
+EVENT_KEEPALIVE_SECONDS = 15
 
 # Calendar credentials (you should change these!)
 CALENDAR_USERNAME = "admin"
@@ -51,15 +236,80 @@ CALENDAR_PASSWORD = "change_me_please"
 
 # Add request logging middleware
 @app.before_request
-def log_request():
-    logger.info(f"Request: {request.method} {request.path}")
-    logger.info(f"Headers: {dict(request.headers)}")
-    if request.method == 'POST':
-        logger.info(f"Body: {request.get_data(as_text=True)}")
+def start_request_timer():
+    g.request_started = perf_counter()
+    metrics.request_started()
+
+@app.after_request
+def record_request_metrics(response):
+    """
+    Count and time the request per route pattern and status (see metrics.py)
+    """
+    route = request.url_rule.rule if request.url_rule else metrics.UNMATCHED_ROUTE
+    metrics.observe_request(request.method, route, response.status_code,
+                            perf_counter() - g.get('request_started', perf_counter()))
+    return response
+
+@app.teardown_request
+def finish_request(exc):
+    if 'request_started' in g:
+        metrics.request_finished()
+
+@app.after_request
+def log_request(response):
+    """
+    One structured record per request; the body only for a sampled share
+    of requests and with customer fields redacted
+    """
+    if not logger.isEnabledFor(logging.INFO):
+        return response
+
+    fields = {
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'duration_ms': round((perf_counter() - g.get('request_started', perf_counter())) * 1000, 2)
+    }
+    if request.method == 'POST' and should_sample(LOG_BODY_SAMPLE_RATE):
+        body = request.get_json(silent=True)
+        if body is not None:
+            fields['body'] = redact(body)
+    logger.info('request', extra={'fields': fields})
+    return response
+
+@app.after_request
+def compress(response):
+    """gzip/brotli-encode the response as negotiated with Accept-Encoding"""
+    return compress_response(response, request.headers.get('Accept-Encoding'), COMPRESS_MIN_BYTES, COMPRESS_MIMETYPES)
+
+# Open the storage backend (see repository.py)
+# and report its connection pool on /metrics
+if STORAGE_BACKEND == 'sqlite':
+    repository = SQLiteRepository(SQLITE_PATH, search_max_time_ms=CUSTOMER_SEARCH_MAX_TIME_MS)
+    metrics.register_pool('sqlite', repository.pool_usage)
+elif STORAGE_BACKEND == 'mongodb':
+    # Command timings and pool usage come from pymongo's event listeners
+    mongo_pool_monitor = metrics.PoolMonitor()
+    repository = MongoRepository(
+        MongoConnection(MONGO_URI, event_listeners=[metrics.CommandTimer(), mongo_pool_monitor], **MONGO_CLIENT_OPTIONS),
+        MONGO_DB,
+        transactions=RESERVATION_TRANSACTIONS,
+        search_max_time_ms=CUSTOMER_SEARCH_MAX_TIME_MS
+    )
+    metrics.register_pool('mongodb', mongo_pool_monitor.usage)
+else:
+    raise ValueError(f'Unknown STORAGE_BACKEND: {STORAGE_BACKEND}')
+
+# Database check of GET /readyz
+readiness = ReadinessCheck(repository.ping, HEALTH_CHECK_TIMEOUT_MS, cache_seconds=HEALTH_CHECK_CACHE_SECONDS)
 
-# Connect to MongoDB
-client = MongoClient('mongodb://localhost:27017/')
-db = client['repair_shop']  # Database name
+# Transition lookup tables for PATCH /request/<id>/status
+workflow = compile_bpmn(WORKFLOW_BPMN)
+
+# Move finished repair requests to the archive in the background
+# (started per process by start_process())
+archiver = Archiver(repository, workflow, after_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE,
+                    pause_seconds=ARCHIVE_BATCH_PAUSE_SECONDS, max_batches=ARCHIVE_MAX_BATCHES)
 
 # Authentication decorator for protected calendar endpoint
 def require_calendar_auth(f):
@@ -75,33 +325,223 @@ def require_calendar_auth(f):
         return f(*args, **kwargs)
     return decorated
 
+def booking_version():
+    """Booking version of all worker processes, from the database"""
+    return repository.booking_version()
+
+# Response cache for the calendar feeds, invalidated on every booking
+feed_cache = FeedCache(max_age_seconds=FEED_CACHE_SECONDS, shared_version=booking_version)
+
+def cached_feed(f):
+    """
+    Serve a feed from the versioned response cache with ETag/Last-Modified
+    validators, answering repeat polls with 304 Not Modified
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        key = (
+            request.path,
+            tuple(sorted(request.args.items(multi=True))),
+            'full' if request.authorization else 'public',
+            date.today().isoformat()
+        )
+        entry = feed_cache.get(key)
+        if entry is None:
+            version = feed_cache.version
+            response = app.make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            headers = {}
+            if 'Content-Disposition' in response.headers:
+                headers['Content-Disposition'] = response.headers['Content-Disposition']
+            
+            if response.is_streamed:
+                # Pass chunks through to the client and cache the complete body
+                # afterwards; validators are only sent from the next hit on
+                def record(chunks, mimetype=response.mimetype):
+                    body = []
+                    for chunk in chunks:
+                        body.append(chunk)
+                        yield chunk
+                    feed_cache.put(key, b''.join(body), mimetype, headers, version=version)
+                response.response = record(response.response)
+                response.headers['Cache-Control'] = 'no-cache'
+                return response
+            
+            entry = feed_cache.put(key, response.get_data(), response.mimetype, headers, version=version)
+
+        response = Response(entry.body, mimetype=entry.mimetype, headers=entry.headers)
+        response.set_etag(entry.etag)
+        response.last_modified = entry.last_modified
+        response.headers['Cache-Control'] = 'no-cache'
+        response.vary.add('Authorization')
+        return response.make_conditional(request)
+    return decorated
+
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
 
-def convert_decimal128(doc):
+def encode_page_token(doc, score=None):
     """
-    Recursively convert Decimal128 objects to floats in a document for JSON serialization
+    Opaque keyset token for the position after doc in the
+    (score,) submittedAt, _id descending sort order of /requests
     """
-    if isinstance(doc, dict):
-        return {key: convert_decimal128(value) for key, value in doc.items()}
-    elif isinstance(doc, list):
-        return [convert_decimal128(item) for item in doc]
-    elif isinstance(doc, Decimal128):
-        return float(doc.to_decimal())
-    else:
-        return doc
+    key = {'t': doc['submittedAt'].isoformat(), 'i': str(doc['_id'])}
+    if score is not None:
+        key['s'] = score
+    raw = json.dumps(key, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_page_token(token):
+    """
+    Decode a token from encode_page_token()
+    Returns (score or None, submittedAt, ObjectId), raises ValueError if invalid
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        key = json.loads(raw)
+        return key.get('s'), datetime.fromisoformat(key['t']), ObjectId(key['i'])
+    except Exception:
+        raise ValueError('Invalid after token')
+
+
+def requests_filters(args):
+    """
+    Build the backend-neutral filters for the /requests search parameters
+    (shared by /requests and the facet counts of /options)
+    """
+    filters = {}
+    
+    # (1) Filter by request date range
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
+    
+    if start_date or end_date:
+        if start_date:
+            filters['submitted_from'] = datetime.strptime(start_date, '%Y-%m-%d')
+        else:
+            # Default to today if not provided
+            filters['submitted_from'] = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        
+        if end_date:
+            filters['submitted_to'] = datetime.strptime(end_date, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
+        else:
+            # Default to 90 days from start
+            filters['submitted_to'] = filters['submitted_from'] + timedelta(days=90)
+    
+    # (2) Filter by device type, (3) brand (manufacturer), (4) model and
+    # (5) postal code
+    for name in ('device_type', 'brand', 'model', 'postal_code'):
+        value = args.get(name)
+        if value:
+            filters[name] = value
+    
+    # (6) Search by customer (across multiple fields) via the write-time search keys
+    customer_search = args.get('customer_search')
+    if customer_search and search_terms(customer_search):
+        filters['customer_search'] = customer_search
+    
+    return filters
+
+
+COUNT_MODES = ('exact', 'estimate', 'none')
+
+
+def requests_page_params(args):
+    """
+    Parse the /requests parameters (filter, limit, after, count, archive,
+    fields, view)
+    Raises ValueError for invalid dates, page tokens, archive options or fields
+    """
+    # Get limit parameter (default 10, max 50)
+    limit = args.get('limit', '10')
+    try:
+        limit = min(int(limit), 50)  # Cap at 50
+    except ValueError:
+        limit = 10
+    
+    # Position after the last result of the previous page
+    after = args.get('after')
+    
+    # Archived requests are only searched on request
+    archive = args.get('archive', 'exclude').lower()
+    if archive not in ARCHIVE_SCOPES:
+        raise ValueError(f"Invalid archive option: {archive}, expected one of: {', '.join(ARCHIVE_SCOPES)}")
+    
+    return {
+        'filters': requests_filters(args),
+        'customer_search': args.get('customer_search'),
+        'limit': limit,
+        'position': decode_page_token(after) if after else None,
+        'count_mode': args.get('count', 'exact').lower(),
+        'archive': archive,
+        'fields': parse_fields(args.get('fields'), args.get('view'))
+    }
+
+
+def invalid_count_mode(count_mode):
+    return {
+        'success': False,
+        'error': f'Invalid count mode: {count_mode}',
+        'available_count_modes': list(COUNT_MODES)
+    }
+
+
+def finish_requests_page(page, repair_requests):
+    """
+    Cut the extra look-ahead document off a page
+    Returns (results, next_after token or None)
+    """
+    limit = page['limit']
+    next_after = None
+    if len(repair_requests) > limit:
+        repair_requests = repair_requests[:limit]
+        last = repair_requests[-1]
+        next_after = encode_page_token(last, last.get('_score') if page['customer_search'] else None)
+    
+    # Decimal128, ObjectId and datetime values are serialized by the JSON
+    # provider; only the appointment date is shown as a plain date
+    fields = page.get('fields')
+    for doc in repair_requests:
+        doc.pop('_score', None)
+        if fields and 'submittedAt' not in fields:
+            doc.pop('submittedAt', None)
+        appointment = doc.get('appointment')
+        if isinstance(appointment, dict) and isinstance(appointment.get('date'), datetime):
+            appointment['date'] = appointment['date'].strftime('%Y-%m-%d')
+    return repair_requests, next_after
+
+
+def requests_page_body(page, results, next_after, total_found, total_found_exact, search_time):
+    """
+    Response body of /requests
+    """
+    return {
+        'success': True,
+        'count': len(results),
+        'total_found': total_found,
+        'total_found_exact': total_found_exact,
+        'limit': page['limit'],
+        'next_after': next_after,
+        'search_time_ms': round(search_time * 1000, 2),
+        'results': results
+    }
+
+
+# Working hours, holidays and closures compiled into per-year tables
+business_calendar = BusinessCalendar(SLOT_DURATION_MINUTES, WORKING_HOURS, FIXED_HOLIDAYS, EASTER_HOLIDAYS, CLOSURES)
 
 
 def is_holiday(date_obj):
-    """Check if a date is a configured holiday"""
-    return (date_obj.month, date_obj.day) in FIXED_HOLIDAYS
+    """Check if a date is a configured holiday or closure"""
+    return business_calendar.is_closed_day(date_obj)
 
 
 def is_working_day(date_obj):
     """Check if a date is a working day (has working hours and not a holiday)"""
-    weekday = date_obj.weekday()
-    return WORKING_HOURS.get(weekday) is not None and not is_holiday(date_obj)
+    return business_calendar.hours(date_obj) is not None
 
 
 def get_non_working_blocks(start_date, end_date):
@@ -114,10 +554,9 @@ def get_non_working_blocks(start_date, end_date):
     end = end_date.date()
     
     while current_date <= end:
-        weekday = current_date.weekday()
-        working_hours = WORKING_HOURS.get(weekday)
+        working_hours = business_calendar.hours(current_date)
         
-        if working_hours is None or is_holiday(current_date):
+        if working_hours is None:
             # Full day blocked (Sunday or holiday)
             blocks.append((
                 datetime.combine(current_date, time(0, 0)),
@@ -144,73 +583,569 @@ def get_non_working_blocks(start_date, end_date):
     return blocks
 
 
-def get_appointments(start_date=None, end_date=None):
+def calendar_appointment(cal_entry):
     """
-    Retrieve appointments from MongoDB
+    Convert a calendar collection entry into an appointment dictionary
+    """
+    return {
+        'id': cal_entry.get('customer', {}).get('request_id', str(cal_entry['_id'])),
+        'date': cal_entry.get('date'),
+        'timezone': cal_entry.get('timezone', 'UTC'),
+        'start_time': cal_entry.get('start_time'),
+        'end_time': cal_entry.get('end_time'),
+        'customer': cal_entry.get('customer', {}),
+        'device': cal_entry.get('device', {})
+    }
+
+
+def iter_calendar_appointments(start_date=None, end_date=None):
+    """
+    Iterate over appointments from calendar collection straight from the cursor
+    Yields appointment dictionaries
+    """
+    for cal_entry in repository.calendar_entries(start_date, end_date):
+        yield calendar_appointment(cal_entry)
+
+
+def get_calendar_appointments(start_date=None, end_date=None):
+    """
+    Retrieve appointments from calendar collection
     Returns list of appointment dictionaries
     """
-    query = {}
+    return list(iter_calendar_appointments(start_date, end_date))
+
+
+def calendar_body(appointments, start_date, end_date):
+    """
+    Response body of /calendar: the appointments as events
+    """
+    events = []
     
-    # Filter by date range if provided
-    if start_date or end_date:
-        date_filter = {}
-        if start_date:
-            date_filter['$gte'] = start_date
-        if end_date:
-            date_filter['$lte'] = end_date
-        query['appointment.date'] = date_filter
+    for appt in appointments:
+        events.append({
+            'type': 'appointment',
+            'id': appt['id'],
+            'date': appt['date'],
+            'timezone': appt['timezone'],
+            'start': appt['start_time'],
+            'end': appt['end_time'],
+            'customer': appt['customer'],
+            'device': appt['device']
+        })
     
-    # Only get repair requests that have appointments scheduled
-    query['appointment'] = {'$exists': True}
+    return {
+        'success': True,
+        'period': {
+            'start': start_date.isoformat(),
+            'end': end_date.isoformat()
+        },
+        'slot_duration_minutes': SLOT_DURATION_MINUTES,
+        'events': events
+    }
+
+
+def closed_block_event(block_start, block_end, public):
+    """
+    Build the VEVENT for a non-working block
+    public: generic 'Unavailable' entry for /slots.ics, otherwise 'Closed' with reason
+    """
+    event = Event()
+    event.add('summary', 'Unavailable' if public else 'Closed')
+    event.add('dtstart', block_start)
+    event.add('dtend', block_end)
+    event.add('transp', 'OPAQUE')  # Show as busy
+    event.add('status', 'CONFIRMED')
     
-    appointments = []
-    for request_doc in db.repair_requests.find(query):
-        if 'appointment' in request_doc:
-            appt = request_doc['appointment']
-            appointments.append({
-                'id': str(request_doc['_id']),
-                'customer': request_doc.get('customer', {}),
-                'device': request_doc.get('device', {}),
-                'service_type': request_doc.get('serviceType', 'Unknown'),
-                'date': appt.get('date'),
-                'time_slot': appt.get('timeSlot', 'Not specified'),
-                'status': request_doc.get('status', 'pending'),
-                'notes': request_doc.get('additionalNotes', '')
-            })
+    if public:
+        event.add('class', 'PUBLIC')
+    # Add description for closed periods
+    elif business_calendar.closed_reason(block_start.date()):
+        event.add('description', business_calendar.closed_reason(block_start.date()))
+    elif WORKING_HOURS.get(block_start.weekday()) is None:
+        event.add('description', 'Weekend - Shop Closed')
+    else:
+        event.add('description', 'Non-working hours')
     
-    return appointments
+    return event
 
 
-def get_calendar_appointments(start_date=None, end_date=None):
+def appointment_event(appt, public):
     """
-    Retrieve appointments from calendar collection
-    Returns list of appointment dictionaries
+    Build the VEVENT for a calendar appointment
+    public: generic 'Busy' entry without customer details for /slots.ics
     """
-    query = {}
+    event = Event()
     
-    # Filter by date range if provided
-    if start_date or end_date:
-        date_filter = {}
-        if start_date:
-            # Convert to date string for comparison
-            date_filter['$gte'] = start_date.strftime('%Y-%m-%d')
-        if end_date:
-            date_filter['$lte'] = end_date.strftime('%Y-%m-%d')
-        query['date'] = date_filter
+    if public:
+        event.add('summary', 'Busy')  # Generic title only
+    else:
+        # Build detailed summary
+        customer = appt.get('customer', {})
+        device = appt.get('device', {})
+        customer_name = f"{customer.get('first_name', '')} {customer.get('last_name', '')}".strip()
+        device_info = f"{device.get('brand', '')} {device.get('model', '')}".strip()
+        
+        event.add('summary', f"Appointment: {customer_name}")
+        
+        # Build detailed description
+        description_parts = [
+            f"Customer: {customer_name}",
+            f"Phone: {customer.get('phone', 'N/A')}",
+            f"Email: {customer.get('email', 'N/A')}",
+            f"Device: {device_info}",
+            f"Device Type: {device.get('device_type', 'N/A')}"
+        ]
+        
+        event.add('description', '\n'.join(description_parts))
     
-    appointments = []
-    for cal_entry in db.calendar.find(query):
-        appointments.append({
-            'id': cal_entry.get('customer', {}).get('request_id', str(cal_entry['_id'])),
-            'date': cal_entry.get('date'),
-            'timezone': cal_entry.get('timezone', 'UTC'),
-            'start_time': cal_entry.get('start_time'),
-            'end_time': cal_entry.get('end_time'),
-            'customer': cal_entry.get('customer', {}),
-            'device': cal_entry.get('device', {})
-        })
+    # Set date/time - combine date string with time string
+    appt_date_str = appt.get('date')  # YYYY-MM-DD
+    start_time_str = appt.get('start_time')  # HH:MM
+    end_time_str = appt.get('end_time')  # HH:MM
+    
+    if appt_date_str and start_time_str:
+        # Parse date and time
+        appt_date = datetime.strptime(appt_date_str, '%Y-%m-%d').date()
+        start_hour, start_minute = map(int, start_time_str.split(':'))
+        start_datetime = datetime.combine(appt_date, time(start_hour, start_minute))
+        
+        event.add('dtstart', start_datetime)
+        
+        if end_time_str:
+            end_hour, end_minute = map(int, end_time_str.split(':'))
+            end_datetime = datetime.combine(appt_date, time(end_hour, end_minute))
+            event.add('dtend', end_datetime)
+        else:
+            event.add('dtend', start_datetime + timedelta(minutes=SLOT_DURATION_MINUTES))
+    
+    event.add('status', 'CONFIRMED')
+    event.add('transp', 'OPAQUE')  # Show as busy
+    if public:
+        event.add('class', 'PUBLIC')
+        event.add('uid', f"slot-{appt['id']}@repairshop.local")
+        # No description, location, or attendee information
+    else:
+        event.add('uid', f"repair-{appt['id']}@repairshop.local")
+    
+    return event
+
+
+def iter_feed_events(start_date, end_date, public):
+    """
+    Yield all VEVENTs of a feed: non-working blocks first, then appointments
+    read lazily from the calendar collection
+    """
+    for block_start, block_end in get_non_working_blocks(start_date, end_date):
+        yield closed_block_event(block_start, block_end, public)
+    for appt in iter_calendar_appointments(start_date, end_date):
+        yield appointment_event(appt, public)
+
+
+def iter_compact_feed_events(start_date, end_date, public):
+    """
+    Yield the VEVENTs of a compact feed: one weekly RRULE per closed period
+    (holidays and closures excluded via EXDATE), one yearly whole-day event
+    per fixed holiday, one event per Easter-based holiday and closure, then
+    the appointments. The number of weekly and yearly closed events does
+    not grow with the length of the window.
+    """
+    first_day = start_date.date()
+    last_day = end_date.date()
+    until = datetime.combine(last_day, time(23, 59, 59))
+    closed_days = business_calendar.closed_dates(first_day, last_day)
+    holidays = [day for day, _ in closed_days]
+    
+    # Weekly recurring closed hours
+    for rule in closed_hour_rules(WORKING_HOURS):
+        day = first_occurrence(rule.weekdays, first_day)
+        if day is None or day > last_day:
+            continue
+        weekday_codes = [WEEKDAY_CODES[weekday] for weekday in rule.weekdays]
+        
+        event = Event()
+        event.add('summary', 'Unavailable' if public else 'Closed')
+        event.add('dtstart', datetime.combine(day, rule.start))
+        event.add('dtend', datetime.combine(day, rule.end))
+        event.add('rrule', {'freq': 'weekly', 'byday': weekday_codes, 'until': until})
+        exdates = [datetime.combine(holiday, rule.start) for holiday in holidays if holiday.weekday() in rule.weekdays]
+        if exdates:
+            event.add('exdate', exdates)
+        event.add('transp', 'OPAQUE')  # Show as busy
+        event.add('status', 'CONFIRMED')
+        if public:
+            event.add('class', 'PUBLIC')
+        else:
+            event.add('description', rule.reason)
+        event.add('uid', f"closed-{'-'.join(weekday_codes).lower()}-{rule.start.strftime('%H%M')}@repairshop.local")
+        yield event
+    
+    # Fixed holidays as yearly whole-day events, starting at their first occurrence
+    fixed_holidays = holiday_dates(FIXED_HOLIDAYS, first_day, last_day)
+    first_holidays = {}
+    for holiday in fixed_holidays:
+        first_holidays.setdefault((holiday.month, holiday.day), holiday)
+    for holiday in sorted(first_holidays.values()):
+        event = Event()
+        event.add('summary', 'Unavailable' if public else 'Closed')
+        event.add('dtstart', holiday)
+        event.add('dtend', holiday + timedelta(days=1))
+        event.add('rrule', {'freq': 'yearly', 'until': last_day})
+        event.add('transp', 'OPAQUE')  # Show as busy
+        event.add('status', 'CONFIRMED')
+        if public:
+            event.add('class', 'PUBLIC')
+        else:
+            event.add('description', 'Holiday - Shop Closed')
+        event.add('uid', f"holiday-{holiday.strftime('%m%d')}@repairshop.local")
+        yield event
+    
+    # Other closed days, consecutive days with the same reason as one event
+    fixed_holidays = set(fixed_holidays)
+    runs = []
+    for day, reason in closed_days:
+        if day in fixed_holidays:
+            continue
+        if runs and runs[-1][2] == reason and runs[-1][1] + timedelta(days=1) == day:
+            runs[-1][1] = day
+        else:
+            runs.append([day, day, reason])
+    for first, last, reason in runs:
+        event = Event()
+        event.add('summary', 'Unavailable' if public else 'Closed')
+        event.add('dtstart', first)
+        event.add('dtend', last + timedelta(days=1))
+        event.add('transp', 'OPAQUE')  # Show as busy
+        event.add('status', 'CONFIRMED')
+        if public:
+            event.add('class', 'PUBLIC')
+        else:
+            event.add('description', reason)
+        event.add('uid', f"closed-{first.strftime('%Y%m%d')}@repairshop.local")
+        yield event
+    
+    for appt in iter_calendar_appointments(start_date, end_date):
+        yield appointment_event(appt, public)
+
+
+def compact_feed_requested():
+    """Check the compact=1 query parameter of the .ics feeds"""
+    return request.args.get('compact', '').lower() in ('1', 'true', 'yes')
+
+
+def ics_response(properties, events, filename):
+    """
+    Serialize a feed either streamed event by event or as one Calendar object,
+    recording generation time and size per feed
+    """
+    if ICS_STREAMING:
+        body = metrics.timed_ics(request.path, stream_calendar(properties, events))
+    else:
+        started = perf_counter()
+        body = build_calendar(properties, events).to_ical()
+        metrics.observe_ics(request.path, perf_counter() - started, len(body))
+    return Response(
+        body,
+        mimetype='text/calendar',
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}'
+        }
+    )
+
+
+def load_occupancy_bookings(start_date):
+    """
+    Load calendar entries on or after start_date for the occupancy index
+    """
+    return repository.calendar_times(start_date)
+
+
+occupancy = OccupancyIndex(
+    business_calendar,
+    load_occupancy_bookings,
+    horizon_days=OCCUPANCY_HORIZON_DAYS,
+    refresh_seconds=OCCUPANCY_REFRESH_SECONDS
+)
+
+# Models and repairs for GET /catalog/*, repair durations for the scheduler
+catalog = Catalog(CATALOG_MODELS_CSV, CATALOG_REPAIRS_CSV, reload_seconds=CATALOG_RELOAD_SECONDS)
+
+# Repair prices for POST /quotes/batch
+pricing = PricingEngine(
+    catalog,
+    brand_multipliers=PRICE_BRAND_MULTIPLIERS,
+    model_multipliers=PRICE_MODEL_MULTIPLIERS,
+    age_multipliers=PRICE_AGE_MULTIPLIERS,
+    combined_discounts=COMBINED_REPAIR_DISCOUNTS
+)
+
+# Technician masks for GET /schedule
+scheduler = BenchScheduler(
+    TECHNICIANS,
+    business_calendar,
+    load_occupancy_bookings,
+    horizon_days=OCCUPANCY_HORIZON_DAYS,
+    refresh_seconds=OCCUPANCY_REFRESH_SECONDS
+)
+
+# Slot change events for GET /events; the change stream watcher of this
+# process, if any, is started by start_process()
+slot_events = EventBus(buffer_size=EVENT_BUFFER_SIZE)
+slot_watcher = None
+
+# ============================================================================
+# PROCESS STARTUP
+# ============================================================================
+
+_started_pid = None
+_start_lock = threading.Lock()
+
+
+def prepare_database():
+    """
+    Database work of start_process(), in a thread of its own so the first
+    request does not wait for it
+    """
+    global slot_watcher
+    # Create the indexes the endpoints rely on (see indexes.py)
+    if ENSURE_INDEXES_ON_STARTUP:
+        try:
+            repository.ensure_indexes()
+        except Exception as e:
+            logger.warning(f"Could not ensure database indexes: {str(e)}")
+
+    # Counters, facets and search keys an older version did not write
+    if BACKFILL_ON_STARTUP:
+        try:
+            built = repository.backfill(workflow.initial)
+            if built:
+                logger.info(f"Backfilled {', '.join(built)}")
+        except Exception as e:
+            logger.warning(f"Could not backfill status counts, facets and search keys: {str(e)}; run "
+                           f"python workflow.py --rebuild-counts, python facets.py and python searchindex.py")
+
+    watch_slots = repository.can_watch_slots() if SLOT_EVENTS_CHANGE_STREAM == 'auto' else SLOT_EVENTS_CHANGE_STREAM
+    if watch_slots:
+        slot_watcher = SlotWatcher(repository, slot_events)
+        slot_watcher.start()
+
+
+def start_process():
+    """
+    Start what every serving process needs once: the database indexes and
+    backfills, the archiver thread and the slot change stream watcher
+    Runs on the first request of each process (and from asgi.py's
+    lifespan), not on import, so that a pre-forking server (gunicorn
+    --preload) neither connects to the database in the master nor leaves
+    background threads behind in it, where no worker would see them
+    """
+    global _started_pid, slot_watcher
+    if _started_pid == os.getpid():
+        return
+    with _start_lock:
+        if _started_pid == os.getpid():
+            return
+        _started_pid = os.getpid()
+        # Threads are not inherited by forked children, so each process starts its own
+        slot_watcher = None
+        if AUTO_ARCHIVE_INTERVAL_SECONDS:
+            archiver.start(AUTO_ARCHIVE_INTERVAL_SECONDS)
+        threading.Thread(target=prepare_database, name='prepare-database', daemon=True).start()
+
+
+@app.before_request
+def start_on_first_request():
+    start_process()
+
+def announce_slots(event_type, date_str, start_time, end_time):
+    """
+    Publish slot_booked or slot_released for every slot a booking of this
+    process covers (unless the change stream reports every change anyway)
+    """
+    if slot_watcher is not None:
+        return
+    day = slot_date(date_str).date()
+    for time_str in slot_times(start_time, end_time, SLOT_DURATION_MINUTES):
+        bookings = occupancy.bookings(day, minutes_of(time_str))
+        slot_events.publish(event_type, slot_event_data(date_str, time_str, bookings, SLOT_CAPACITY))
+
+def bench_conflict(date_str, start_time):
+    """Why no technician could be reserved: a full start slot or a repair too long for the gap"""
+    if scheduler.free_technician(date_str, start_time, time_of(minutes_of(start_time) + SLOT_DURATION_MINUTES)):
+        return 'No technician is free for the whole repair'
+    return 'Slot is already fully booked'
+
+def release_bench(calendar_entry):
+    """Give back the technician reserved for a calendar entry that was not written or was released"""
+    scheduler.release(calendar_entry['date'], calendar_entry['start_time'], calendar_entry['end_time'],
+                      calendar_entry['technician'])
+
+def release_appointment(request_id):
+    """
+    Free the slots, bench time and calendar entry of a repair request whose
+    appointment no longer takes place
+    """
+    for calendar_entry in repository.release_appointment(request_id):
+        occupancy.remove_booking(calendar_entry['date'], calendar_entry['start_time'], calendar_entry['end_time'])
+        if calendar_entry.get('technician'):
+            release_bench(calendar_entry)
+        # New booking version: cached feeds are stale now
+        feed_cache.bump()
+        announce_slots('slot_released', calendar_entry['date'], calendar_entry['start_time'],
+                       calendar_entry['end_time'])
+
+def slot_conflict(appt_day, start_min, message, duration=SLOT_DURATION_MINUTES):
+    """
+    409 response for a slot that cannot be booked, with the next start
+    times that have duration minutes of free bench time
+    """
+    requested = appt_day + timedelta(minutes=start_min)
+    alternatives = scheduler.candidates(max(requested, datetime.now()), duration, ALTERNATIVE_SLOTS)
+    return jsonify({
+        'success': False,
+        'error': message,
+        'alternatives': [
+            {'date': day.strftime('%Y-%m-%d'), 'timeSlot': time_of(minutes)}
+            for day, minutes, _ in alternatives
+        ]
+    }), 409
+
+# ============================================================================
+# REPAIR REQUEST DOCUMENTS
+# ============================================================================
+
+def quote_repairs(device, repairs):
+    """
+    Repairs of a payload with the server's quotedPrice (see pricing.py) and
+    their totalQuotedPrice; if the catalog cannot price the device and all
+    of its repairs, the client's prices are dropped and the total is None,
+    to be quoted by the shop
+    """
+    quote = pricing.request_quote(device, repairs)
+    if quote is not None:
+        return apply_quote(repairs, quote)
+    return [
+        {key: value for key, value in repair.items() if key != 'quotedPrice'} if isinstance(repair, dict) else repair
+        for repair in repairs
+    ], None
+
+
+def build_repair_request(data):
+    """
+    Build the repair_requests document for a POST /request payload
+    Raises KeyError for missing required fields, ValueError for a bad appointment date
+    """
+    # Create repair request document with required fields
+    repair_request = {
+        'customer': data['customer'],
+        'device': data['device'],
+        'serviceType': data['serviceType'],
+        'submittedAt': datetime.utcnow()
+    }
+    
+    # Add optional fields if provided
+    if 'repairs' in data:
+        # Prices come from the pricing engine, never from the client
+        repair_request['repairs'], total = quote_repairs(data['device'], data['repairs'])
+        if total is not None:
+            repair_request['totalQuotedPrice'] = total
+    if 'appointment' in data:
+        # Convert date string to datetime object for MongoDB
+        appointment = data['appointment'].copy()
+        if 'time' in appointment and 'timeSlot' not in appointment:
+            appointment['timeSlot'] = appointment.pop('time')
+        if 'date' in appointment and isinstance(appointment['date'], str):
+            # Parse date string (format: YYYY-MM-DD)
+            appointment['date'] = datetime.strptime(appointment['date'], '%Y-%m-%d')
+        repair_request['appointment'] = appointment
+    # Workflow status (see workflow.py): new requests start in the initial
+    # one and only move on through PATCH /request/<id>/status
+    if data.get('status', workflow.initial) != workflow.initial:
+        raise InvalidStatus(f"New repair requests start as '{workflow.initial}', "
+                            f"change the status with PATCH /request/<id>/status")
+    repair_request['status'] = workflow.initial
+    repair_request['statusChangedAt'] = repair_request['submittedAt']
+    if 'totalActualPrice' in data:
+        repair_request['totalActualPrice'] = data['totalActualPrice']
+    if 'additionalNotes' in data:
+        repair_request['additionalNotes'] = data['additionalNotes']
     
-    return appointments
+    # Search keys for customer_search on /requests
+    repair_request.update(build_search_keys(data['customer']))
+    return repair_request
+
+
+def request_duration(data):
+    """
+    Bench time of a POST /request payload's repairs in minutes, rounded up
+    to whole slots
+    """
+    minutes = bench_minutes(data.get('repairs'), catalog.repair_durations(), SLOT_DURATION_MINUTES)
+    return scheduler.slots_for(minutes) * SLOT_DURATION_MINUTES
+
+
+def appointment_slot(appointment_data):
+    """
+    Start time 'HH:MM' of a requested appointment: its timeSlot, or time as
+    request.htm sent it before; raises ValueError if there is none
+    """
+    time_slot = appointment_data.get('timeSlot') or appointment_data.get('time')
+    if not isinstance(time_slot, str) or not re.fullmatch(r'([01]?[0-9]|2[0-3]):[0-5][0-9]', time_slot.strip()):
+        raise ValueError('appointment.timeSlot (HH:MM) is required')
+    return time_slot.strip()
+
+
+def appointment_times(appointment_data, duration=SLOT_DURATION_MINUTES):
+    """
+    Date, start and end time of a requested appointment of duration minutes
+    Returns ('YYYY-MM-DD', 'HH:MM', 'HH:MM')
+    """
+    # Parse the appointment date and time
+    appt_date_str = appointment_data.get('date')  # YYYY-MM-DD
+    start_hour, start_minute = divmod(minutes_of(appointment_slot(appointment_data)), 60)
+    
+    end_hour = start_hour
+    end_minute = start_minute + duration
+    if end_minute >= 60:
+        end_hour += end_minute // 60
+        end_minute = end_minute % 60
+    
+    return appt_date_str, f"{start_hour:02d}:{start_minute:02d}", f"{end_hour:02d}:{end_minute:02d}"
+
+
+def minutes_of(hhmm):
+    """Minutes since midnight of an 'HH:MM' string"""
+    hour, minute = hhmm.split(':')
+    return int(hour) * 60 + int(minute)
+
+
+def time_of(minutes):
+    """'HH:MM' string of minutes since midnight"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def build_calendar_entry(data, request_id, appt_date_str, start_time, end_time):
+    """
+    Build the calendar document for a booked appointment
+    """
+    return {
+        'date': appt_date_str,
+        'timezone': 'UTC',
+        'start_time': start_time,
+        'end_time': end_time,
+        'customer': {
+            'request_id': str(request_id),
+            'booking_time': datetime.utcnow().isoformat(),
+            'first_name': data['customer'].get('firstName', ''),
+            'last_name': data['customer'].get('lastName', ''),
+            'email': data['customer'].get('email', ''),
+            'phone': data['customer'].get('phoneNumber', '')
+        },
+        'device': {
+            'device_type': data['device'].get('type', ''),
+            'brand': data['device'].get('manufacturer', ''),
+            'model': data['device'].get('model', '')
+        }
+    }
 
 # ============================================================================
 # ROUTE HANDLERS - DOCUMENTATION
@@ -232,40 +1167,78 @@ def list_routes():
                 'brand': 'Filter by manufacturer/brand',
                 'model': 'Filter by device model',
                 'postal_code': 'Filter by customer postal code',
-                'customer_search': 'Search across all customer fields (name, email, phone, address)',
-                'limit': 'Max results (default: 10, max: 50)'
+                'customer_search': 'Search across all customer fields (name, email, phone, address), ranked by exact word matches',
+                'limit': 'Max results (default: 10, max: 50)',
+                'after': 'Opaque next_after token of the previous page',
+                'count': 'exact (default), estimate or none: how total_found is computed',
+                'archive': 'exclude (default), include or only: whether archived requests are searched',
+                'fields': 'Comma-separated field paths to return, e.g. customer.lastName,device.model (default: all)',
+                'view': 'Named field set: list (result cards), calendar or detail (all fields)'
             },
-            'returns': 'Array of matching repair requests with metadata'
+            'returns': 'Array of matching repair requests (newest first) with metadata'
         },
         'GET /options': {
-            'description': 'Get available filter options',
+            'description': 'Get available filter options with request counts',
             'parameters': {
-                'filter': 'Required: device_types, brands, models, postal_codes, cities',
+                'filter': 'Required: device_types, brands, models, postal_codes, cities, all',
                 'device_type': 'For models filter: limit to specific device type',
-                'brand': 'For models filter: limit to specific brand'
+                'brand': 'For models filter: limit to specific brand',
+                'prefix': 'Only values starting with this text (case-insensitive)',
+                'sort': 'value (default) or count',
+                'limit': 'Max values (default: 50, max: 500)',
+                'offset': 'Number of values to skip'
             },
             'examples': [
                 '/options?filter=device_types',
                 '/options?filter=models&device_type=smartphone',
-                '/options?filter=models&brand=Samsung'
+                '/options?filter=models&brand=Samsung&prefix=gal',
+                '/options?filter=all&brand=Samsung'
             ],
-            'returns': 'List of available options (max 50, sorted)'
+            'returns': 'Sorted list of available options with counts; filter=all returns the counts of every facet for the /requests filter parameters'
         },
         'GET /request?id=<id>': {
-            'description': 'Get details of a specific repair request',
-            'parameters': 'id (required): MongoDB ObjectId of the repair request',
-            'returns': 'Complete repair request document'
+            'description': 'Get details of a specific repair request (archived ones included)',
+            'parameters': 'id (required): ObjectId of the repair request; fields, view (optional): as for /requests',
+            'returns': 'Complete repair request document, or the selected fields'
         },
         'POST /request': {
             'description': 'Create a new repair request',
             'required_fields': ['customer', 'device', 'serviceType'],
-            'optional_fields': ['repairs', 'appointment', 'status', 'totalQuotedPrice', 'totalActualPrice', 'additionalNotes'],
-            'returns': 'ID of newly created repair request'
+            'optional_fields': ['repairs', 'appointment', 'totalActualPrice', 'additionalNotes'],
+            'returns': 'ID of newly created repair request',
+            'conflict': '409 with alternative slots if the appointment slot is fully booked or closed, or no technician is free for the bench time of its repairs'
+        },
+        'PATCH /request/<id>/status': {
+            'description': 'Move a repair request to another workflow status',
+            'body': 'status (required), from (optional): expected current status, note (optional)',
+            'returns': 'New and previous status; 409 with the allowed next statuses if the transition is not allowed; '
+                       'cancelled and rejected free the appointment slots for new bookings'
+        },
+        'GET /statuses': {
+            'description': 'Workflow statuses with their allowed next statuses and the number of repair requests in each',
+            'returns': 'Statuses in workflow order with count and next'
+        },
+        'POST /requests/bulk': {
+            'description': 'Create many repair requests at once',
+            'body': 'JSON array or NDJSON (application/x-ndjson) of POST /request payloads',
+            'returns': 'Per-item results (index, success, status, id or error)'
         },
         'GET /sorry': {
             'description': 'Get a random BOFH excuse',
             'returns': 'Random excuse text'
         },
+        'GET /metrics': {
+            'description': 'Prometheus metrics: request latencies per route, MongoDB command timings, connection pools, .ics feed sizes',
+            'returns': 'Prometheus text exposition format'
+        },
+        'GET /healthz': {
+            'description': 'Liveness probe: the process answers (no database access)',
+            'returns': 'status ok, process id and the database state of the last readiness check'
+        },
+        'GET /readyz': {
+            'description': 'Readiness probe: the database answers a ping within HEALTH_CHECK_TIMEOUT_MS (result reused for HEALTH_CHECK_CACHE_SECONDS)',
+            'returns': 'ready, database state and latency_ms; 503 with the error if the database is slow or down'
+        },
         'GET /calendar': {
             'description': 'Full calendar with appointment details as JSON (requires authentication)',
             'authentication': 'HTTP Basic Auth required',
@@ -274,16 +1247,55 @@ def list_routes():
         'GET /calendar.ics': {
             'description': 'Full calendar with appointment details (requires authentication)',
             'authentication': 'HTTP Basic Auth required',
+            'parameters': 'compact (optional): 1 to publish closed hours as recurring events (RRULE/EXDATE)',
             'returns': 'iCalendar file with complete appointment information'
         },
         'GET /slots?range=<range>': {
             'description': 'Available/busy slots without details (public)',
-            'parameters': 'range (optional): today (default), this_week, next_week, this_month, next_month, this_year',
-            'returns': 'JSON with booked slots and non-working hours'
+            'parameters': {
+                'range': 'today (default), this_week, next_week, this_month, next_month, this_year',
+                'format': 'rules: closed hours as weekly closed_rules plus closed_dates instead of one block per day'
+            },
+            'returns': 'JSON with booked slots and non-working hours'
         },
         'GET /slots.ics': {
             'description': 'Available/busy slots as calendar (public)',
+            'parameters': 'compact (optional): 1 to publish closed hours as recurring events (RRULE/EXDATE)',
             'returns': 'iCalendar file showing busy/free times without details'
+        },
+        'GET /catalog/models': {
+            'description': 'Autocomplete for device models from smartphone_models.csv (public)',
+            'parameters': {
+                'q': 'Search text: every word matches the start of a brand or model word, or fuzzily (typos)',
+                'brand': 'Only models of this brand',
+                'limit': 'Max results (default: 10, max: 100)'
+            },
+            'returns': 'Matching models (brand, model, release date, connector, ...), exact matches and popular models first'
+        },
+        'GET /catalog/repairs?model=<model>': {
+            'description': 'Repairs offered for a device model from repairs_overview.csv (public)',
+            'parameters': 'model (required): model name with or without brand, brand (optional)',
+            'returns': 'The model and its repairs with type, name, description (English and German), duration and price; 404 for an unknown model'
+        },
+        'POST /quotes/batch': {
+            'description': 'Server-side quotes for many device and repair combinations in one call (public)',
+            'body': 'JSON array of {model, brand (optional), repairs: [repair names]} (max 10000 items)',
+            'returns': 'Per item: repair prices with brand, model and age multipliers, subtotal, combined-repair discount and totalQuotedPrice (null if a repair is priced on request), or an error'
+        },
+        'GET /schedule': {
+            'description': 'Next appointment start times with one technician free for the whole bench time (public)',
+            'parameters': {
+                'repair': 'Repair name as in repairs_overview.csv, repeatable: bench time is the sum of their durations',
+                'duration': 'Bench time in minutes instead of repair',
+                'after': 'Start searching after this date or datetime (ISO format, default: now)',
+                'count': 'Number of candidates (default: 5, max: 50)'
+            },
+            'returns': 'Candidates with date, timeSlot, endTime and technician, earliest first'
+        },
+        'GET /events': {
+            'description': 'Server-Sent Events stream of slot changes (public)',
+            'parameters': 'Last-Event-ID header or last_event_id (optional): resume after this event',
+            'returns': 'text/event-stream of slot_booked/slot_released events with date, time, bookings, capacity and available; reset if missed events are no longer available'
         }
     }
     
@@ -297,22 +1309,33 @@ def list_routes():
 # ROUTE HANDLERS - UTILITY ENDPOINTS
 # ============================================================================
 
+FORTUNE_COMMAND = '/usr/games/fortune'
+FORTUNE_TIMEOUT_SECONDS = 5
+
+
+def clean_excuse(output):
+    """
+    Strip the "BOFH excuse #XXX:" prefix from fortune output
+    """
+    excuse = output.strip()
+    
+    # Remove "BOFH excuse #XXX:" prefix if present
+    if excuse.startswith("BOFH excuse"):
+        # Find the position after the newlines following the prefix
+        lines = excuse.split('\n', 2)  # Split at most into 3 parts
+        if len(lines) >= 3:
+            excuse = lines[2].strip()  # Take everything after the second newline
+        elif len(lines) == 2:
+            excuse = lines[1].strip()  # Take everything after the first newline
+    
+    return excuse
+
+
 @app.route("/sorry")
 def get_excuse():
     try:
-       result = subprocess.run(['/usr/games/fortune'], capture_output=True, text=True, timeout=5 )
-       excuse = result.stdout.strip()
-
-       # Remove "BOFH excuse #XXX:" prefix if present
-       if excuse.startswith("BOFH excuse"):
-           # Find the position after the newlines following the prefix
-           lines = excuse.split('\n', 2)  # Split at most into 3 parts
-           if len(lines) >= 3:
-              excuse = lines[2].strip()  # Take everything after the second newline
-           elif len(lines) == 2:
-              excuse = lines[1].strip()  # Take everything after the first newline
-
-       return jsonify({"excuse": excuse})
+       result = subprocess.run([FORTUNE_COMMAND], capture_output=True, text=True, timeout=FORTUNE_TIMEOUT_SECONDS)
+       return jsonify({"excuse": clean_excuse(result.stdout)})
     except subprocess.TimeoutExpired:
        return jsonify({"excuse": "The excuse generator timed out"}), 500
     except FileNotFoundError:
@@ -320,6 +1343,41 @@ def get_excuse():
     except Exception as e:
        return jsonify({"excuse": f"Error: {str(e)}"}), 500
 
+
+@app.route("/metrics", methods=['GET'])
+def prometheus_metrics():
+    """
+    Prometheus scrape endpoint (see metrics.py)
+    """
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+
+@app.route("/healthz", methods=['GET'])
+def healthz():
+    """
+    Liveness: the process answers requests; no database I/O (see health.py)
+    """
+    response = jsonify({
+        'success': True,
+        'status': 'ok',
+        'pid': os.getpid(),
+        'database': readiness.last()
+    })
+    response.headers['Cache-Control'] = 'no-store'
+    return response, 200
+
+
+@app.route("/readyz", methods=['GET'])
+def readyz():
+    """
+    Readiness: the database answered a ping within HEALTH_CHECK_TIMEOUT_MS
+    """
+    result = readiness.check()
+    response = jsonify(dict(result, success=result['ready'], backend=STORAGE_BACKEND))
+    response.headers['Cache-Control'] = 'no-store'
+    return response, 200 if result['ready'] else 503
+
 # ============================================================================
 # ROUTE HANDLERS - REPAIR REQUESTS
 # ============================================================================
@@ -330,106 +1388,47 @@ def list_repair_requests():
         import time
         start_time = time.time()
         
-        # Build query filter
-        query = {}
+        page = requests_page_params(request.args)
+        if page['count_mode'] not in COUNT_MODES:
+            return jsonify(invalid_count_mode(page['count_mode'])), 400
         
-        # (1) Filter by request date range
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
+        # Execute query; one extra document tells whether there is a next page
+        repair_requests = repository.find_requests(page)
+        results, next_after = finish_requests_page(page, repair_requests)
         
-        if start_date or end_date:
-            date_filter = {}
-            if start_date:
-                date_filter['$gte'] = datetime.strptime(start_date, '%Y-%m-%d')
+        # Count the whole result set only as precisely as the caller needs
+        filters = page['filters']
+        total_found_exact = True
+        if page['count_mode'] == 'exact':
+            total_found = repository.count_requests(filters, archive=page['archive'])
+        elif page['count_mode'] == 'estimate':
+            if filters:
+                total_found = repository.count_requests(filters, limit=COUNT_ESTIMATE_LIMIT, archive=page['archive'])
+                total_found_exact = total_found < COUNT_ESTIMATE_LIMIT
             else:
-                # Default to today if not provided
-                date_filter['$gte'] = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            
-            if end_date:
-                date_filter['$lte'] = datetime.strptime(end_date, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
-            else:
-                # Default to 90 days from start
-                start = date_filter.get('$gte', datetime.now())
-                date_filter['$lte'] = start + timedelta(days=90)
-            
-            query['submittedAt'] = date_filter
-        
-        # (2) Filter by device type
-        device_type = request.args.get('device_type')
-        if device_type:
-            query['device.type'] = device_type
-        
-        # (3) Filter by brand (manufacturer)
-        brand = request.args.get('brand')
-        if brand:
-            query['device.manufacturer'] = brand
-        
-        # (4) Filter by model
-        model = request.args.get('model')
-        if model:
-            query['device.model'] = model
-        
-        # (5) Search by postal code
-        postal_code = request.args.get('postal_code')
-        if postal_code:
-            query['customer.address.postalCode'] = postal_code
-        
-        # (6) Search by customer (across multiple fields)
-        customer_search = request.args.get('customer_search')
-        if customer_search:
-            # Create regex pattern for case-insensitive search
-            regex_pattern = {'$regex': customer_search, '$options': 'i'}
-            query['$or'] = [
-                {'customer.firstName': regex_pattern},
-                {'customer.lastName': regex_pattern},
-                {'customer.email': regex_pattern},
-                {'customer.phoneNumber': regex_pattern},
-                {'customer.address.street': regex_pattern},
-                {'customer.address.postalCode': regex_pattern},
-                {'customer.address.city': regex_pattern},
-                {'customer.address.houseNumber': regex_pattern}
-            ]
-        
-        # Get limit parameter (default 10, max 50)
-        limit = request.args.get('limit', '10')
-        try:
-            limit = min(int(limit), 50)  # Cap at 50
-        except ValueError:
-            limit = 10
-        
-        # Execute query
-        repair_requests = list(db.repair_requests.find(query).limit(limit))
-        
-        # Convert to response format
-        results = []
-        for doc in repair_requests:
-            # Convert Decimal128 to float
-            doc = convert_decimal128(doc)
-            
-            doc['_id'] = str(doc['_id'])
-            
-            # Convert datetime objects to ISO format
-            if 'submittedAt' in doc:
-                doc['submittedAt'] = doc['submittedAt'].isoformat()
-            if 'updatedAt' in doc:
-                doc['updatedAt'] = doc['updatedAt'].isoformat()
-            if 'appointment' in doc and 'date' in doc['appointment']:
-                if isinstance(doc['appointment']['date'], datetime):
-                    doc['appointment']['date'] = doc['appointment']['date'].strftime('%Y-%m-%d')
-            
-            results.append(doc)
+                total_found = repository.estimated_count(archive=page['archive'])
+                total_found_exact = False
+        else:
+            total_found = None
+            total_found_exact = False
         
         # Calculate search time
         search_time = time.time() - start_time
         
+        return jsonify(requests_page_body(page, results, next_after, total_found, total_found_exact, search_time)), 200
+        
+    except ValueError as e:
         return jsonify({
-            'success': True,
-            'count': len(results),
-            'total_found': db.repair_requests.count_documents(query),
-            'limit': limit,
-            'search_time_ms': round(search_time * 1000, 2),
-            'results': results
-        }), 200
+            'success': False,
+            'error': str(e)
+        }), 400
+        
+    except QueryTimeout:
+        logger.warning(f"customer_search exceeded {CUSTOMER_SEARCH_MAX_TIME_MS} ms")
+        return jsonify({
+            'success': False,
+            'error': 'Search took too long, please use a more specific search term'
+        }), 503
         
     except Exception as e:
         logger.error(f"Error in list_repair_requests: {str(e)}", exc_info=True)
@@ -441,79 +1440,75 @@ def list_repair_requests():
 @app.route("/options", methods=['GET'])
 def get_filter_options():
     """
-    Get available filter options for search
+    Get available filter options for search from the facet store
     Examples:
     - /options?filter=device_types
-    - /options?filter=brands
+    - /options?filter=brands&sort=count
     - /options?filter=models&device_type=smartphone
-    - /options?filter=models&brand=Samsung
+    - /options?filter=models&brand=Samsung&prefix=gal
+    - /options?filter=all&start_date=2025-01-01 (counts of every facet for a /requests filter)
     """
     try:
         import time
         start_time = time.time()
         
         filter_type = request.args.get('filter')
+        available_filters = list(FACETS) + ['all']
         
         if not filter_type:
             return jsonify({
                 'success': False,
                 'error': 'Missing filter parameter',
-                'available_filters': ['device_types', 'brands', 'models', 'postal_codes', 'cities']
+                'available_filters': available_filters
             }), 400
         
-        results = []
-        
-        if filter_type == 'device_types':
-            # Get all unique device types
-            results = db.repair_requests.distinct('device.type')
-            
-        elif filter_type == 'brands':
-            # Get all unique brands/manufacturers
-            results = db.repair_requests.distinct('device.manufacturer')
-            
-        elif filter_type == 'models':
-            # Get models, optionally filtered by device_type or brand
-            query = {}
-            device_type = request.args.get('device_type')
-            brand = request.args.get('brand')
-            
-            if device_type:
-                query['device.type'] = device_type
-            if brand:
-                query['device.manufacturer'] = brand
-            
-            if query:
-                # Use aggregation to get distinct models with filter
-                results = db.repair_requests.find(query).distinct('device.model')
-            else:
-                results = db.repair_requests.distinct('device.model')
-        
-        elif filter_type == 'postal_codes':
-            # Get all unique postal codes
-            results = db.repair_requests.distinct('customer.address.postalCode')
-            
-        elif filter_type == 'cities':
-            # Get all unique cities
-            results = db.repair_requests.distinct('customer.address.city')
-            
-        else:
+        if filter_type not in available_filters:
             return jsonify({
                 'success': False,
                 'error': f'Invalid filter type: {filter_type}',
-                'available_filters': ['device_types', 'brands', 'models', 'postal_codes', 'cities']
+                'available_filters': available_filters
             }), 400
         
-        # Filter out None values and limit to 50 results
-        results = [r for r in results if r is not None][:50]
+        # Paging parameters (default 50 values, max 500)
+        try:
+            limit = min(int(request.args.get('limit', '50')), 500)
+            offset = max(int(request.args.get('offset', '0')), 0)
+        except ValueError:
+            limit, offset = 50, 0
+        
+        if filter_type == 'all':
+            # Counts of every facet for the current /requests filter in one round-trip
+            facets = repository.facet_counts(requests_filters(request.args), limit)
+            search_time = time.time() - start_time
+            return jsonify({
+                'success': True,
+                'filter': filter_type,
+                'search_time_ms': round(search_time * 1000, 2),
+                'facets': facets
+            }), 200
+        
+        sort = request.args.get('sort', 'value')
+        scope = {name: request.args.get(name) for name in FACETS[filter_type]['scope']}
+        counts, has_more = repository.facet_options(
+            filter_type,
+            scope=scope,
+            prefix=request.args.get('prefix'),
+            sort=sort,
+            offset=offset,
+            limit=limit
+        )
         
         search_time = time.time() - start_time
         
         return jsonify({
             'success': True,
             'filter': filter_type,
-            'count': len(results),
+            'count': len(counts),
+            'offset': offset,
+            'has_more': has_more,
             'search_time_ms': round(search_time * 1000, 2),
-            'options': sorted(results)  # Sort alphabetically for better UX
+            'options': [row['value'] for row in counts],  # Sorted alphabetically unless sort=count
+            'counts': counts
         }), 200
         
     except Exception as e:
@@ -534,11 +1529,16 @@ def handle_repair_request():
                     'success': False,
                     'error': 'Missing id parameter'
                 }), 400
+            try:
+                fields = parse_fields(request.args.get('fields'), request.args.get('view'))
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 400
             
-            from bson.objectid import ObjectId
-            
-            # Find the repair request by ID
-            repair_request = db.repair_requests.find_one({'_id': ObjectId(request_id)})
+            # Find the repair request by ID (without its search keys)
+            repair_request = repository.get_request(request_id, fields=fields)
             
             if not repair_request:
                 return jsonify({
@@ -546,18 +1546,6 @@ def handle_repair_request():
                     'error': 'Repair request not found'
                 }), 404
             
-            # Convert Decimal128 to float
-            repair_request = convert_decimal128(repair_request)
-            
-            # Convert ObjectId to string for JSON serialization
-            repair_request['_id'] = str(repair_request['_id'])
-            
-            # Convert datetime objects to ISO format strings
-            if 'submittedAt' in repair_request:
-                repair_request['submittedAt'] = repair_request['submittedAt'].isoformat()
-            if 'updatedAt' in repair_request:
-                repair_request['updatedAt'] = repair_request['updatedAt'].isoformat()
-            
             return jsonify({
                 'success': True,
                 'data': repair_request
@@ -571,101 +1559,63 @@ def handle_repair_request():
     
     else:  # POST method
         try:
-            logger.info("POST /request - Processing repair request submission")
             data = request.get_json()
-            logger.info(f"Received data: {data}")
-            
-            # Create repair request document with required fields
-            repair_request = {
-                'customer': data['customer'],
-                'device': data['device'],
-                'serviceType': data['serviceType'],
-                'submittedAt': datetime.utcnow()
-            }
-            
-            # Add optional fields if provided
-            if 'repairs' in data:
-                for repair in data['repairs']:
-                    if 'quotedPrice' in repair:
-                       repair['quotedPrice'] = Decimal128(str(repair['quotedPrice']))
-                repair_request['repairs'] = data['repairs']
-            if 'appointment' in data:
-                # Convert date string to datetime object for MongoDB
-                appointment = data['appointment'].copy()
-                if 'date' in appointment and isinstance(appointment['date'], str):
-                    # Parse date string (format: YYYY-MM-DD)
-                    from datetime import datetime as dt
-                    appointment['date'] = dt.strptime(appointment['date'], '%Y-%m-%d')
-                repair_request['appointment'] = appointment
-            if 'status' in data:
-                repair_request['status'] = data['status']
-            if 'totalQuotedPrice' in data:
-                repair_request['totalQuotedPrice'] = data['totalQuotedPrice']
-            if 'totalActualPrice' in data:
-                repair_request['totalActualPrice'] = data['totalActualPrice']
-            if 'additionalNotes' in data:
-                repair_request['additionalNotes'] = data['additionalNotes']
             
-            logger.info(f"Inserting into MongoDB: {repair_request}")
-            # Insert into MongoDB
-            result = db.repair_requests.insert_one(repair_request)
-            logger.info(f"Successfully inserted with ID: {result.inserted_id}")
+            repair_request = build_repair_request(data)
             
-            # If appointment is provided, also insert into calendar collection
+            # If appointment is provided, the slot is reserved and the calendar entry
+            # written together with the repair request (see reservations.py)
             if 'appointment' in data:
-                appointment_data = data['appointment']
+                # The appointment lasts as long as its repairs take on the bench
+                duration = request_duration(data)
+                appt_date_str, start_time, end_time = appointment_times(data['appointment'], duration)
+                appt_day = slot_date(appt_date_str)
+                start_min, end_min = minutes_of(start_time), minutes_of(end_time)
                 
-                # Parse the appointment date and time
-                appt_date_str = appointment_data.get('date')  # YYYY-MM-DD
-                appt_time_str = appointment_data.get('timeSlot', '09:00')  # HH:MM
+                # Closed hours and holidays cannot be booked at all
+                if not occupancy.is_open(appt_day.date(), start_min, end_min):
+                    return slot_conflict(appt_day, start_min, 'Slot is outside opening hours', duration)
                 
-                # Calculate start and end times
-                if ':' in appt_time_str:
-                    start_hour, start_minute = map(int, appt_time_str.split(':'))
-                else:
-                    start_hour, start_minute = 9, 0
+                # One technician has to be free for the whole bench time
+                technician = scheduler.reserve(appt_date_str, start_time, end_time)
+                if technician is None:
+                    return slot_conflict(appt_day, start_min, bench_conflict(appt_date_str, start_time), duration)
                 
-                end_hour = start_hour
-                end_minute = start_minute + SLOT_DURATION_MINUTES
-                if end_minute >= 60:
-                    end_hour += end_minute // 60
-                    end_minute = end_minute % 60
+                repair_request['_id'] = ObjectId()
+                calendar_entry = build_calendar_entry(data, repair_request['_id'], appt_date_str, start_time, end_time)
+                calendar_entry['technician'] = technician
                 
-                start_time = f"{start_hour:02d}:{start_minute:02d}"
-                end_time = f"{end_hour:02d}:{end_minute:02d}"
+                try:
+                    repository.book(repair_request, calendar_entry, SLOT_CAPACITY, SLOT_DURATION_MINUTES)
+                except SlotUnavailable:
+                    release_bench(calendar_entry)
+                    return slot_conflict(appt_day, start_min, 'Slot is already fully booked', duration)
+                except Exception:
+                    release_bench(calendar_entry)
+                    raise
+                inserted_id = repair_request['_id']
                 
-                # Create calendar entry
-                calendar_entry = {
-                    'date': appt_date_str,
-                    'timezone': 'UTC',
-                    'start_time': start_time,
-                    'end_time': end_time,
-                    'customer': {
-                        'request_id': str(result.inserted_id),
-                        'booking_time': datetime.utcnow().isoformat(),
-                        'first_name': data['customer'].get('firstName', ''),
-                        'last_name': data['customer'].get('lastName', ''),
-                        'email': data['customer'].get('email', ''),
-                        'phone': data['customer'].get('phoneNumber', '')
-                    },
-                    'device': {
-                        'device_type': data['device'].get('type', ''),
-                        'brand': data['device'].get('manufacturer', ''),
-                        'model': data['device'].get('model', '')
-                    }
-                }
-                
-                logger.info(f"Inserting into calendar collection: {calendar_entry}")
-                db.calendar.insert_one(calendar_entry)
-                logger.info("Successfully inserted into calendar collection")
+                # Keep the slot occupancy index in sync without a rebuild
+                occupancy.add_booking(appt_date_str, start_time, end_time)
+                # New booking version: cached feeds are stale now
+                feed_cache.bump()
+                announce_slots('slot_booked', appt_date_str, start_time, end_time)
+            else:
+                inserted_id = repository.insert_request(repair_request)
+            
+            # Keep the /options facet counts up to date
+            repository.record_facets([repair_request])
             
             response_data = {
                 'success': True,
-                'id': str(result.inserted_id),
+                'id': str(inserted_id),
                 'message': 'Repair request created successfully',
                 'submittedAt': repair_request['submittedAt'].isoformat()
             }
-            logger.info(f"Sending response: {response_data}")
+            logger.info('Repair request created', extra={'fields': {
+                'request_id': response_data['id'],
+                'appointment': 'appointment' in data
+            }})
             
             return jsonify(response_data), 201
             
@@ -675,6 +1625,16 @@ def handle_repair_request():
                 'success': False,
                 'error': f'Missing required field: {str(e)}'
             }), 400
+        except InvalidStatus as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': f'Invalid appointment: {str(e)}'
+            }), 400
         except Exception as e:
             logger.error(f"Error processing request: {str(e)}", exc_info=True)
             return jsonify({
@@ -682,12 +1642,381 @@ def handle_repair_request():
                 'error': str(e)
             }), 500
 
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/x-jsonlines')
+
+
+def iter_json_array(stream, read_bytes=BULK_READ_BYTES, max_item_bytes=BULK_MAX_ITEM_BYTES):
+    """
+    Yield (item, error) for every element of a JSON array in a binary
+    stream, decoding one element at a time with JSONDecoder.raw_decode, so
+    the array is never held as a whole
+    Raises ValueError if the body does not start a JSON array; an element
+    that cannot be decoded (or is larger than max_item_bytes) is yielded
+    as an error and ends the array, as the elements after it cannot be found
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8-sig')()
+    buffer = ''
+    pos = 0
+    eof = False
+    state = 'start'  # start, first (value or ']'), value, separator, end
+
+    while True:
+        # Skip whitespace, reading on at the end of the buffer
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            chunk = stream.read(read_bytes)
+            eof = not chunk
+            buffer, pos = text.decode(chunk, final=eof), 0
+        if pos >= len(buffer):
+            if state == 'end':
+                return
+            if state == 'start':
+                raise ValueError('Expected a JSON array or NDJSON (Content-Type: application/x-ndjson)')
+            yield None, 'Invalid JSON: the array is not closed'
+            return
+
+        char = buffer[pos]
+        if state == 'start':
+            if char != '[':
+                raise ValueError('Expected a JSON array or NDJSON (Content-Type: application/x-ndjson)')
+            pos += 1
+            state = 'first'
+        elif state == 'separator' or (state == 'first' and char == ']'):
+            if char == ']':
+                state = 'end'
+            elif char != ',':
+                yield None, f"Invalid JSON: expected ',' or ']' at '{buffer[pos:pos + 20]}'"
+                return
+            else:
+                state = 'value'
+            pos += 1
+        elif state == 'end':
+            yield None, 'Invalid JSON: data after the array'
+            return
+        else:
+            # Decode the next element, reading on while it is cut off by the
+            # end of the buffer (a number could go on in the next read)
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                    if end < len(buffer) or eof:
+                        break
+                except ValueError as e:
+                    if eof:
+                        yield None, f'Invalid JSON: {str(e)}'
+                        return
+                if len(buffer) - pos > max_item_bytes:
+                    yield None, f'Item larger than {max_item_bytes} bytes'
+                    return
+                chunk = stream.read(read_bytes)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + text.decode(chunk, final=eof), 0
+            yield item, None
+            pos = end
+            state = 'separator'
+
+
+def iter_bulk_items():
+    """
+    Yield (item, error) for every entry of a bulk body: a JSON array, which
+    is decoded item by item (see iter_json_array), or NDJSON, which is read
+    line by line
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line), None
+            except ValueError as e:
+                yield None, f'Invalid JSON: {str(e)}'
+        return
+
+    if not request.is_json:
+        raise ValueError('Expected a JSON array or NDJSON (Content-Type: application/x-ndjson)')
+    yield from iter_json_array(request.stream)
+
+
+def item_error(index, status, error):
+    return {'index': index, 'success': False, 'status': status, 'error': error}
+
+
+def insert_bulk_chunk(chunk):
+    """
+    Validate, reserve and insert one chunk of (index, item, parse error)
+    Returns the per-item results and the number of booked appointments
+    """
+    results = []
+    pending = []  # (index, repair_request, calendar_entry or None)
+    for index, data, error in chunk:
+        if error:
+            results.append(item_error(index, 400, error))
+            continue
+        try:
+            if not isinstance(data, dict):
+                raise ValueError('item must be a JSON object')
+            repair_request = build_repair_request(data)
+            repair_request['_id'] = ObjectId()
+            calendar_entry = None
+            if 'appointment' in data:
+                appt_date_str, start_time, end_time = appointment_times(data['appointment'], request_duration(data))
+                appt_day = slot_date(appt_date_str)
+                if not occupancy.is_open(appt_day.date(), minutes_of(start_time), minutes_of(end_time)):
+                    results.append(item_error(index, 409, 'Slot is outside opening hours'))
+                    continue
+                technician = scheduler.reserve(appt_date_str, start_time, end_time)
+                if technician is None:
+                    results.append(item_error(index, 409, bench_conflict(appt_date_str, start_time)))
+                    continue
+                try:
+                    calendar_entry = build_calendar_entry(data, repair_request['_id'], appt_date_str, start_time,
+                                                          end_time)
+                    calendar_entry['technician'] = technician
+                    # Same conditional updates as POST /request, one per slot the appointment covers
+                    times = slot_times(start_time, end_time, SLOT_DURATION_MINUTES)
+                    reserved = repository.reserve_slots(appt_date_str, times, repair_request['_id'],
+                                                        data['customer'].get('email', ''), SLOT_CAPACITY)
+                except Exception:
+                    scheduler.release(appt_date_str, start_time, end_time, technician)
+                    raise
+                if not reserved:
+                    release_bench(calendar_entry)
+                    results.append(item_error(index, 409, 'Slot is already fully booked'))
+                    continue
+            pending.append((index, repair_request, calendar_entry))
+        except KeyError as e:
+            results.append(item_error(index, 400, f'Missing required field: {str(e)}'))
+        except (ValueError, TypeError, AttributeError, ArithmeticError) as e:
+            results.append(item_error(index, 400, f'Invalid item: {str(e)}'))
+        except Exception as e:
+            # One item's failure (e.g. a lost database connection) ends that item, not the chunk
+            logger.error(f"Bulk item {index} failed: {str(e)}", exc_info=True)
+            results.append(item_error(index, 500, str(e)))
+
+    failed = {}
+    if pending:
+        try:
+            errors = repository.insert_requests([doc for _, doc, _ in pending])
+            for position, error in errors.items():
+                failed[pending[position][0]] = error
+
+            entries = [(index, entry) for index, _, entry in pending if entry is not None and index not in failed]
+            if entries:
+                errors = repository.insert_calendar_entries([entry for _, entry in entries])
+                for position, error in errors.items():
+                    failed[entries[position][0]] = error
+        except Exception as e:
+            logger.error(f"Bulk insert failed: {str(e)}", exc_info=True)
+            failed = {index: str(e) for index, _, _ in pending}
+
+    created = []
+    booked = 0
+    for index, repair_request, calendar_entry in pending:
+        if index in failed:
+            # Undo whatever part of this item made it, so nothing is orphaned
+            repository.remove_request(repair_request, calendar_entry)
+            if calendar_entry is not None:
+                release_bench(calendar_entry)
+                announce_slots('slot_released', calendar_entry['date'], calendar_entry['start_time'],
+                               calendar_entry['end_time'])
+            results.append(item_error(index, 500, failed[index]))
+            continue
+        created.append(repair_request)
+        if calendar_entry is not None:
+            occupancy.add_booking(calendar_entry['date'], calendar_entry['start_time'], calendar_entry['end_time'])
+            announce_slots('slot_booked', calendar_entry['date'], calendar_entry['start_time'],
+                           calendar_entry['end_time'])
+            booked += 1
+        results.append({'index': index, 'success': True, 'status': 201, 'id': str(repair_request['_id'])})
+
+    # Keep the /options facet counts up to date
+    if created:
+        repository.record_facets(created)
+
+    results.sort(key=lambda result: result['index'])
+    return results, booked
+
+
+@app.route("/requests/bulk", methods=['POST'])
+def create_repair_requests_bulk():
+    """
+    Create many repair requests at once: a JSON array or NDJSON stream of
+    POST /request payloads, inserted in chunks of BULK_CHUNK_SIZE
+    """
+    try:
+        results = []
+        booked = 0
+        chunk = []
+        truncated = False
+
+        for index, (item, error) in enumerate(iter_bulk_items()):
+            if index >= BULK_MAX_ITEMS:
+                truncated = True
+                break
+            chunk.append((index, item, error))
+            if len(chunk) >= BULK_CHUNK_SIZE:
+                chunk_results, chunk_booked = insert_bulk_chunk(chunk)
+                results.extend(chunk_results)
+                booked += chunk_booked
+                chunk = []
+        if chunk:
+            chunk_results, chunk_booked = insert_bulk_chunk(chunk)
+            results.extend(chunk_results)
+            booked += chunk_booked
+
+        if booked:
+            # New booking version: cached feeds are stale now
+            feed_cache.bump()
+
+        inserted = sum(1 for result in results if result['success'])
+        logger.info('Bulk repair requests', extra={'fields': {
+            'items': len(results),
+            'inserted': inserted,
+            'appointments': booked
+        }})
+
+        return jsonify({
+            'success': inserted == len(results) and not truncated,
+            'total': len(results),
+            'inserted': inserted,
+            'failed': len(results) - inserted,
+            'truncated': truncated,
+            'results': results
+        }), 200
+
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"Error in create_repair_requests_bulk: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# ============================================================================
+# ROUTE HANDLERS - WORKFLOW STATUS
+# ============================================================================
+
+def transition_conflict(current, target, expected=None):
+    """
+    409 response for a status change the workflow does not allow, or one
+    whose expected current status no longer matches
+    """
+    if workflow.allowed(current, target) and expected != current:
+        error = f"Status is '{current}', not '{expected}'"
+    else:
+        error = f"Cannot change status from '{current}' to '{target}'"
+    return jsonify({
+        'success': False,
+        'error': error,
+        'status': current,
+        'allowed': workflow.next_states(current)
+    }), 409
+
+
+@app.route("/request/<request_id>/status", methods=['PATCH'])
+def update_request_status(request_id):
+    """
+    Move a repair request to another workflow status
+    The transition is checked against the compiled workflow and applied in a
+    single conditional update, so concurrent changes cannot skip a state;
+    with 'from' the change only happens if the status is still that one
+    """
+    try:
+        if not ObjectId.is_valid(request_id):
+            return jsonify({'success': False, 'error': 'Invalid id'}), 400
+        data = request.get_json(silent=True) or {}
+        target = workflow.validate(data.get('status'))
+
+        sources = workflow.sources[target]
+        if data.get('from') is not None:
+            sources = sources & {workflow.validate(data['from'])}
+
+        changed_at = datetime.utcnow()
+        previous = repository.transition_status(request_id, sources, target, changed_at, data.get('note'))
+        if previous is None:
+            repair_request = repository.get_request(request_id)
+            if repair_request is None:
+                return jsonify({'success': False, 'error': 'Repair request not found'}), 404
+            return transition_conflict(repair_request.get('status'), target, data.get('from'))
+
+        if target in APPOINTMENT_RELEASE_STATUSES:
+            release_appointment(request_id)
+
+        metrics.STATUS_TRANSITIONS.labels(previous, target).inc()
+        logger.info('Repair request status changed', extra={'fields': {
+            'request_id': request_id,
+            'from': previous,
+            'to': target
+        }})
+        return jsonify({
+            'success': True,
+            'id': request_id,
+            'status': target,
+            'previousStatus': previous,
+            'statusChangedAt': changed_at.isoformat(),
+            'allowed': workflow.next_states(target)
+        }), 200
+
+    except InvalidStatus as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"Error in update_request_status: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route("/statuses", methods=['GET'])
+def list_statuses():
+    """
+    Workflow statuses in order with their allowed next statuses and the
+    number of repair requests in each, read from the status counters
+    """
+    try:
+        counts = repository.status_counts()
+        statuses = [
+            {'status': status, 'count': counts.get(status, 0), 'next': workflow.next_states(status)}
+            for status in workflow.states
+        ]
+        # Statuses written before the workflow existed (e.g. 'completed')
+        statuses += [
+            {'status': status, 'count': count, 'next': []}
+            for status, count in sorted(counts.items()) if count and not workflow.is_state(status)
+        ]
+        return jsonify({
+            'success': True,
+            'initial': workflow.initial,
+            'statuses': statuses,
+            'total': sum(counts.values())
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 # ============================================================================
 # ROUTE HANDLERS - CALENDAR ENDPOINTS
 # ============================================================================
 
 @app.route("/calendar", methods=['GET'])
 @require_calendar_auth
+@cached_feed
 def calendar_json():
     """
     Full calendar with all appointment details - JSON format (requires authentication)
@@ -700,30 +2029,7 @@ def calendar_json():
         # Get appointments from calendar collection
         appointments = get_calendar_appointments(start_date, end_date)
         
-        # Build response with appointments only
-        events = []
-        
-        for appt in appointments:
-            events.append({
-                'type': 'appointment',
-                'id': appt['id'],
-                'date': appt['date'],
-                'timezone': appt['timezone'],
-                'start': appt['start_time'],
-                'end': appt['end_time'],
-                'customer': appt['customer'],
-                'device': appt['device']
-            })
-        
-        return jsonify({
-            'success': True,
-            'period': {
-                'start': start_date.isoformat(),
-                'end': end_date.isoformat()
-            },
-            'slot_duration_minutes': SLOT_DURATION_MINUTES,
-            'events': events
-        }), 200
+        return jsonify(calendar_body(appointments, start_date, end_date)), 200
         
     except Exception as e:
         logger.error(f"Error generating calendar JSON: {str(e)}", exc_info=True)
@@ -735,101 +2041,31 @@ def calendar_json():
 
 @app.route("/calendar.ics", methods=['GET'])
 @require_calendar_auth
+@cached_feed
 def calendar_full():
     """
     Full calendar with all appointment details - requires authentication
     """
     try:
-        # Create calendar
-        cal = Calendar()
-        cal.add('prodid', '-//Repair Shop Calendar//EN')
-        cal.add('version', '2.0')
-        cal.add('calscale', 'GREGORIAN')
-        cal.add('x-wr-calname', 'Repair Shop - Full Details')
-        cal.add('x-wr-timezone', 'UTC')
+        calendar_properties = [
+            ('prodid', '-//Repair Shop Calendar//EN'),
+            ('version', '2.0'),
+            ('calscale', 'GREGORIAN'),
+            ('x-wr-calname', 'Repair Shop - Full Details'),
+            ('x-wr-timezone', 'UTC')
+        ]
         
         # Get date range (next 90 days)
         start_date = datetime.now()
         end_date = start_date + timedelta(days=90)
         
-        # Add non-working hour blocks
-        non_working_blocks = get_non_working_blocks(start_date, end_date)
-        for block_start, block_end in non_working_blocks:
-            event = Event()
-            event.add('summary', 'Closed')
-            event.add('dtstart', block_start)
-            event.add('dtend', block_end)
-            event.add('transp', 'OPAQUE')  # Show as busy
-            event.add('status', 'CONFIRMED')
-            
-            # Add description for closed periods
-            if is_holiday(block_start):
-                event.add('description', 'Holiday - Shop Closed')
-            elif WORKING_HOURS.get(block_start.weekday()) is None:
-                event.add('description', 'Weekend - Shop Closed')
-            else:
-                event.add('description', 'Non-working hours')
-            
-            cal.add_component(event)
-        
-        # Add appointments with full details from calendar collection
-        appointments = get_calendar_appointments(start_date, end_date)
-        
-        for appt in appointments:
-            event = Event()
-            
-            # Build detailed summary
-            customer = appt.get('customer', {})
-            device = appt.get('device', {})
-            customer_name = f"{customer.get('first_name', '')} {customer.get('last_name', '')}".strip()
-            device_info = f"{device.get('brand', '')} {device.get('model', '')}".strip()
-            
-            event.add('summary', f"Appointment: {customer_name}")
-            
-            # Build detailed description
-            description_parts = [
-                f"Customer: {customer_name}",
-                f"Phone: {customer.get('phone', 'N/A')}",
-                f"Email: {customer.get('email', 'N/A')}",
-                f"Device: {device_info}",
-                f"Device Type: {device.get('device_type', 'N/A')}"
-            ]
-            
-            event.add('description', '\n'.join(description_parts))
-            
-            # Set date/time - combine date string with time string
-            appt_date_str = appt.get('date')  # YYYY-MM-DD
-            start_time_str = appt.get('start_time')  # HH:MM
-            end_time_str = appt.get('end_time')  # HH:MM
-            
-            if appt_date_str and start_time_str:
-                # Parse date and time
-                appt_date = datetime.strptime(appt_date_str, '%Y-%m-%d').date()
-                start_hour, start_minute = map(int, start_time_str.split(':'))
-                start_datetime = datetime.combine(appt_date, time(start_hour, start_minute))
-                
-                event.add('dtstart', start_datetime)
-                
-                if end_time_str:
-                    end_hour, end_minute = map(int, end_time_str.split(':'))
-                    end_datetime = datetime.combine(appt_date, time(end_hour, end_minute))
-                    event.add('dtend', end_datetime)
-                else:
-                    event.add('dtend', start_datetime + timedelta(minutes=SLOT_DURATION_MINUTES))
-            
-            event.add('status', 'CONFIRMED')
-            event.add('transp', 'OPAQUE')  # Show as busy
-            event.add('uid', f"repair-{appt['id']}@repairshop.local")
-            
-            cal.add_component(event)
+        # Non-working hour blocks plus appointments with full details
+        if compact_feed_requested():
+            events = iter_compact_feed_events(start_date, end_date, public=False)
+        else:
+            events = iter_feed_events(start_date, end_date, public=False)
         
-        return Response(
-            cal.to_ical(),
-            mimetype='text/calendar',
-            headers={
-                'Content-Disposition': 'attachment; filename=repair-shop-full.ics'
-            }
-        )
+        return ics_response(calendar_properties, events, 'repair-shop-full.ics')
         
     except Exception as e:
         logger.error(f"Error generating full calendar: {str(e)}", exc_info=True)
@@ -840,9 +2076,12 @@ def calendar_full():
 
 
 @app.route("/slots", methods=['GET'])
+@cached_feed
 def slots_json():
     """
     Public endpoint showing busy/free slots without details - JSON format
+    With format=rules closed hours are returned as weekly closed_rules plus
+    closed_dates (holidays) and busy_slots only lists the bookings
     """
     try:
         # Get time range parameter (default: today)
@@ -889,50 +2128,42 @@ def slots_json():
             # Invalid parameter, default to today
             end_date = start_date.replace(hour=23, minute=59, second=59)
         
-        # Get non-working blocks
-        non_working_blocks = get_non_working_blocks(start_date, end_date)
-        
-        # Get appointments from calendar collection (without customer details)
-        appointments = get_calendar_appointments(start_date, end_date)
-        
-        # Build response
+        # Closed blocks and bookings come from the precomputed occupancy index
         busy_slots = []
+        rules_format = request.args.get('format') == 'rules'
         
-        # Add non-working blocks
-        for block_start, block_end in non_working_blocks:
-            busy_slots.append({
-                'start': block_start.isoformat(),
-                'end': block_end.isoformat(),
-                'type': 'closed',
-                'reason': 'Non-working hours'
-            })
-        
-        # Add booked appointments (without customer details)
-        for appt in appointments:
-            appt_date_str = appt.get('date')  # YYYY-MM-DD
-            start_time_str = appt.get('start_time')  # HH:MM
-            end_time_str = appt.get('end_time')  # HH:MM
-            
-            if appt_date_str and start_time_str:
-                # Parse date and time to create ISO format datetime
-                appt_date = datetime.strptime(appt_date_str, '%Y-%m-%d').date()
-                start_hour, start_minute = map(int, start_time_str.split(':'))
-                start_datetime = datetime.combine(appt_date, time(start_hour, start_minute))
-                
-                if end_time_str:
-                    end_hour, end_minute = map(int, end_time_str.split(':'))
-                    end_datetime = datetime.combine(appt_date, time(end_hour, end_minute))
-                else:
-                    end_datetime = start_datetime + timedelta(minutes=SLOT_DURATION_MINUTES)
-                
+        if rules_format:
+            # Closed hours as weekly rules plus holiday exceptions
+            closed_rules = [{
+                'days': list(rule.weekdays),
+                'start': rule.start.isoformat(),
+                'end': rule.end.isoformat(),
+                'reason': rule.reason
+            } for rule in closed_hour_rules(WORKING_HOURS)]
+            closed_dates = [{
+                'date': day.isoformat(),
+                'reason': reason
+            } for day, reason in business_calendar.closed_dates(start_date.date(), end_date.date())]
+        else:
+            # Add non-working blocks
+            for block_start, block_end in occupancy.closed_blocks(start_date, end_date):
                 busy_slots.append({
-                    'start': start_datetime.isoformat(),
-                    'end': end_datetime.isoformat(),
-                    'type': 'booked',
-                    'reason': 'Appointment scheduled'
+                    'start': block_start.isoformat(),
+                    'end': block_end.isoformat(),
+                    'type': 'closed',
+                    'reason': 'Non-working hours'
                 })
         
-        return jsonify({
+        # Add booked appointments (without customer details)
+        for appt_start, appt_end in occupancy.booked_intervals(start_date, end_date):
+            busy_slots.append({
+                'start': appt_start.isoformat(),
+                'end': appt_end.isoformat(),
+                'type': 'booked',
+                'reason': 'Appointment scheduled'
+            })
+        
+        response_data = {
             'success': True,
             'range': range_param,
             'period': {
@@ -948,7 +2179,12 @@ def slots_json():
                 } if hours else None
                 for day, hours in WORKING_HOURS.items()
             }
-        }), 200
+        }
+        if rules_format:
+            response_data['closed_rules'] = closed_rules
+            response_data['closed_dates'] = closed_dates
+        
+        return jsonify(response_data), 200
         
     except Exception as e:
         logger.error(f"Error generating slots JSON: {str(e)}", exc_info=True)
@@ -959,88 +2195,219 @@ def slots_json():
 
 
 @app.route("/slots.ics", methods=['GET'])
+@cached_feed
 def slots_ics():
     """
     Public endpoint showing busy/free slots without details - iCalendar format
     """
     try:
-        # Create calendar
-        cal = Calendar()
-        cal.add('prodid', '-//Repair Shop Calendar//EN')
-        cal.add('version', '2.0')
-        cal.add('calscale', 'GREGORIAN')
-        cal.add('x-wr-calname', 'Repair Shop - Availability')
-        cal.add('x-wr-timezone', 'UTC')
-        cal.add('method', 'PUBLISH')
+        calendar_properties = [
+            ('prodid', '-//Repair Shop Calendar//EN'),
+            ('version', '2.0'),
+            ('calscale', 'GREGORIAN'),
+            ('x-wr-calname', 'Repair Shop - Availability'),
+            ('x-wr-timezone', 'UTC'),
+            ('method', 'PUBLISH')
+        ]
         
         # Get date range (next 90 days)
         start_date = datetime.now()
         end_date = start_date + timedelta(days=90)
         
-        # Add non-working hour blocks
-        non_working_blocks = get_non_working_blocks(start_date, end_date)
-        for block_start, block_end in non_working_blocks:
-            event = Event()
-            event.add('summary', 'Unavailable')
-            event.add('dtstart', block_start)
-            event.add('dtend', block_end)
-            event.add('transp', 'OPAQUE')  # Show as busy
-            event.add('status', 'CONFIRMED')
-            event.add('class', 'PUBLIC')
-            
-            cal.add_component(event)
+        # Non-working hour blocks plus appointments without details
+        if compact_feed_requested():
+            events = iter_compact_feed_events(start_date, end_date, public=True)
+        else:
+            events = iter_feed_events(start_date, end_date, public=True)
         
-        # Add appointments without details from calendar collection
-        appointments = get_calendar_appointments(start_date, end_date)
+        return ics_response(calendar_properties, events, 'repair-shop-slots.ics')
         
-        for appt in appointments:
-            event = Event()
-            event.add('summary', 'Busy')  # Generic title only
-            
-            # Set date/time - combine date string with time string
-            appt_date_str = appt.get('date')  # YYYY-MM-DD
-            start_time_str = appt.get('start_time')  # HH:MM
-            end_time_str = appt.get('end_time')  # HH:MM
-            
-            if appt_date_str and start_time_str:
-                # Parse date and time
-                appt_date = datetime.strptime(appt_date_str, '%Y-%m-%d').date()
-                start_hour, start_minute = map(int, start_time_str.split(':'))
-                start_datetime = datetime.combine(appt_date, time(start_hour, start_minute))
-                
-                event.add('dtstart', start_datetime)
-                
-                if end_time_str:
-                    end_hour, end_minute = map(int, end_time_str.split(':'))
-                    end_datetime = datetime.combine(appt_date, time(end_hour, end_minute))
-                    event.add('dtend', end_datetime)
-                else:
-                    event.add('dtend', start_datetime + timedelta(minutes=SLOT_DURATION_MINUTES))
-            
-            event.add('status', 'CONFIRMED')
-            event.add('transp', 'OPAQUE')  # Show as busy
-            event.add('class', 'PUBLIC')
-            event.add('uid', f"slot-{appt['id']}@repairshop.local")
-            
-            # No description, location, or attendee information
-            
-            cal.add_component(event)
+    except Exception as e:
+        logger.error(f"Error generating slots calendar: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route("/catalog/models", methods=['GET'])
+def catalog_models():
+    """
+    Autocomplete for device models: every term of q matches the start of a
+    word of brand or model, or fuzzily if nothing starts with it
+    """
+    try:
+        try:
+            limit = min(int(request.args.get('limit', CATALOG_MODELS_LIMIT)), CATALOG_MODELS_MAX_LIMIT)
+            if limit <= 0:
+                raise ValueError('limit must be positive')
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': f'Invalid parameter: {str(e)}'
+            }), 400
         
-        return Response(
-            cal.to_ical(),
-            mimetype='text/calendar',
-            headers={
-                'Content-Disposition': 'attachment; filename=repair-shop-slots.ics'
-            }
-        )
+        query = request.args.get('q', '')
+        models = []
+        for model, match in catalog.search_models(query, brand=request.args.get('brand'), limit=limit):
+            entry = {key: value for key, value in model.items() if key != 'popularity'}
+            entry['match'] = match
+            models.append(entry)
+        
+        return jsonify({
+            'success': True,
+            'query': query,
+            'count': len(models),
+            'models': models
+        }), 200
         
     except Exception as e:
-        logger.error(f"Error generating slots calendar: {str(e)}", exc_info=True)
+        logger.error(f"Error searching the catalog: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route("/catalog/repairs", methods=['GET'])
+def catalog_repairs():
+    """
+    Repairs offered for a device model, with duration and price
+    """
+    try:
+        name = request.args.get('model')
+        if not name:
+            return jsonify({
+                'success': False,
+                'error': 'Missing model parameter'
+            }), 400
+        
+        model = catalog.find_model(name, brand=request.args.get('brand'))
+        if model is None:
+            return jsonify({
+                'success': False,
+                'error': 'Model not found'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'model': {key: value for key, value in model.items() if key != 'popularity'},
+            'repairs': catalog.repairs()
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error reading the catalog: {str(e)}", exc_info=True)
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+
+@app.route("/quotes/batch", methods=['POST'])
+def quote_batch():
+    """
+    Server-side quotes for many device and repair combinations at once: a
+    JSON array of {model, brand (optional), repairs: [repair names]}
+    """
+    try:
+        items = request.get_json(silent=True)
+        if not isinstance(items, list):
+            return jsonify({
+                'success': False,
+                'error': 'Body must be a JSON array of quote items'
+            }), 400
+        if len(items) > QUOTE_BATCH_MAX_ITEMS:
+            return jsonify({
+                'success': False,
+                'error': f'At most {QUOTE_BATCH_MAX_ITEMS} items per batch'
+            }), 400
+        
+        results = []
+        for index, quote in enumerate(pricing.quote_batch(items)):
+            if isinstance(quote, QuoteError):
+                results.append({'index': index, 'success': False, 'error': str(quote)})
+            else:
+                results.append({'index': index, 'success': True, 'quote': quote})
+        
+        quoted = sum(1 for result in results if result['success'])
+        return jsonify({
+            'success': quoted == len(results),
+            'total': len(results),
+            'quoted': quoted,
+            'failed': len(results) - quoted,
+            'results': results
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error in quote_batch: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route("/schedule", methods=['GET'])
+def schedule_candidates():
+    """
+    Next start times at which one technician is free for the whole bench
+    time of the given repairs (see scheduler.py), for the booking form
+    """
+    try:
+        try:
+            if request.args.get('duration'):
+                duration = int(request.args['duration'])
+                if duration <= 0:
+                    raise ValueError('duration must be positive')
+            else:
+                repairs = [{'serviceName': name} for name in request.args.getlist('repair')]
+                duration = bench_minutes(repairs, catalog.repair_durations(), SLOT_DURATION_MINUTES)
+            count = min(int(request.args.get('count', SCHEDULE_CANDIDATES)), SCHEDULE_MAX_CANDIDATES)
+            if count <= 0:
+                raise ValueError('count must be positive')
+            after = datetime.fromisoformat(request.args['after']) if request.args.get('after') else datetime.now()
+            after = max(after, datetime.now())
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': f'Invalid parameter: {str(e)}'
+            }), 400
+        
+        slots = scheduler.slots_for(duration)
+        candidates = []
+        for day, minutes, technician in scheduler.candidates(after, duration, count):
+            candidates.append({
+                'date': day.strftime('%Y-%m-%d'),
+                'timeSlot': time_of(minutes),
+                'endTime': time_of(minutes + slots * SLOT_DURATION_MINUTES),
+                'technician': technician
+            })
+        
+        return jsonify({
+            'success': True,
+            'duration_minutes': slots * SLOT_DURATION_MINUTES,
+            'slot_duration_minutes': SLOT_DURATION_MINUTES,
+            'candidates': candidates
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error finding schedule candidates: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route("/events", methods=['GET'])
+def slot_event_stream():
+    """
+    Server-Sent Events of booked and released slots (see events.py),
+    resuming after the Last-Event-ID header or last_event_id parameter
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    return Response(
+        event_stream(slot_events, last_event_id, EVENT_KEEPALIVE_SECONDS),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 # ============================================================================
 # APPLICATION ENTRY POINT
 # ============================================================================
@@ -1048,4 +2415,5 @@ def slots_ics():
 if __name__ == "__main__":
     # Run the Flask development server
     # For production, use a proper WSGI server like gunicorn
+    # or the ASGI entry point in asgi.py (uvicorn asgi:app)
     app.run(host="0.0.0.0", port=5001, debug=True)
@@ -0,0 +1,106 @@
+"""
+Auto-archive job: moves finished repair requests out of the hot collection.
+
+Requests that stayed in a status leading to 'archived' in the workflow
+(feedback_received, rejected, cancelled) for ARCHIVE_AFTER_DAYS are set to
+'archived' and, together with requests archived by hand, moved from
+repair_requests to archived_requests (tables of the same names with
+SQLite). repair_requests and its indexes then only hold the requests the
+shop still works on; /requests searches the archive when asked to with
+?archive=include or ?archive=only, GET /request finds archived requests too.
+
+A run finds its candidates through the (status, statusChangedAt) index in
+batches of ARCHIVE_BATCH_SIZE, pauses ARCHIVE_BATCH_PAUSE_SECONDS between
+batches so bookings and searches are not held up, and stops after
+ARCHIVE_MAX_BATCHES; whatever is left is picked up by the next run. Each
+batch copies its requests before deleting them from repair_requests (in a
+transaction where the database supports one), and the copy replaces an
+existing one, so a run that was interrupted leaves nothing behind that the
+next run would not fix. The status counters and the /options facet
+counts move with every batch.
+
+app.py starts the job in a background thread every
+AUTO_ARCHIVE_INTERVAL_SECONDS; with that set to None, run it from cron:
+    python archiver.py
+"""
+import argparse
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_STATUS = 'archived'
+AUTO_ARCHIVE_NOTE = 'auto-archived'
+
+
+class Archiver:
+    """
+    Moves archivable repair requests of a repository to its archive
+    after_days: time a request stays in a final status before it is archived
+    """
+
+    def __init__(self, repository, workflow, after_days=90, batch_size=500, pause_seconds=1.0, max_batches=100):
+        if not workflow.is_state(ARCHIVED_STATUS):
+            raise ValueError(f"The workflow has no '{ARCHIVED_STATUS}' status")
+        self.repository = repository
+        self.statuses = sorted(workflow.sources[ARCHIVED_STATUS])
+        self.after_days = after_days
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+        self.max_batches = max_batches
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run(self, now=None):
+        """
+        Archive up to max_batches batches; returns the number of moved requests
+        """
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(days=self.after_days)
+        total = 0
+        for batch in range(self.max_batches):
+            if batch and self._stop.wait(self.pause_seconds):
+                break
+            moved = self.repository.archive_requests(
+                self.statuses, cutoff, ARCHIVED_STATUS, now, self.batch_size, note=AUTO_ARCHIVE_NOTE
+            )
+            total += moved
+            metrics.ARCHIVED_REQUESTS.inc(moved)
+            # A short batch means nothing else was due
+            if moved < self.batch_size:
+                break
+        if total:
+            logger.info(f"Archived {total} repair requests")
+        return total
+
+    def start(self, interval_seconds):
+        """Run every interval_seconds in a daemon thread (the first run after one interval)"""
+        self._thread = threading.Thread(target=self._loop, args=(interval_seconds,), name='archiver', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _loop(self, interval_seconds):
+        while not self._stop.wait(interval_seconds):
+            try:
+                self.run()
+            except Exception as e:
+                logger.error(f"Auto-archive failed: {str(e)}", exc_info=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Move finished repair requests to the archive (uses app.py's settings)")
+    parser.add_argument('--max-batches', type=int, help='batches in this run (default: ARCHIVE_MAX_BATCHES)')
+    args = parser.parse_args()
+
+    import app
+
+    if args.max_batches:
+        app.archiver.max_batches = args.max_batches
+    print(f"Archived {app.archiver.run()} repair requests")
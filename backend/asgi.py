@@ -0,0 +1,365 @@
+"""
+ASGI serving mode for the repair shop backend.
+
+The read endpoints that wait on MongoDB or on a subprocess are served as
+coroutines: /requests, GET /request and /calendar use an async MongoDB
+client, /sorry runs fortune as an asyncio subprocess. A single process then
+keeps many slow searches and calendar reads in flight on one event loop
+instead of holding a worker thread for each of them. The same goes for the
+/events streams (see events.py), which mostly sit idle. Query building,
+paging, formatting and the feed cache are shared with app.py, so routes and
+JSON shapes are the same as in the WSGI deployment.
+
+Every other route (bookings, bulk intake, /options, /slots, the .ics feeds)
+is passed on to the Flask app in app.py, which runs in a bounded thread pool.
+With STORAGE_BACKEND = 'sqlite' only /sorry and /events are served
+natively; all database routes go to the Flask app.
+
+Run with an ASGI server, e.g.:
+    uvicorn asgi:app --host 0.0.0.0 --port 5001
+
+Needs starlette, a2wsgi and pymongo >= 4.13 (AsyncMongoClient) or motor.
+"""
+import asyncio
+import base64
+import contextlib
+import functools
+import inspect
+import logging
+import time
+from datetime import date, datetime, timedelta
+
+from a2wsgi import WSGIMiddleware
+from bson.objectid import ObjectId
+from pymongo.errors import ExecutionTimeout
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.http import http_date, is_resource_modified
+
+try:
+    from pymongo import AsyncMongoClient
+except ImportError:  # pymongo < 4.13
+    from motor.motor_asyncio import AsyncIOMotorClient as AsyncMongoClient
+
+import app as wsgi
+import metrics
+from compression import CompressionMiddleware
+from events import stream_async as event_stream
+from fieldsets import parse_fields, projection
+from jsonprovider import RAW_BSON_OPTIONS, encode
+from repository import (ARCHIVE_SCOPES, REQUESTS_SORT, calendar_query, merge_pages, requests_page_find, requests_query,
+                        requests_search_pipeline)
+
+logger = logging.getLogger(__name__)
+
+# Worker threads for the routes served by the Flask app
+WSGI_THREADS = 32
+
+mongo = None  # AsyncMongoClient, opened on startup
+
+
+def adb():
+    return mongo[wsgi.MONGO_DB]
+
+
+async def maybe_await(value):
+    """AsyncMongoClient returns coroutines where motor returns cursors directly"""
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
+def json_response(body, status=200, headers=None):
+    return Response(encode(body), status_code=status, media_type='application/json', headers=headers)
+
+
+def calendar_authorized(request):
+    """Same check as require_calendar_auth() in app.py"""
+    auth = request.headers.get('authorization', '')
+    scheme, _, credentials = auth.partition(' ')
+    if scheme.lower() != 'basic':
+        return False
+    try:
+        username, _, password = base64.b64decode(credentials).decode('utf-8').partition(':')
+    except Exception:
+        return False
+    return username == wsgi.CALENDAR_USERNAME and password == wsgi.CALENDAR_PASSWORD
+
+
+def logged(handler):
+    """
+    One structured log record per request, like log_request() in app.py,
+    and the same request metrics as the Flask hooks
+    """
+    @functools.wraps(handler)
+    async def decorated(request):
+        started = time.perf_counter()
+        metrics.request_started()
+        try:
+            response = await handler(request)
+        finally:
+            metrics.request_finished()
+        duration = time.perf_counter() - started
+        metrics.observe_request(request.method, request.url.path, response.status_code, duration)
+        logger.info('request', extra={'fields': {
+            'method': request.method,
+            'path': request.url.path,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2)
+        }})
+        return response
+    return decorated
+
+
+def auth_required():
+    return Response(
+        'Authentication required for full calendar access',
+        401,
+        {'WWW-Authenticate': 'Basic realm="Calendar Access"'}
+    )
+
+
+def cached_response(request, entry):
+    """
+    Feed cache entry as a response with the validators cached_feed() in
+    app.py sends, or 304 Not Modified for a matching conditional request
+    """
+    headers = dict(entry.headers)
+    headers['ETag'] = f'"{entry.etag}"'
+    headers['Last-Modified'] = http_date(entry.last_modified)
+    headers['Cache-Control'] = 'no-cache'
+    headers['Vary'] = 'Authorization'
+
+    environ = {'REQUEST_METHOD': request.method}
+    for name in ('if-none-match', 'if-modified-since'):
+        if name in request.headers:
+            environ['HTTP_' + name.upper().replace('-', '_')] = request.headers[name]
+    if not is_resource_modified(environ, etag=entry.etag, last_modified=entry.last_modified):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type=entry.mimetype, headers=headers)
+
+# ============================================================================
+# ROUTE HANDLERS
+# ============================================================================
+
+@logged
+async def get_excuse(request):
+    try:
+        process = await asyncio.create_subprocess_exec(
+            wsgi.FORTUNE_COMMAND,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        try:
+            stdout, _ = await asyncio.wait_for(process.communicate(), timeout=wsgi.FORTUNE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return json_response({"excuse": "The excuse generator timed out"}, 500)
+        return json_response({"excuse": wsgi.clean_excuse(stdout.decode('utf-8', errors='replace'))})
+    except FileNotFoundError:
+        return json_response({"excuse": "Command not found"}, 500)
+    except Exception as e:
+        return json_response({"excuse": f"Error: {str(e)}"}, 500)
+
+
+@logged
+async def list_repair_requests(request):
+    try:
+        start_time = time.time()
+
+        page = wsgi.requests_page_params(request.query_params)
+        if page['count_mode'] not in wsgi.COUNT_MODES:
+            return json_response(wsgi.invalid_count_mode(page['count_mode']), 400)
+
+        # The hot collection, the archive or both (merged like MongoRepository does)
+        collections = [adb()[name] for name in ARCHIVE_SCOPES[page['archive']]]
+        pages = []
+        for collection in collections:
+            if page['customer_search']:
+                cursor = await maybe_await(collection.aggregate(
+                    requests_search_pipeline(page), maxTimeMS=wsgi.CUSTOMER_SEARCH_MAX_TIME_MS
+                ))
+                pages.append(await cursor.to_list(None))
+            else:
+                page_query, projection = requests_page_find(page)
+                pages.append(await (
+                    collection.find(page_query, projection)
+                    .sort(REQUESTS_SORT)
+                    .limit(page['limit'] + 1)
+                    .to_list(None)
+                ))
+        results, next_after = wsgi.finish_requests_page(page, merge_pages(page, pages))
+
+        query = requests_query(page['filters'])
+        count_options = {'maxTimeMS': wsgi.CUSTOMER_SEARCH_MAX_TIME_MS} if page['customer_search'] else {}
+        total_found_exact = True
+        if page['count_mode'] == 'exact':
+            total_found = 0
+            for collection in collections:
+                total_found += await collection.count_documents(query, **count_options)
+        elif page['count_mode'] == 'estimate':
+            if query:
+                total_found = 0
+                for collection in collections:
+                    total_found += await collection.count_documents(
+                        query, limit=wsgi.COUNT_ESTIMATE_LIMIT, **count_options
+                    )
+                total_found = min(total_found, wsgi.COUNT_ESTIMATE_LIMIT)
+                total_found_exact = total_found < wsgi.COUNT_ESTIMATE_LIMIT
+            else:
+                total_found = 0
+                for collection in collections:
+                    total_found += await collection.estimated_document_count()
+                total_found_exact = False
+        else:
+            total_found = None
+            total_found_exact = False
+
+        search_time = time.time() - start_time
+        return json_response(wsgi.requests_page_body(page, results, next_after, total_found, total_found_exact, search_time))
+
+    except ValueError as e:
+        return json_response({'success': False, 'error': str(e)}, 400)
+    except ExecutionTimeout:
+        logger.warning(f"customer_search exceeded {wsgi.CUSTOMER_SEARCH_MAX_TIME_MS} ms")
+        return json_response({
+            'success': False,
+            'error': 'Search took too long, please use a more specific search term'
+        }, 503)
+    except Exception as e:
+        logger.error(f"Error in list_repair_requests: {str(e)}", exc_info=True)
+        return json_response({'success': False, 'error': str(e)}, 500)
+
+
+@logged
+async def get_repair_request(request):
+    try:
+        request_id = request.query_params.get('id')
+        if not request_id:
+            return json_response({'success': False, 'error': 'Missing id parameter'}, 400)
+        try:
+            fields = parse_fields(request.query_params.get('fields'), request.query_params.get('view'))
+        except ValueError as e:
+            return json_response({'success': False, 'error': str(e)}, 400)
+
+        # Archived requests are looked up once the hot collection has none
+        for name in ARCHIVE_SCOPES['include']:
+            collection = adb()[name].with_options(codec_options=RAW_BSON_OPTIONS)
+            repair_request = await collection.find_one(
+                {'_id': ObjectId(request_id)},
+                projection(fields)
+            )
+            if repair_request:
+                break
+        if not repair_request:
+            return json_response({'success': False, 'error': 'Repair request not found'}, 404)
+
+        return json_response({'success': True, 'data': repair_request})
+
+    except Exception as e:
+        return json_response({'success': False, 'error': str(e)}, 500)
+
+
+@logged
+async def calendar_json(request):
+    if not calendar_authorized(request):
+        return auth_required()
+    try:
+        key = (
+            request.url.path,
+            tuple(sorted(request.query_params.multi_items())),
+            'full',
+            date.today().isoformat()
+        )
+        entry = wsgi.feed_cache.get(key)
+        if entry is None:
+            version = wsgi.feed_cache.version
+
+            # Get date range (next 90 days)
+            start_date = datetime.now()
+            end_date = start_date + timedelta(days=90)
+
+            entries = await adb().calendar.find(calendar_query(start_date, end_date)).to_list(None)
+            appointments = [wsgi.calendar_appointment(cal_entry) for cal_entry in entries]
+            body = encode(wsgi.calendar_body(appointments, start_date, end_date))
+            entry = wsgi.feed_cache.put(key, body, 'application/json', version=version)
+
+        return cached_response(request, entry)
+
+    except Exception as e:
+        logger.error(f"Error generating calendar JSON: {str(e)}", exc_info=True)
+        return json_response({'success': False, 'error': str(e)}, 500)
+
+@logged
+async def slot_event_stream(request):
+    """Same stream as /events in app.py, one coroutine per subscriber"""
+    last_event_id = request.headers.get('last-event-id') or request.query_params.get('last_event_id')
+    return StreamingResponse(
+        event_stream(wsgi.slot_events, last_event_id, wsgi.EVENT_KEEPALIVE_SECONDS),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# ============================================================================
+# APPLICATION
+# ============================================================================
+
+flask_app = WSGIMiddleware(wsgi.app, workers=WSGI_THREADS)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(application):
+    global mongo
+    # Indexes, archiver and slot watcher of this worker (the routes served
+    # here never reach the Flask app's first-request hook)
+    wsgi.start_process()
+    if wsgi.STORAGE_BACKEND != 'mongodb':
+        yield
+        return
+    # Commands and connections of the async client are reported alongside
+    # those of the Flask app's client; it has the same pool settings
+    mongo = AsyncMongoClient(
+        wsgi.MONGO_URI,
+        event_listeners=[metrics.CommandTimer(), wsgi.mongo_pool_monitor],
+        **wsgi.MONGO_CLIENT_OPTIONS
+    )
+    try:
+        yield
+    finally:
+        await maybe_await(mongo.close())
+
+
+routes = [
+    Route('/sorry', get_excuse, methods=['GET']),
+    Route('/events', slot_event_stream, methods=['GET'])
+]
+if wsgi.STORAGE_BACKEND == 'mongodb':
+    routes += [
+        Route('/requests', list_repair_requests, methods=['GET']),
+        Route('/request', get_repair_request, methods=['GET']),
+        Route('/calendar', calendar_json, methods=['GET'])
+    ]
+# Other methods on these paths (POST /request, CORS preflights) fall through
+# to the Flask app mounted last
+routes.append(Mount('/', app=flask_app))
+
+app = Starlette(
+    routes=routes,
+    middleware=[
+        # Same CORS configuration as app.py
+        Middleware(
+            CORSMiddleware,
+            allow_origins=['*'],
+            allow_methods=['GET', 'POST', 'PATCH', 'OPTIONS'],
+            allow_headers=['Content-Type', 'Authorization'],
+            expose_headers=['ETag', 'Last-Modified']
+        ),
+        # Same compression as app.py; the Flask app's responses arrive compressed already
+        Middleware(CompressionMiddleware, min_bytes=wsgi.COMPRESS_MIN_BYTES, mimetypes=wsgi.COMPRESS_MIMETYPES)
+    ],
+    lifespan=lifespan
+)
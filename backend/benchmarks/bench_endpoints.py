@@ -0,0 +1,246 @@
+"""
+Benchmark: endpoint latency and throughput at growing data sizes
+
+Fills the database with synthetic repair requests (generate_dataset.py)
+up to each of --sizes in turn and times the main endpoints at every size:
+/requests (plain, filtered, customer_search, estimated count), /options,
+/slots, /calendar.ics and POST /request. Requests go through Flask's test
+client in this process, or with --url to a running server that uses the
+same database. The feeds are fetched with a unique dummy parameter so the
+feed cache does not answer them (--warm-cache to measure cache hits).
+
+Every run appends one JSON line per size and endpoint (p50/p95/p99 in ms,
+requests/s, errors) to --results, tagged with the git revision or --label,
+and is compared with the latest earlier run of another revision with the
+same backend, target, size and concurrency. p95 regressions above
+--threshold are flagged; --fail-on-regression turns them into a non-zero
+exit status.
+
+Usage (from the backend folder):
+    python benchmarks/bench_endpoints.py [--sizes 10000 100000 1000000] [--requests 200] \\
+        [--concurrency 1] [--backend sqlite --sqlite-path /tmp/bench.db] [--keep] \\
+        [--url http://localhost:5001] [--label after-index-change] [--fail-on-regression]
+"""
+import argparse
+import base64
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from generate_dataset import DatasetGenerator, add_storage_arguments, booked_slots, open_app, populate
+
+RESULTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results', 'endpoints.jsonl')
+
+# (name, method, path); the bodies of POST cases are generated per call
+CASES = [
+    ('GET /requests', 'GET', '/requests'),
+    ('GET /requests?brand', 'GET', '/requests?brand=Samsung'),
+    ('GET /requests?customer_search', 'GET', '/requests?customer_search=schmidt%20berlin'),
+    ('GET /requests?count=estimate', 'GET', '/requests?count=estimate&device_type=smartphone'),
+    ('GET /options?filter=models', 'GET', '/options?filter=models&brand=Apple'),
+    ('GET /options?filter=all', 'GET', '/options?filter=all&brand=Samsung'),
+    ('GET /slots', 'GET', '/slots?range=this_month'),
+    ('GET /calendar.ics', 'GET', '/calendar.ics'),
+    ('POST /request', 'POST', '/request')
+]
+FEEDS = ('/slots', '/calendar.ics')
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else float('nan')
+
+
+def revision():
+    """Short git revision of the working tree ('-dirty' with local changes)"""
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+class TestClientTarget:
+    """Requests through Flask's test client (one client per thread)"""
+
+    name = 'testclient'
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def __call__(self, method, path, body, headers):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.app.test_client()
+        started = time.perf_counter()
+        response = client.open(path, method=method, json=body, headers=headers)
+        response.get_data()
+        return response.status_code, time.perf_counter() - started
+
+
+class HTTPTarget:
+    """Requests to a running server"""
+
+    name = 'http'
+
+    def __init__(self, base_url, timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def __call__(self, method, path, body, headers):
+        data = None
+        headers = dict(headers)
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            status = e.code
+        except OSError:
+            status = None
+        return status, time.perf_counter() - started
+
+
+def run_case(target, generator, case, total, concurrency, warm_cache, headers):
+    """Time total calls of one case; returns the result fields"""
+    _, method, path = case
+    lock = threading.Lock()
+
+    def call(i):
+        body = None
+        call_path = path
+        if method == 'POST':
+            with lock:  # the generator is not thread-safe
+                body = generator.payload(future=True)[0]
+        elif path.startswith(FEEDS) and not warm_cache:
+            call_path += ('&' if '?' in path else '?') + f'nocache={time.time_ns()}-{i}'
+        return target(method, call_path, body, headers)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for status, latency in results if status is not None and status < 400]
+    return {
+        'requests': total,
+        'concurrency': concurrency,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'throughput': round(total / elapsed, 1),
+        'errors': total - len(latencies)
+    }
+
+
+def load_results(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def baseline_for(history, record):
+    """Latest earlier result of another version for the same measurement"""
+    for previous in reversed(history):
+        if previous['version'] != record['version'] and all(
+                previous.get(key) == record[key] for key in ('backend', 'target', 'size', 'concurrency', 'endpoint')):
+            return previous
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--requests', type=int, default=200, help='calls per endpoint and size')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--url', help='benchmark a running server on the same database instead of the test client')
+    parser.add_argument('--user', default='admin:change_me_please', help='Basic auth for /calendar.ics')
+    parser.add_argument('--endpoint', action='append', help='only cases whose name contains this text, repeatable')
+    parser.add_argument('--warm-cache', action='store_true', help='let the feed cache answer /slots and /calendar.ics')
+    parser.add_argument('--keep', action='store_true', help='keep existing data (default: start empty)')
+    parser.add_argument('--seed', type=int, default=418)
+    parser.add_argument('--results', default=RESULTS_FILE)
+    parser.add_argument('--label', help='version tag of this run (default: git describe)')
+    parser.add_argument('--threshold', type=float, default=1.2, help='p95 ratio to the baseline flagged as regression')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    add_storage_arguments(parser)
+    args = parser.parse_args()
+
+    app = open_app(args.backend, args.mongo_uri, args.mongo_db, args.sqlite_path, drop=not args.keep)
+    target = HTTPTarget(args.url) if args.url else TestClientTarget(app)
+    cases = [case for case in CASES if not args.endpoint or any(text in case[0] for text in args.endpoint)]
+    headers = {'Authorization': 'Basic ' + base64.b64encode(args.user.encode('utf-8')).decode('ascii')}
+
+    earliest = datetime.combine(date.today() - timedelta(days=730), datetime.min.time())
+    generator = DatasetGenerator(app, seed=args.seed, taken=booked_slots(app.repository, earliest))
+    version = args.label or revision()
+    history = load_results(args.results)
+    os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+
+    print(f"version {version}, {app.STORAGE_BACKEND} via {target.name}, {args.requests} calls per endpoint, "
+          f"concurrency {args.concurrency}")
+    current = app.repository.count_requests({})
+    regressions = []
+    with open(args.results, 'a', encoding='utf-8') as results_file:
+        for size in sorted(args.sizes):
+            print(f"\n{size} repair requests")
+            if size > current:
+                started = time.perf_counter()
+                populate(generator, size - current)
+                print(f"(generated {size - current} in {time.perf_counter() - started:.1f} s)")
+                current = size
+            # Bookings were written behind the app's back
+            app.occupancy.build()
+            app.feed_cache.bump()
+
+            print(f"{'endpoint':<32} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8} {'errors':>6}  vs. baseline p95")
+            for case in cases:
+                record = {
+                    'version': version,
+                    'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+                    'backend': app.STORAGE_BACKEND,
+                    'target': target.name,
+                    'size': size,
+                    'endpoint': case[0]
+                }
+                record.update(run_case(target, generator, case, args.requests, args.concurrency,
+                                       args.warm_cache, headers))
+                results_file.write(json.dumps(record) + '\n')
+                results_file.flush()
+                current += args.requests if case[1] == 'POST' else 0
+
+                comparison = ''
+                baseline = baseline_for(history, record)
+                if baseline and baseline['p95_ms']:
+                    ratio = record['p95_ms'] / baseline['p95_ms']
+                    comparison = f"{ratio - 1:+.0%} ({baseline['version']})"
+                    if ratio > args.threshold:
+                        comparison += '  REGRESSION'
+                        regressions.append(f"{case[0]} @ {size}")
+                print(f"{case[0]:<32} {record['p50_ms']:>9.2f} {record['p95_ms']:>9.2f} {record['p99_ms']:>9.2f} "
+                      f"{record['throughput']:>8.1f} {record['errors']:>6}  {comparison}")
+
+    print(f"results appended to {args.results}")
+    if regressions:
+        print(f"p95 regressions over {args.threshold:.2f}x: {', '.join(regressions)}")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark: full Calendar object graph vs. streamed iCalendar output
+
+Compares build_calendar(...).to_ical() with stream_calendar(...) for the
+/calendar.ics feed on a 90-day and a 365-day window. Appointments are
+synthetic (one every working half hour with the given fill rate), so no
+MongoDB instance is needed.
+
+Usage (from the backend folder):
+    python benchmarks/bench_ics.py [--fill 0.5] [--repeat 3]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app  # noqa: E402
+from icswriter import build_calendar, stream_calendar  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+CALENDAR_PROPERTIES = [
+    ('prodid', '-//Repair Shop Calendar//EN'),
+    ('version', '2.0'),
+    ('calscale', 'GREGORIAN'),
+    ('x-wr-calname', 'Repair Shop - Full Details'),
+    ('x-wr-timezone', 'UTC')
+]
+
+
+def synthetic_appointments(start_date, days, fill):
+    """Calendar entries for every free working slot, kept with probability fill"""
+    rng = random.Random(418)
+    appointments = []
+    for offset in range(days + 1):
+        day = (start_date + timedelta(days=offset)).date()
+        hours = app.business_calendar.hours(day)
+        if hours is None:
+            continue
+        slot = datetime.combine(day, hours[0])
+        while slot.time() < hours[1]:
+            if rng.random() < fill:
+                end = slot + timedelta(minutes=app.SLOT_DURATION_MINUTES)
+                appointments.append({
+                    'id': f'{len(appointments):024x}',
+                    'date': day.isoformat(),
+                    'start_time': slot.strftime('%H:%M'),
+                    'end_time': end.strftime('%H:%M'),
+                    'customer': {'first_name': 'Erika', 'last_name': 'Mustermann',
+                                 'email': 'erika@example.org', 'phone': '+49 30 1234567'},
+                    'device': {'device_type': 'smartphone', 'brand': 'Fairphone', 'model': 'Fairphone 5'}
+                })
+            slot += timedelta(minutes=app.SLOT_DURATION_MINUTES)
+    return appointments
+
+
+def events(start_date, end_date, appointments):
+    for block_start, block_end in app.get_non_working_blocks(start_date, end_date):
+        yield app.closed_block_event(block_start, block_end, public=False)
+    for appt in appointments:
+        yield app.appointment_event(appt, public=False)
+
+
+def run_build(start_date, end_date, appointments):
+    started = time.perf_counter()
+    body = build_calendar(CALENDAR_PROPERTIES, events(start_date, end_date, appointments)).to_ical()
+    # The whole body only exists once everything is serialized
+    first_byte = time.perf_counter() - started
+    return body, first_byte, time.perf_counter() - started
+
+
+def run_stream(start_date, end_date, appointments):
+    started = time.perf_counter()
+    first_byte = None
+    chunks = []
+    for chunk in stream_calendar(CALENDAR_PROPERTIES, events(start_date, end_date, appointments)):
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        chunks.append(chunk)
+    return b''.join(chunks), first_byte, time.perf_counter() - started
+
+
+def measure(fn, start_date, end_date, appointments, repeat):
+    timings = []
+    for _ in range(repeat):
+        body, first_byte, total = fn(start_date, end_date, appointments)
+        timings.append((first_byte, total))
+    # Peak memory in a separate run so tracing does not skew the timings
+    tracemalloc.start()
+    fn(start_date, end_date, appointments)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    best_first = min(t[0] for t in timings)
+    best_total = min(t[1] for t in timings)
+    return body, best_first, best_total, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fill', type=float, default=0.5, help='share of working slots that are booked')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement (best is reported)')
+    args = parser.parse_args()
+
+    start_date = datetime.now()
+    print(f"{'window':>8} {'events':>7} {'mode':>7} {'first byte ms':>14} {'total ms':>9} {'peak KiB':>9} {'size KiB':>9}")
+    for days in (90, 365):
+        end_date = start_date + timedelta(days=days)
+        appointments = synthetic_appointments(start_date, days, args.fill)
+        n_events = len(app.get_non_working_blocks(start_date, end_date)) + len(appointments)
+
+        results = {}
+        for mode, fn in (('build', run_build), ('stream', run_stream)):
+            body, first_byte, total, peak = measure(fn, start_date, end_date, appointments, args.repeat)
+            results[mode] = body
+            print(f"{days:>7}d {n_events:>7} {mode:>7} {first_byte * 1000:>14.2f} {total * 1000:>9.1f} "
+                  f"{peak / 1024:>9.0f} {len(body) / 1024:>9.0f}")
+
+        if results['build'] != results['stream']:
+            print(f"ERROR: outputs differ for the {days}-day window")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
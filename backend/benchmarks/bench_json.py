@@ -0,0 +1,154 @@
+"""
+Benchmark: JSON encoding of /requests result pages
+
+Compares the former response path (recursive convert_decimal128() copy,
+manual _id/datetime fixes, Flask's default JSON provider) with the
+single-pass BSONJSONProvider, both on decoded documents and on
+RawBSONDocuments as pymongo returns them with RAW_BSON_OPTIONS. The
+provider decodes every RawBSONDocument with bson.decode() when it encodes
+it, so the raw column is compared with decoding plus the provider on
+decoded documents (what pymongo's default dict documents cost), not with
+the provider alone.
+Documents are synthetic, so no MongoDB instance is needed.
+
+Usage (from the backend folder):
+    python benchmarks/bench_json.py [--repeat 5]
+"""
+import argparse
+import copy
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import bson  # noqa: E402
+from bson.decimal128 import Decimal128  # noqa: E402
+from bson.objectid import ObjectId  # noqa: E402
+from bson.raw_bson import RawBSONDocument  # noqa: E402
+from flask import Flask  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+from jsonprovider import BSONJSONProvider, orjson  # noqa: E402
+
+
+def convert_decimal128(doc):
+    """
+    Recursively convert Decimal128 objects to floats in a document for JSON serialization
+    (the helper app.py used before BSONJSONProvider)
+    """
+    if isinstance(doc, dict):
+        return {key: convert_decimal128(value) for key, value in doc.items()}
+    elif isinstance(doc, list):
+        return [convert_decimal128(item) for item in doc]
+    elif isinstance(doc, Decimal128):
+        return float(doc.to_decimal())
+    else:
+        return doc
+
+
+def synthetic_requests(n):
+    rng = random.Random(418)
+    now = datetime(2026, 1, 1, 9, 0)
+    docs = []
+    for i in range(n):
+        submitted = now + timedelta(minutes=17 * i)
+        repairs = [{
+            'serviceName': rng.choice(['Screen', 'Battery', 'Charging Port', 'Camera']),
+            'quotedPrice': Decimal128(f'{rng.randint(30, 300)}.95'),
+            'estimatedDuration': 30
+        } for _ in range(rng.randint(1, 3))]
+        docs.append({
+            '_id': ObjectId(),
+            'customer': {
+                'firstName': 'Erika', 'lastName': 'Mustermann', 'email': f'erika{i}@example.org',
+                'phoneNumber': '+49 30 1234567',
+                'address': {'street': 'Hauptstraße', 'houseNumber': str(i % 200), 'postalCode': '10115', 'city': 'Berlin'}
+            },
+            'device': {'type': 'smartphone', 'manufacturer': 'Fairphone', 'model': 'Fairphone 5'},
+            'serviceType': 'walk-in',
+            'repairs': repairs,
+            'appointment': {'date': submitted.replace(hour=0, minute=0), 'timeSlot': '10:00'},
+            'status': 'pending_quote',
+            'totalQuotedPrice': Decimal128('139.90'),
+            'additionalNotes': 'Screen cracked in upper right corner',
+            'submittedAt': submitted,
+            'updatedAt': submitted
+        })
+    return docs
+
+
+def legacy_page(app, docs):
+    results = []
+    for doc in docs:
+        doc = convert_decimal128(doc)
+        doc['_id'] = str(doc['_id'])
+        if 'submittedAt' in doc:
+            doc['submittedAt'] = doc['submittedAt'].isoformat()
+        if 'updatedAt' in doc:
+            doc['updatedAt'] = doc['updatedAt'].isoformat()
+        if 'appointment' in doc and 'date' in doc['appointment']:
+            if isinstance(doc['appointment']['date'], datetime):
+                doc['appointment']['date'] = doc['appointment']['date'].strftime('%Y-%m-%d')
+        results.append(doc)
+    return app.json.response({'success': True, 'results': results}).get_data()
+
+
+def provider_page(app, docs):
+    for doc in docs:
+        appointment = doc.get('appointment')
+        if isinstance(appointment, dict) and isinstance(appointment.get('date'), datetime):
+            appointment['date'] = appointment['date'].strftime('%Y-%m-%d')
+    return app.json.response({'success': True, 'results': docs}).get_data()
+
+
+def raw_page(app, docs):
+    return app.json.response({'success': True, 'results': docs}).get_data()
+
+
+def decode_page(app, raw_docs):
+    return raw_page(app, [bson.decode(doc.raw) for doc in raw_docs])
+
+
+def best_of(repeat, fn, make_input):
+    timings = []
+    for _ in range(repeat):
+        data = make_input()
+        started = time.perf_counter()
+        body = fn(data)
+        timings.append(time.perf_counter() - started)
+    return min(timings), body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement (best is reported)')
+    args = parser.parse_args()
+
+    legacy_app = Flask('legacy')
+    legacy_app.json = DefaultJSONProvider(legacy_app)
+    provider_app = Flask('provider')
+    provider_app.json = BSONJSONProvider(provider_app)
+
+    print(f"JSON backend of BSONJSONProvider: {'orjson' if orjson else 'json'}")
+    print(f"{'docs':>6} {'legacy ms':>10} {'provider ms':>12} {'decode+provider ms':>19} {'raw ms':>8} "
+          f"{'speed-up':>9}")
+    for n in (50, 1000, 10000):
+        docs = synthetic_requests(n)
+        raw_docs = [RawBSONDocument(bson.encode(doc)) for doc in docs]
+
+        with legacy_app.app_context():
+            legacy, _ = best_of(args.repeat, lambda d: legacy_page(legacy_app, d), lambda: copy.deepcopy(docs))
+        with provider_app.app_context():
+            provider, _ = best_of(args.repeat, lambda d: provider_page(provider_app, d), lambda: copy.deepcopy(docs))
+            decoded, _ = best_of(args.repeat, lambda d: decode_page(provider_app, d), lambda: raw_docs)
+            raw, _ = best_of(args.repeat, lambda d: raw_page(provider_app, d), lambda: raw_docs)
+
+        print(f"{n:>6} {legacy * 1000:>10.2f} {provider * 1000:>12.2f} {decoded * 1000:>19.2f} {raw * 1000:>8.2f} "
+              f"{legacy / provider:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
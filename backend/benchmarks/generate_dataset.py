@@ -0,0 +1,313 @@
+"""
+Synthetic dataset generator: repair requests and calendar entries
+
+Generates realistic repair requests (10k to several million) and writes
+them through the storage backend app.py is configured with. Devices are
+drawn from data/smartphone_models.csv, weighted by their popularity, and
+repairs with their prices from data/repairs_overview.csv. Requests are
+spread over the last --days days. Walk-ins get an appointment in a free
+working slot up to --ahead-days days ahead; once a slot is taken the
+request is sent in instead, so no slot is overbooked. Documents are built
+with the same helpers as POST /request (search keys, Decimal128 prices,
+calendar entries), and the /options facet counts are updated per batch.
+
+Usage (from the backend folder):
+    python benchmarks/generate_dataset.py --count 100000 [--drop] [--seed 418] \\
+        [--backend mongodb --mongo-uri mongodb://localhost:27017/ --mongo-db repair_shop] \\
+        [--backend sqlite --sqlite-path repair_shop.db] [--ndjson requests.ndjson]
+
+--ndjson writes POST /request payloads instead (input for POST /requests/bulk).
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import random
+import sys
+import time
+import unicodedata
+from datetime import date, datetime, timedelta
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DATA_DIR = os.path.join(BACKEND_DIR, '..', 'data')
+
+sys.path.insert(0, BACKEND_DIR)
+
+# Weight of the "Market Share / Popularity" levels of smartphone_models.csv
+POPULARITY_WEIGHTS = {'high': 8, 'medium-high': 5, 'medium': 3, 'low-medium': 2, 'low': 1}
+
+FIRST_NAMES = ['Anna', 'Ben', 'Clara', 'David', 'Elif', 'Felix', 'Greta', 'Hannah', 'Ismail', 'Jonas', 'Katharina',
+               'Lukas', 'Mia', 'Niklas', 'Olga', 'Paul', 'Quirin', 'Rosa', 'Sophie', 'Tim', 'Ursula', 'Viktor',
+               'Wiebke', 'Yusuf', 'Zoe', 'Jürgen', 'Björn', 'Sören', 'Małgorzata', 'Chloé']
+LAST_NAMES = ['Müller', 'Schmidt', 'Schneider', 'Fischer', 'Weber', 'Meyer', 'Wagner', 'Becker', 'Schulz', 'Hoffmann',
+              'Schäfer', 'Koch', 'Bauer', 'Richter', 'Klein', 'Wolf', 'Schröder', 'Neumann', 'Schwarz', 'Zimmermann',
+              'Braun', 'Krüger', 'Hofmann', 'Hartmann', 'Lange', 'Yılmaz', 'Kowalski', 'Nguyen', 'Rossi', 'García']
+STREETS = ['Hauptstraße', 'Schulstraße', 'Gartenstraße', 'Bahnhofstraße', 'Dorfstraße', 'Bergstraße', 'Birkenweg',
+           'Lindenstraße', 'Kirchstraße', 'Waldstraße', 'Ringstraße', 'Schillerstraße', 'Goethestraße', 'Am Markt']
+CITIES = [('10115', 'Berlin'), ('10247', 'Berlin'), ('12043', 'Berlin'), ('20095', 'Hamburg'), ('22765', 'Hamburg'),
+          ('80331', 'München'), ('81667', 'München'), ('50667', 'Köln'), ('60311', 'Frankfurt am Main'),
+          ('70173', 'Stuttgart'), ('40213', 'Düsseldorf'), ('04109', 'Leipzig'), ('01067', 'Dresden'),
+          ('28195', 'Bremen'), ('30159', 'Hannover'), ('90402', 'Nürnberg'), ('14467', 'Potsdam'),
+          ('24103', 'Kiel'), ('18055', 'Rostock'), ('79098', 'Freiburg im Breisgau')]
+MAIL_DOMAINS = ['example.org', 'example.com', 'example.net', 'mail.example.de']
+NOTES = ['Screen cracked in upper right corner', 'Dropped into water yesterday', 'Battery drains within hours',
+         'Does not charge with the original cable', 'Please call before starting the repair',
+         'Backup needed before any reset', 'Second repair of this device']
+
+# Status by age of the request: (max age in days, [(status, weight), ...])
+STATUS_BY_AGE = [
+    (2, [('pending_quote', 6), ('quoted', 3), ('confirmed', 1)]),
+    (14, [('quoted', 2), ('confirmed', 2), ('scheduled', 1), ('diagnosing', 1), ('awaiting_parts', 1),
+          ('in_progress', 2), ('ready_for_pickup', 1), ('rejected', 1), ('cancelled', 1)]),
+    (None, [('collected', 4), ('feedback_received', 12), ('rejected', 1), ('cancelled', 2), ('in_progress', 1)])
+]
+
+
+def load_models(path=None):
+    """(brand, model, weight) rows of smartphone_models.csv"""
+    models = []
+    with open(path or os.path.join(DATA_DIR, 'smartphone_models.csv'), encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            popularity = row['Market Share / Popularity'].split('(')[0].strip().lower()
+            models.append((row['Brand'], row['Model'], POPULARITY_WEIGHTS.get(popularity, 1)))
+    return models
+
+
+def load_repairs(path=None):
+    """(name, price or None, duration in minutes) rows of repairs_overview.csv"""
+    repairs = []
+    with open(path or os.path.join(DATA_DIR, 'repairs_overview.csv'), encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            try:
+                price = float(row['Price in Euro'])
+            except ValueError:
+                price = None  # "Price on request"
+            repairs.append((row['Repair name'], price, int(row['Duration (minutes)'])))
+    return repairs
+
+
+def ascii_slug(text):
+    text = unicodedata.normalize('NFKD', text.replace('ß', 'ss').replace('ı', 'i').replace('ł', 'l').lower())
+    return ''.join(char for char in text if char.isascii() and char.isalnum())
+
+
+class DatasetGenerator:
+    """
+    Reproducible stream of POST /request payloads and submission times
+    taken: (date, time) -> bookings of slots that are already booked
+    """
+
+    def __init__(self, app, seed=418, days=730, ahead_days=90, appointment_share=0.6, now=None, taken=None):
+        self.app = app
+        self.rng = random.Random(seed)
+        self.days = days
+        self.ahead_days = ahead_days
+        self.appointment_share = appointment_share
+        self.now = now or datetime.utcnow().replace(microsecond=0)
+        self.taken = taken if taken is not None else {}
+        self.models = load_models()
+        self.model_weights = [weight for _, _, weight in self.models]
+        self.repairs = load_repairs()
+
+    def customer(self):
+        rng = self.rng
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        postal_code, city = rng.choice(CITIES)
+        return {
+            'firstName': first,
+            'lastName': last,
+            'email': f"{ascii_slug(first)}.{ascii_slug(last)}{rng.randint(1, 9999)}@{rng.choice(MAIL_DOMAINS)}",
+            'phoneNumber': f"+49 1{rng.randint(50, 79)} {rng.randint(1000000, 9999999)}",
+            'address': {
+                'streetName': rng.choice(STREETS),
+                'houseNumber': str(rng.randint(1, 180)),
+                'postalCode': postal_code,
+                'city': city
+            }
+        }
+
+    def status(self, age_days):
+        for max_age, choices in STATUS_BY_AGE:
+            if max_age is None or age_days <= max_age:
+                statuses, weights = zip(*choices)
+                return self.rng.choices(statuses, weights)[0]
+
+    def free_slot(self, submitted):
+        """A free working slot a few days after submitted, or None"""
+        app = self.app
+        rng = self.rng
+        horizon = self.now + timedelta(days=self.ahead_days)
+        for _ in range(5):
+            day = (submitted + timedelta(days=rng.randint(1, 10))).date()
+            if day > horizon.date():
+                return None
+            hours = app.business_calendar.hours(day)
+            if hours is None:
+                continue
+            open_min = hours[0].hour * 60 + hours[0].minute
+            close_min = hours[1].hour * 60 + hours[1].minute
+            slots = (close_min - open_min) // app.SLOT_DURATION_MINUTES
+            start = open_min + rng.randrange(slots) * app.SLOT_DURATION_MINUTES
+            key = (day.isoformat(), f"{start // 60:02d}:{start % 60:02d}")
+            if self.taken.get(key, 0) < app.SLOT_CAPACITY:
+                self.taken[key] = self.taken.get(key, 0) + 1
+                return key
+        return None
+
+    def payload(self, future=False):
+        """
+        One POST /request payload and its submission time
+        future: submitted now (for write benchmarks) instead of in the past
+        """
+        rng = self.rng
+        submitted = self.now if future else self.now - timedelta(seconds=rng.randrange(self.days * 86400))
+        brand, model, _ = rng.choices(self.models, self.model_weights)[0]
+
+        repairs = []
+        for name, price, duration in rng.sample(self.repairs, rng.choice([1, 1, 1, 2, 2, 3])):
+            repair = {'serviceName': name, 'estimatedDuration': duration}
+            if price is not None:
+                repair['quotedPrice'] = price
+            repairs.append(repair)
+
+        data = {
+            'customer': self.customer(),
+            'device': {'type': 'smartphone', 'manufacturer': brand, 'model': model},
+            'serviceType': 'walk-in',
+            'repairs': repairs,
+            'totalQuotedPrice': round(sum(repair.get('quotedPrice', 0) for repair in repairs), 2)
+        }
+        if rng.random() < 0.15:
+            data['additionalNotes'] = rng.choice(NOTES)
+        slot = None if future or rng.random() >= self.appointment_share else self.free_slot(submitted)
+        if slot:
+            data['appointment'] = {'date': slot[0], 'timeSlot': slot[1]}
+        else:
+            data['serviceType'] = 'send-in'
+        return data, submitted
+
+    def documents(self, data, submitted):
+        """repair_requests document and calendar entry (or None) for a payload"""
+        app = self.app
+        repair_request = app.build_repair_request(data)
+        repair_request['submittedAt'] = repair_request['statusChangedAt'] = submitted
+        # Where the request would be by now; the API only creates new ones
+        repair_request['status'] = self.status((self.now - submitted).days)
+        calendar_entry = None
+        if 'appointment' in data:
+            from bson.objectid import ObjectId
+
+            repair_request['_id'] = ObjectId()
+            date_str, start_time, end_time = app.appointment_times(data['appointment'])
+            calendar_entry = app.build_calendar_entry(data, repair_request['_id'], date_str, start_time, end_time)
+            calendar_entry['customer']['booking_time'] = submitted.isoformat()
+        return repair_request, calendar_entry
+
+
+def booked_slots(repository, since):
+    """Bookings per (date, time) already in the calendar"""
+    taken = {}
+    for entry in repository.calendar_times(since):
+        key = (entry['date'], entry['start_time'])
+        taken[key] = taken.get(key, 0) + 1
+    return taken
+
+
+def populate(generator, count, batch_size=5000, progress=None):
+    """
+    Write count repair requests through generator.app.repository
+    Returns (requests, appointments) written
+    """
+    repository = generator.app.repository
+    written = booked = 0
+    while written < count:
+        docs, entries = [], []
+        for _ in range(min(batch_size, count - written)):
+            repair_request, calendar_entry = generator.documents(*generator.payload())
+            docs.append(repair_request)
+            if calendar_entry is not None:
+                entries.append(calendar_entry)
+        errors = repository.insert_requests(docs)
+        if entries:
+            errors.update(repository.insert_calendar_entries(entries))
+        if errors:
+            raise RuntimeError(f"{len(errors)} documents could not be written, e.g. {next(iter(errors.values()))}")
+        repository.record_facets(docs)
+        written += len(docs)
+        booked += len(entries)
+        if progress:
+            progress(written, booked)
+    return written, booked
+
+
+def open_app(backend=None, mongo_uri=None, mongo_db=None, sqlite_path=None, drop=False):
+    """
+    Import app.py on the given storage backend (environment overrides)
+    drop: start from an empty database
+    """
+    for name, value in (('STORAGE_BACKEND', backend), ('MONGO_URI', mongo_uri), ('MONGO_DB', mongo_db),
+                        ('SQLITE_PATH', sqlite_path)):
+        if value:
+            os.environ[name] = value
+    if drop and os.environ.get('STORAGE_BACKEND') == 'sqlite':
+        path = os.environ.get('SQLITE_PATH', 'repair_shop.db')
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    import app
+
+    logging.disable(logging.CRITICAL)
+    if drop and app.STORAGE_BACKEND == 'mongodb':
+        app.repository.client.drop_database(app.MONGO_DB)
+        app.repository.ensure_indexes()
+    return app
+
+
+def add_storage_arguments(parser):
+    parser.add_argument('--backend', choices=['mongodb', 'sqlite'], help='STORAGE_BACKEND (default: as in app.py)')
+    parser.add_argument('--mongo-uri')
+    parser.add_argument('--mongo-db')
+    parser.add_argument('--sqlite-path')
+    parser.add_argument('--drop', action='store_true', help='delete all existing data first')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, required=True, help='repair requests to generate')
+    parser.add_argument('--seed', type=int, default=418)
+    parser.add_argument('--days', type=int, default=730, help='spread submissions over this many past days')
+    parser.add_argument('--ahead-days', type=int, default=90, help='latest appointment, days from today')
+    parser.add_argument('--appointment-share', type=float, default=0.6, help='share of walk-ins asking for a slot')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--ndjson', help='write POST /request payloads to this file instead of the database')
+    add_storage_arguments(parser)
+    args = parser.parse_args()
+
+    app = open_app(args.backend, args.mongo_uri, args.mongo_db, args.sqlite_path, drop=args.drop and not args.ndjson)
+    started = time.perf_counter()
+
+    if args.ndjson:
+        generator = DatasetGenerator(app, args.seed, args.days, args.ahead_days, args.appointment_share)
+        with open(args.ndjson, 'w', encoding='utf-8') as f:
+            for _ in range(args.count):
+                f.write(json.dumps(generator.payload()[0], ensure_ascii=False) + '\n')
+        print(f"Wrote {args.count} payloads to {args.ndjson} in {time.perf_counter() - started:.1f} s")
+        return
+
+    earliest = datetime.combine(date.today() - timedelta(days=args.days), datetime.min.time())
+    taken = booked_slots(app.repository, earliest)
+    generator = DatasetGenerator(app, args.seed, args.days, args.ahead_days, args.appointment_share, taken=taken)
+
+    def progress(written, booked):
+        rate = written / (time.perf_counter() - started)
+        print(f"\r{written:>9} requests, {booked:>7} appointments ({rate:,.0f}/s)", end='', flush=True)
+
+    written, booked = populate(generator, args.count, args.batch_size, progress)
+    print(f"\nWrote {written} repair requests and {booked} calendar entries to {app.STORAGE_BACKEND} "
+          f"in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
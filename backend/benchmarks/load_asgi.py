@@ -0,0 +1,87 @@
+"""
+Load test: WSGI deployment vs. ASGI serving mode
+
+Sends GET requests for the given paths to two running servers, one at a
+time, at increasing concurrency levels and reports throughput, p50/p99
+latency and failures (5xx, timeouts, refused connections) per level.
+Start both servers on the same database first, e.g.
+    gunicorn -w 2 --threads 8 -b :5001 app:app
+    uvicorn asgi:app --port 5002
+
+Usage (from the backend folder):
+    python benchmarks/load_asgi.py --wsgi http://localhost:5001 --asgi http://localhost:5002 \\
+        [--path /sorry --path "/requests?customer_search=mueller" --path /calendar] \\
+        [--concurrency 10 50 200] [--requests 400] [--user admin:change_me_please]
+"""
+import argparse
+import base64
+import itertools
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_PATHS = ['/sorry', '/requests?customer_search=mueller', '/calendar']
+
+
+def fetch(url, headers, timeout):
+    req = urllib.request.Request(url, headers=headers)
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+    except OSError:
+        status = None
+    return status, time.perf_counter() - started
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else float('nan')
+
+
+def run_level(base_url, paths, concurrency, total, headers, timeout):
+    urls = itertools.cycle([base_url.rstrip('/') + path for path in paths])
+    jobs = [next(urls) for _ in range(total)]
+
+    def worker(url):
+        return fetch(url, headers, timeout)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, jobs))
+    elapsed = time.perf_counter() - started
+
+    ok = [latency for status, latency in results if status is not None and status < 500]
+    failed = len(results) - len(ok)
+    return len(results) / elapsed, percentile(ok, 50), percentile(ok, 99), failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--wsgi', required=True, help='base URL of the WSGI deployment (app:app)')
+    parser.add_argument('--asgi', required=True, help='base URL of the ASGI deployment (asgi:app)')
+    parser.add_argument('--path', action='append', help=f'request path, repeatable (default: {" ".join(DEFAULT_PATHS)})')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--requests', type=int, default=400, help='requests per server and concurrency level')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--user', default='admin:change_me_please', help='Basic auth for /calendar')
+    args = parser.parse_args()
+
+    paths = args.path or DEFAULT_PATHS
+    headers = {'Authorization': 'Basic ' + base64.b64encode(args.user.encode('utf-8')).decode('ascii')}
+
+    print(f"paths: {', '.join(paths)}; {args.requests} requests per level")
+    print(f"{'server':<6} {'conc.':>6} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'failed':>7}")
+    for concurrency in args.concurrency:
+        for name, base_url in (('wsgi', args.wsgi), ('asgi', args.asgi)):
+            rate, p50, p99, failed = run_level(base_url, paths, concurrency, args.requests, headers, args.timeout)
+            print(f"{name:<6} {concurrency:>6} {rate:>8.1f} {p50 * 1000:>9.1f} {p99 * 1000:>9.1f} {failed:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Stress test: hundreds of parallel bookings for one appointment slot
+
+Fires --bookings POST /request calls for the same date and time slot at a
+running server, released together by a barrier, and checks that exactly
+SLOT_CAPACITY of them succeed (201) while all others get 409 with
+alternative slots. With --mongo-uri the slot document and the calendar
+collection are checked for overbooking as well.
+
+Usage (from the backend folder, with app.py running):
+    python benchmarks/stress_reservations.py --date 2026-11-03 --time 10:00 \\
+        [--url http://localhost:5000] [--bookings 300] [--workers 100] [--capacity 1] \\
+        [--mongo-uri mongodb://localhost:27017/]
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+def payload(i, date_str, time_str):
+    return {
+        'customer': {
+            'firstName': 'Stress', 'lastName': f'Test {i}', 'email': f'stress{i}@example.org',
+            'phoneNumber': '+49 30 1234567',
+            'address': {'street': 'Hauptstraße', 'houseNumber': '1', 'postalCode': '10115', 'city': 'Berlin'}
+        },
+        'device': {'type': 'smartphone', 'manufacturer': 'Fairphone', 'model': 'Fairphone 5'},
+        'serviceType': 'walk-in',
+        'appointment': {'date': date_str, 'timeSlot': time_str}
+    }
+
+
+def post(url, body):
+    req = urllib.request.Request(url, data=json.dumps(body).encode('utf-8'),
+                                 headers={'Content-Type': 'application/json'}, method='POST')
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            status, data = response.status, response.read()
+    except urllib.error.HTTPError as e:
+        status, data = e.code, e.read()
+    except OSError as e:
+        status, data = None, str(e).encode('utf-8')
+    return status, time.perf_counter() - started, data
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0.0
+
+
+def verify_database(uri, date_str, time_str, capacity):
+    from pymongo import MongoClient
+
+    db = MongoClient(uri)['repair_shop']
+    slot = db.appointment_slots.find_one({'date': datetime.strptime(date_str, '%Y-%m-%d'), 'time': time_str})
+    calendar = db.calendar.count_documents({'date': date_str, 'start_time': time_str})
+    current = slot['currentBookings'] if slot else 0
+    held = len(slot['bookedBy']) if slot else 0
+    print(f"appointment_slots: currentBookings={current} bookedBy={held} maxCapacity={slot and slot['maxCapacity']}")
+    print(f"calendar entries for the slot: {calendar}")
+    return current <= capacity and held == current and calendar <= capacity
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--date', required=True, help='YYYY-MM-DD of an open, not yet booked slot')
+    parser.add_argument('--time', required=True, help='HH:MM')
+    parser.add_argument('--bookings', type=int, default=300)
+    parser.add_argument('--workers', type=int, default=100)
+    parser.add_argument('--capacity', type=int, default=1, help='SLOT_CAPACITY the server runs with')
+    parser.add_argument('--mongo-uri', help='also check the database for overbooking')
+    args = parser.parse_args()
+
+    url = args.url.rstrip('/') + '/request'
+    barrier = threading.Barrier(min(args.workers, args.bookings))
+
+    def attempt(i):
+        try:
+            barrier.wait(timeout=10)
+        except threading.BrokenBarrierError:
+            pass
+        return post(url, payload(i, args.date, args.time))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(attempt, range(args.bookings)))
+    elapsed = time.perf_counter() - started
+
+    statuses = Counter(status for status, _, _ in results)
+    conflicts = [json.loads(data) for status, _, data in results if status == 409]
+    print(f"{args.bookings} bookings for {args.date} {args.time} from {args.workers} workers in {elapsed:.2f} s")
+    for status, count in sorted(statuses.items(), key=lambda item: str(item[0])):
+        latencies = [latency for s, latency, _ in results if s == status]
+        print(f"  {status}: {count:>5}  p50 {percentile(latencies, 50) * 1000:.1f} ms  "
+              f"p99 {percentile(latencies, 99) * 1000:.1f} ms")
+    if conflicts:
+        print(f"  alternatives offered: {conflicts[0].get('alternatives')}")
+
+    ok = statuses.get(201, 0) == args.capacity and statuses.get(409, 0) == args.bookings - args.capacity
+    if args.mongo_uri:
+        ok = verify_database(args.mongo_uri, args.date, args.time, args.capacity) and ok
+    print('PASS' if ok else 'FAIL')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""
+Business calendar: when the shop is open, compiled into per-year tables.
+
+Working hours per weekday, fixed holidays ((month, day) pairs), holidays
+relative to Easter Sunday (days of offset, e.g. -2 for Good Friday) and
+closures (date ranges such as vacations or one-off closing days) are
+compiled once per year into a table with one byte per slot of every day
+(1 = closed) and the reason of every closed day. Tables are built on first
+use and cached, so the slot index, the .ics feeds and the scheduler look
+days and slots up instead of repeating the date arithmetic for every day of
+every request.
+"""
+import threading
+from datetime import date, timedelta
+
+from recurrence import holiday_dates
+
+MINUTES_PER_DAY = 24 * 60
+
+HOLIDAY_REASON = 'Holiday - Shop Closed'
+CLOSURE_REASON = 'Shop Closed'
+
+
+def easter_sunday(year):
+    """Date of Easter Sunday in the Gregorian calendar (anonymous Gregorian algorithm)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def parse_closure(closure):
+    """
+    (first day, last day, reason) of a closure given as (first, last) or
+    (first, last, reason) with dates or 'YYYY-MM-DD' strings
+    """
+    first, last = closure[0], closure[1]
+    reason = closure[2] if len(closure) > 2 else CLOSURE_REASON
+    if isinstance(first, str):
+        first = date.fromisoformat(first)
+    if isinstance(last, str):
+        last = date.fromisoformat(last)
+    if last < first:
+        raise ValueError(f'Closure ends before it starts: {first} - {last}')
+    return first, last, reason
+
+
+def weekday_masks(working_hours, slot_minutes):
+    """
+    Closed-slot mask of a regular day per weekday (1 = closed); a slot
+    is open if any part of it lies within the working hours
+    """
+    spd = MINUTES_PER_DAY // slot_minutes
+    masks = {}
+    for weekday in range(7):
+        hours = working_hours.get(weekday)
+        if hours is None:
+            masks[weekday] = b'\x01' * spd
+            continue
+        work_start, work_end = hours
+        open_from = (work_start.hour * 60 + work_start.minute) // slot_minutes
+        open_until = -(-(work_end.hour * 60 + work_end.minute) // slot_minutes)
+        masks[weekday] = b'\x01' * open_from + b'\x00' * (open_until - open_from) + b'\x01' * (spd - open_until)
+    return masks
+
+
+class YearTable:
+    """Closed slots and closed days of one year"""
+
+    def __init__(self, year, slots_per_day):
+        self.first_day = date(year, 1, 1).toordinal()
+        self.days = date(year + 1, 1, 1).toordinal() - self.first_day
+        self.closed = bytearray(self.days * slots_per_day)  # 1 = closed
+        self.reasons = {}  # day ordinal -> reason the whole day is closed
+
+
+class BusinessCalendar:
+    """
+    Opening hours of the shop as per-year lookup tables
+
+    working_hours maps weekday -> (start time, end time) or None,
+    fixed_holidays holds (month, day) pairs, easter_holidays offsets in days
+    from Easter Sunday and closures (first, last[, reason]) date ranges,
+    both days included.
+    """
+
+    def __init__(self, slot_minutes, working_hours, fixed_holidays=(), easter_holidays=(), closures=()):
+        self.slot_minutes = slot_minutes
+        self.slots_per_day = MINUTES_PER_DAY // slot_minutes
+        self.working_hours = working_hours
+        self.fixed_holidays = list(fixed_holidays)
+        self.easter_holidays = list(easter_holidays)
+        self.closures = [parse_closure(closure) for closure in closures]
+
+        self._lock = threading.Lock()
+        self._years = {}  # year -> YearTable
+
+        self._week = weekday_masks(working_hours, slot_minutes)
+
+    # ------------------------------------------------------------------
+    # Compiling
+    # ------------------------------------------------------------------
+
+    def closed_days(self, year):
+        """Whole closed days of a year (holidays and closures) as day ordinal -> reason"""
+        first, last = date(year, 1, 1), date(year, 12, 31)
+        reasons = {}
+        for first_day, last_day, reason in self.closures:
+            day = max(first_day, first)
+            while day <= min(last_day, last):
+                reasons[day.toordinal()] = reason
+                day += timedelta(days=1)
+        easter = easter_sunday(year)
+        for offset in self.easter_holidays:
+            holiday = easter + timedelta(days=offset)
+            if holiday.year == year:
+                reasons[holiday.toordinal()] = HOLIDAY_REASON
+        for holiday in holiday_dates(self.fixed_holidays, first, last):
+            reasons[holiday.toordinal()] = HOLIDAY_REASON
+        return reasons
+
+    def _compile(self, year):
+        spd = self.slots_per_day
+        table = YearTable(year, spd)
+        table.reasons = self.closed_days(year)
+        closed_day = b'\x01' * spd
+        weekday = date(year, 1, 1).weekday()
+        for index in range(table.days):
+            mask = closed_day if table.first_day + index in table.reasons else self._week[(weekday + index) % 7]
+            table.closed[index * spd:(index + 1) * spd] = mask
+        return table
+
+    def table(self, year):
+        """The compiled YearTable of a year (built on first use)"""
+        table = self._years.get(year)
+        if table is None:
+            with self._lock:
+                table = self._years.get(year)
+                if table is None:
+                    table = self._years[year] = self._compile(year)
+        return table
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def closed_reason(self, day):
+        """Why the whole day is closed (holiday or closure), None on regular days"""
+        return self.table(day.year).reasons.get(day.toordinal())
+
+    def is_closed_day(self, day):
+        """Check whether a day is a holiday or falls into a closure"""
+        return day.toordinal() in self.table(day.year).reasons
+
+    def hours(self, day):
+        """Working hours (start time, end time) of a day, None if it is closed"""
+        if self.is_closed_day(day):
+            return None
+        return self.working_hours.get(day.weekday())
+
+    def closed_mask(self, day):
+        """One byte per slot of the day, 1 = closed"""
+        table = self.table(day.year)
+        offset = (day.toordinal() - table.first_day) * self.slots_per_day
+        return bytes(table.closed[offset:offset + self.slots_per_day])
+
+    def is_open(self, day, start_min, end_min):
+        """Check whether every slot in [start_min, end_min) of a day lies within working hours"""
+        table = self.table(day.year)
+        base = (day.toordinal() - table.first_day) * self.slots_per_day
+        first = base + start_min // self.slot_minutes
+        last = base + min(-(-end_min // self.slot_minutes), self.slots_per_day)
+        return first < last and not any(table.closed[first:last])
+
+    def is_bookable(self, moment):
+        """Check whether the slot containing a datetime lies within working hours"""
+        table = self.table(moment.year)
+        slot = (moment.hour * 60 + moment.minute) // self.slot_minutes
+        return not table.closed[(moment.toordinal() - table.first_day) * self.slots_per_day + slot]
+
+    def closed_dates(self, start_date, end_date):
+        """Holidays and closure days within [start_date, end_date] as sorted (date, reason) tuples"""
+        dates = []
+        for year in range(start_date.year, end_date.year + 1):
+            for ordinal, reason in self.table(year).reasons.items():
+                if start_date.toordinal() <= ordinal <= end_date.toordinal():
+                    dates.append((date.fromordinal(ordinal), reason))
+        return sorted(dates)
@@ -0,0 +1,289 @@
+"""
+In-memory device and repair catalog for GET /catalog/models and
+GET /catalog/repairs.
+
+data/smartphone_models.csv and data/repairs_overview.csv are read once into
+a snapshot of plain dictionaries plus two indexes on the model
+names (brand and model, normalized like the customer search):
+  * every distinct token with a bitmask of the models containing it, kept
+    sorted, so a prefix is a bisect over the tokens and a query with
+    several terms is an AND of bitmasks
+  * the bigrams of every token, for a fuzzy fallback when a term is not
+    the prefix of any token: tokens sharing enough bigrams are compared by
+    edit distance, so typos such as 'galxy' or 'iphnoe' still match
+
+Lookups only read the current snapshot and take microseconds. On access
+the catalog checks the files' modification times at most every
+reload_seconds and swaps in a new snapshot when they changed; a file that
+cannot be read (e.g. while it is written) keeps the previous snapshot.
+"""
+import csv
+import logging
+import os
+import threading
+import time as _time
+from bisect import bisect_left
+from collections import Counter
+
+from searchindex import normalize
+
+logger = logging.getLogger(__name__)
+
+# Popularity column values from most to least popular
+POPULARITY_ORDER = ['High', 'Medium-High', 'Medium', 'Low-Medium', 'Low']
+# Search terms of this length and longer may have two typos, shorter ones one
+FUZZY_TWO_EDITS_LENGTH = 6
+# Fuzzy matches remembered per snapshot
+FUZZY_CACHE_SIZE = 10000
+ACTIVE = 'Active'
+
+
+def popularity_rank(value):
+    """Position of a 'Market Share / Popularity' value in POPULARITY_ORDER"""
+    level = (value or '').split('(')[0].strip()
+    return POPULARITY_ORDER.index(level) if level in POPULARITY_ORDER else len(POPULARITY_ORDER)
+
+
+def parse_number(value):
+    """Float of a CSV value, None for text such as 'Price on request' or 'N/A'"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def bigrams(token):
+    """All 2-character substrings of a token"""
+    return {token[i:i + 2] for i in range(len(token) - 1)}
+
+
+def typos(a, b):
+    """Edits (insertions, deletions, substitutions, swaps of neighbours) turning a into b"""
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def name_key(text):
+    """Lookup key of a brand or model name (case, accents and punctuation ignored)"""
+    return ' '.join(normalize(text))
+
+
+def read_models(path):
+    """Model dictionaries of smartphone_models.csv"""
+    models = []
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            brand, model = (row.get('Brand') or '').strip(), (row.get('Model') or '').strip()
+            if not brand or not model:
+                continue
+            decommissioned = (row.get('Decommissioning Date') or '').strip()
+            models.append({
+                'brand': brand,
+                'model': model,
+                'screenSize': parse_number(row.get('Screen Size')),
+                'releaseDate': (row.get('Release Date') or '').strip() or None,
+                'active': decommissioned == ACTIVE,
+                'decommissionedAt': None if decommissioned in ('', ACTIVE) else decommissioned,
+                'usbType': (row.get('USB Type') or '').strip() or None,
+                'sdSlot': (row.get('SD Slot') or '').strip() == 'Yes',
+                'popularity': popularity_rank(row.get('Market Share / Popularity'))
+            })
+    return models
+
+
+def read_repairs(path):
+    """Repair dictionaries of repairs_overview.csv"""
+    repairs = []
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            name = (row.get('Repair name') or '').strip()
+            if not name:
+                continue
+            try:
+                duration = int(row.get('Duration (minutes)'))
+            except (TypeError, ValueError):
+                duration = None
+            price = parse_number(row.get('Price in Euro'))
+            repairs.append({
+                'type': (row.get('Repair type') or '').strip(),
+                'name': name,
+                'description': (row.get('Description') or '').strip(),
+                'typeDe': (row.get('Reparaturtyp') or '').strip(),
+                'nameDe': (row.get('Reparaturname') or '').strip(),
+                'descriptionDe': (row.get('Beschreibung') or '').strip(),
+                'durationMinutes': duration,
+                'price': price,
+                'priceOnRequest': price is None
+            })
+    return repairs
+
+
+class CatalogSnapshot:
+    """Models, repairs and the model name indexes of one version of the CSV files"""
+
+    def __init__(self, models, repairs):
+        # Most popular models first, so equally good matches come out in that order
+        self.models = sorted(models, key=lambda m: (m['popularity'], m['brand'], m['model']))
+        self.repairs = repairs
+        self.durations = {
+            repair['name'].lower(): repair['durationMinutes']
+            for repair in repairs if repair['durationMinutes'] is not None
+        }
+
+        self.by_name = {}      # normalized 'model' and 'brand model' -> [model positions]
+        self.brand_masks = {}  # normalized brand -> bitmask of model positions
+        masks = {}             # token -> bitmask of model positions
+        self.tokens_of = []    # model position -> set of tokens
+        for position, model in enumerate(self.models):
+            brand = name_key(model['brand'])
+            self.brand_masks[brand] = self.brand_masks.get(brand, 0) | (1 << position)
+            tokens = set(normalize(model['brand'])) | set(normalize(model['model']))
+            self.tokens_of.append(tokens)
+            for token in tokens:
+                masks[token] = masks.get(token, 0) | (1 << position)
+            for key in (model['model'], f"{model['brand']} {model['model']}"):
+                self.by_name.setdefault(name_key(key), []).append(position)
+
+        self.tokens = sorted(masks)
+        self.masks = [masks[token] for token in self.tokens]
+        self.by_bigram = {}  # bigram -> token indexes
+        for index, token in enumerate(self.tokens):
+            for gram in bigrams(token):
+                self.by_bigram.setdefault(gram, []).append(index)
+        self.all_models = (1 << len(self.models)) - 1
+        self.fuzzy_masks = {}  # term -> fuzzy_mask(term)
+
+    def prefix_mask(self, term):
+        """Models with a token starting with term"""
+        mask = 0
+        index = bisect_left(self.tokens, term)
+        while index < len(self.tokens) and self.tokens[index].startswith(term):
+            mask |= self.masks[index]
+            index += 1
+        return mask
+
+    def fuzzy_mask(self, term):
+        """
+        Models with a token at most one typo (two for terms of
+        FUZZY_TWO_EDITS_LENGTH characters or more) away from term; only
+        tokens of about the same length sharing enough of its bigrams are
+        compared, and results are kept for the next keystrokes
+        """
+        mask = self.fuzzy_masks.get(term)
+        if mask is not None:
+            return mask
+        edits = 1 if len(term) < FUZZY_TWO_EDITS_LENGTH else 2
+        grams = bigrams(term)
+        # Every typo changes at most two bigrams
+        needed = max(len(grams) - 2 * edits, 1)
+        counts = Counter(index for gram in grams for index in self.by_bigram.get(gram, ()))
+        mask = 0
+        for index, shared in counts.items():
+            token = self.tokens[index]
+            if shared >= needed and abs(len(token) - len(term)) <= edits and typos(term, token) <= edits:
+                mask |= self.masks[index]
+        if len(self.fuzzy_masks) < FUZZY_CACHE_SIZE:
+            self.fuzzy_masks[term] = mask
+        return mask
+
+    def search(self, text, brand=None, limit=10):
+        """
+        Models matching every term of text by prefix, or fuzzily for terms
+        that match nothing by prefix; returns [(model, match)] with match
+        'prefix' or 'fuzzy', exact token matches and popular models first
+        """
+        terms = normalize(text)
+        mask = self.brand_masks.get(name_key(brand), 0) if brand else self.all_models
+        fuzzy = False
+        for term in terms:
+            term_mask = self.prefix_mask(term)
+            if not term_mask and len(term) >= 3:
+                term_mask = self.fuzzy_mask(term)
+                fuzzy = True
+            mask &= term_mask
+            if not mask:
+                return []
+
+        found = []
+        position = 0
+        while mask:
+            if mask & 1:
+                exact = sum(1 for term in terms if term in self.tokens_of[position])
+                found.append((-exact, position))
+            mask >>= 1
+            position += 1
+        found.sort()
+        match = 'fuzzy' if fuzzy else 'prefix'
+        return [(self.models[position], match) for _, position in found[:limit]]
+
+    def find_model(self, name, brand=None):
+        """The model named name ('Model' or 'Brand Model', case and accents ignored), None if unknown"""
+        positions = self.by_name.get(name_key(name), [])
+        if brand:
+            brand_mask = self.brand_masks.get(name_key(brand), 0)
+            positions = [position for position in positions if brand_mask >> position & 1]
+        return self.models[positions[0]] if positions else None
+
+
+class Catalog:
+    """
+    The current CatalogSnapshot of two CSV files, reloaded when they change
+    """
+
+    def __init__(self, models_path, repairs_path, reload_seconds=5):
+        self.paths = (models_path, repairs_path)
+        self.reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+        self._snapshot = CatalogSnapshot([], [])
+        self._mtimes = None
+        self._checked_at = None
+        self.reload()
+
+    def _file_mtimes(self):
+        return tuple(os.stat(path).st_mtime_ns for path in self.paths)
+
+    def reload(self):
+        """Read both files into a new snapshot; keeps the old one if they cannot be read"""
+        with self._lock:
+            self._checked_at = _time.monotonic()
+            try:
+                mtimes = self._file_mtimes()
+                snapshot = CatalogSnapshot(read_models(self.paths[0]), read_repairs(self.paths[1]))
+            except (OSError, csv.Error, UnicodeDecodeError) as e:
+                logger.warning(f"Could not load the catalog: {str(e)}")
+                return False
+            self._snapshot, self._mtimes = snapshot, mtimes
+            logger.info(f"Catalog loaded: {len(snapshot.models)} models, {len(snapshot.repairs)} repairs")
+            return True
+
+    def snapshot(self):
+        """The current snapshot, reloaded first if a file changed since the last check"""
+        if _time.monotonic() - self._checked_at > self.reload_seconds:
+            self._checked_at = _time.monotonic()
+            try:
+                changed = self._file_mtimes() != self._mtimes
+            except OSError:
+                changed = False
+            if changed:
+                self.reload()
+        return self._snapshot
+
+    def search_models(self, text, brand=None, limit=10):
+        return self.snapshot().search(text, brand=brand, limit=limit)
+
+    def find_model(self, name, brand=None):
+        return self.snapshot().find_model(name, brand=brand)
+
+    def repairs(self):
+        return self.snapshot().repairs
+
+    def repair_durations(self):
+        """Repair name (lower case) -> duration in minutes"""
+        return self.snapshot().durations
@@ -0,0 +1,113 @@
+"""
+gzip/brotli compression of responses, negotiated from Accept-Encoding.
+
+JSON pages and .ics feeds are repetitive text and shrink to a fraction of
+their size. brotli is used when the brotli package is installed and the
+client accepts it, gzip otherwise. Streamed responses (/events, streamed
+feeds) are passed through as they are, so every chunk reaches the client
+right away; small bodies are not worth the CPU time.
+
+compress_response() is the after_request hook of app.py,
+CompressionMiddleware does the same for the routes asgi.py serves itself.
+"""
+import gzip
+
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only
+    brotli = None
+
+# Preferred first when the client accepts several equally
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def negotiate(accept_encoding):
+    """The best of ENCODINGS an Accept-Encoding header allows, None for none"""
+    if not accept_encoding:
+        return None
+    return parse_accept_header(accept_encoding).best_match(ENCODINGS)
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response, accept_encoding, min_bytes, mimetypes):
+    """
+    Compress a complete Werkzeug response of one of the mimetypes with
+    the negotiated encoding if its body has at least min_bytes
+    """
+    if response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers \
+            or response.status_code in (204, 206, 304) or response.mimetype not in mimetypes:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate(accept_encoding)
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < min_bytes:
+        return response
+    response.set_data(compress(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    # The compressed body is another representation of the same content
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing complete response bodies like
+    compress_response(); responses sent in several chunks pass unchanged
+    """
+
+    def __init__(self, app, min_bytes=1024, mimetypes=()):
+        self.app = app
+        self.min_bytes = min_bytes
+        self.mimetypes = set(mimetypes)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = dict(scope['headers']).get(b'accept-encoding', b'').decode('latin-1')
+        encoding = negotiate(accept_encoding)
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message['type'] == 'http.response.start':
+                # Held back until the first body part shows whether it is all of it
+                start = message
+                return
+            if message['type'] == 'http.response.body' and start is not None:
+                held, start = start, None
+                headers = [(name.lower(), value) for name, value in held.get('headers', [])]
+                mimetype = dict(headers).get(b'content-type', b'').decode('latin-1').split(';')[0].strip()
+                if mimetype in self.mimetypes and b'content-encoding' not in dict(headers) \
+                        and held['status'] not in (204, 206, 304):
+                    headers.append((b'vary', b'Accept-Encoding'))
+                    body = message.get('body', b'')
+                    if encoding is not None and not message.get('more_body') and len(body) >= self.min_bytes:
+                        body = compress(body, encoding)
+                        headers = [
+                            (name, b'W/' + value if name == b'etag' and value.startswith(b'"') else value)
+                            for name, value in headers if name != b'content-length'
+                        ]
+                        headers += [
+                            (b'content-encoding', encoding.encode('latin-1')),
+                            (b'content-length', str(len(body)).encode('latin-1'))
+                        ]
+                        message = dict(message, body=body)
+                    held = dict(held, headers=headers)
+                await send(held)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
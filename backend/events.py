@@ -0,0 +1,224 @@
+"""
+Server-Sent Events for slot changes (GET /events).
+
+Pages showing free slots subscribe once and receive a small event whenever
+a slot is booked or released, instead of downloading /slots and /calendar
+again. Every event carries the slot's state afterwards (date, time,
+bookings, capacity, available) and no customer details, so clients can
+apply it without knowing what they missed before.
+
+Events come from one of two sources:
+  * a MongoDB change stream on appointment_slots (replica set only), which
+    every worker process follows, so a subscriber sees the bookings of all
+    workers; event ids are the change stream's resume tokens and therefore
+    the same in every process
+  * otherwise app.py publishes the bookings and releases of its own
+    process, one event per slot a booking covers; event ids start with a
+    per-process prefix
+
+Each process keeps the last EVENT_BUFFER_SIZE events. A client that
+reconnects with a Last-Event-ID still in the buffer gets the events it
+missed; for an unknown id it gets a 'reset' event and reloads /slots.
+
+Subscribers share one wake-up per event: a thread in the Flask app waits on
+a condition, a coroutine of asgi.py on a future shared by all coroutines of
+its event loop, so thousands of idle subscribers cost one suspended
+coroutine each. Under WSGI every subscriber holds a worker thread, so serve
+/events through asgi.py when many clients listen.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Sent when the Last-Event-ID is no longer (or was never) in the buffer
+RESET_EVENT = 'reset'
+# Reconnection delay suggested to EventSource clients
+RETRY_MILLISECONDS = 3000
+
+
+class Event:
+    """One published event"""
+
+    def __init__(self, event_id, event_type, data):
+        self.id = event_id
+        self.type = event_type
+        self.data = data
+
+
+def encode_event(event):
+    """An event in the text/event-stream format"""
+    return f'id: {event.id}\nevent: {event.type}\ndata: {json.dumps(event.data, separators=(",", ":"))}\n\n'
+
+
+def slot_event_data(date_str, time_str, bookings, capacity, available=True):
+    """Public state of a slot after a change"""
+    return {'date': date_str, 'time': time_str, 'bookings': bookings, 'capacity': capacity, 'available': available}
+
+
+class EventBus:
+    """
+    Bounded in-process event buffer with blocking and asyncio waiting
+    """
+
+    def __init__(self, buffer_size=1000):
+        self._events = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._futures = {}  # event loop -> future resolved by the next event
+        self._prefix = f'{os.getpid():x}{int(time.time()):x}'
+        self._sequence = 0
+
+    def publish(self, event_type, data, event_id=None):
+        """Append an event (numbered by this bus unless event_id is given) and wake all subscribers"""
+        with self._lock:
+            self._sequence += 1
+            event = Event(event_id or f'{self._prefix}-{self._sequence}', event_type, data)
+            self._events.append(event)
+            self._condition.notify_all()
+            futures, self._futures = self._futures, {}
+        for loop, future in futures.items():
+            loop.call_soon_threadsafe(_resolve, future)
+        return event.id
+
+    def last_id(self):
+        with self._lock:
+            return self._events[-1].id if self._events else None
+
+    def since(self, last_id):
+        """
+        Events after last_id as (events, found); found is False if last_id
+        is not in the buffer (events then is empty)
+        """
+        with self._lock:
+            if last_id is None:
+                return list(self._events), True
+            for position in range(len(self._events) - 1, -1, -1):
+                if self._events[position].id == last_id:
+                    return list(self._events)[position + 1:], True
+            return [], False
+
+    def wait(self, last_id, timeout):
+        """Block until an event after last_id was published or timeout seconds passed"""
+        with self._condition:
+            self._condition.wait_for(
+                lambda: (self._events[-1].id if self._events else None) != last_id, timeout
+            )
+
+    async def wait_async(self, last_id, timeout):
+        """Coroutine version of wait()"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if (self._events[-1].id if self._events else None) != last_id:
+                return
+            future = self._futures.get(loop)
+            if future is None:
+                future = self._futures[loop] = loop.create_future()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+def subscribe(bus, last_event_id):
+    """
+    Start of a subscription: (first chunk, position to continue from)
+    The first chunk suggests a retry delay and replays missed events or,
+    for an unknown last_event_id, asks the client to reload with 'reset'
+    """
+    head = f'retry: {RETRY_MILLISECONDS}\n\n'
+    position = bus.last_id()
+    if last_event_id:
+        missed, found = bus.since(last_event_id)
+        if found:
+            head += ''.join(encode_event(event) for event in missed)
+        else:
+            head += encode_event(Event(position or '', RESET_EVENT, {}))
+    return head, position
+
+
+def next_chunk(bus, position):
+    """Events after position as (chunk, new position); a keep-alive comment if there are none"""
+    events, found = bus.since(position)
+    if not found:
+        # Fell out of the buffer while waiting (only with a tiny buffer)
+        position = bus.last_id()
+        return encode_event(Event(position or '', RESET_EVENT, {})), position
+    if not events:
+        return ': keep-alive\n\n', position
+    return ''.join(encode_event(event) for event in events), events[-1].id
+
+
+def stream(bus, last_event_id=None, keepalive_seconds=15):
+    """text/event-stream chunks for a WSGI response (holds the thread until the client leaves)"""
+    head, position = subscribe(bus, last_event_id)
+    metrics.EVENT_SUBSCRIBERS.inc()
+    try:
+        yield head
+        while True:
+            bus.wait(position, keepalive_seconds)
+            chunk, position = next_chunk(bus, position)
+            yield chunk
+    finally:
+        metrics.EVENT_SUBSCRIBERS.dec()
+
+
+async def stream_async(bus, last_event_id=None, keepalive_seconds=15):
+    """text/event-stream chunks for an ASGI response"""
+    head, position = subscribe(bus, last_event_id)
+    metrics.EVENT_SUBSCRIBERS.inc()
+    try:
+        yield head
+        while True:
+            await bus.wait_async(position, keepalive_seconds)
+            chunk, position = next_chunk(bus, position)
+            yield chunk
+    finally:
+        metrics.EVENT_SUBSCRIBERS.dec()
+
+
+class SlotWatcher:
+    """
+    Thread publishing the slot changes of a repository's change feed
+    (Repository.watch_slots); reconnects after errors and resumes after
+    the last event it published
+    """
+
+    def __init__(self, repository, bus, retry_seconds=5):
+        self.repository = repository
+        self.bus = bus
+        self.retry_seconds = retry_seconds
+        self._resume_after = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='slot-watcher', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.repository.watch_slots(self.publish, self._stop, resume_after=self._resume_after)
+            except Exception as e:
+                logger.warning(f"Slot change stream failed: {str(e)}")
+                self._stop.wait(self.retry_seconds)
+
+    def publish(self, event_id, event_type, data):
+        self.bus.publish(event_type, data, event_id=event_id)
+        self._resume_after = event_id
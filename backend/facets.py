@@ -0,0 +1,142 @@
+"""
+Incrementally maintained facet store behind GET /options.
+
+For every facet (device type, brand, model, postal code, city) the
+'facets' collection holds one document per distinct value with the number
+of repair requests carrying it. Models are additionally scoped by device
+type and brand, so /options?filter=models&brand=... only has to group a
+few small documents. POST /request increments the counters and archiving
+a request (archiver.py) decrements them, so no distinct over
+repair_requests is needed when a dropdown opens.
+
+app.py builds the store on startup when it is empty while repair_requests
+is not (see Repository.backfill()); it can be rebuilt with:
+    python facets.py
+"""
+import re
+
+from pymongo import UpdateOne
+
+# filter name -> document field, plus the scope fields stored with each value
+FACETS = {
+    'device_types': {'field': 'device.type', 'scope': []},
+    'brands': {'field': 'device.manufacturer', 'scope': []},
+    'models': {'field': 'device.model', 'scope': ['device_type', 'brand']},
+    'postal_codes': {'field': 'customer.address.postalCode', 'scope': []},
+    'cities': {'field': 'customer.address.city', 'scope': []}
+}
+
+# scope name -> document field
+SCOPE_FIELDS = {
+    'device_type': 'device.type',
+    'brand': 'device.manufacturer'
+}
+
+
+def get_path(doc, path):
+    """Value of a dotted path in a nested dict (None if missing)"""
+    for key in path.split('.'):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(key)
+    return doc
+
+
+def facet_updates(doc, inc=1):
+    """Counter updates for a single repair request document"""
+    updates = []
+    for facet, spec in FACETS.items():
+        value = get_path(doc, spec['field'])
+        if value is None or value == '':
+            continue
+        key = {'facet': facet, 'value': value}
+        for scope in spec['scope']:
+            key[scope] = get_path(doc, SCOPE_FIELDS[scope])
+        updates.append(UpdateOne(
+            key,
+            {'$inc': {'count': inc}, '$set': {'key': str(value).casefold()}},
+            upsert=True
+        ))
+    return updates
+
+
+def record(collection, docs, inc=1, session=None):
+    """Add (inc=1) or remove (inc=-1) repair requests from the facet counts"""
+    updates = []
+    for doc in docs:
+        updates.extend(facet_updates(doc, inc))
+    if updates:
+        collection.bulk_write(updates, ordered=False, session=session)
+    if inc < 0:
+        collection.delete_many({'count': {'$lte': 0}}, session=session)
+
+
+def options_pipeline(facet, scope=None, prefix=None, sort='value', offset=0, limit=50):
+    """Aggregation over the facet store behind options()"""
+    match = {'facet': facet}
+    for name, value in (scope or {}).items():
+        if value:
+            match[name] = value
+    if prefix:
+        # Anchored on the casefolded key, so it can use the index
+        match['key'] = {'$regex': '^' + re.escape(prefix.casefold())}
+
+    sort_spec = {'count': -1, '_id': 1} if sort == 'count' else {'_id': 1}
+    return [
+        {'$match': match},
+        {'$group': {'_id': '$value', 'count': {'$sum': '$count'}}},
+        {'$match': {'count': {'$gt': 0}}},
+        {'$sort': sort_spec},
+        {'$skip': offset},
+        {'$limit': limit + 1}
+    ]
+
+
+def options(collection, facet, scope=None, prefix=None, sort='value', offset=0, limit=50):
+    """
+    Distinct values of a facet with their counts
+    Returns (list of {'value', 'count'}, has_more)
+    """
+    pipeline = options_pipeline(facet, scope, prefix, sort, offset, limit)
+    rows = [{'value': row['_id'], 'count': row['count']} for row in collection.aggregate(pipeline)]
+    return rows[:limit], len(rows) > limit
+
+
+def counts_pipeline(query, limit=50):
+    """
+    Single aggregation returning the value counts of every facet for the
+    repair requests matching query (used for /options?filter=all)
+    """
+    return [
+        {'$match': query},
+        {'$facet': {
+            facet: [
+                {'$match': {spec['field']: {'$nin': [None, '']}}},
+                {'$group': {'_id': '$' + spec['field'], 'count': {'$sum': 1}}},
+                {'$sort': {'count': -1, '_id': 1}},
+                {'$limit': limit}
+            ]
+            for facet, spec in FACETS.items()
+        }}
+    ]
+
+
+def rebuild(requests_collection, facets_collection, query=None):
+    """Recount all facets from scratch (from the repair requests matching query)"""
+    facets_collection.delete_many({})
+    batch = []
+    for doc in requests_collection.find(query or {}, {'device': 1, 'customer.address': 1}):
+        batch.append(doc)
+        if len(batch) >= 1000:
+            record(facets_collection, batch)
+            batch = []
+    record(facets_collection, batch)
+
+
+if __name__ == '__main__':
+    from pymongo import MongoClient
+
+    client = MongoClient('mongodb://localhost:27017/')
+    db = client['repair_shop']
+    rebuild(db.repair_requests, db.facets)
+    print(f"Rebuilt {db.facets.count_documents({})} facet values")
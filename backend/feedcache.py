@@ -0,0 +1,98 @@
+"""
+Versioned response cache for the calendar and slot feeds.
+
+Feeds only change when a booking is written, so rendered responses are kept
+per (path, range, auth scope, day) together with the booking version they
+were built for. Writing a booking bumps the version which invalidates every
+entry at once. With a shared version (booking_version() in app.py, a
+counter in the database every worker process raises with its booking
+writes) a booking of any process invalidates the entries of all of them on
+their next request; without one each process only knows its own bookings
+and the entries of the others expire after max_age_seconds.
+
+Each entry carries a strong ETag (hash of the body) and a Last-Modified
+timestamp, so repeated polls can be answered with 304 Not Modified after a
+header comparison.
+"""
+import hashlib
+import threading
+import time as _time
+from datetime import datetime, timezone
+
+
+class CachedFeed:
+    """A rendered feed body together with its validators"""
+
+    def __init__(self, body, mimetype, headers, etag, last_modified, version):
+        self.body = body
+        self.mimetype = mimetype
+        self.headers = headers
+        self.etag = etag
+        self.last_modified = last_modified
+        self.version = version
+        self.created = _time.monotonic()
+
+
+class FeedCache:
+    """
+    In-process cache of rendered feeds keyed by an arbitrary hashable key
+
+    max_age_seconds bounds how long an entry is served without re-rendering,
+    so bookings written by other worker processes become visible eventually
+    even without a shared version. shared_version is a callable returning
+    the booking version of all processes, read on every lookup.
+    """
+
+    def __init__(self, max_age_seconds=300, max_entries=256, shared_version=None):
+        self.max_age_seconds = max_age_seconds
+        self.max_entries = max_entries
+        self.shared_version = shared_version
+        self.bumps = 0
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    @property
+    def version(self):
+        """Current version: the shared one (if any) and this process's bumps"""
+        shared = self.shared_version() if self.shared_version is not None else 0
+        return shared, self.bumps
+
+    def bump(self):
+        """Invalidate all cached feeds of this process (called whenever a booking is written)"""
+        with self._lock:
+            self.bumps += 1
+            return self.bumps
+
+    def get(self, key):
+        """Return the cached feed for key if it is still current"""
+        entry = self._entries.get(key)
+        if entry is None or entry.version != self.version:
+            return None
+        if _time.monotonic() - entry.created > self.max_age_seconds:
+            return None
+        return entry
+
+    def put(self, key, body, mimetype, headers=None, version=None):
+        """
+        Store a freshly rendered body and return its cache entry
+
+        version should be read before rendering started, so that a booking
+        written while rendering does not get masked by a stale entry.
+        """
+        etag = hashlib.sha1(body).hexdigest()
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is not None and previous.etag == etag:
+                # Unchanged content keeps its original modification time
+                last_modified = previous.last_modified
+            else:
+                last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+
+            if len(self._entries) >= self.max_entries and key not in self._entries:
+                self._entries.clear()
+
+            if version is None:
+                version = self.version
+            entry = CachedFeed(body, mimetype, headers or {}, etag, last_modified, version)
+            self._entries[key] = entry
+            return entry
@@ -0,0 +1,119 @@
+"""
+Sparse fieldsets for GET /requests and GET /request.
+
+fields= lists the document fields a caller needs as dotted paths
+(customer.lastName,device.model), view= names a predefined set of them
+(VIEWS). In MongoDB the paths become an inclusion projection; in SQLite
+only the top-level fields they start with are extracted from the stored
+document by json_object(), and the nested paths are applied after loading.
+Either way the rest of each document is neither transferred nor decoded.
+Nested paths follow MongoDB's projection rules: a path into an array
+selects the field in every element of it.
+"""
+import re
+from functools import lru_cache
+
+from searchindex import TOKEN_FIELDS
+
+FIELD_PATH = re.compile(r'[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*')
+MAX_FIELDS = 50
+
+# Named views: field paths, None for whole documents
+VIEWS = {
+    # Result cards of search.htm
+    'list': (
+        'status', 'submittedAt', 'serviceType',
+        'customer.firstName', 'customer.lastName', 'customer.email', 'customer.phoneNumber', 'customer.address',
+        'device.type', 'device.manufacturer', 'device.model'
+    ),
+    # Appointment details as calendar.htm shows them
+    'calendar': (
+        'status', 'serviceType', 'appointment',
+        'customer.firstName', 'customer.lastName', 'customer.email', 'customer.phoneNumber',
+        'device.type', 'device.manufacturer', 'device.model'
+    ),
+    'detail': None
+}
+
+
+def parse_fields(fields=None, view=None):
+    """
+    Sorted field paths of a fields= (comma separated) and view= parameter,
+    both together select the fields of either; None for whole documents
+    Raises ValueError for an unknown view or an invalid path
+    """
+    if not fields and not view:
+        return None
+    paths = set()
+    if view:
+        if view not in VIEWS:
+            raise ValueError(f"Invalid view: {view}, expected one of: {', '.join(VIEWS)}")
+        if VIEWS[view] is None:
+            return None
+        paths.update(VIEWS[view])
+    for path in (fields or '').split(','):
+        path = path.strip()
+        if not path:
+            continue
+        if not FIELD_PATH.fullmatch(path) or path.split('.')[0] in TOKEN_FIELDS:
+            raise ValueError(f'Invalid field: {path}')
+        paths.add(path)
+    if len(paths) > MAX_FIELDS:
+        raise ValueError(f'At most {MAX_FIELDS} fields')
+    # _id is always returned; a path inside a selected field adds nothing
+    paths.discard('_id')
+    return tuple(
+        path for path in sorted(paths)
+        if not any(path.startswith(other + '.') for other in paths)
+    )
+
+
+def projection(paths, *extra):
+    """
+    MongoDB projection of parse_fields() paths plus extra fields the query
+    needs itself (e.g. the sort keys); without paths everything but the
+    search keys
+    """
+    if paths is None:
+        return {field: 0 for field in TOKEN_FIELDS}
+    return {path: 1 for path in paths + extra}
+
+
+def top_level(paths):
+    """The top-level fields the paths start with"""
+    return sorted({path.split('.')[0] for path in paths})
+
+
+@lru_cache(maxsize=256)
+def field_tree(paths):
+    """{field: True (all of it) or sub-tree} of a tuple of paths"""
+    tree = {}
+    for path in paths:
+        node = tree
+        *parents, leaf = path.split('.')
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[leaf] = True
+    return tree
+
+
+def _select(value, tree):
+    selected = {}
+    for key, sub in tree.items():
+        if key not in value:
+            continue
+        field = value[key]
+        if sub is True:
+            selected[key] = field
+        elif isinstance(field, dict):
+            selected[key] = _select(field, sub)
+        elif isinstance(field, list):
+            selected[key] = [_select(item, sub) for item in field if isinstance(item, dict)]
+    return selected
+
+
+def select(doc, paths):
+    """The parts of a document the paths select, with its _id, like a MongoDB projection"""
+    selected = {'_id': doc['_id']} if '_id' in doc else {}
+    selected.update(_select(doc, field_tree(paths)))
+    return selected
@@ -0,0 +1,63 @@
+"""
+Liveness and readiness checks for GET /healthz and GET /readyz.
+
+/healthz only tells that the process answers requests: it does no I/O and
+reports the database state found by the last readiness check. /readyz
+pings the database with a time limit, so a load balancer stops sending
+requests to a worker within one probe when its database is slow or down,
+instead of queueing them behind blocked threads. A result is reused for
+cache_seconds and only one thread probes at a time while the others get the
+previous result, so frequent probes from several balancers cost one ping.
+"""
+import os
+import threading
+import time as _time
+
+
+class ReadinessCheck:
+    """
+    Cached result of probe(timeout_ms), a repository's ping(): the round
+    trip time in milliseconds, or an exception
+    """
+
+    def __init__(self, probe, timeout_ms, cache_seconds=1.0):
+        self.probe = probe
+        self.timeout_ms = timeout_ms
+        self.cache_seconds = cache_seconds
+        self._lock = threading.Lock()
+        self._result = None
+        self._checked_at = None
+        if hasattr(os, 'register_at_fork'):
+            # A forked worker has its own connections to check
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._result = None
+        self._checked_at = None
+
+    def last(self):
+        """Database state of the last check: 'ok', 'unavailable' or 'unknown' before the first one"""
+        result = self._result
+        return result['database'] if result else 'unknown'
+
+    def check(self):
+        """{'ready', 'database', 'latency_ms' or 'error'}, probed at most every cache_seconds"""
+        result = self._result
+        if result is not None and _time.monotonic() - self._checked_at < self.cache_seconds:
+            return result
+        # Without a previous result, wait for the probe running in another thread
+        if not self._lock.acquire(blocking=result is None):
+            return result
+        try:
+            if self._result is not result and self._result is not None:
+                return self._result
+            try:
+                latency = self.probe(self.timeout_ms)
+                result = {'ready': True, 'database': 'ok', 'latency_ms': round(latency, 2)}
+            except Exception as e:
+                result = {'ready': False, 'database': 'unavailable', 'error': str(e)}
+            self._result, self._checked_at = result, _time.monotonic()
+            return result
+        finally:
+            self._lock.release()
@@ -0,0 +1,44 @@
+"""
+iCalendar serialization for the .ics feeds.
+
+build_calendar() creates the complete icalendar.Calendar object graph and is
+serialized with to_ical() in one go. stream_calendar() yields the same bytes
+chunk by chunk: the calendar header, one VEVENT per event as soon as it is
+produced, and the closing line. Every chunk is rendered by icalendar itself,
+so both paths stay byte-compatible while the streaming one only ever holds a
+single event in memory.
+"""
+from icalendar import Calendar
+
+END_CALENDAR = b'END:VCALENDAR\r\n'
+
+
+def build_calendar(properties, events):
+    """
+    Build a full Calendar from (name, value) properties and Event objects
+    """
+    cal = Calendar()
+    for name, value in properties:
+        cal.add(name, value)
+    for event in events:
+        cal.add_component(event)
+    return cal
+
+
+def calendar_header(properties):
+    """Serialized calendar properties without the closing END:VCALENDAR"""
+    ical = build_calendar(properties, []).to_ical()
+    if not ical.endswith(END_CALENDAR):
+        raise ValueError('Unexpected calendar serialization')
+    return ical[:-len(END_CALENDAR)]
+
+
+def stream_calendar(properties, events):
+    """
+    Yield a calendar as byte chunks, byte-identical to
+    build_calendar(properties, events).to_ical()
+    """
+    yield calendar_header(properties)
+    for event in events:
+        yield event.to_ical()
+    yield END_CALENDAR
@@ -0,0 +1,194 @@
+"""
+Index declarations for the collections used by app.py.
+
+INDEXES lists, per collection, the indexes each endpoint relies on.
+ensure_indexes() creates them (a no-op for indexes that already exist) and
+is called when the app starts.
+
+Check mode runs explain() on the queries the endpoints actually issue,
+against the database given on the command line, and fails if any of them
+falls back to a collection scan:
+    python indexes.py --check [--uri mongodb://localhost:27017/] [--db repair_shop]
+"""
+import argparse
+import logging
+import sys
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+logger = logging.getLogger(__name__)
+
+# GET /requests, on repair_requests and (archive=include|only) archived_requests
+REQUESTS_INDEXES = [
+    # Default sort, keyset pagination and date range
+    IndexModel([('submittedAt', DESCENDING), ('_id', DESCENDING)], name='submitted_at'),
+    # Filters, newest first
+    IndexModel([('device.type', ASCENDING), ('submittedAt', DESCENDING)], name='device_type'),
+    IndexModel([('device.manufacturer', ASCENDING), ('device.model', ASCENDING), ('submittedAt', DESCENDING)],
+               name='device_manufacturer_model'),
+    IndexModel([('device.model', ASCENDING), ('submittedAt', DESCENDING)], name='device_model'),
+    IndexModel([('customer.address.postalCode', ASCENDING), ('submittedAt', DESCENDING)], name='postal_code'),
+    # customer_search (see searchindex.py)
+    IndexModel([('searchTrigrams', ASCENDING)], name='search_trigrams'),
+    IndexModel([('searchTokens', ASCENDING)], name='search_tokens')
+]
+
+INDEXES = {
+    'repair_requests': REQUESTS_INDEXES + [
+        # Appointment lookups
+        IndexModel([('appointment.date', ASCENDING), ('appointment.timeSlot', ASCENDING)], name='appointment'),
+        IndexModel([('customer.email', ASCENDING)], name='customer_email'),
+        IndexModel([('status', ASCENDING)], name='status'),
+        # Auto-archive candidates (see archiver.py)
+        IndexModel([('status', ASCENDING), ('statusChangedAt', ASCENDING)], name='status_changed_at')
+    ],
+    'archived_requests': REQUESTS_INDEXES,
+    'calendar': [
+        # GET /calendar, /calendar.ics, /slots, /slots.ics (date range, stored as YYYY-MM-DD)
+        IndexModel([('date', ASCENDING), ('start_time', ASCENDING)], name='date_start_time')
+    ],
+    'appointment_slots': [
+        # POST /request slot reservation (see reservations.py); unique so a slot exists only once
+        IndexModel([('date', ASCENDING), ('time', ASCENDING)], name='date_time', unique=True),
+        # Orphaned reservation cleanup
+        IndexModel([('bookedBy.bookedAt', ASCENDING)], name='booked_at', sparse=True)
+    ],
+    'facets': [
+        # GET /options (see facets.py); unique so concurrent upserts cannot duplicate values
+        IndexModel([('facet', ASCENDING), ('value', ASCENDING), ('device_type', ASCENDING), ('brand', ASCENDING)],
+                   name='facet_value', unique=True),
+        IndexModel([('facet', ASCENDING), ('key', ASCENDING)], name='facet_prefix')
+    ]
+}
+
+
+def ensure_indexes(db):
+    """Create all declared indexes (existing ones are left untouched)"""
+    for collection, indexes in INDEXES.items():
+        names = db[collection].create_indexes(indexes)
+        logger.debug(f"Indexes on {collection}: {', '.join(names)}")
+
+
+# ============================================================================
+# QUERY PLAN CHECK
+# ============================================================================
+
+def requests_page(filters, customer_search=None, position=None, fields=None):
+    """A /requests page (see repository.py) as GET /requests builds it"""
+    return {'filters': dict(filters, customer_search=customer_search) if customer_search else filters,
+            'customer_search': customer_search, 'limit': 10, 'position': position, 'fields': fields,
+            'archive': 'exclude'}
+
+
+def representative_queries():
+    """
+    (label, collection, explain command) for the queries issued by
+    /requests, /options, /calendar, /slots and the archiver, built with the
+    same helpers as the repository (nothing of app.py is imported, so a
+    check never touches the database the app is configured for)
+    """
+    from bson.objectid import ObjectId
+
+    from archiver import ARCHIVED_STATUS
+    from facets import options_pipeline
+    from fieldsets import parse_fields
+    from repository import (REQUESTS_SORT, archive_query, calendar_query, requests_page_find,
+                            requests_search_pipeline)
+    from workflow import compile_bpmn
+
+    sort = dict(REQUESTS_SORT)
+    now = datetime.now()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    checks = []
+
+    def find(label, collection, page):
+        query, fields = requests_page_find(page)
+        checks.append((label, collection, {
+            'find': collection, 'filter': query, 'projection': fields, 'sort': sort, 'limit': page['limit'] + 1
+        }))
+
+    for label, filters in [
+        ('/requests', {}),
+        ('/requests?start_date', {'submitted_from': today, 'submitted_to': today + timedelta(days=90)}),
+        ('/requests?device_type', {'device_type': 'smartphone'}),
+        ('/requests?brand', {'brand': 'Samsung'}),
+        ('/requests?brand&model', {'brand': 'Samsung', 'model': 'Galaxy S24'}),
+        ('/requests?model', {'model': 'Galaxy S24'}),
+        ('/requests?postal_code', {'postal_code': '10115'})
+    ]:
+        find(label, 'repair_requests', requests_page(filters))
+    find('/requests?after (next page)', 'repair_requests', requests_page({}, position=(None, now, ObjectId())))
+    find('/requests?view=list', 'repair_requests', requests_page({}, fields=parse_fields(view='list')))
+    find('/requests?brand&archive=only', 'archived_requests', requests_page({'brand': 'Samsung'}))
+
+    for label, text in [('/requests?customer_search', 'mueller'), ('/requests?customer_search (short)', 'mu')]:
+        pipeline = requests_search_pipeline(requests_page({}, customer_search=text))
+        checks.append((label, 'repair_requests', {'aggregate': 'repair_requests', 'pipeline': pipeline, 'cursor': {}}))
+
+    for label, kwargs in [
+        ('/options?filter=brands', {'facet': 'brands'}),
+        ('/options?filter=models&brand', {'facet': 'models', 'scope': {'brand': 'Samsung'}}),
+        ('/options?filter=cities&prefix', {'facet': 'cities', 'prefix': 'ber'})
+    ]:
+        pipeline = options_pipeline(**kwargs)
+        checks.append((label, 'facets', {'aggregate': 'facets', 'pipeline': pipeline, 'cursor': {}}))
+
+    # The statuses of flow.bpmn; cutoff and batch size do not change the plan
+    statuses = sorted(compile_bpmn().sources[ARCHIVED_STATUS])
+    query = archive_query(statuses, now - timedelta(days=90), ARCHIVED_STATUS)
+    checks.append(('archiver', 'repair_requests', {'find': 'repair_requests', 'filter': query, 'limit': 500}))
+    checks.append(('/calendar', 'calendar',
+                   {'find': 'calendar', 'filter': calendar_query(now, now + timedelta(days=90))}))
+    checks.append(('/slots (occupancy index)', 'calendar',
+                   {'find': 'calendar', 'filter': calendar_query(now)}))
+    return checks
+
+
+def find_stages(plan, stage_name):
+    """Yield every node of the winning plan(s) with the given stage name"""
+    if isinstance(plan, dict):
+        if plan.get('stage') == stage_name:
+            yield plan
+        for key, value in plan.items():
+            if key != 'rejectedPlans':
+                yield from find_stages(value, stage_name)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from find_stages(item, stage_name)
+
+
+def check(db):
+    """Explain the representative queries; returns the labels that COLLSCAN"""
+    failures = []
+    for label, collection, command in representative_queries():
+        explain = db.command('explain', command, verbosity='queryPlanner')
+        collscan = any(find_stages(explain, 'COLLSCAN'))
+        print(f"{'COLLSCAN' if collscan else 'ok':>8}  {label}  ({collection})")
+        if collscan:
+            failures.append(label)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Create indexes and verify query plans')
+    parser.add_argument('--uri', default='mongodb://localhost:27017/')
+    parser.add_argument('--db', default='repair_shop')
+    parser.add_argument('--check', action='store_true', help='fail if any endpoint query uses a COLLSCAN')
+    args = parser.parse_args()
+
+    from pymongo import MongoClient
+
+    db = MongoClient(args.uri)[args.db]
+    ensure_indexes(db)
+    print(f"Ensured indexes on {', '.join(INDEXES)}")
+
+    if args.check:
+        failures = check(db)
+        if failures:
+            print(f"{len(failures)} quer{'y' if len(failures) == 1 else 'ies'} without index: {', '.join(failures)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Flask JSON provider that serializes MongoDB documents in a single pass.
+
+Decimal128 values become floats, ObjectIds strings and datetimes ISO 8601
+strings while the response is being encoded, so documents can be handed to
+jsonify() as returned by pymongo - without a recursive conversion copy and
+without patching fields by hand. RawBSONDocuments (pymongo's
+document_class=RawBSONDocument) are accepted as well: each one is decoded
+into dicts with bson.decode() when the encoder reaches it. That is the same
+C-level decode pymongo does for dict documents, only later, so it costs
+about as much per document (benchmarks/bench_json.py compares both); the
+decoded dicts of a document only live while it is encoded, and documents
+fetched but never encoded are never decoded.
+
+orjson is used when it is installed, otherwise the standard json module.
+"""
+import json
+from datetime import date, datetime
+from functools import lru_cache
+
+import bson
+from bson.codec_options import CodecOptions
+from bson.decimal128 import Decimal128
+from bson.objectid import ObjectId
+from bson.raw_bson import RawBSONDocument
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+# Codec options for collections whose documents go straight into a response
+RAW_BSON_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+
+
+@lru_cache(maxsize=4096)
+def _decimal128_to_float(bid):
+    # Decimal128.to_decimal() is slow and prices repeat a lot
+    return float(Decimal128.from_bid(bid).to_decimal())
+
+
+def bson_default(o):
+    """Convert the BSON types json/orjson cannot handle themselves"""
+    if isinstance(o, Decimal128):
+        return _decimal128_to_float(o.bid)
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    if isinstance(o, RawBSONDocument):
+        # Decoded into dicts here, when it is encoded, not skipped
+        return bson.decode(o.raw)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def encode(obj, sort_keys=True, indent=False):
+    """
+    Response body bytes for obj, as BSONJSONProvider.response() writes them
+    (also used by the ASGI routes in asgi.py)
+    """
+    if orjson is None:
+        if indent:
+            text = json.dumps(obj, default=bson_default, sort_keys=sort_keys, indent=2)
+        else:
+            text = json.dumps(obj, default=bson_default, sort_keys=sort_keys, separators=(',', ':'))
+        return (text + '\n').encode('utf-8')
+
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(obj, default=bson_default, option=option)
+
+
+class BSONJSONProvider(DefaultJSONProvider):
+    """JSON provider for app.json, see module docstring"""
+
+    default = staticmethod(bson_default)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+
+        # Hand orjson's bytes to the response without a str round-trip
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(encode(obj, self.sort_keys, indent), mimetype=self.mimetype)
@@ -0,0 +1,261 @@
+"""
+Prometheus metrics for the /metrics endpoint.
+
+Request hooks in app.py (and the native routes of asgi.py) record request
+counts and latencies per route and status code and the number of requests
+in flight. CommandTimer is a pymongo CommandListener that times every
+MongoDB command per collection and command name; PoolMonitor is a
+ConnectionPoolListener counting open, checked-out and waiting connections
+per server, SQLiteRepository counts its own connections. The .ics feeds
+record how long they took to render and how many bytes they produced,
+PATCH /request/<id>/status counts the workflow transitions it applies and
+the archiver (archiver.py) the requests it moved to the archive; /events
+streams are counted while they are open.
+
+With several worker processes (gunicorn), point PROMETHEUS_MULTIPROC_DIR to
+an empty directory shared by the workers before they start; /metrics then
+adds up what all workers recorded. Connection pool gauges always describe
+the process that answers the scrape.
+"""
+import os
+import threading
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+from prometheus_client.core import GaugeMetricFamily
+from pymongo import monitoring
+
+# Seconds, from cached feeds up to customer searches hitting their time budget
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COMMAND_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+# Bytes, from a quiet week of /slots.ics to a year of /calendar.ics
+SIZE_BUCKETS = (4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# Route label of requests that matched no route (keeps scanners from
+# creating a time series per path)
+UNMATCHED_ROUTE = 'unmatched'
+
+HTTP_REQUESTS = Counter(
+    'repairflow_http_requests_total', 'HTTP requests handled',
+    ['method', 'route', 'status']
+)
+HTTP_LATENCY = Histogram(
+    'repairflow_http_request_duration_seconds', 'Time until the response was handed to the server',
+    ['method', 'route', 'status'], buckets=LATENCY_BUCKETS
+)
+HTTP_IN_FLIGHT = Gauge(
+    'repairflow_http_requests_in_flight', 'Requests being handled',
+    multiprocess_mode='livesum'
+)
+MONGO_COMMAND_DURATION = Histogram(
+    'repairflow_mongodb_command_duration_seconds', 'MongoDB command round trips',
+    ['collection', 'command'], buckets=COMMAND_BUCKETS
+)
+MONGO_COMMAND_FAILURES = Counter(
+    'repairflow_mongodb_command_failures_total', 'MongoDB commands that returned an error',
+    ['collection', 'command']
+)
+MONGO_CHECKOUT_FAILURES = Counter(
+    'repairflow_mongodb_pool_checkout_failures_total', 'Connection pool check-outs that failed',
+    ['reason']
+)
+STATUS_TRANSITIONS = Counter(
+    'repairflow_status_transitions_total', 'Workflow status changes of repair requests',
+    ['from_status', 'to_status']
+)
+ARCHIVED_REQUESTS = Counter(
+    'repairflow_archived_requests_total', 'Repair requests moved to archived_requests'
+)
+EVENT_SUBSCRIBERS = Gauge(
+    'repairflow_event_subscribers', 'Open /events streams',
+    multiprocess_mode='livesum'
+)
+ICS_GENERATION = Histogram(
+    'repairflow_ics_generation_seconds', 'Time to render an .ics feed (streamed feeds until the last chunk)',
+    ['feed'], buckets=LATENCY_BUCKETS
+)
+ICS_SIZE = Histogram(
+    'repairflow_ics_response_bytes', 'Size of rendered .ics feeds',
+    ['feed'], buckets=SIZE_BUCKETS
+)
+
+# ============================================================================
+# HTTP REQUESTS
+# ============================================================================
+
+def request_started():
+    HTTP_IN_FLIGHT.inc()
+
+
+def request_finished():
+    HTTP_IN_FLIGHT.dec()
+
+
+def observe_request(method, route, status, seconds):
+    status = str(status)
+    HTTP_REQUESTS.labels(method, route, status).inc()
+    HTTP_LATENCY.labels(method, route, status).observe(seconds)
+
+# ============================================================================
+# ICS FEEDS
+# ============================================================================
+
+def observe_ics(feed, seconds, size):
+    ICS_GENERATION.labels(feed).observe(seconds)
+    ICS_SIZE.labels(feed).observe(size)
+
+
+def timed_ics(feed, chunks):
+    """
+    Pass the chunks of a streamed feed through and record its generation
+    time and size once the last one was produced
+    """
+    started = time.perf_counter()
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        yield chunk
+    observe_ics(feed, time.perf_counter() - started, size)
+
+# ============================================================================
+# MONGODB
+# ============================================================================
+
+def command_collection(event):
+    """Collection a command works on, '' for database and admin commands"""
+    if event.command_name == 'getMore':
+        name = event.command.get('collection')
+    else:
+        name = event.command.get(event.command_name)
+    return name if isinstance(name, str) else ''
+
+
+class CommandTimer(monitoring.CommandListener):
+    """
+    Command durations as measured by the driver, per collection and command
+    (MongoClient(..., event_listeners=[CommandTimer()]))
+    """
+
+    def __init__(self):
+        # (connection, request id) -> collection of commands in flight; the
+        # finished events no longer carry the command document
+        self._collections = {}
+
+    def started(self, event):
+        self._collections[(event.connection_id, event.request_id)] = command_collection(event)
+
+    def succeeded(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), '')
+        MONGO_COMMAND_DURATION.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), '')
+        MONGO_COMMAND_DURATION.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_FAILURES.labels(collection, event.command_name).inc()
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """
+    Open, checked-out and waiting connections per MongoDB server; one
+    instance can watch several clients of a process
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools = {}
+        if hasattr(os, 'register_at_fork'):
+            # A forked worker opens its own pools (see mongoconnection.py)
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._pools = {}
+
+    def _add(self, address, state, delta):
+        with self._lock:
+            pool = self._pools.setdefault(f'{address[0]}:{address[1]}', {'open': 0, 'in_use': 0, 'waiting': 0})
+            pool[state] += delta
+
+    def usage(self):
+        """{server: {'open', 'in_use', 'waiting'}}"""
+        with self._lock:
+            return {address: dict(pool) for address, pool in self._pools.items()}
+
+    def pool_created(self, event):
+        self._add(event.address, 'open', 0)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._add(event.address, 'open', 1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add(event.address, 'open', -1)
+
+    def connection_check_out_started(self, event):
+        self._add(event.address, 'waiting', 1)
+
+    def connection_check_out_failed(self, event):
+        self._add(event.address, 'waiting', -1)
+        MONGO_CHECKOUT_FAILURES.labels(str(event.reason)).inc()
+
+    def connection_checked_out(self, event):
+        self._add(event.address, 'waiting', -1)
+        self._add(event.address, 'in_use', 1)
+
+    def connection_checked_in(self, event):
+        self._add(event.address, 'in_use', -1)
+
+# ============================================================================
+# CONNECTION POOLS AND EXPOSITION
+# ============================================================================
+
+class PoolCollector:
+    """Connection pool gauges, read from usage() at scrape time"""
+
+    def __init__(self, backend, usage):
+        self.backend = backend
+        self.usage = usage
+
+    def collect(self):
+        family = GaugeMetricFamily(
+            'repairflow_db_pool_connections', 'Database connections of this process by state',
+            labels=['backend', 'pool', 'state']
+        )
+        for pool, states in self.usage().items():
+            for state, count in states.items():
+                family.add_metric([self.backend, pool, state], count)
+        yield family
+
+
+_pool_collectors = []
+
+
+def register_pool(backend, usage):
+    """Report a connection pool; usage() returns {pool: {state: connections}}"""
+    collector = PoolCollector(backend, usage)
+    _pool_collectors.append(collector)
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        REGISTRY.register(collector)
+
+
+def render():
+    """(body, content type) of a scrape"""
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    for collector in _pool_collectors:
+        registry.register(collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,75 @@
+"""
+Per-process MongoDB client, created on first use.
+
+A MongoClient must not be used across fork(): its pooled sockets and
+monitor threads belong to the process that opened them. Under a
+pre-forking server (e.g. gunicorn --preload) app.py is imported once in the
+master and then forked into the workers, so MongoConnection does not open
+its client when it is created but on first use, and drops it in every
+forked child (os.register_at_fork), which then opens its own pool on its
+first query. The parent's client is left alone, not closed, since closing
+it from the child would end sessions the parent still uses.
+
+The client options (pool size, idle time, timeouts) come from app.py. Short
+connect, server selection and pool wait timeouts let requests fail fast
+while mongod is slow or down, instead of blocking every worker thread for
+pymongo's default 30 seconds.
+"""
+import os
+import threading
+import time
+
+import pymongo
+from pymongo import MongoClient
+
+
+class MongoConnection:
+    """
+    The MongoClient of the current process, opened lazily with the given
+    options
+    """
+
+    def __init__(self, uri, **options):
+        self.uri = uri
+        self.options = options
+        self._lock = threading.Lock()
+        self._client = None
+        self._pid = None
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._forget)
+
+    def _forget(self):
+        # Runs in the child right after fork(); a lock held by another thread
+        # of the parent at that moment would never be released here
+        self._lock = threading.Lock()
+        self._client = None
+        self._pid = None
+
+    @property
+    def client(self):
+        """The client of this process, opened on first use"""
+        client = self._client
+        if client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    self._client = MongoClient(self.uri, **self.options)
+                    self._pid = os.getpid()
+                client = self._client
+        return client
+
+    def close(self):
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self._client = None
+
+    def ping(self, timeout_ms):
+        """
+        Round-trip time of a ping command in milliseconds; raises a
+        PyMongoError if no server answers within timeout_ms (server
+        selection and connecting included)
+        """
+        started = time.perf_counter()
+        with pymongo.timeout(timeout_ms / 1000):
+            self.client.admin.command('ping')
+        return (time.perf_counter() - started) * 1000
@@ -148,14 +148,27 @@ db.createCollection("repair_services", {
 // CREATE INDEXES
 // ============================================================================
 
-// Indexes for repair_requests
-db.repair_requests.createIndex({ "customer.email": 1 });
-db.repair_requests.createIndex({ "submittedAt": -1 });
-db.repair_requests.createIndex({ "status": 1 });
-db.repair_requests.createIndex({ "appointment.date": 1, "appointment.time": 1 });
-db.repair_requests.createIndex({ "device.brand": 1, "device.model": 1 });
+// Indexes for repair_requests, calendar and facets as used by backend/app.py.
+// The backend creates these itself on startup, see backend/indexes.py
+db.repair_requests.createIndex({ "submittedAt": -1, "_id": -1 }, { name: "submitted_at" });
+db.repair_requests.createIndex({ "device.type": 1, "submittedAt": -1 }, { name: "device_type" });
+db.repair_requests.createIndex({ "device.manufacturer": 1, "device.model": 1, "submittedAt": -1 }, { name: "device_manufacturer_model" });
+db.repair_requests.createIndex({ "device.model": 1, "submittedAt": -1 }, { name: "device_model" });
+db.repair_requests.createIndex({ "customer.address.postalCode": 1, "submittedAt": -1 }, { name: "postal_code" });
+db.repair_requests.createIndex({ "searchTrigrams": 1 }, { name: "search_trigrams" });
+db.repair_requests.createIndex({ "searchTokens": 1 }, { name: "search_tokens" });
+db.repair_requests.createIndex({ "appointment.date": 1, "appointment.timeSlot": 1 }, { name: "appointment" });
+db.repair_requests.createIndex({ "customer.email": 1 }, { name: "customer_email" });
+db.repair_requests.createIndex({ "status": 1 }, { name: "status" });
 db.repair_requests.createIndex({ "customer.phoneNumber": 1 });
 
+// Indexes for calendar
+db.calendar.createIndex({ "date": 1, "start_time": 1 }, { name: "date_start_time" });
+
+// Indexes for facets
+db.facets.createIndex({ "facet": 1, "value": 1, "device_type": 1, "brand": 1 }, { name: "facet_value", unique: true });
+db.facets.createIndex({ "facet": 1, "key": 1 }, { name: "facet_prefix" });
+
 // Indexes for appointment_slots
 db.appointment_slots.createIndex({ "date": 1, "time": 1 }, { unique: true });
 db.appointment_slots.createIndex({ "date": 1, "isAvailable": 1 });
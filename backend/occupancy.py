@@ -0,0 +1,270 @@
+"""
+In-process slot occupancy index for the public /slots endpoint.
+
+The index keeps one contiguous bytearray per state ("closed" and "booked")
+holding SLOT_DURATION_MINUTES slots for every day of a rolling horizon.
+Closed slots are copied from the business calendar's year tables, bookings
+are loaded once from the calendar collection and then updated incrementally
+whenever POST /request books a slot or a booking is released. Range
+queries slice the arrays instead of recomputing blocks and scanning MongoDB
+on every call.
+"""
+import threading
+import time as _time
+from datetime import date, datetime, time, timedelta
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def _parse_hhmm(value):
+    """Convert a 'HH:MM' string to minutes since midnight (None if invalid)"""
+    try:
+        hour, minute = value.split(':')
+        return int(hour) * 60 + int(minute)
+    except (AttributeError, ValueError):
+        return None
+
+
+class OccupancyIndex:
+    """
+    Per-day bitmap of closed and booked slots
+
+    calendar is the shop's BusinessCalendar (see businesscalendar.py),
+    whose slots the index uses, and load_bookings(start_date) returns
+    calendar entries (dicts with 'date', 'start_time' and 'end_time') on
+    or after start_date.
+    """
+
+    def __init__(self, calendar, load_bookings, horizon_days=400, refresh_seconds=300):
+        self.calendar = calendar
+        self.slot_minutes = calendar.slot_minutes
+        self.slots_per_day = MINUTES_PER_DAY // self.slot_minutes
+        self.load_bookings = load_bookings
+        self.horizon_days = horizon_days
+        self.refresh_seconds = refresh_seconds
+
+        self._lock = threading.RLock()
+        self._first_day = None      # ordinal of the first indexed day
+        self._days = 0              # number of indexed days
+        self._closed = bytearray()  # 1 = outside working hours / holiday
+        self._booked = bytearray()  # number of bookings touching the slot
+        self._bookings = {}         # day ordinal -> [(start_min, end_min), ...]
+        self._built_at = None
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+
+    def _extend_to(self, ordinal):
+        """Grow the closed mask so that it covers the given day"""
+        spd = self.slots_per_day
+        while self._first_day + self._days <= ordinal:
+            self._closed += self.calendar.closed_mask(date.fromordinal(self._first_day + self._days))
+            self._booked += bytes(spd)
+            self._days += 1
+
+    def build(self, today=None):
+        """(Re)build the whole index starting at today"""
+        today = today or date.today()
+        with self._lock:
+            self._first_day = today.toordinal()
+            self._days = 0
+            self._closed = bytearray()
+            self._booked = bytearray()
+            self._bookings = {}
+            self._extend_to(self._first_day + self.horizon_days - 1)
+
+            for entry in self.load_bookings(today):
+                self._add(entry.get('date'), entry.get('start_time'), entry.get('end_time'))
+
+            self._built_at = _time.monotonic()
+
+    def ensure_fresh(self):
+        """Build on first use and periodically afterwards, so that bookings
+        written by other worker processes show up eventually"""
+        if self._built_at is None or _time.monotonic() - self._built_at > self.refresh_seconds \
+                or date.today().toordinal() < self._first_day:
+            self.build()
+
+    # ------------------------------------------------------------------
+    # Bookings
+    # ------------------------------------------------------------------
+
+    def _interval(self, date_str, start_time, end_time):
+        """(day ordinal, start minute, end minute) of an indexed booking, None if invalid or past"""
+        try:
+            day = date.fromisoformat(date_str)
+        except (TypeError, ValueError):
+            return None
+        start_min = _parse_hhmm(start_time)
+        if start_min is None:
+            return None
+        end_min = _parse_hhmm(end_time) if end_time else None
+        if end_min is None:
+            end_min = start_min + self.slot_minutes
+
+        ordinal = day.toordinal()
+        if ordinal < self._first_day:
+            return None
+        self._extend_to(ordinal)
+        return ordinal, start_min, end_min
+
+    def _slot_range(self, ordinal, start_min, end_min):
+        base = (ordinal - self._first_day) * self.slots_per_day
+        first = start_min // self.slot_minutes
+        last = min(-(-end_min // self.slot_minutes), self.slots_per_day)
+        return range(base + first, base + last)
+
+    def _add(self, date_str, start_time, end_time):
+        interval = self._interval(date_str, start_time, end_time)
+        if interval is None:
+            return False
+        ordinal, start_min, end_min = interval
+        self._bookings.setdefault(ordinal, []).append((start_min, end_min))
+        for i in self._slot_range(*interval):
+            if self._booked[i] < 255:
+                self._booked[i] += 1
+        return True
+
+    def add_booking(self, date_str, start_time, end_time=None):
+        """Register a booking written by this process"""
+        with self._lock:
+            if self._built_at is None:
+                return False
+            return self._add(date_str, start_time, end_time)
+
+    def remove_booking(self, date_str, start_time, end_time=None):
+        """Forget a booking this process cancelled or rolled back"""
+        with self._lock:
+            if self._built_at is None:
+                return False
+            interval = self._interval(date_str, start_time, end_time)
+            if interval is None:
+                return False
+            ordinal, start_min, end_min = interval
+            bookings = self._bookings.get(ordinal, [])
+            if (start_min, end_min) not in bookings:
+                return False
+            bookings.remove((start_min, end_min))
+            for i in self._slot_range(*interval):
+                if self._booked[i]:
+                    self._booked[i] -= 1
+            return True
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _day_range(self, start_date, end_date):
+        first = max(start_date.date().toordinal(), self._first_day)
+        last = end_date.date().toordinal()
+        if last >= first:
+            self._extend_to(last)
+        return first, last
+
+    def closed_blocks(self, start_date, end_date):
+        """
+        Non-working blocks as (start_datetime, end_datetime) tuples,
+        identical to get_non_working_blocks() for the same range
+        """
+        self.ensure_fresh()
+        spd = self.slots_per_day
+        blocks = []
+        with self._lock:
+            first, last = self._day_range(start_date, end_date)
+            for ordinal in range(first, last + 1):
+                offset = (ordinal - self._first_day) * spd
+                mask = self._closed[offset:offset + spd]
+                day = date.fromordinal(ordinal)
+                slot = 0
+                while slot < spd:
+                    if not mask[slot]:
+                        slot += 1
+                        continue
+                    run_start = slot
+                    while slot < spd and mask[slot]:
+                        slot += 1
+                    block_start = datetime.combine(day, time(0, 0)) + timedelta(minutes=run_start * self.slot_minutes)
+                    if slot == spd:
+                        block_end = datetime.combine(day, time(23, 59, 59))
+                    else:
+                        block_end = datetime.combine(day, time(0, 0)) + timedelta(minutes=slot * self.slot_minutes)
+                    blocks.append((block_start, block_end))
+        return blocks
+
+    def booked_intervals(self, start_date, end_date):
+        """Booked appointments as (start_datetime, end_datetime) tuples"""
+        self.ensure_fresh()
+        intervals = []
+        with self._lock:
+            first, last = self._day_range(start_date, end_date)
+            for ordinal in range(first, last + 1):
+                bookings = self._bookings.get(ordinal)
+                if not bookings:
+                    continue
+                midnight = datetime.combine(date.fromordinal(ordinal), time(0, 0))
+                for start_min, end_min in bookings:
+                    intervals.append((midnight + timedelta(minutes=start_min),
+                                      midnight + timedelta(minutes=end_min)))
+        return intervals
+
+    def is_open(self, day, start_min, end_min):
+        """Check whether every slot in [start_min, end_min) lies within working hours"""
+        self.ensure_fresh()
+        with self._lock:
+            ordinal = day.toordinal()
+            if ordinal < self._first_day:
+                return False
+            self._extend_to(ordinal)
+            base = (ordinal - self._first_day) * self.slots_per_day
+            first = base + start_min // self.slot_minutes
+            last = base + min(-(-end_min // self.slot_minutes), self.slots_per_day)
+            return first < last and not any(self._closed[first:last])
+
+    def is_free(self, day, start_min, end_min, capacity=1):
+        """Check whether every slot in [start_min, end_min) is open and has fewer than capacity bookings"""
+        self.ensure_fresh()
+        with self._lock:
+            ordinal = day.toordinal()
+            if ordinal < self._first_day:
+                return False
+            self._extend_to(ordinal)
+            base = (ordinal - self._first_day) * self.slots_per_day
+            first = base + start_min // self.slot_minutes
+            last = base + min(-(-end_min // self.slot_minutes), self.slots_per_day)
+            return first < last and not any(self._closed[first:last]) \
+                and max(self._booked[first:last]) < capacity
+
+    def bookings(self, day, start_min):
+        """Number of bookings touching the slot starting at start_min"""
+        self.ensure_fresh()
+        with self._lock:
+            ordinal = day.toordinal()
+            if ordinal < self._first_day or ordinal >= self._first_day + self._days:
+                return 0
+            return self._booked[(ordinal - self._first_day) * self.slots_per_day + start_min // self.slot_minutes]
+
+    def free_slots(self, after, limit=3, capacity=1):
+        """
+        The next open slots with fewer than capacity bookings starting
+        after the given datetime, as (date, minutes since midnight) tuples
+        """
+        self.ensure_fresh()
+        spd = self.slots_per_day
+        found = []
+        with self._lock:
+            ordinal = max(after.date().toordinal(), self._first_day)
+            slot = 0
+            if ordinal == after.date().toordinal():
+                slot = (after.hour * 60 + after.minute) // self.slot_minutes + 1
+            last_day = self._first_day + self._days - 1
+            while ordinal <= last_day and len(found) < limit:
+                base = (ordinal - self._first_day) * spd
+                for i in range(base + slot, base + spd):
+                    if not self._closed[i] and self._booked[i] < capacity:
+                        found.append((date.fromordinal(ordinal), (i - base) * self.slot_minutes))
+                        if len(found) == limit:
+                            break
+                ordinal += 1
+                slot = 0
+        return found
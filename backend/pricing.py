@@ -0,0 +1,309 @@
+"""
+Server-side repair pricing for POST /quotes/batch, the published price list
+and the prices POST /request stores (app.quote_repairs(), which ignores any
+price the client sends).
+
+Prices start from 'Price in Euro' of data/repairs_overview.csv (through the
+catalog) and are multiplied per device by
+  * PRICE_BRAND_MULTIPLIERS and PRICE_MODEL_MULTIPLIERS
+  * PRICE_AGE_MULTIPLIERS: (minimum age in years, multiplier) steps on the
+    years since the model's 'Release Date' in smartphone_models.csv; the
+    step with the highest minimum age the device has reached applies
+and the total of several repairs at once is reduced by
+COMBINED_REPAIR_DISCOUNTS (number of repairs -> share, the largest number
+reached applies). Repairs priced 'on request' in the CSV leave the total
+open.
+
+A PriceList compiles these settings and one catalog snapshot into a table
+with the price in cents of every repair for every model, so a quote is a
+model lookup, one dictionary lookup per repair and an integer sum. Batches price every distinct
+(model, repairs) combination once. The PricingEngine recompiles the price
+list when the catalog reloads or the day changes.
+
+    python pricing.py --price-list prices.csv   (every model and repair)
+    python pricing.py --requote                 (re-price pending_quote requests)
+"""
+import argparse
+import csv
+import threading
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
+
+from bson.decimal128 import Decimal128
+
+from catalog import name_key
+
+DAYS_PER_YEAR = Decimal('365.25')
+# Model names as asked for remembered per price list
+POSITION_CACHE_SIZE = 10000
+MILLION = 1000000
+
+
+def to_cents(euros):
+    """Integer cents of a price in Euro"""
+    return int((Decimal(str(euros)) * 100).quantize(Decimal(1), ROUND_HALF_UP))
+
+
+def to_euros(cents):
+    """Price in Euro of integer cents, as float for JSON responses"""
+    return cents / 100
+
+
+def to_decimal128(cents):
+    """Stored form of a price (like quotedPrice of POST /request)"""
+    return Decimal128(f'{cents // 100}.{cents % 100:02d}')
+
+
+def step_value(steps, reached, default):
+    """Value of the (threshold, value) step with the highest threshold not above reached"""
+    value = default
+    for threshold, step in sorted(steps):
+        if reached >= threshold:
+            value = step
+    return value
+
+
+class QuoteError(ValueError):
+    """A device or repair that cannot be priced"""
+
+
+class PriceList:
+    """Multipliers, prices and discounts of one catalog snapshot, compiled for lookups"""
+
+    def __init__(self, snapshot, brand_multipliers=None, model_multipliers=None, age_multipliers=(),
+                 combined_discounts=None, today=None):
+        today = today or date.today()
+        self.snapshot = snapshot
+        self.day = today
+        brand_factors = {name_key(brand): Decimal(str(factor)) for brand, factor in (brand_multipliers or {}).items()}
+        model_factors = {name_key(model): Decimal(str(factor)) for model, factor in (model_multipliers or {}).items()}
+        age_steps = [(Decimal(str(age)), Decimal(str(factor))) for age, factor in age_multipliers]
+
+        # Model position -> {repair name (lower case) -> (name, cents or None for 'price on request')}
+        self.prices = []
+        for model in snapshot.models:
+            factor = brand_factors.get(name_key(model['brand']), Decimal(1))
+            factor *= model_factors.get(
+                name_key(f"{model['brand']} {model['model']}"), model_factors.get(name_key(model['model']), Decimal(1))
+            )
+            try:
+                released = date.fromisoformat(model['releaseDate'])
+                age = Decimal((today - released).days) / DAYS_PER_YEAR
+                factor *= step_value(age_steps, age, Decimal(1))
+            except (TypeError, ValueError):
+                pass
+            prices = {}
+            for repair in snapshot.repairs:
+                cents = None
+                if repair['price'] is not None:
+                    cents = int((to_cents(repair['price']) * factor).quantize(Decimal(1), ROUND_HALF_UP))
+                prices[repair['name'].lower()] = (repair['name'], cents)
+            self.prices.append(prices)
+
+        # (number of repairs, share in millionths), so discounts are integer arithmetic
+        self.discounts = sorted(
+            (int(count), int(Decimal(str(share)) * MILLION)) for count, share in (combined_discounts or {}).items()
+        )
+        self._positions = {}  # (model, brand) as asked for -> model position
+
+    def repair_cents(self, position, repair):
+        """(name, price) of a repair for the model at position, price None if it is priced on request"""
+        line = self.prices[position].get(repair.strip().lower()) if isinstance(repair, str) else None
+        if line is None:
+            raise QuoteError(f'Unknown repair: {repair}')
+        return line
+
+    def model_position(self, model, brand=None):
+        if not isinstance(model, str) or not isinstance(brand, (str, type(None))):
+            raise QuoteError('model and brand must be text')
+        key = (model, brand)
+        position = self._positions.get(key)
+        if position is not None:
+            return position
+        positions = self.snapshot.by_name.get(name_key(model), [])
+        if brand:
+            brand_mask = self.snapshot.brand_masks.get(name_key(brand), 0)
+            positions = [position for position in positions if brand_mask >> position & 1]
+        if not positions:
+            raise QuoteError(f'Unknown model: {model}')
+        if len(self._positions) < POSITION_CACHE_SIZE:
+            self._positions[key] = positions[0]
+        return positions[0]
+
+    def quote(self, model, repairs, brand=None):
+        """
+        Quote for repairs (names) of a device model as a dict with the model,
+        one quotedPrice per repair, subtotal, discount and totalQuotedPrice
+        (None if a repair is priced on request); raises QuoteError
+        """
+        if not repairs:
+            raise QuoteError('No repairs')
+        position = self.model_position(model, brand)
+        lines = [self.repair_cents(position, repair) for repair in repairs]
+        on_request = any(cents is None for _, cents in lines)
+        subtotal = sum(cents for _, cents in lines if cents is not None)
+        share = step_value(self.discounts, len(lines), 0)
+        discount = (subtotal * share + MILLION // 2) // MILLION
+        found = self.snapshot.models[position]
+        return {
+            'brand': found['brand'],
+            'model': found['model'],
+            'repairs': [{'serviceName': name, 'quotedPrice': cents} for name, cents in lines],
+            'subtotal': subtotal,
+            'discount': discount,
+            'totalQuotedPrice': None if on_request else subtotal - discount,
+            'priceOnRequest': on_request
+        }
+
+
+def quote_json(quote):
+    """A quote of PriceList.quote() with prices in Euro"""
+    result = dict(quote)
+    result['repairs'] = [
+        {'serviceName': line['serviceName'],
+         'quotedPrice': None if line['quotedPrice'] is None else to_euros(line['quotedPrice'])}
+        for line in quote['repairs']
+    ]
+    for key in ('subtotal', 'discount', 'totalQuotedPrice'):
+        if result[key] is not None:
+            result[key] = to_euros(result[key])
+    return result
+
+
+class PricingEngine:
+    """
+    The current PriceList of a catalog with the pricing settings
+    """
+
+    def __init__(self, catalog, brand_multipliers=None, model_multipliers=None, age_multipliers=(),
+                 combined_discounts=None):
+        self.catalog = catalog
+        self.settings = (brand_multipliers, model_multipliers, age_multipliers, combined_discounts)
+        self._lock = threading.Lock()
+        self._price_list = None
+
+    def price_list(self):
+        """The PriceList of the current catalog snapshot and day"""
+        snapshot = self.catalog.snapshot()
+        price_list = self._price_list
+        if price_list is None or price_list.snapshot is not snapshot or price_list.day != date.today():
+            with self._lock:
+                price_list = self._price_list
+                if price_list is None or price_list.snapshot is not snapshot or price_list.day != date.today():
+                    price_list = self._price_list = PriceList(snapshot, *self.settings)
+        return price_list
+
+    def quote(self, model, repairs, brand=None):
+        return self.price_list().quote(model, repairs, brand=brand)
+
+    def quote_batch(self, items):
+        """
+        Quotes for many {'model', 'brand' (optional), 'repairs'} items in
+        one pass; returns one quote_json() dict or QuoteError per item
+        """
+        price_list = self.price_list()
+        quotes = {}  # (brand, model, repairs) -> quote or error, each combination priced once
+        results = []
+        for item in items:
+            try:
+                if not isinstance(item, dict):
+                    raise QuoteError('item must be a JSON object')
+                repairs = item.get('repairs')
+                if not isinstance(repairs, list):
+                    raise QuoteError('repairs must be a list of repair names')
+                key = (item.get('brand'), item.get('model'), tuple(repairs))
+            except (QuoteError, TypeError) as e:
+                results.append(e if isinstance(e, QuoteError) else QuoteError(str(e)))
+                continue
+            try:
+                result = quotes.get(key)
+            except TypeError:
+                result = QuoteError('repairs must be a list of repair names')
+            if result is None:
+                try:
+                    result = quote_json(price_list.quote(key[1], repairs, brand=key[0]))
+                except QuoteError as e:
+                    result = e
+                quotes[key] = result
+            results.append(result)
+        return results
+
+    def request_quote(self, device, repairs):
+        """
+        Server-side quote for a repair request's device and repairs (dicts
+        with serviceName) as POST /request and requote() store it, None if
+        any of them is not in the catalog
+        """
+        if not isinstance(device, dict) or not isinstance(repairs, list) or not repairs:
+            return None
+        names = [repair.get('serviceName') if isinstance(repair, dict) else None for repair in repairs]
+        try:
+            return self.quote(device.get('model'), names, brand=device.get('manufacturer'))
+        except QuoteError:
+            return None
+
+
+def apply_quote(repairs, quote):
+    """
+    Copy a request_quote() onto the repairs of a request; returns the
+    repairs and the stored totalQuotedPrice
+    """
+    priced = []
+    for repair, line in zip(repairs, quote['repairs']):
+        repair = dict(repair)
+        repair['quotedPrice'] = None if line['quotedPrice'] is None else to_decimal128(line['quotedPrice'])
+        priced.append(repair)
+    total = quote['totalQuotedPrice']
+    return priced, None if total is None else to_decimal128(total)
+
+
+def requote(repository, engine, status, batch_size=1000):
+    """
+    Re-price the repair requests in status whose device and repairs are in
+    the catalog; returns (requests checked, requests updated)
+    """
+    checked = updated = 0
+    updates = []
+    for doc in repository.requests_in_status(status, batch_size=batch_size):
+        checked += 1
+        quote = engine.request_quote(doc.get('device'), doc.get('repairs'))
+        if quote is None:
+            continue
+        repairs, total = apply_quote(doc['repairs'], quote)
+        if repairs != doc['repairs'] or total != doc.get('totalQuotedPrice'):
+            updates.append((doc['_id'], repairs, total))
+        if len(updates) >= batch_size:
+            updated += repository.update_quotes(updates, status)
+            updates = []
+    if updates:
+        updated += repository.update_quotes(updates, status)
+    return checked, updated
+
+
+def write_price_list(engine, f):
+    """Price of every repair for every model as CSV (empty price: on request)"""
+    price_list = engine.price_list()
+    writer = csv.writer(f)
+    writer.writerow(['Brand', 'Model', 'Repair name', 'Price in Euro'])
+    for position, model in enumerate(price_list.snapshot.models):
+        for repair in price_list.snapshot.repairs:
+            _, cents = price_list.repair_cents(position, repair['name'])
+            writer.writerow([model['brand'], model['model'], repair['name'],
+                             '' if cents is None else f'{cents // 100}.{cents % 100:02d}'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Publish or apply the repair prices (uses app.py's settings)")
+    parser.add_argument('--price-list', metavar='PATH', help='write the price of every repair for every model to PATH')
+    parser.add_argument('--requote', action='store_true', help='re-price the repair requests waiting for a quote')
+    args = parser.parse_args()
+
+    import app
+
+    if args.price_list:
+        with open(args.price_list, 'w', encoding='utf-8', newline='') as f:
+            write_price_list(app.pricing, f)
+        print(f"Price list written to {args.price_list}")
+    if args.requote:
+        checked, updated = requote(app.repository, app.pricing, app.workflow.initial)
+        print(f"Re-quoted {updated} of {checked} repair requests")
@@ -0,0 +1,67 @@
+"""
+Recurring closed hours derived from the opening hours configuration.
+
+Instead of materializing two or three closed blocks per day, the closed
+periods of a week are grouped into a handful of weekly rules (weekdays that
+share the same closed period end up in one rule) and the fixed holidays are
+returned as exception dates. The .ics feeds turn these into RRULE/EXDATE
+events and /slots?format=rules publishes them as JSON, so the size of the
+result no longer depends on the length of the published window.
+"""
+from collections import namedtuple
+from datetime import date, time, timedelta
+
+WEEKDAY_CODES = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+
+START_OF_DAY = time(0, 0)
+END_OF_DAY = time(23, 59, 59)
+
+# weekdays: tuple of weekday numbers (0 = Monday), start/end: datetime.time
+ClosedRule = namedtuple('ClosedRule', ['weekdays', 'start', 'end', 'reason'])
+
+
+def closed_hour_rules(working_hours):
+    """
+    Weekly closed periods as ClosedRule tuples, sorted by first weekday and start
+    Mirrors the blocks produced by get_non_working_blocks() for regular days
+    """
+    groups = {}
+    for weekday in range(7):
+        hours = working_hours.get(weekday)
+        if hours is None:
+            periods = [(START_OF_DAY, END_OF_DAY, 'Weekend - Shop Closed')]
+        else:
+            work_start, work_end = hours
+            periods = []
+            if work_start > START_OF_DAY:
+                periods.append((START_OF_DAY, work_start, 'Non-working hours'))
+            if work_end < END_OF_DAY:
+                periods.append((work_end, END_OF_DAY, 'Non-working hours'))
+        for period in periods:
+            groups.setdefault(period, []).append(weekday)
+
+    rules = [ClosedRule(tuple(days), start, end, reason) for (start, end, reason), days in groups.items()]
+    return sorted(rules, key=lambda rule: (rule.weekdays[0], rule.start))
+
+
+def first_occurrence(weekdays, start_date):
+    """First date on or after start_date falling on one of the weekdays"""
+    for offset in range(7):
+        day = start_date + timedelta(days=offset)
+        if day.weekday() in weekdays:
+            return day
+    return None
+
+
+def holiday_dates(fixed_holidays, start_date, end_date):
+    """Dates of the fixed (month, day) holidays within [start_date, end_date]"""
+    dates = []
+    for year in range(start_date.year, end_date.year + 1):
+        for month, day in fixed_holidays:
+            try:
+                holiday = date(year, month, day)
+            except ValueError:
+                continue  # e.g. February 29th outside leap years
+            if start_date <= holiday <= end_date:
+                dates.append(holiday)
+    return sorted(dates)
@@ -0,0 +1,777 @@
+"""
+Storage backends behind the endpoints of app.py.
+
+A repository hides where repair requests, calendar entries, slot
+reservations and facet counts live. MongoRepository keeps the collections,
+indexes and reservation logic the app has always used; SQLiteRepository
+(sqlite_repository.py) stores the same documents in a single SQLite file,
+for shops that run without a database server. app.py picks one with
+STORAGE_BACKEND.
+
+Filters are passed in the backend-neutral form built by requests_filters()
+in app.py: a dict with any of submitted_from/submitted_to (datetimes),
+device_type, brand, model, postal_code and customer_search. A /requests
+page is a dict with 'filters', 'customer_search', 'limit', 'position'
+((score or None, submittedAt, ObjectId) of the last result of the previous
+page, or None) and 'fields' (field paths of fieldsets.py, or None for whole
+documents; submittedAt is always returned for the page token).
+
+Every backend keeps one counter per workflow status (see workflow.py) and
+moves it with each insert, removal and status transition, so the queue
+sizes never need a count over all repair requests.
+
+Archived repair requests are moved out of repair_requests into
+archived_requests by the archiver (archiver.py), so the hot collection only
+holds the requests the shop still works on. /requests pages carry an
+'archive' scope (a key of ARCHIVE_SCOPES) saying which of the two to search.
+"""
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+from pymongo import DESCENDING, DeleteOne, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, ExecutionTimeout
+
+from events import slot_event_data
+from facets import FACETS, counts_pipeline, options as facet_options, rebuild as rebuild_facets, record as record_facets
+from fieldsets import projection
+from indexes import ensure_indexes
+from jsonprovider import RAW_BSON_OPTIONS
+from reservations import book, release_all, reserve_all, supports_transactions
+from searchindex import backfill as backfill_search_keys, build_search_filter, score_expression
+
+logger = logging.getLogger(__name__)
+
+REQUESTS_SORT = [('submittedAt', -1), ('_id', -1)]
+
+# filter name -> repair_requests field
+FILTER_FIELDS = {
+    'device_type': 'device.type',
+    'brand': 'device.manufacturer',
+    'model': 'device.model',
+    'postal_code': 'customer.address.postalCode'
+}
+
+# Longest a backfill (see Repository.backfill()) may take before another process may start one
+BACKFILL_LEASE_SECONDS = 600
+
+# Name of the booking version counter (see Repository.booking_version)
+BOOKING_VERSION = 'booking_version'
+
+
+# /requests?archive=... -> collections (tables with SQLite) searched
+ARCHIVE_SCOPES = {
+    'exclude': ('repair_requests',),
+    'include': ('repair_requests', 'archived_requests'),
+    'only': ('archived_requests',)
+}
+
+
+class QueryTimeout(Exception):
+    """A customer_search query exceeded its time budget"""
+
+
+def status_changes(repair_requests, inc=1):
+    """Counter deltas {status: n} for adding (inc=1) or removing (inc=-1) repair requests"""
+    changes = Counter()
+    for doc in repair_requests:
+        if doc.get('status'):
+            changes[doc['status']] += inc
+    return changes
+
+
+def transition_changes(previous, status):
+    """Counter deltas of one status transition"""
+    changes = Counter({status: 1})
+    changes[previous] -= 1
+    return changes
+
+
+def merge_pages(page, results):
+    """
+    One /requests page (plus look-ahead document) from the pages found in
+    several collections, each sorted and cut like a single one
+    """
+    docs = [doc for result in results for doc in result]
+    if len(results) > 1:
+        docs.sort(key=lambda doc: (doc.get('_score', 0), doc['submittedAt'], doc['_id']), reverse=True)
+    return docs[:page['limit'] + 1]
+
+
+class Repository:
+    """
+    Interface of a storage backend (see MongoRepository for the reference
+    implementation)
+    """
+
+    def ensure_indexes(self):
+        """Create the indexes the endpoints rely on"""
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+    def ping(self, timeout_ms):
+        """
+        Round-trip time of a trivial command in milliseconds; raises if the
+        database does not answer within timeout_ms
+        """
+        raise NotImplementedError
+
+    # Repair requests
+
+    def get_request(self, request_id, fields=None):
+        """
+        Repair request (archived ones included) without search keys, or
+        None; only the given field paths (see fieldsets.py) if fields is set
+        """
+        raise NotImplementedError
+
+    def insert_request(self, repair_request):
+        """Insert a repair request without appointment; returns its id"""
+        raise NotImplementedError
+
+    def book(self, repair_request, calendar_entry, capacity, slot_minutes):
+        """
+        Reserve every slot of slot_minutes calendar_entry covers and insert
+        both documents, all or nothing
+        repair_request must carry its _id already; raises SlotUnavailable
+        """
+        raise NotImplementedError
+
+    def insert_requests(self, repair_requests):
+        """Insert many repair requests; returns {position: error} for failed ones"""
+        raise NotImplementedError
+
+    def insert_calendar_entries(self, calendar_entries):
+        """Insert many calendar entries; returns {position: error} for failed ones"""
+        raise NotImplementedError
+
+    def remove_request(self, repair_request, calendar_entry=None):
+        """Undo a partially written request: delete it, its calendar entry and its slot reservations"""
+        raise NotImplementedError
+
+    def find_requests(self, page):
+        """
+        Repair requests of a /requests page plus one look-ahead document,
+        newest first; ranked by '_score' first with customer_search
+        Raises QueryTimeout
+        """
+        raise NotImplementedError
+
+    def count_requests(self, filters, limit=None, archive='exclude'):
+        """Number of matching repair requests (at most limit); raises QueryTimeout"""
+        raise NotImplementedError
+
+    def estimated_count(self, archive='exclude'):
+        """Fast, approximate number of all repair requests"""
+        raise NotImplementedError
+
+    def archive_requests(self, from_statuses, cutoff, archived_status, changed_at, limit, note=None):
+        """
+        Move up to limit repair requests to archived_requests: those in
+        archived_status, and those in one of from_statuses since cutoff or
+        earlier, which are set to archived_status
+        Returns the number of moved requests
+        """
+        raise NotImplementedError
+
+    # Workflow status
+
+    def transition_status(self, request_id, from_statuses, to_status, changed_at, note=None):
+        """
+        Move a repair request to to_status, only if its current status is one
+        of from_statuses, and move the status counters with it
+        Returns the previous status, or None if the request was not changed
+        """
+        raise NotImplementedError
+
+    def status_counts(self):
+        """{status: number of repair requests} from the status counters"""
+        raise NotImplementedError
+
+    def rebuild_status_counts(self, default_status):
+        """Set default_status on repair requests without one and recount all statuses (archive included)"""
+        raise NotImplementedError
+
+    def backfill(self, default_status):
+        """
+        Build what a database written by an older version lacks: the status
+        counters and facet counts while their store is empty but repair
+        requests exist, and the search keys of requests without them
+        Returns the names of what was built
+        """
+        raise NotImplementedError
+
+    # Quotes
+
+    def requests_in_status(self, status, batch_size=1000):
+        """_id, device, repairs and totalQuotedPrice of the repair requests in status"""
+        raise NotImplementedError
+
+    def update_quotes(self, updates, status):
+        """
+        Set repairs and totalQuotedPrice of repair requests from (_id,
+        repairs, totalQuotedPrice) tuples, only while they are in status
+        Returns the number of updated requests
+        """
+        raise NotImplementedError
+
+    # Slot reservations
+
+    def reserve_slots(self, date_str, times, request_id, email, capacity):
+        """
+        Claim one place in each of the slots of a day starting at times;
+        False, holding none of them, if one is full or disabled
+        """
+        raise NotImplementedError
+
+    def release_slots(self, date_str, request_id):
+        """Give back every place request_id holds on a day"""
+        raise NotImplementedError
+
+    def release_appointment(self, request_id):
+        """
+        Delete the calendar entries of a repair request whose appointment no
+        longer takes place and give back their slot reservations
+        Returns the deleted calendar entries
+        """
+        raise NotImplementedError
+
+    def can_watch_slots(self):
+        """True if watch_slots() follows the slot changes of every process"""
+        return False
+
+    def watch_slots(self, publish, stop, resume_after=None):
+        """
+        Call publish(event id, event type, slot state) for every slot change
+        until stop (a threading.Event) is set, starting after the given event id
+        """
+        raise NotImplementedError
+
+    # Calendar
+
+    def calendar_entries(self, start_date=None, end_date=None):
+        """Calendar entries whose date is within the range"""
+        raise NotImplementedError
+
+    def calendar_times(self, start_date):
+        """date, start_time, end_time and technician of the calendar entries on or after start_date"""
+        raise NotImplementedError
+
+    def booking_version(self):
+        """
+        Counter raised by every write of calendar entries or slot releases,
+        by any process; one indexed read, so feed caches can check it on
+        every request
+        """
+        raise NotImplementedError
+
+    # Facets
+
+    def record_facets(self, repair_requests):
+        """Count new repair requests in the /options facets"""
+        raise NotImplementedError
+
+    def facet_options(self, facet, scope=None, prefix=None, sort='value', offset=0, limit=50):
+        """
+        Distinct values of a facet with their counts
+        Returns (list of {'value', 'count'}, has_more)
+        """
+        raise NotImplementedError
+
+    def facet_counts(self, filters, limit=50):
+        """Value counts of every facet for the matching repair requests"""
+        raise NotImplementedError
+
+# ============================================================================
+# MONGODB
+# ============================================================================
+
+def requests_query(filters):
+    """
+    MongoDB filter for backend-neutral /requests filters
+    """
+    query = {}
+    if 'submitted_from' in filters:
+        query['submittedAt'] = {'$gte': filters['submitted_from'], '$lte': filters['submitted_to']}
+    for name, field in FILTER_FIELDS.items():
+        if filters.get(name):
+            query[field] = filters[name]
+    # Customer search via the write-time search keys
+    if filters.get('customer_search'):
+        search_filter = build_search_filter(filters['customer_search'])
+        if search_filter:
+            query.update(search_filter)
+    return query
+
+
+def calendar_query(start_date=None, end_date=None):
+    """
+    Build the calendar collection filter for a date range
+    """
+    query = {}
+
+    # Filter by date range if provided
+    if start_date or end_date:
+        date_filter = {}
+        if start_date:
+            # Convert to date string for comparison
+            date_filter['$gte'] = start_date.strftime('%Y-%m-%d')
+        if end_date:
+            date_filter['$lte'] = end_date.strftime('%Y-%m-%d')
+        query['date'] = date_filter
+
+    return query
+
+
+def keyset_filter(score, submitted_at, object_id):
+    """Filter selecting documents sorted after the given keyset position"""
+    after = {'$or': [
+        {'submittedAt': {'$lt': submitted_at}},
+        {'submittedAt': submitted_at, '_id': {'$lt': object_id}}
+    ]}
+    if score is None:
+        return after
+    return {'$or': [
+        {'_score': {'$lt': score}},
+        {'$and': [{'_score': score}, after]}
+    ]}
+
+
+def requests_search_pipeline(page):
+    """
+    Aggregation for a customer_search page, ranked by the number of search
+    terms matching a token exactly (search keys are never returned)
+    """
+    pipeline = [
+        {'$match': requests_query(page['filters'])},
+        {'$addFields': {'_score': score_expression(page['customer_search'])}}
+    ]
+    if page['position']:
+        pipeline.append({'$match': keyset_filter(*page['position'])})
+    pipeline += [
+        {'$sort': {'_score': -1, 'submittedAt': -1, '_id': -1}},
+        {'$limit': page['limit'] + 1},
+        # Sort keys stay for merging pages and the next page token
+        {'$project': projection(page.get('fields'), 'submittedAt', '_score')}
+    ]
+    return pipeline
+
+
+def requests_page_find(page):
+    """
+    Filter and projection of a /requests page without customer_search
+    """
+    query = requests_query(page['filters'])
+    position = page['position']
+    page_query = {'$and': [query, keyset_filter(None, *position[1:])]} if position else query
+    return page_query, projection(page.get('fields'), 'submittedAt')
+
+
+def archive_query(statuses, cutoff, archived_status):
+    """
+    Filter of the repair requests the archiver moves (requests from before
+    status changes were recorded count from their submission)
+    """
+    statuses = list(statuses)
+    return {'$or': [
+        {'status': archived_status},
+        {'status': {'$in': statuses}, 'statusChangedAt': {'$lte': cutoff}},
+        {'status': {'$in': statuses}, 'statusChangedAt': None, 'submittedAt': {'$lte': cutoff}}
+    ]}
+
+
+def status_count_updates(changes):
+    """Upserts applying {status: delta} to the status_counts collection"""
+    return [
+        UpdateOne({'_id': status}, {'$inc': {'count': delta}}, upsert=True)
+        for status, delta in sorted(changes.items()) if delta
+    ]
+
+
+def status_history_entry(status, changed_at, note=None):
+    """statusHistory item of a transition"""
+    entry = {'status': status, 'changedAt': changed_at}
+    if note:
+        entry['note'] = note
+    return entry
+
+
+def set_status(doc, status, changed_at, note=None):
+    """Apply a status transition to a repair request document"""
+    doc['status'] = status
+    doc['statusChangedAt'] = changed_at
+    doc.setdefault('statusHistory', []).append(status_history_entry(status, changed_at, note))
+
+
+def slot_change_type(update_description):
+    """
+    Event type of a slot update: reserve() pushes to bookedBy, release()
+    pulls from it, which rewrites the whole array
+    """
+    fields = update_description.get('updatedFields', {})
+    if any(field.startswith('bookedBy.') for field in fields):
+        return 'slot_booked'
+    if 'bookedBy' in fields:
+        return 'slot_released'
+    return 'slot_changed'
+
+
+def slot_state(slot, bookings=None):
+    """Public state of an appointment_slots document (see events.py)"""
+    return slot_event_data(
+        slot['date'].strftime('%Y-%m-%d'),
+        slot['time'],
+        slot.get('currentBookings', 0) if bookings is None else bookings,
+        slot.get('maxCapacity'),
+        slot.get('isAvailable', True) is not False
+    )
+
+
+def write_errors(error):
+    """{position: message} of the documents an unordered insert_many rejected"""
+    return {write_error['index']: write_error['errmsg'] for write_error in error.details['writeErrors']}
+
+
+class MongoRepository(Repository):
+    """
+    repair_requests, archived_requests, calendar, appointment_slots, facets and status_counts collections
+    transactions: reserve slots and change statuses in a transaction (True/False, 'auto' asks the server once)
+    Status counters of new requests are moved right after the insert, like the facet counts
+    """
+
+    def __init__(self, connection, db_name, transactions='auto', search_max_time_ms=None):
+        self.connection = connection  # MongoConnection (mongoconnection.py)
+        self.db_name = db_name
+        self.transactions = transactions
+        self.search_max_time_ms = search_max_time_ms
+        self._transactions_supported = None
+        self._db = None
+
+    @property
+    def client(self):
+        """The MongoClient of this process"""
+        return self.connection.client
+
+    @property
+    def db(self):
+        client = self.connection.client
+        if self._db is None or self._db.client is not client:
+            self._db = client[self.db_name]
+        return self._db
+
+    def ensure_indexes(self):
+        ensure_indexes(self.db)
+
+    def close(self):
+        self.connection.close()
+
+    def ping(self, timeout_ms):
+        return self.connection.ping(timeout_ms)
+
+    def use_transaction(self):
+        if self.transactions != 'auto':
+            return bool(self.transactions)
+        if self._transactions_supported is None:
+            try:
+                self._transactions_supported = supports_transactions(self.client)
+            except Exception as e:
+                logger.warning(f"Could not detect transaction support: {str(e)}")
+                self._transactions_supported = False
+        return self._transactions_supported
+
+    def search_options(self, filters):
+        if filters.get('customer_search') and self.search_max_time_ms:
+            return {'maxTimeMS': self.search_max_time_ms}
+        return {}
+
+    def get_request(self, request_id, fields=None):
+        # The raw BSON document is handed to the JSON provider without
+        # decoding it into dicts first
+        for name in ARCHIVE_SCOPES['include']:
+            repair_request = self.db[name].with_options(codec_options=RAW_BSON_OPTIONS).find_one(
+                {'_id': ObjectId(request_id)},
+                projection(fields)
+            )
+            if repair_request is not None:
+                return repair_request
+        return None
+
+    def count_statuses(self, changes, session=None):
+        updates = status_count_updates(changes)
+        if updates:
+            self.db.status_counts.bulk_write(updates, ordered=False, session=session)
+
+    def insert_request(self, repair_request):
+        inserted_id = self.db.repair_requests.insert_one(repair_request).inserted_id
+        self.count_statuses(status_changes([repair_request]))
+        return inserted_id
+
+    def book(self, repair_request, calendar_entry, capacity, slot_minutes):
+        book(self.db, repair_request, calendar_entry, capacity, slot_minutes, use_transaction=self.use_transaction())
+        self.count_statuses(status_changes([repair_request]))
+        self.bump_booking_version()
+
+    def insert_requests(self, repair_requests):
+        errors = {}
+        try:
+            self.db.repair_requests.insert_many(repair_requests, ordered=False)
+        except BulkWriteError as e:
+            errors = write_errors(e)
+        self.count_statuses(status_changes(
+            doc for position, doc in enumerate(repair_requests) if position not in errors
+        ))
+        return errors
+
+    def insert_calendar_entries(self, calendar_entries):
+        try:
+            self.db.calendar.insert_many(calendar_entries, ordered=False)
+        except BulkWriteError as e:
+            return write_errors(e)
+        finally:
+            self.bump_booking_version()
+        return {}
+
+    def remove_request(self, repair_request, calendar_entry=None):
+        if self.db.repair_requests.delete_one({'_id': repair_request['_id']}).deleted_count:
+            self.count_statuses(status_changes([repair_request], -1))
+        if calendar_entry is not None:
+            self.db.calendar.delete_one({'customer.request_id': str(repair_request['_id'])})
+            self.release_slots(calendar_entry['date'], repair_request['_id'])
+
+    def find_in(self, collection, page):
+        if page['customer_search']:
+            return list(collection.aggregate(
+                requests_search_pipeline(page), **self.search_options(page['filters'])
+            ))
+        page_query, projection = requests_page_find(page)
+        return list(collection.find(page_query, projection).sort(REQUESTS_SORT).limit(page['limit'] + 1))
+
+    def find_requests(self, page):
+        try:
+            return merge_pages(page, [self.find_in(self.db[name], page) for name in ARCHIVE_SCOPES[page['archive']]])
+        except ExecutionTimeout:
+            raise QueryTimeout()
+
+    def count_requests(self, filters, limit=None, archive='exclude'):
+        options = self.search_options(filters)
+        if limit:
+            options['limit'] = limit
+        try:
+            count = sum(
+                self.db[name].count_documents(requests_query(filters), **options) for name in ARCHIVE_SCOPES[archive]
+            )
+        except ExecutionTimeout:
+            raise QueryTimeout()
+        return min(count, limit) if limit else count
+
+    def estimated_count(self, archive='exclude'):
+        return sum(self.db[name].estimated_document_count() for name in ARCHIVE_SCOPES[archive])
+
+    def archive_requests(self, from_statuses, cutoff, archived_status, changed_at, limit, note=None):
+        docs = list(self.db.repair_requests.find(archive_query(from_statuses, cutoff, archived_status)).limit(limit))
+        if not docs:
+            return 0
+        previous = {doc['_id']: doc.get('status') for doc in docs}
+        for doc in docs:
+            if doc.get('status') != archived_status:
+                set_status(doc, archived_status, changed_at, note)
+
+        def write(session=None):
+            # Copy first: if a run stops half way, the next one finds the same
+            # requests again and overwrites their copies
+            self.db.archived_requests.bulk_write(
+                [ReplaceOne({'_id': doc['_id']}, doc, upsert=True) for doc in docs], ordered=False, session=session
+            )
+            # One delete per request, so that only the requests this run
+            # removed count: requests whose status changed since they were
+            # read stay hot, those another archiver moved meanwhile were
+            # counted by that one
+            moved, changes = [], Counter()
+            for doc in docs:
+                status = previous[doc['_id']]
+                result = self.db.repair_requests.delete_one({'_id': doc['_id'], 'status': status}, session=session)
+                if result.deleted_count:
+                    moved.append(doc)
+                    changes.update(transition_changes(status, archived_status))
+            moved_ids = {doc['_id'] for doc in moved}
+            kept = [doc['_id'] for doc in self.db.repair_requests.find(
+                {'_id': {'$in': [_id for _id in previous if _id not in moved_ids]}}, {'_id': 1}, session=session
+            )]
+            if kept:
+                self.db.archived_requests.delete_many({'_id': {'$in': kept}}, session=session)
+            self.count_statuses(changes, session=session)
+            # /options only lists values of the requests still being worked on
+            record_facets(self.db.facets, moved, -1, session=session)
+            return len(moved)
+
+        if self.use_transaction():
+            with self.client.start_session() as session:
+                return session.with_transaction(write)
+        return write()
+
+    def transition_status(self, request_id, from_statuses, to_status, changed_at, note=None):
+        def write(session=None):
+            # The status filter makes check and update one atomic step
+            previous = self.db.repair_requests.find_one_and_update(
+                {'_id': ObjectId(request_id), 'status': {'$in': list(from_statuses)}},
+                {
+                    '$set': {'status': to_status, 'statusChangedAt': changed_at},
+                    '$push': {'statusHistory': status_history_entry(to_status, changed_at, note)}
+                },
+                projection={'status': 1},
+                session=session
+            )
+            if previous is None:
+                return None
+            self.count_statuses(transition_changes(previous['status'], to_status), session=session)
+            return previous['status']
+
+        if self.use_transaction():
+            with self.client.start_session() as session:
+                return session.with_transaction(write)
+        return write()
+
+    def status_counts(self):
+        return {doc['_id']: doc['count'] for doc in self.db.status_counts.find()}
+
+    def rebuild_status_counts(self, default_status):
+        self.db.repair_requests.update_many({'status': {'$in': [None, '']}}, {'$set': {'status': default_status}})
+        counts = Counter()
+        for name in ARCHIVE_SCOPES['include']:
+            for row in self.db[name].aggregate([{'$group': {'_id': '$status', 'count': {'$sum': 1}}}]):
+                counts[row['_id']] += row['count']
+        self.db.status_counts.delete_many({})
+        documents = [{'_id': status, 'count': count} for status, count in counts.items()]
+        if documents:
+            self.db.status_counts.insert_many(documents)
+
+    def backfill(self, default_status):
+        # Every worker starts with this; a lease lets one of them do it
+        now = datetime.utcnow()
+        try:
+            self.db.maintenance.find_one_and_update(
+                {'_id': 'backfill', 'lockedUntil': {'$lt': now}},
+                {'$set': {'lockedUntil': now + timedelta(seconds=BACKFILL_LEASE_SECONDS)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return []
+        built = []
+        try:
+            collections = [self.db[name] for name in ARCHIVE_SCOPES['include']]
+            has_requests = any(collection.find_one({}, {'_id': 1}) for collection in collections)
+            if has_requests and self.db.status_counts.find_one() is None:
+                self.rebuild_status_counts(default_status)
+                built.append('status counts')
+            newest = self.db.repair_requests.find_one({}, {'_id': 1}, sort=[('_id', DESCENDING)])
+            if newest and self.db.facets.find_one() is None:
+                # Requests inserted after the newest one count themselves
+                rebuild_facets(self.db.repair_requests, self.db.facets, {'_id': {'$lte': newest['_id']}})
+                built.append('facet counts')
+            for collection in collections:
+                if collection.find_one({'searchTokens': {'$exists': False}}, {'_id': 1}):
+                    backfill_search_keys(collection)
+                    built.append(f'search keys of {collection.name}')
+        finally:
+            self.db.maintenance.update_one({'_id': 'backfill'}, {'$set': {'lockedUntil': datetime.utcnow()}})
+        return built
+
+    def requests_in_status(self, status, batch_size=1000):
+        return self.db.repair_requests.find(
+            {'status': status}, {'device': 1, 'repairs': 1, 'totalQuotedPrice': 1}, batch_size=batch_size
+        )
+
+    def update_quotes(self, updates, status):
+        if not updates:
+            return 0
+        result = self.db.repair_requests.bulk_write([
+            UpdateOne({'_id': _id, 'status': status}, {'$set': {'repairs': repairs, 'totalQuotedPrice': total}})
+            for _id, repairs, total in updates
+        ], ordered=False)
+        return result.matched_count
+
+    def reserve_slots(self, date_str, times, request_id, email, capacity):
+        return reserve_all(self.db, date_str, times, request_id, email, capacity)
+
+    def release_slots(self, date_str, request_id):
+        release_all(self.db, date_str, request_id)
+        self.bump_booking_version()
+
+    def release_appointment(self, request_id):
+        def write(session=None):
+            entries = list(self.db.calendar.find({'customer.request_id': str(request_id)}, session=session))
+            if entries:
+                self.db.calendar.delete_many({'_id': {'$in': [entry['_id'] for entry in entries]}}, session=session)
+            for date_str in {entry['date'] for entry in entries}:
+                release_all(self.db, date_str, ObjectId(request_id), session=session)
+            return entries
+
+        if self.use_transaction():
+            with self.client.start_session() as session:
+                entries = session.with_transaction(write)
+        else:
+            entries = write()
+        self.bump_booking_version()
+        return entries
+
+    def can_watch_slots(self):
+        # Change streams need a replica set, like transactions
+        try:
+            return supports_transactions(self.client)
+        except Exception as e:
+            logger.warning(f"Could not detect change stream support: {str(e)}")
+            return False
+
+    def watch_slots(self, publish, stop, resume_after=None):
+        with self.db.appointment_slots.watch(
+            [{'$match': {'operationType': 'update'}}],
+            full_document='updateLookup',
+            resume_after={'_data': resume_after} if resume_after else None,
+            max_await_time_ms=1000
+        ) as changes:
+            while not stop.is_set():
+                change = changes.try_next()
+                if change is None or change.get('fullDocument') is None:
+                    continue
+                # The looked-up document may already include later changes,
+                # the update description has the count of this one
+                description = change.get('updateDescription', {})
+                bookings = description.get('updatedFields', {}).get('currentBookings')
+                publish(
+                    change['_id']['_data'], slot_change_type(description), slot_state(change['fullDocument'], bookings)
+                )
+
+    def calendar_entries(self, start_date=None, end_date=None):
+        return self.db.calendar.find(calendar_query(start_date, end_date))
+
+    def calendar_times(self, start_date):
+        return self.db.calendar.find(
+            calendar_query(start_date),
+            {'_id': 0, 'date': 1, 'start_time': 1, 'end_time': 1, 'technician': 1}
+        )
+
+    def bump_booking_version(self):
+        # After the booking write: a feed rendered in between is only
+        # rendered once more, never cached as current
+        self.db.counters.update_one({'_id': BOOKING_VERSION}, {'$inc': {'value': 1}}, upsert=True)
+
+    def booking_version(self):
+        doc = self.db.counters.find_one({'_id': BOOKING_VERSION})
+        return doc['value'] if doc else 0
+
+    def record_facets(self, repair_requests):
+        record_facets(self.db.facets, repair_requests)
+
+    def facet_options(self, facet, scope=None, prefix=None, sort='value', offset=0, limit=50):
+        return facet_options(self.db.facets, facet, scope=scope, prefix=prefix, sort=sort, offset=offset, limit=limit)
+
+    def facet_counts(self, filters, limit=50):
+        result = next(self.db.repair_requests.aggregate(counts_pipeline(requests_query(filters), limit)), {})
+        return {
+            facet: [{'value': row['_id'], 'count': row['count']} for row in result.get(facet, [])]
+            for facet in FACETS
+        }
+
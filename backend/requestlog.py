@@ -0,0 +1,124 @@
+"""
+Structured, non-blocking request logging.
+
+setup_logging() routes all log records through a QueueHandler: the request
+thread only puts the record on an in-process queue, while a background
+QueueListener formats it as one JSON object per line and writes it out;
+forked worker processes start a listener of their own.
+Request bodies are logged for a sampled share of requests only and customer
+data is redacted before it reaches a record.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+# Keys whose values never end up in a log record
+REDACT_KEYS = {
+    'customer', 'firstName', 'lastName', 'first_name', 'last_name', 'email', 'phoneNumber', 'phone',
+    'address', 'street', 'streetName', 'houseNumber', 'postalCode', 'city', 'imeiNumber',
+    'authorization', 'cookie', 'password'
+}
+REDACTED = '[redacted]'
+_REDACT_KEYS_LOWER = {key.lower() for key in REDACT_KEYS}
+
+
+def redact(value):
+    """Copy of a JSON-like value with customer fields replaced by [redacted]"""
+    if isinstance(value, dict):
+        return {key: REDACTED if str(key).lower() in _REDACT_KEYS_LOWER else redact(item)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
+
+
+def should_sample(rate):
+    """True for roughly rate (0..1) of all calls"""
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record; structured data is passed as extra={'fields': {...}}"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves all formatting to the listener thread
+    (the stock prepare() formats the record on the calling thread)
+    """
+
+    dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        # Never block or raise on the request thread; drop when the writer falls behind
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(level=logging.INFO, stream=None, filename=None, queue_size=10000):
+    """
+    Install the queue-backed JSON logging pipeline on the root logger
+    Returns the started QueueListener (stopped automatically at exit)
+    """
+    if filename:
+        target = logging.FileHandler(filename, encoding='utf-8')
+    else:
+        target = logging.StreamHandler(stream or sys.stderr)
+    target.setFormatter(JSONFormatter())
+
+    log_queue = queue.Queue(queue_size)
+    handler = DeferredQueueHandler(log_queue)
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, target, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_logging, listener)
+    # A forked child (a gunicorn --preload worker) inherits the queue but not the thread draining it
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=lambda: restart_logging(listener, handler, queue_size))
+    return listener
+
+
+def restart_logging(listener, handler, queue_size):
+    """Give a forked child its own queue and listener thread"""
+    log_queue = queue.Queue(queue_size)
+    handler.queue = log_queue
+    listener.queue = log_queue
+    listener._thread = None
+    listener.start()
+
+
+def stop_logging(listener):
+    """Flush the queue and stop the listener thread (safe to call twice)"""
+    if listener._thread is not None:
+        listener.stop()
@@ -0,0 +1,205 @@
+"""
+Atomic appointment slot reservation for POST /request.
+
+Every bookable slot has one document in 'appointment_slots' (the model from
+mongodb_example.js: date, time, maxCapacity, currentBookings, isAvailable,
+bookedBy). A booking claims a place with a single conditional update that
+only matches while currentBookings < maxCapacity, so concurrent requests
+for the same slot can never push it over capacity; the losers get None
+back immediately and POST /request answers 409. An appointment longer than
+one slot claims every slot it covers (slot_times()), one conditional
+update each; if one of them is full, the places already claimed are given
+back, so a booking holds all of its slots or none.
+
+Slot documents are created on first use (seeded with the bookings already
+in the calendar collection for that slot). When MongoDB runs as a replica
+set, the reservation and both inserts happen in one transaction. On a
+standalone server the slot is reserved first and released again if an
+insert fails; places left behind by a process that died in between are
+released by:
+    python reservations.py [--older-than 10]
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+class SlotUnavailable(Exception):
+    """The requested slot is closed or fully booked"""
+
+
+def slot_date(date_str):
+    """Slot documents store the day as a datetime at midnight"""
+    if not isinstance(date_str, str):
+        raise ValueError('appointment date must be a YYYY-MM-DD string')
+    return datetime.strptime(date_str, '%Y-%m-%d')
+
+
+def slot_times(start_time, end_time, slot_minutes):
+    """Start times 'HH:MM' of the slots an appointment from start_time to end_time covers"""
+    start_hour, start_minute = map(int, start_time.split(':'))
+    end_hour, end_minute = map(int, end_time.split(':'))
+    start, end = start_hour * 60 + start_minute, end_hour * 60 + end_minute
+    return [f'{minutes // 60:02d}:{minutes % 60:02d}' for minutes in range(start, max(end, start + 1), slot_minutes)]
+
+
+def covering_query(date_str, time_str):
+    """Calendar entries of a day that start in or run through the slot starting at time_str"""
+    return {'date': date_str, '$or': [
+        {'start_time': time_str},
+        {'start_time': {'$lt': time_str}, 'end_time': {'$gt': time_str}}
+    ]}
+
+
+def ensure_slot(db, date_str, time_str, capacity, session=None):
+    """Create the slot document unless it exists"""
+    day = slot_date(date_str)
+    if db.appointment_slots.count_documents({'date': day, 'time': time_str}, limit=1, session=session):
+        return
+    existing = db.calendar.count_documents(covering_query(date_str, time_str), session=session)
+    try:
+        db.appointment_slots.update_one(
+            {'date': day, 'time': time_str},
+            {'$setOnInsert': {
+                'maxCapacity': capacity,
+                'currentBookings': existing,
+                'isAvailable': True,
+                'bookedBy': []
+            }},
+            upsert=True,
+            session=session
+        )
+    except DuplicateKeyError:
+        pass  # created concurrently by another request
+
+
+def reserve(db, date_str, time_str, request_id, email, capacity, session=None):
+    """
+    Claim one place in a slot with a single conditional update
+    Returns the updated slot document, or None if the slot is full or disabled
+    """
+    ensure_slot(db, date_str, time_str, capacity, session=session)
+    return db.appointment_slots.find_one_and_update(
+        {
+            'date': slot_date(date_str),
+            'time': time_str,
+            'isAvailable': {'$ne': False},
+            '$expr': {'$lt': ['$currentBookings', '$maxCapacity']}
+        },
+        {
+            '$inc': {'currentBookings': 1},
+            '$push': {'bookedBy': {'requestId': request_id, 'customerEmail': email, 'bookedAt': datetime.utcnow()}}
+        },
+        projection={'bookedBy': 0},
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+
+
+def release(db, date_str, time_str, request_id, session=None):
+    """Give back the place held by request_id (no-op if it holds none)"""
+    db.appointment_slots.update_one(
+        {'date': slot_date(date_str), 'time': time_str, 'bookedBy.requestId': request_id},
+        {'$inc': {'currentBookings': -1}, '$pull': {'bookedBy': {'requestId': request_id}}},
+        session=session
+    )
+
+
+def reserve_all(db, date_str, times, request_id, email, capacity, session=None):
+    """
+    Claim one place in each of the slots at times with reserve(), in order
+    Returns False, with the places claimed so far given back, as soon as
+    one of them is full or disabled
+    """
+    claimed = []
+    for time_str in times:
+        if reserve(db, date_str, time_str, request_id, email, capacity, session=session) is None:
+            for claimed_time in reversed(claimed):
+                release(db, date_str, claimed_time, request_id, session=session)
+            return False
+        claimed.append(time_str)
+    return True
+
+
+def release_all(db, date_str, request_id, session=None):
+    """Give back every place request_id holds in the slots of a day"""
+    db.appointment_slots.update_many(
+        {'date': slot_date(date_str), 'bookedBy.requestId': request_id},
+        {'$inc': {'currentBookings': -1}, '$pull': {'bookedBy': {'requestId': request_id}}},
+        session=session
+    )
+
+
+def supports_transactions(client):
+    """True if the server is a replica set member or mongos"""
+    hello = client.admin.command('hello')
+    return bool(hello.get('setName')) or hello.get('msg') == 'isdbgrid'
+
+
+def book(db, repair_request, calendar_entry, capacity, slot_minutes, use_transaction=False):
+    """
+    Reserve every slot calendar_entry covers and insert both documents
+    repair_request must carry its _id already; raises SlotUnavailable
+    """
+    date_str = calendar_entry['date']
+    times = slot_times(calendar_entry['start_time'], calendar_entry['end_time'], slot_minutes)
+    request_id = repair_request['_id']
+    email = repair_request.get('customer', {}).get('email', '')
+
+    if use_transaction:
+        def write(session):
+            if not reserve_all(db, date_str, times, request_id, email, capacity, session=session):
+                raise SlotUnavailable(f"{date_str} {calendar_entry['start_time']}")
+            db.repair_requests.insert_one(repair_request, session=session)
+            db.calendar.insert_one(calendar_entry, session=session)
+
+        with db.client.start_session() as session:
+            session.with_transaction(write)
+        return
+
+    if not reserve_all(db, date_str, times, request_id, email, capacity):
+        raise SlotUnavailable(f"{date_str} {calendar_entry['start_time']}")
+    try:
+        db.repair_requests.insert_one(repair_request)
+        db.calendar.insert_one(calendar_entry)
+    except Exception:
+        # Undo in reverse order so that no orphaned documents stay behind
+        db.repair_requests.delete_one({'_id': request_id})
+        release_all(db, date_str, request_id)
+        raise
+
+
+def release_orphans(db, older_than_minutes=10):
+    """
+    Release places whose repair request was never written (the process
+    died between reservation and insert); returns the number released
+    """
+    cutoff = datetime.utcnow() - timedelta(minutes=older_than_minutes)
+    released = 0
+    for slot in db.appointment_slots.find({'bookedBy.bookedAt': {'$lt': cutoff}}, {'date': 1, 'time': 1, 'bookedBy': 1}):
+        for booking in slot['bookedBy']:
+            if booking['bookedAt'] >= cutoff:
+                continue
+            if db.repair_requests.count_documents({'_id': booking['requestId']}, limit=1):
+                continue
+            result = db.appointment_slots.update_one(
+                {'_id': slot['_id'], 'bookedBy.requestId': booking['requestId']},
+                {'$inc': {'currentBookings': -1}, '$pull': {'bookedBy': {'requestId': booking['requestId']}}}
+            )
+            released += result.modified_count
+    return released
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Release slot reservations without a repair request')
+    parser.add_argument('--uri', default='mongodb://localhost:27017/')
+    parser.add_argument('--db', default='repair_shop')
+    parser.add_argument('--older-than', type=int, default=10, help='minutes a reservation may be pending')
+    args = parser.parse_args()
+
+    from pymongo import MongoClient
+
+    db = MongoClient(args.uri)[args.db]
+    print(f"Released {release_orphans(db, args.older_than)} orphaned reservations")
@@ -0,0 +1,259 @@
+"""
+Duration-aware bench scheduler for appointments (GET /schedule).
+
+A repair request's bench time is the sum of its repairs' durations: the
+duration of a repair's serviceName in the catalog
+(data/repairs_overview.csv), or one slot for a repair the catalog does not
+know. A client's estimatedDuration is ignored, so no payload can book less
+bench time than its repairs take. The sum is rounded up to whole
+SLOT_DURATION_MINUTES slots and needs that many contiguous free slots on a
+single bench.
+
+Every technician (or bench) of TECHNICIANS has its own working hours and
+its own busy mask: one byte per slot for every day of a rolling horizon,
+1 where the bench is closed or booked. The next start for a bench time of
+n slots is a bytes.find() of n zero bytes in that mask, so finding the next
+K candidates costs K searches per bench in C, however many bookings the
+horizon holds.
+
+Bookings are loaded once from the calendar collection, like the slot
+occupancy index; a booking of this process reserves its bench before it is
+written and releases it again if the slot turns out to be taken. A
+calendar entry's 'technician' says which bench it occupies; older entries
+without one are put on the first bench that is free for their whole time.
+Bookings of other worker processes show up with the next rebuild; until
+then their slot reservations (every slot a booking covers is claimed in
+appointment_slots) keep them apart.
+"""
+import threading
+import time as _time
+from datetime import date
+
+from businesscalendar import weekday_masks
+from occupancy import MINUTES_PER_DAY, _parse_hhmm
+
+
+def bench_minutes(repairs, durations, default_minutes):
+    """
+    Total bench time of a list of repairs in minutes, from the catalog
+    durations by service name (default_minutes for a request without
+    repairs and for repairs the catalog does not know)
+    """
+    total = 0
+    for repair in repairs or []:
+        minutes = None
+        if isinstance(repair, dict) and isinstance(repair.get('serviceName'), str):
+            minutes = durations.get(repair['serviceName'].strip().lower())
+        try:
+            minutes = int(minutes)
+        except (TypeError, ValueError):
+            minutes = default_minutes
+        total += max(minutes, 0)
+    return total or default_minutes
+
+
+class BenchScheduler:
+    """
+    Per-technician busy masks and a search for contiguous free slots
+
+    technicians maps name -> working hours (weekday -> (start time,
+    end time) or None) or None for the shop's hours. The shop's
+    BusinessCalendar provides those hours and the holidays and closures
+    that apply to everyone; load_bookings works as for OccupancyIndex,
+    calendar entries may name their 'technician'.
+    """
+
+    def __init__(self, technicians, calendar, load_bookings, horizon_days=400, refresh_seconds=300):
+        if not technicians:
+            raise ValueError('At least one technician is required')
+        self.calendar = calendar
+        self.slot_minutes = calendar.slot_minutes
+        self.slots_per_day = MINUTES_PER_DAY // self.slot_minutes
+        self.names = list(technicians)
+        # Weekday masks of technicians with their own hours, None for the shop's
+        self.weeks = [
+            weekday_masks(technicians[name], self.slot_minutes) if technicians[name] else None
+            for name in self.names
+        ]
+        self.load_bookings = load_bookings
+        self.horizon_days = horizon_days
+        self.refresh_seconds = refresh_seconds
+
+        self._lock = threading.RLock()
+        self._first_day = None  # ordinal of the first indexed day
+        self._days = 0          # number of indexed days
+        self._busy = []         # per technician: bytearray, 1 = closed or booked
+        self._built_at = None
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+
+    def _extend_to(self, ordinal):
+        """Grow the masks so that they cover the given day"""
+        while self._first_day + self._days <= ordinal:
+            day = date.fromordinal(self._first_day + self._days)
+            shop = self.calendar.closed_mask(day)
+            closed = self.calendar.is_closed_day(day)
+            for week, busy in zip(self.weeks, self._busy):
+                if week is None:
+                    busy += shop
+                elif closed:
+                    busy += b'\x01' * self.slots_per_day
+                else:
+                    busy += week[day.weekday()]
+            self._days += 1
+
+    def build(self, today=None):
+        """(Re)build all masks starting at today"""
+        today = today or date.today()
+        with self._lock:
+            self._first_day = today.toordinal()
+            self._days = 0
+            self._busy = [bytearray() for _ in self.names]
+            self._extend_to(self._first_day + self.horizon_days - 1)
+
+            for entry in self.load_bookings(today):
+                self._add(entry.get('date'), entry.get('start_time'), entry.get('end_time'), entry.get('technician'))
+
+            self._built_at = _time.monotonic()
+
+    def ensure_fresh(self):
+        """Build on first use and periodically afterwards, so that bookings
+        written by other worker processes show up eventually"""
+        if self._built_at is None or _time.monotonic() - self._built_at > self.refresh_seconds \
+                or date.today().toordinal() < self._first_day:
+            self.build()
+
+    # ------------------------------------------------------------------
+    # Bookings
+    # ------------------------------------------------------------------
+
+    def slots_for(self, minutes):
+        """Number of slots a bench time of minutes occupies"""
+        return max(-(-minutes // self.slot_minutes), 1)
+
+    def _range(self, date_str, start_time, end_time):
+        """(first, last) slot index of a booking, None if it is invalid or in the past"""
+        try:
+            day = date.fromisoformat(date_str)
+        except (TypeError, ValueError):
+            return None
+        start_min = _parse_hhmm(start_time)
+        if start_min is None:
+            return None
+        end_min = _parse_hhmm(end_time) if end_time else None
+        if end_min is None or end_min <= start_min:
+            end_min = start_min + self.slot_minutes
+
+        ordinal = day.toordinal()
+        if ordinal < self._first_day:
+            return None
+        self._extend_to(ordinal)
+        base = (ordinal - self._first_day) * self.slots_per_day
+        first = start_min // self.slot_minutes
+        last = min(-(-end_min // self.slot_minutes), self.slots_per_day)
+        return base + first, base + last
+
+    def _free_bench(self, first, last):
+        """Position of the first technician without closed or booked slots in [first, last)"""
+        return next((i for i, busy in enumerate(self._busy) if not any(busy[first:last])), None)
+
+    def _add(self, date_str, start_time, end_time, technician=None):
+        slots = self._range(date_str, start_time, end_time)
+        if slots is None:
+            return None
+        first, last = slots
+        if technician in self.names:
+            position = self.names.index(technician)
+        else:
+            # Entries without a (known) technician go to the first free bench
+            position = self._free_bench(first, last) or 0
+        self._busy[position][first:last] = b'\x01' * (last - first)
+        return self.names[position]
+
+    def free_technician(self, date_str, start_time, end_time):
+        """The first technician who is free for all of [start_time, end_time), None if nobody is"""
+        self.ensure_fresh()
+        with self._lock:
+            slots = self._range(date_str, start_time, end_time)
+            if slots is None or slots[0] >= slots[1]:
+                return None
+            position = self._free_bench(*slots)
+            return None if position is None else self.names[position]
+
+    def reserve(self, date_str, start_time, end_time):
+        """
+        Mark [start_time, end_time) busy on the first technician who is
+        free for all of it; returns the technician (None if nobody is)
+        Release it again if the booking is not written after all
+        """
+        self.ensure_fresh()
+        with self._lock:
+            slots = self._range(date_str, start_time, end_time)
+            if slots is None or slots[0] >= slots[1]:
+                return None
+            first, last = slots
+            position = self._free_bench(first, last)
+            if position is None:
+                return None
+            self._busy[position][first:last] = b'\x01' * (last - first)
+            return self.names[position]
+
+    def release(self, date_str, start_time, end_time, technician):
+        """Undo reserve()"""
+        with self._lock:
+            slots = self._range(date_str, start_time, end_time)
+            if slots is None or technician not in self.names:
+                return
+            first, last = slots
+            self._busy[self.names.index(technician)][first:last] = bytes(last - first)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _starts(self, busy, needle, position, end, limit):
+        """Up to limit slot indexes in [position, end) where needle fits within one day"""
+        spd = self.slots_per_day
+        starts = []
+        while len(starts) < limit:
+            position = busy.find(needle, position, end)
+            if position < 0:
+                break
+            day_end = (position // spd + 1) * spd
+            if position + len(needle) > day_end:
+                # The run continues past midnight: go on with the next day
+                position = day_end
+                continue
+            starts.append(position)
+            position += 1
+        return starts
+
+    def candidates(self, after, minutes, limit=5):
+        """
+        The next limit start times after the given datetime with minutes
+        of contiguous free bench time, as (date, minutes since midnight,
+        technician) tuples; a start free on several benches is listed once
+        with the first of them
+        """
+        self.ensure_fresh()
+        spd = self.slots_per_day
+        needle = b'\x00' * self.slots_for(minutes)
+        with self._lock:
+            ordinal = max(after.date().toordinal(), self._first_day)
+            slot = 0
+            if ordinal == after.date().toordinal():
+                slot = (after.hour * 60 + after.minute) // self.slot_minutes + 1
+            position = (ordinal - self._first_day) * spd + slot
+            end = self._days * spd
+
+            starts = {}
+            for name, busy in zip(self.names, self._busy):
+                for start in self._starts(busy, needle, position, end, limit):
+                    starts.setdefault(start, name)
+
+            return [
+                (date.fromordinal(self._first_day + start // spd), (start % spd) * self.slot_minutes, starts[start])
+                for start in sorted(starts)[:limit]
+            ]
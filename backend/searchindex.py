@@ -0,0 +1,133 @@
+"""
+Write-time search keys for the customer_search filter of GET /requests.
+
+Every repair request stores the normalized tokens of the customer's name,
+email, phone number (digits only) and address in searchTokens and the
+trigrams of those tokens in searchTrigrams. Both arrays are backed by
+multikey indexes, so a search term becomes an indexed $all over its
+trigrams, checked against the tokens the index has narrowed the search
+to (substring match: trigrams of different tokens must not add up to a
+term), or an anchored prefix match on the tokens for terms shorter than
+three characters. Consecutive numbers of a search are joined into one
+term, as a formatted phone number is stored as one digits-only token.
+Results are ranked by the number of search terms that match a token
+exactly.
+
+app.py adds them to older documents on startup (see
+Repository.backfill()), or by hand:
+    python searchindex.py
+"""
+import re
+import unicodedata
+
+TOKEN_FIELDS = ['searchTokens', 'searchTrigrams']
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+_NON_DIGIT = re.compile(r'\D+')
+
+
+def normalize(text):
+    """Lowercase, strip accents and split into alphanumeric tokens"""
+    if not isinstance(text, str):
+        return []
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return [token for token in _NON_ALNUM.split(text) if token]
+
+
+def trigrams(token):
+    """All 3-character substrings of a token (the token itself if shorter)"""
+    if len(token) < 3:
+        return {token}
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+def build_search_keys(customer):
+    """
+    Search keys for a customer sub-document
+    Returns {'searchTokens': [...], 'searchTrigrams': [...]}
+    """
+    customer = customer or {}
+    address = customer.get('address') or {}
+
+    tokens = set()
+    for value in (customer.get('firstName'), customer.get('lastName'), customer.get('email'),
+                  address.get('street'), address.get('streetName'), address.get('houseNumber'),
+                  address.get('postalCode'), address.get('city')):
+        tokens.update(normalize(value))
+
+    phone = customer.get('phoneNumber')
+    if isinstance(phone, str):
+        digits = _NON_DIGIT.sub('', phone)
+        if digits:
+            tokens.add(digits)
+
+    grams = set()
+    for token in tokens:
+        grams.update(trigrams(token))
+
+    return {
+        'searchTokens': sorted(tokens),
+        'searchTrigrams': sorted(grams)
+    }
+
+
+def search_terms(text):
+    """
+    Normalized, de-duplicated terms of a search string; consecutive
+    numbers are joined like the digits of a stored phone number
+    ('+49 30 1234' -> '49301234')
+    """
+    terms = []
+    for token in normalize(text):
+        if token.isdigit() and terms and terms[-1].isdigit():
+            terms[-1] += token
+        else:
+            terms.append(token)
+    return sorted(set(terms))
+
+
+def build_search_filter(text):
+    """
+    MongoDB filter matching documents whose search keys contain every term
+    Returns None if the text contains no searchable characters
+    """
+    conditions = []
+    for term in search_terms(text):
+        if len(term) >= 3:
+            conditions.append({'searchTrigrams': {'$all': sorted(trigrams(term))}})
+            conditions.append({'searchTokens': {'$regex': re.escape(term)}})
+        else:
+            conditions.append({'searchTokens': {'$regex': '^' + re.escape(term)}})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {'$and': conditions}
+
+
+def score_expression(text):
+    """Aggregation expression counting the terms that match a token exactly"""
+    return {'$size': {'$setIntersection': [{'$ifNull': ['$searchTokens', []]}, search_terms(text)]}}
+
+
+def backfill(collection, batch_size=1000):
+    """Add search keys to documents that do not have them yet"""
+    from pymongo import UpdateOne
+
+    updated = 0
+    batch = []
+    for doc in collection.find({'searchTokens': {'$exists': False}}, {'customer': 1}):
+        batch.append(UpdateOne({'_id': doc['_id']}, {'$set': build_search_keys(doc.get('customer'))}))
+        if len(batch) >= batch_size:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        updated += collection.bulk_write(batch, ordered=False).modified_count
+    return updated
+
+
+if __name__ == '__main__':
+    from pymongo import MongoClient
+
+    client = MongoClient('mongodb://localhost:27017/')
+    count = backfill(client['repair_shop'].repair_requests)
+    print(f"Added search keys to {count} repair requests")
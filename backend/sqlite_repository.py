@@ -0,0 +1,920 @@
+"""
+SQLite storage backend (STORAGE_BACKEND = 'sqlite' in app.py).
+
+Repair requests and calendar entries are free-form documents (repairs,
+notes, prices as Decimal128), so they are stored as extended JSON in a
+document column, next to the fields the endpoints filter, sort and group
+on, which are extracted into indexed columns when a document is written.
+The search keys of searchindex.py go into two side tables and replace the
+multikey indexes of MongoDB. Slots use the appointment_slots table of
+sqlite_example.sql with the same conditional update as reservations.py;
+a booking reserves every slot it covers and writes both documents in one
+transaction.
+Facet counts are grouped from the indexed columns, so there is no separate
+facet store to maintain; the per-status counters live in status_counts and
+are updated in the same transaction as the repair requests. Archived
+requests move to archived_requests, a table of the same shape; the search
+key tables are shared by both. The booking version the feed caches check
+is a row of the counters table, raised in the transaction of every
+calendar or slot write.
+
+The database runs in WAL mode, so readers never wait for the writer. Every
+thread works on its own connection, taken from a pool of idle connections
+and returned afterwards, so short-lived request threads do not reopen the
+file; the file's tables are created on the first use, not when the
+repository is created, and a forked child starts with an empty pool. All
+SQL is parameterized with fixed statement texts, which sqlite3
+compiles once per connection and keeps in its statement cache.
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from bson import json_util
+from bson.objectid import ObjectId
+
+from archiver import ARCHIVED_STATUS
+from facets import FACETS, get_path
+from fieldsets import select, top_level
+from repository import (ARCHIVE_SCOPES, BOOKING_VERSION, QueryTimeout, Repository, merge_pages, set_status,
+                        status_changes, status_history_entry, transition_changes)
+from reservations import SlotUnavailable, slot_date, slot_times
+from searchindex import TOKEN_FIELDS, search_terms, trigrams
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repair_requests (
+    request_id TEXT PRIMARY KEY,
+    submitted_at TEXT NOT NULL,
+    device_type TEXT,
+    brand TEXT,
+    model TEXT,
+    postal_code TEXT,
+    city TEXT,
+    customer_email TEXT,
+    status TEXT,
+    status_changed_at TEXT,
+    appointment_date TEXT,
+    appointment_time TEXT,
+    document TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS archived_requests (
+    request_id TEXT PRIMARY KEY,
+    submitted_at TEXT NOT NULL,
+    device_type TEXT,
+    brand TEXT,
+    model TEXT,
+    postal_code TEXT,
+    city TEXT,
+    customer_email TEXT,
+    status TEXT,
+    status_changed_at TEXT,
+    appointment_date TEXT,
+    appointment_time TEXT,
+    document TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS search_tokens (
+    token TEXT NOT NULL,
+    request_id TEXT NOT NULL,
+    PRIMARY KEY (token, request_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS search_trigrams (
+    trigram TEXT NOT NULL,
+    request_id TEXT NOT NULL,
+    PRIMARY KEY (trigram, request_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS calendar (
+    entry_id TEXT PRIMARY KEY,
+    request_id TEXT,
+    date TEXT NOT NULL,
+    start_time TEXT,
+    end_time TEXT,
+    document TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS appointment_slots (
+    slot_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    slot_date DATE NOT NULL,
+    slot_time TIME NOT NULL,
+    is_available INTEGER DEFAULT 1,
+    max_capacity INTEGER DEFAULT 1,
+    current_bookings INTEGER DEFAULT 0,
+    UNIQUE(slot_date, slot_time)
+);
+
+CREATE TABLE IF NOT EXISTS status_counts (
+    status TEXT PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS slot_bookings (
+    slot_id INTEGER NOT NULL REFERENCES appointment_slots(slot_id),
+    request_id TEXT NOT NULL,
+    customer_email TEXT,
+    booked_at TEXT NOT NULL,
+    PRIMARY KEY (slot_id, request_id)
+);
+"""
+
+INDEXES = """
+-- Indexes of sqlite_example.sql
+CREATE INDEX IF NOT EXISTS idx_repair_requests_email ON repair_requests(customer_email);
+CREATE INDEX IF NOT EXISTS idx_repair_requests_status ON repair_requests(status);
+CREATE INDEX IF NOT EXISTS idx_repair_requests_appointment ON repair_requests(appointment_date, appointment_time);
+CREATE INDEX IF NOT EXISTS idx_appointment_slots_date ON appointment_slots(slot_date, is_available);
+
+-- GET /requests: default sort, keyset pagination and filters (as in indexes.py)
+CREATE INDEX IF NOT EXISTS idx_repair_requests_submitted ON repair_requests(submitted_at DESC, request_id DESC);
+CREATE INDEX IF NOT EXISTS idx_repair_requests_device_type ON repair_requests(device_type, submitted_at DESC);
+CREATE INDEX IF NOT EXISTS idx_repair_requests_brand_model ON repair_requests(brand, model, submitted_at DESC);
+CREATE INDEX IF NOT EXISTS idx_repair_requests_model ON repair_requests(model, submitted_at DESC);
+CREATE INDEX IF NOT EXISTS idx_repair_requests_postal_code ON repair_requests(postal_code, submitted_at DESC);
+-- GET /options?filter=cities
+CREATE INDEX IF NOT EXISTS idx_repair_requests_city ON repair_requests(city);
+-- Deleting the search keys of a request
+CREATE INDEX IF NOT EXISTS idx_search_tokens_request ON search_tokens(request_id);
+CREATE INDEX IF NOT EXISTS idx_search_trigrams_request ON search_trigrams(request_id);
+-- Auto-archive (see archiver.py)
+CREATE INDEX IF NOT EXISTS idx_repair_requests_status_changed ON repair_requests(status, status_changed_at);
+
+-- GET /requests?archive=include|only
+CREATE INDEX IF NOT EXISTS idx_archived_requests_submitted ON archived_requests(submitted_at DESC, request_id DESC);
+CREATE INDEX IF NOT EXISTS idx_archived_requests_device_type ON archived_requests(device_type, submitted_at DESC);
+CREATE INDEX IF NOT EXISTS idx_archived_requests_brand_model ON archived_requests(brand, model, submitted_at DESC);
+CREATE INDEX IF NOT EXISTS idx_archived_requests_model ON archived_requests(model, submitted_at DESC);
+CREATE INDEX IF NOT EXISTS idx_archived_requests_postal_code ON archived_requests(postal_code, submitted_at DESC);
+
+-- GET /calendar, /calendar.ics, /slots, /slots.ics
+CREATE INDEX IF NOT EXISTS idx_calendar_date ON calendar(date, start_time);
+CREATE INDEX IF NOT EXISTS idx_calendar_request ON calendar(request_id);
+"""
+
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA foreign_keys = ON',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA mmap_size = 268435456'
+)
+
+# filter / facet name -> column
+FILTER_COLUMNS = {
+    'device_type': 'device_type',
+    'brand': 'brand',
+    'model': 'model',
+    'postal_code': 'postal_code'
+}
+FACET_COLUMNS = {
+    'device_types': 'device_type',
+    'brands': 'brand',
+    'models': 'model',
+    'postal_codes': 'postal_code',
+    'cities': 'city'
+}
+
+# Search tokens only contain [0-9a-z], so every token starting with a
+# prefix sorts below prefix + '{'
+PREFIX_END = '{'
+
+REQUEST_COLUMNS = (
+    '(request_id, submitted_at, device_type, brand, model, postal_code, city, customer_email, status, '
+    'status_changed_at, appointment_date, appointment_time, document) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+)
+INSERT_REQUEST = 'INSERT INTO repair_requests ' + REQUEST_COLUMNS
+# A request archived by an interrupted run is archived again
+ARCHIVE_REQUEST = 'INSERT OR REPLACE INTO archived_requests ' + REQUEST_COLUMNS
+SELECT_ARCHIVABLE = (
+    'SELECT request_id, status, document FROM repair_requests '
+    'WHERE status = ? OR (status IN (SELECT value FROM json_each(?)) AND status_changed_at <= ?) LIMIT ?'
+)
+INSERT_TOKEN = 'INSERT OR IGNORE INTO search_tokens (token, request_id) VALUES (?, ?)'
+INSERT_TRIGRAM = 'INSERT OR IGNORE INTO search_trigrams (trigram, request_id) VALUES (?, ?)'
+INSERT_CALENDAR = (
+    'INSERT INTO calendar (entry_id, request_id, date, start_time, end_time, document) VALUES (?, ?, ?, ?, ?, ?)'
+)
+ENSURE_SLOT = (
+    'INSERT OR IGNORE INTO appointment_slots (slot_date, slot_time, max_capacity, current_bookings) '
+    'SELECT ?, ?, ?, COUNT(*) FROM calendar '
+    'WHERE date = ? AND (start_time = ? OR (start_time < ? AND end_time > ?))'
+)
+RESERVE_SLOT = (
+    'UPDATE appointment_slots SET current_bookings = current_bookings + 1 '
+    'WHERE slot_date = ? AND slot_time = ? AND is_available = 1 AND current_bookings < max_capacity '
+    'RETURNING slot_id'
+)
+INSERT_SLOT_BOOKING = (
+    'INSERT INTO slot_bookings (slot_id, request_id, customer_email, booked_at) VALUES (?, ?, ?, ?)'
+)
+DELETE_SLOT_BOOKINGS = (
+    'DELETE FROM slot_bookings WHERE request_id = ? AND slot_id IN '
+    '(SELECT slot_id FROM appointment_slots WHERE slot_date = ?) '
+    'RETURNING slot_id'
+)
+RELEASE_SLOT = 'UPDATE appointment_slots SET current_bookings = current_bookings - 1 WHERE slot_id = ?'
+BUMP_COUNTER = (
+    'INSERT INTO counters (name, value) VALUES (?, 1) '
+    'ON CONFLICT (name) DO UPDATE SET value = value + 1'
+)
+COUNT_STATUS = (
+    'INSERT INTO status_counts (status, count) VALUES (?, ?) '
+    'ON CONFLICT (status) DO UPDATE SET count = count + excluded.count'
+)
+
+
+def timestamp(value):
+    """
+    Sortable text form of a datetime, at the millisecond precision BSON
+    stores (so keyset positions read back from documents match exactly)
+    """
+    return value.isoformat(sep=' ', timespec='milliseconds')
+
+
+def text_or_none(value):
+    if value is None or value == '':
+        return None
+    return str(value)
+
+
+def dump_document(doc):
+    """
+    Extended JSON of a document without _id and search keys (json_util
+    only converts the BSON values, the rest is left to the json module)
+    """
+    return json.dumps(
+        {key: value for key, value in doc.items() if key != '_id' and key not in TOKEN_FIELDS},
+        default=json_util.default,
+        ensure_ascii=False,
+        separators=(',', ':')
+    )
+
+
+def load_document(object_id, document):
+    doc = {'_id': ObjectId(object_id)}
+    doc.update(json_util.loads(document))
+    return doc
+
+
+def document_sql(fields, alias='r'):
+    """
+    SQL expression and parameters of the stored document, or of an object
+    with only the top-level fields the field paths start with
+    """
+    if fields is None:
+        return f'{alias}.document', []
+    keys = top_level(fields)
+    params = []
+    for key in keys:
+        params += [key, '$.' + key]
+    pairs = ', '.join(f'?, json_extract({alias}.document, ?)' for _ in keys)
+    return f'json_object({pairs})', params
+
+
+def load_fields(object_id, document, fields):
+    """load_document() of a document_sql() object, cut to the field paths"""
+    doc = load_document(object_id, document)
+    if fields is None:
+        return doc
+    # json_object() gives null for fields the document does not have
+    return select({key: value for key, value in doc.items() if value is not None}, fields)
+
+
+def status_changed_at(doc):
+    """Time of the last status change; requests from before they were recorded count from their submission"""
+    return timestamp(doc.get('statusChangedAt') or doc['submittedAt'])
+
+
+def request_row(doc):
+    """Column values of a repair request"""
+    appointment = doc.get('appointment')
+    appointment_date = appointment_time = None
+    if isinstance(appointment, dict):
+        appointment_date = appointment.get('date')
+        if isinstance(appointment_date, datetime):
+            appointment_date = appointment_date.strftime('%Y-%m-%d')
+        appointment_time = appointment.get('timeSlot')
+    return (
+        str(doc['_id']),
+        timestamp(doc['submittedAt']),
+        text_or_none(get_path(doc, 'device.type')),
+        text_or_none(get_path(doc, 'device.manufacturer')),
+        text_or_none(get_path(doc, 'device.model')),
+        text_or_none(get_path(doc, 'customer.address.postalCode')),
+        text_or_none(get_path(doc, 'customer.address.city')),
+        text_or_none(get_path(doc, 'customer.email')),
+        text_or_none(doc.get('status')),
+        status_changed_at(doc),
+        text_or_none(appointment_date),
+        text_or_none(appointment_time),
+        dump_document(doc)
+    )
+
+
+def calendar_row(entry):
+    return (
+        str(entry['_id']),
+        get_path(entry, 'customer.request_id'),
+        entry['date'],
+        entry.get('start_time'),
+        entry.get('end_time'),
+        dump_document(entry)
+    )
+
+
+def search_conditions(text):
+    """
+    WHERE conditions and parameters requiring every search term: all
+    trigrams of terms with 3+ characters and a token containing the term,
+    a token prefix for shorter ones
+    """
+    conditions, params = [], []
+    for term in search_terms(text):
+        if len(term) >= 3:
+            grams = sorted(trigrams(term))
+            conditions.append(
+                'r.request_id IN (SELECT request_id FROM search_trigrams '
+                'WHERE trigram IN (SELECT value FROM json_each(?)) GROUP BY request_id HAVING COUNT(*) = ?)'
+            )
+            # Trigrams of different tokens can add up to a term that none contains
+            conditions.append(
+                'EXISTS (SELECT 1 FROM search_tokens t WHERE t.request_id = r.request_id AND instr(t.token, ?) > 0)'
+            )
+            params += [json.dumps(grams), len(grams), term]
+        else:
+            conditions.append(
+                'r.request_id IN (SELECT request_id FROM search_tokens WHERE token >= ? AND token < ?)'
+            )
+            params += [term, term + PREFIX_END]
+    return conditions, params
+
+
+def filter_conditions(filters):
+    """WHERE conditions and parameters for backend-neutral /requests filters"""
+    conditions, params = [], []
+    if 'submitted_from' in filters:
+        conditions.append('r.submitted_at >= ? AND r.submitted_at <= ?')
+        params += [timestamp(filters['submitted_from']), timestamp(filters['submitted_to'])]
+    for name, column in FILTER_COLUMNS.items():
+        if filters.get(name):
+            conditions.append(f'r.{column} = ?')
+            params.append(filters[name])
+    if filters.get('customer_search'):
+        search, search_params = search_conditions(filters['customer_search'])
+        conditions += search
+        params += search_params
+    return conditions, params
+
+
+def where(conditions):
+    return ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+
+
+def escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class SQLiteRepository(Repository):
+    """
+    Repair shop data in one SQLite database file
+    pool_size: idle connections kept open for reuse
+    """
+
+    def __init__(self, path, pool_size=16, busy_timeout_ms=5000, search_max_time_ms=None):
+        self.path = path
+        self.pool_size = pool_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.search_max_time_ms = search_max_time_ms
+        self._prepare_lock = threading.Lock()
+        self._prepared = False
+        self._forget()
+        # Connections must not be shared with forked children (see mongoconnection.py)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._forget)
+
+    def _forget(self):
+        self._usage_lock = threading.Lock()
+        self._idle = queue.LifoQueue(maxsize=self.pool_size)
+        self._local = threading.local()
+        self._usage = {'open': 0, 'in_use': 0}
+
+    def prepare(self, conn):
+        """Create the tables and indexes on the first use of the file in this process"""
+        with self._prepare_lock:
+            if self._prepared:
+                return
+            conn.executescript(SCHEMA)
+            self.migrate(conn)
+            conn.executescript(INDEXES)
+            self._prepared = True
+
+    # Connections
+
+    def connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            isolation_level=None,  # transactions are started explicitly
+            check_same_thread=False,  # handed between threads by the pool, used by one at a time
+            cached_statements=256
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        self._count('open', 1)
+        return conn
+
+    def _count(self, state, delta):
+        with self._usage_lock:
+            self._usage[state] += delta
+
+    def pool_usage(self):
+        """{path: {'open', 'in_use'}} connections of this process (see metrics.py)"""
+        with self._usage_lock:
+            return {self.path: dict(self._usage)}
+
+    @contextmanager
+    def connection(self):
+        """
+        The calling thread's connection; nested uses share it, the
+        outermost one gives it back to the pool
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self.connect()
+        self._local.conn = conn
+        self._count('in_use', 1)
+        try:
+            if not self._prepared:
+                self.prepare(conn)
+            yield conn
+        finally:
+            self._local.conn = None
+            self._count('in_use', -1)
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+                self._count('open', -1)
+
+    @contextmanager
+    def transaction(self):
+        """Write transaction holding the database write lock from the start"""
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    @contextmanager
+    def time_budget(self, conn, filters):
+        """Abort customer_search queries that run longer than search_max_time_ms"""
+        if not (filters.get('customer_search') and self.search_max_time_ms):
+            yield
+            return
+        deadline = time.monotonic() + self.search_max_time_ms / 1000
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+        try:
+            yield
+        except sqlite3.OperationalError as e:
+            if 'interrupted' in str(e):
+                raise QueryTimeout()
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
+
+    def migrate(self, conn):
+        """Add the columns files created by older versions lack"""
+        columns = {row['name'] for row in conn.execute('PRAGMA table_info(repair_requests)')}
+        if 'status_changed_at' in columns:
+            return
+        with self.transaction():
+            conn.execute('ALTER TABLE repair_requests ADD COLUMN status_changed_at TEXT')
+            rows = conn.execute('SELECT request_id, document FROM repair_requests').fetchall()
+            conn.executemany('UPDATE repair_requests SET status_changed_at = ? WHERE request_id = ?', [
+                (status_changed_at(load_document(row['request_id'], row['document'])), row['request_id'])
+                for row in rows
+            ])
+
+    def ensure_indexes(self):
+        with self.connection() as conn:
+            conn.executescript(INDEXES)
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.execute('PRAGMA optimize')
+            conn.close()
+            self._count('open', -1)
+
+    def ping(self, timeout_ms):
+        # Reads never wait for writers in WAL mode, so no timeout applies
+        started = time.perf_counter()
+        with self.connection() as conn:
+            conn.execute('SELECT 1 FROM sqlite_master LIMIT 1').fetchall()
+        return (time.perf_counter() - started) * 1000
+
+    # Repair requests
+
+    def write_requests(self, conn, docs):
+        conn.executemany(INSERT_REQUEST, [request_row(doc) for doc in docs])
+        # Search keys of all documents at once, in index order
+        tokens, grams = [], []
+        for doc in docs:
+            request_id = str(doc['_id'])
+            tokens += [(token, request_id) for token in doc.get('searchTokens', [])]
+            grams += [(gram, request_id) for gram in doc.get('searchTrigrams', [])]
+        conn.executemany(INSERT_TOKEN, sorted(tokens))
+        conn.executemany(INSERT_TRIGRAM, sorted(grams))
+        self.count_statuses(conn, status_changes(docs))
+
+    def count_statuses(self, conn, changes):
+        conn.executemany(COUNT_STATUS, [(status, delta) for status, delta in sorted(changes.items()) if delta])
+
+    def write_calendar_entries(self, conn, entries):
+        for entry in entries:
+            entry.setdefault('_id', ObjectId())
+        conn.executemany(INSERT_CALENDAR, [calendar_row(entry) for entry in entries])
+        conn.execute(BUMP_COUNTER, (BOOKING_VERSION,))
+
+    def get_request(self, request_id, fields=None):
+        object_id = ObjectId(request_id)
+        document, params = document_sql(fields)
+        with self.connection() as conn:
+            row = conn.execute(
+                f'SELECT r.request_id, {document} AS document FROM repair_requests r WHERE r.request_id = ? UNION ALL '
+                f'SELECT r.request_id, {document} AS document FROM archived_requests r WHERE r.request_id = ?',
+                params + [str(object_id)] + params + [str(object_id)]
+            ).fetchone()
+        return load_fields(row['request_id'], row['document'], fields) if row else None
+
+    def insert_request(self, repair_request):
+        repair_request.setdefault('_id', ObjectId())
+        with self.transaction() as conn:
+            self.write_requests(conn, [repair_request])
+        return repair_request['_id']
+
+    def book(self, repair_request, calendar_entry, capacity, slot_minutes):
+        date_str, time_str = calendar_entry['date'], calendar_entry['start_time']
+        times = slot_times(time_str, calendar_entry['end_time'], slot_minutes)
+        email = repair_request.get('customer', {}).get('email', '')
+        with self.transaction() as conn:
+            if not self.claim_slots(conn, date_str, times, repair_request['_id'], email, capacity):
+                raise SlotUnavailable(f'{date_str} {time_str}')
+            self.write_requests(conn, [repair_request])
+            self.write_calendar_entries(conn, [calendar_entry])
+
+    def insert_many(self, docs, write):
+        """
+        Write all documents in one transaction; if that fails, write them
+        one by one to find the failing ones
+        """
+        try:
+            with self.transaction() as conn:
+                write(conn, docs)
+            return {}
+        except sqlite3.Error:
+            pass
+        errors = {}
+        for position, doc in enumerate(docs):
+            try:
+                with self.transaction() as conn:
+                    write(conn, [doc])
+            except sqlite3.Error as e:
+                errors[position] = str(e)
+        return errors
+
+    def insert_requests(self, repair_requests):
+        for doc in repair_requests:
+            doc.setdefault('_id', ObjectId())
+        return self.insert_many(repair_requests, self.write_requests)
+
+    def insert_calendar_entries(self, calendar_entries):
+        return self.insert_many(calendar_entries, self.write_calendar_entries)
+
+    def remove_request(self, repair_request, calendar_entry=None):
+        request_id = str(repair_request['_id'])
+        with self.transaction() as conn:
+            deleted = conn.execute(
+                'DELETE FROM repair_requests WHERE request_id = ? RETURNING status', (request_id,)
+            ).fetchall()
+            self.count_statuses(conn, status_changes([dict(row) for row in deleted], -1))
+            conn.execute('DELETE FROM search_tokens WHERE request_id = ?', (request_id,))
+            conn.execute('DELETE FROM search_trigrams WHERE request_id = ?', (request_id,))
+            if calendar_entry is not None:
+                conn.execute('DELETE FROM calendar WHERE request_id = ?', (request_id,))
+                self.free_slots(conn, calendar_entry['date'], request_id)
+
+    def find_in(self, table, page):
+        filters = page['filters']
+        conditions, params = filter_conditions(filters)
+        position = page['position']
+        # submittedAt is needed for merging pages and the next page token
+        fields = page['fields'] + ('submittedAt',) if page.get('fields') else None
+        document, document_params = document_sql(fields)
+
+        if page['customer_search']:
+            terms = json.dumps(search_terms(page['customer_search']))
+            sql = (
+                f'SELECT * FROM (SELECT r.request_id, r.submitted_at, {document} AS document, '
+                '(SELECT COUNT(*) FROM search_tokens t WHERE t.request_id = r.request_id '
+                'AND t.token IN (SELECT value FROM json_each(?))) AS score '
+                f'FROM {table} r' + where(conditions) + ')'
+            )
+            params = document_params + [terms] + params
+            if position:
+                score, submitted_at, object_id = position
+                sql += (' WHERE score < ? OR (score = ? AND (submitted_at < ? '
+                        'OR (submitted_at = ? AND request_id < ?)))')
+                params += [score, score, timestamp(submitted_at), timestamp(submitted_at), str(object_id)]
+            sql += ' ORDER BY score DESC, submitted_at DESC, request_id DESC LIMIT ?'
+        else:
+            sql = f'SELECT r.request_id, r.submitted_at, {document} AS document FROM {table} r'
+            params = document_params + params
+            if position:
+                _, submitted_at, object_id = position
+                conditions = conditions + ['(r.submitted_at < ? OR (r.submitted_at = ? AND r.request_id < ?))']
+                params += [timestamp(submitted_at), timestamp(submitted_at), str(object_id)]
+            sql += where(conditions) + ' ORDER BY r.submitted_at DESC, r.request_id DESC LIMIT ?'
+        params.append(page['limit'] + 1)
+
+        with self.connection() as conn, self.time_budget(conn, filters):
+            rows = conn.execute(sql, params).fetchall()
+
+        docs = []
+        for row in rows:
+            doc = load_fields(row['request_id'], row['document'], fields)
+            if page['customer_search']:
+                doc['_score'] = row['score']
+            docs.append(doc)
+        return docs
+
+    def find_requests(self, page):
+        # Table names come from ARCHIVE_SCOPES only
+        return merge_pages(page, [self.find_in(table, page) for table in ARCHIVE_SCOPES[page['archive']]])
+
+    def count_requests(self, filters, limit=None, archive='exclude'):
+        conditions, params = filter_conditions(filters)
+        count = 0
+        with self.connection() as conn, self.time_budget(conn, filters):
+            for table in ARCHIVE_SCOPES[archive]:
+                sql = f'SELECT COUNT(*) FROM (SELECT 1 FROM {table} r' + where(conditions) + ' LIMIT ?)'
+                count += conn.execute(sql, params + [limit or -1]).fetchone()[0]
+        return min(count, limit) if limit else count
+
+    def estimated_count(self, archive='exclude'):
+        # The status counters hold every request, archived ones under
+        # ARCHIVED_STATUS (those archived by hand included until they move)
+        counts = self.status_counts()
+        archived = counts.get(ARCHIVED_STATUS, 0)
+        if archive == 'include':
+            return sum(counts.values())
+        if archive == 'only':
+            return archived
+        return max(sum(counts.values()) - archived, 0)
+
+    def archive_requests(self, from_statuses, cutoff, archived_status, changed_at, limit, note=None):
+        # One transaction per batch: the move is all or nothing, and the
+        # write lock is held only as long as one batch takes
+        with self.transaction() as conn:
+            rows = conn.execute(
+                SELECT_ARCHIVABLE, (archived_status, json.dumps(sorted(from_statuses)), timestamp(cutoff), limit)
+            ).fetchall()
+            docs, changes = [], Counter()
+            for row in rows:
+                doc = load_document(row['request_id'], row['document'])
+                if row['status'] != archived_status:
+                    set_status(doc, archived_status, changed_at, note)
+                changes.update(transition_changes(row['status'], archived_status))
+                docs.append(doc)
+            conn.executemany(ARCHIVE_REQUEST, [request_row(doc) for doc in docs])
+            conn.executemany('DELETE FROM repair_requests WHERE request_id = ?', [(row['request_id'],) for row in rows])
+            self.count_statuses(conn, changes)
+        return len(docs)
+
+    # Quotes
+
+    def requests_in_status(self, status, batch_size=1000):
+        # Keyset pages, so that no read is open while update_quotes() writes
+        after = ''
+        while True:
+            with self.connection() as conn:
+                rows = conn.execute(
+                    'SELECT request_id, document FROM repair_requests WHERE status = ? AND request_id > ? '
+                    'ORDER BY request_id LIMIT ?', (status, after, batch_size)
+                ).fetchall()
+            for row in rows:
+                yield load_document(row['request_id'], row['document'])
+            if len(rows) < batch_size:
+                return
+            after = rows[-1]['request_id']
+
+    def update_quotes(self, updates, status):
+        with self.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "UPDATE repair_requests SET document = json_set(document, '$.repairs', json(?), "
+                "'$.totalQuotedPrice', json(?)) WHERE request_id = ? AND status = ?",
+                [
+                    (json.dumps(repairs, default=json_util.default), json.dumps(total, default=json_util.default),
+                     str(_id), status)
+                    for _id, repairs, total in updates
+                ]
+            )
+            return conn.total_changes - before
+
+    # Slot reservations
+
+    def claim_slots(self, conn, date_str, times, request_id, email, capacity):
+        """
+        Conditional updates as in reservations.reserve_all(); inside a
+        transaction, which the caller rolls back if this returns False
+        """
+        slot_day = slot_date(date_str).strftime('%Y-%m-%d')
+        booked_at = timestamp(datetime.utcnow())
+        for time_str in times:
+            conn.execute(ENSURE_SLOT, (slot_day, time_str, capacity, date_str, time_str, time_str, time_str))
+            rows = conn.execute(RESERVE_SLOT, (slot_day, time_str)).fetchall()
+            if not rows:
+                return False
+            conn.execute(INSERT_SLOT_BOOKING, (rows[0][0], str(request_id), email, booked_at))
+        return True
+
+    def free_slots(self, conn, date_str, request_id):
+        rows = conn.execute(
+            DELETE_SLOT_BOOKINGS, (str(request_id), slot_date(date_str).strftime('%Y-%m-%d'))
+        ).fetchall()
+        conn.executemany(RELEASE_SLOT, [(row[0],) for row in rows])
+        conn.execute(BUMP_COUNTER, (BOOKING_VERSION,))
+
+    def reserve_slots(self, date_str, times, request_id, email, capacity):
+        try:
+            with self.transaction() as conn:
+                if not self.claim_slots(conn, date_str, times, request_id, email, capacity):
+                    raise SlotUnavailable(f'{date_str} {times[0]}')
+        except SlotUnavailable:
+            return False
+        return True
+
+    def release_slots(self, date_str, request_id):
+        with self.transaction() as conn:
+            self.free_slots(conn, date_str, request_id)
+
+    def release_appointment(self, request_id):
+        request_id = str(ObjectId(request_id))
+        with self.transaction() as conn:
+            rows = conn.execute(
+                'DELETE FROM calendar WHERE request_id = ? RETURNING entry_id, document', (request_id,)
+            ).fetchall()
+            entries = [load_document(row['entry_id'], row['document']) for row in rows]
+            for date_str in {entry['date'] for entry in entries}:
+                self.free_slots(conn, date_str, request_id)
+        return entries
+
+    # Workflow status
+
+    def transition_status(self, request_id, from_statuses, to_status, changed_at, note=None):
+        request_id = str(ObjectId(request_id))
+        # The write lock is held from the first read, so check and update are atomic
+        with self.transaction() as conn:
+            row = conn.execute(
+                'SELECT status, document FROM repair_requests WHERE request_id = ?', (request_id,)
+            ).fetchone()
+            if row is None or row['status'] not in from_statuses:
+                return None
+            doc = load_document(request_id, row['document'])
+            set_status(doc, to_status, changed_at, note)
+            conn.execute(
+                'UPDATE repair_requests SET status = ?, status_changed_at = ?, document = ? WHERE request_id = ?',
+                (to_status, timestamp(changed_at), dump_document(doc), request_id)
+            )
+            self.count_statuses(conn, transition_changes(row['status'], to_status))
+        return row['status']
+
+    def status_counts(self):
+        with self.connection() as conn:
+            return {row['status']: row['count'] for row in conn.execute('SELECT status, count FROM status_counts')}
+
+    def rebuild_status_counts(self, default_status):
+        with self.transaction() as conn:
+            self.recount_statuses(conn, default_status)
+
+    def backfill(self, default_status):
+        # Facets are grouped from the columns and every request is written
+        # with its search keys, so only the status counters can be missing
+        # (files from before they existed); one process at a time holds the
+        # write lock, the others find them built
+        with self.transaction() as conn:
+            if conn.execute('SELECT 1 FROM status_counts LIMIT 1').fetchone() is not None:
+                return []
+            if conn.execute(
+                'SELECT 1 FROM repair_requests UNION ALL SELECT 1 FROM archived_requests LIMIT 1'
+            ).fetchone() is None:
+                return []
+            self.recount_statuses(conn, default_status)
+        return ['status counts']
+
+    def recount_statuses(self, conn, default_status):
+        conn.execute(
+            "UPDATE repair_requests SET status = ?, document = json_set(document, '$.status', ?) "
+            'WHERE status IS NULL',
+            (default_status, default_status)
+        )
+        conn.execute('DELETE FROM status_counts')
+        conn.execute(
+            'INSERT INTO status_counts (status, count) '
+            'SELECT status, COUNT(*) FROM (SELECT status FROM repair_requests '
+            'UNION ALL SELECT status FROM archived_requests) WHERE status IS NOT NULL GROUP BY status'
+        )
+
+    # Calendar
+
+    def calendar_entries(self, start_date=None, end_date=None):
+        conditions, params = [], []
+        if start_date:
+            conditions.append('date >= ?')
+            params.append(start_date.strftime('%Y-%m-%d'))
+        if end_date:
+            conditions.append('date <= ?')
+            params.append(end_date.strftime('%Y-%m-%d'))
+        # Rows are decoded as they are read, so a feed of a long range is
+        # never held as a whole; the connection is kept until the end
+        with self.connection() as conn:
+            for row in conn.execute('SELECT entry_id, document FROM calendar' + where(conditions), params):
+                yield load_document(row['entry_id'], row['document'])
+
+    def calendar_times(self, start_date):
+        with self.connection() as conn:
+            rows = conn.execute(
+                "SELECT date, start_time, end_time, json_extract(document, '$.technician') AS technician "
+                'FROM calendar WHERE date >= ?', (start_date.strftime('%Y-%m-%d'),)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def booking_version(self):
+        with self.connection() as conn:
+            row = conn.execute('SELECT value FROM counters WHERE name = ?', (BOOKING_VERSION,)).fetchone()
+        return row[0] if row else 0
+
+    # Facets
+
+    def record_facets(self, repair_requests):
+        pass  # grouped from the indexed columns when asked for
+
+    def facet_options(self, facet, scope=None, prefix=None, sort='value', offset=0, limit=50):
+        column = FACET_COLUMNS[facet]
+        conditions = [f'{column} IS NOT NULL']
+        params = []
+        for name, value in (scope or {}).items():
+            if value:
+                conditions.append(f'{FILTER_COLUMNS[name]} = ?')
+                params.append(value)
+        if prefix:
+            conditions.append(f"{column} LIKE ? ESCAPE '\\'")
+            params.append(escape_like(prefix) + '%')
+        order = 'count DESC, value' if sort == 'count' else 'value'
+        sql = (f'SELECT {column} AS value, COUNT(*) AS count FROM repair_requests' + where(conditions) +
+               f' GROUP BY {column} ORDER BY {order} LIMIT ? OFFSET ?')
+        with self.connection() as conn:
+            rows = conn.execute(sql, params + [limit + 1, offset]).fetchall()
+        counts = [{'value': row['value'], 'count': row['count']} for row in rows]
+        return counts[:limit], len(counts) > limit
+
+    def facet_counts(self, filters, limit=50):
+        conditions, params = filter_conditions(filters)
+        counts = {}
+        with self.connection() as conn, self.time_budget(conn, filters):
+            for facet in FACETS:
+                column = FACET_COLUMNS[facet]
+                sql = (f'SELECT r.{column} AS value, COUNT(*) AS count FROM repair_requests r' +
+                       where(conditions + [f'r.{column} IS NOT NULL']) +
+                       f' GROUP BY r.{column} ORDER BY count DESC, value LIMIT ?')
+                rows = conn.execute(sql, params + [limit]).fetchall()
+                counts[facet] = [{'value': row['value'], 'count': row['count']} for row in rows]
+        return counts
@@ -0,0 +1,131 @@
+"""
+Shared fixtures: app.py on a temporary SQLite file, and a repository per
+storage backend (a temporary SQLite file, MongoDB through mongomock).
+
+app.py opens its repository on import, so STORAGE_BACKEND and SQLITE_PATH
+are set before it is imported; each test then gets a fresh repository and
+fresh in-process indexes (occupancy, scheduler, feed cache) in app.py.
+"""
+import base64
+import logging
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+import mongomock
+import pytest
+from bson.codec_options import CodecOptions
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+os.environ['STORAGE_BACKEND'] = 'sqlite'
+os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(), 'import.db')
+
+import app as app_module  # noqa: E402
+import repository as repository_module  # noqa: E402
+from feedcache import FeedCache  # noqa: E402
+from occupancy import OccupancyIndex  # noqa: E402
+from repository import MongoRepository  # noqa: E402
+from scheduler import BenchScheduler  # noqa: E402
+from sqlite_repository import SQLiteRepository  # noqa: E402
+
+# No archiver, index or change stream threads in the tests
+app_module._started_pid = os.getpid()
+logging.disable(logging.CRITICAL)
+# mongomock cannot return RawBSONDocuments; GET /request then hands decoded
+# documents to the JSON provider, which writes them the same way
+repository_module.RAW_BSON_OPTIONS = CodecOptions()
+
+AUTH = {'Authorization': 'Basic ' + base64.b64encode(b'admin:change_me_please').decode('ascii')}
+
+
+class MockConnection:
+    """MongoConnection stand-in with a mongomock client"""
+
+    def __init__(self):
+        self.client = mongomock.MongoClient()
+
+    def close(self):
+        pass
+
+    def ping(self, timeout_ms):
+        return 0
+
+
+def sqlite_repository(path):
+    return SQLiteRepository(str(path))
+
+
+def mongo_repository():
+    return MongoRepository(MockConnection(), 'repair_shop_test', transactions=False)
+
+
+@pytest.fixture(params=['sqlite', 'mongodb'])
+def repository(request, tmp_path):
+    if request.param == 'sqlite':
+        repo = sqlite_repository(tmp_path / 'repair_shop.db')
+    else:
+        repo = mongo_repository()
+    yield repo
+    repo.close()
+
+
+def new_scheduler():
+    return BenchScheduler(
+        app_module.TECHNICIANS,
+        app_module.business_calendar,
+        app_module.load_occupancy_bookings,
+        horizon_days=app_module.OCCUPANCY_HORIZON_DAYS,
+        refresh_seconds=app_module.OCCUPANCY_REFRESH_SECONDS
+    )
+
+
+def new_occupancy():
+    return OccupancyIndex(
+        app_module.business_calendar,
+        app_module.load_occupancy_bookings,
+        horizon_days=app_module.OCCUPANCY_HORIZON_DAYS,
+        refresh_seconds=app_module.OCCUPANCY_REFRESH_SECONDS
+    )
+
+
+@pytest.fixture
+def app(repository, monkeypatch):
+    """app.py serving from the repository fixture"""
+    monkeypatch.setattr(app_module, 'repository', repository)
+    monkeypatch.setattr(app_module, 'occupancy', new_occupancy())
+    monkeypatch.setattr(app_module, 'scheduler', new_scheduler())
+    feed_cache = FeedCache(max_age_seconds=app_module.FEED_CACHE_SECONDS, shared_version=app_module.booking_version)
+    monkeypatch.setattr(app_module, 'feed_cache', feed_cache)
+    monkeypatch.setattr(app_module, 'slot_watcher', None)
+    return app_module
+
+
+@pytest.fixture
+def client(app):
+    return app.app.test_client()
+
+
+def open_day(start_time='11:00', end_time='12:00', weekdays=range(5), after_days=7):
+    """The first day at least after_days ahead on one of weekdays that is open from start_time to end_time"""
+    day = date.today() + timedelta(days=after_days)
+    while day.weekday() not in weekdays or not app_module.business_calendar.is_open(
+            day, app_module.minutes_of(start_time), app_module.minutes_of(end_time)):
+        day += timedelta(days=1)
+    return day.isoformat()
+
+
+def repair_request_payload(appointment=None, repairs=None, email='ada@example.com', last_name='Lovelace'):
+    """A POST /request body"""
+    payload = {
+        'customer': {'firstName': 'Ada', 'lastName': last_name, 'email': email, 'phoneNumber': '0301234567'},
+        'device': {'type': 'smartphone', 'manufacturer': 'Apple', 'model': 'iPhone 14'},
+        'serviceType': 'walk-in'
+    }
+    if repairs is not None:
+        payload['repairs'] = [{'serviceName': name} for name in repairs]
+    if appointment is not None:
+        payload['appointment'] = appointment
+    return payload
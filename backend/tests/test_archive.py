@@ -0,0 +1,136 @@
+"""
+Archiving: status counters, facet counts and the hot/cold collection split
+"""
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from archiver import ARCHIVED_STATUS, Archiver
+from conftest import app_module, mongo_repository, repair_request_payload
+
+NOW = datetime(2026, 6, 1, 12, 0)
+OLD = NOW - timedelta(days=120)
+RECENT = NOW - timedelta(days=10)
+
+
+def add_requests(app, repository, *requests):
+    """Insert (status, statusChangedAt, manufacturer) requests and count them like the endpoints do"""
+    docs = []
+    for status, changed_at, manufacturer in requests:
+        payload = repair_request_payload(email=f'customer{len(docs)}@example.com')
+        payload['device'] = dict(payload['device'], manufacturer=manufacturer)
+        doc = app.build_repair_request(payload)
+        doc['_id'] = ObjectId()
+        doc['status'] = status
+        doc['submittedAt'] = doc['statusChangedAt'] = changed_at
+        docs.append(doc)
+    assert repository.insert_requests(docs) == {}
+    repository.record_facets(docs)
+    repository.rebuild_status_counts(app.workflow.initial)
+    return docs
+
+
+def brand_counts(repository):
+    options, _ = repository.facet_options('brands')
+    return {option['value']: option['count'] for option in options}
+
+
+def test_archiver_moves_due_requests_and_keeps_counters(app, repository):
+    add_requests(
+        app, repository,
+        ('cancelled', OLD, 'Apple'),
+        ('rejected', OLD, 'Samsung'),
+        ('feedback_received', OLD, 'Apple'),
+        ('cancelled', RECENT, 'Apple'),
+        ('pending_quote', OLD, 'Google')
+    )
+    assert brand_counts(repository) == {'Apple': 3, 'Google': 1, 'Samsung': 1}
+
+    archiver = Archiver(repository, app.workflow, after_days=90, batch_size=2, pause_seconds=0)
+    assert archiver.run(now=NOW) == 3
+
+    counts = {status: count for status, count in repository.status_counts().items() if count}
+    assert counts == {ARCHIVED_STATUS: 3, 'cancelled': 1, 'pending_quote': 1}
+    assert brand_counts(repository) == {'Apple': 1, 'Google': 1}
+    assert repository.count_requests({}) == 2
+    assert repository.count_requests({}, archive='only') == 3
+    assert repository.count_requests({}, archive='include') == 5
+
+    # Nothing left to do
+    assert archiver.run(now=NOW) == 0
+    assert repository.count_requests({}, archive='only') == 3
+
+
+def test_statuses_endpoint_reads_the_counters(client, app, repository):
+    add_requests(app, repository, ('cancelled', OLD, 'Apple'), ('pending_quote', OLD, 'Apple'))
+    Archiver(repository, app.workflow, after_days=90, pause_seconds=0).run(now=NOW)
+
+    body = client.get('/statuses').get_json()
+    counts = {entry['status']: entry['count'] for entry in body['statuses']}
+    assert counts[ARCHIVED_STATUS] == 1
+    assert counts['cancelled'] == 0
+    assert counts['pending_quote'] == 1
+    assert body['total'] == 2
+
+
+def test_requests_another_archiver_moved_are_not_counted_twice(monkeypatch):
+    repository = mongo_repository()
+    docs = add_requests(
+        app_module, repository, ('cancelled', OLD, 'Apple'), ('cancelled', OLD, 'Samsung'), ('rejected', OLD, 'Google')
+    )
+
+    # Another archiver moves the first request between this run's read and its deletes
+    archived = repository.db.archived_requests
+    bulk_write = type(archived).bulk_write
+
+    def racing_bulk_write(collection, *args, **kwargs):
+        monkeypatch.setattr(type(archived), 'bulk_write', bulk_write)
+        repository.db.repair_requests.delete_one({'_id': docs[0]['_id']})
+        return bulk_write(collection, *args, **kwargs)
+
+    monkeypatch.setattr(type(archived), 'bulk_write', racing_bulk_write)
+    statuses = sorted(app_module.workflow.sources[ARCHIVED_STATUS])
+    assert repository.archive_requests(statuses, NOW, ARCHIVED_STATUS, NOW, 10) == 2
+
+    counts = {status: count for status, count in repository.status_counts().items() if count}
+    # The other archiver counts its own move
+    assert counts == {ARCHIVED_STATUS: 2, 'cancelled': 1}
+    assert brand_counts(repository) == {'Apple': 1}
+
+
+def test_requests_changed_since_they_were_read_stay(monkeypatch):
+    repository = mongo_repository()
+    docs = add_requests(app_module, repository, ('cancelled', OLD, 'Apple'), ('rejected', OLD, 'Samsung'))
+    statuses = sorted(app_module.workflow.sources[ARCHIVED_STATUS])
+
+    # The first request is archived by hand between this run's read and its deletes
+    archived = repository.db.archived_requests
+    bulk_write = type(archived).bulk_write
+
+    def racing_bulk_write(collection, *args, **kwargs):
+        monkeypatch.setattr(type(archived), 'bulk_write', bulk_write)
+        repository.db.repair_requests.update_one({'_id': docs[0]['_id']}, {'$set': {'status': 'archived'}})
+        return bulk_write(collection, *args, **kwargs)
+
+    monkeypatch.setattr(type(archived), 'bulk_write', racing_bulk_write)
+    assert repository.archive_requests(statuses, NOW, ARCHIVED_STATUS, NOW, 10) == 1
+    # Its copy is dropped again, it stays where the status change left it
+    assert repository.count_requests({}) == 1
+    assert repository.count_requests({}, archive='only') == 1
+    assert brand_counts(repository) == {'Apple': 1}
+
+
+def test_estimated_count_follows_archiving_and_removals(app, repository):
+    docs = add_requests(
+        app, repository,
+        ('cancelled', OLD, 'Apple'),
+        ('rejected', OLD, 'Samsung'),
+        ('pending_quote', OLD, 'Google'),
+        ('pending_quote', RECENT, 'Apple')
+    )
+    Archiver(repository, app.workflow, after_days=90, batch_size=10, pause_seconds=0).run(now=NOW)
+    repository.remove_request(docs[3])
+
+    assert repository.estimated_count() == 1
+    assert repository.estimated_count(archive='only') == 2
+    assert repository.estimated_count(archive='include') == 3
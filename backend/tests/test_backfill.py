@@ -0,0 +1,57 @@
+"""
+Startup backfill of a database written before status counters, facet
+counts and search keys existed
+"""
+from datetime import datetime
+
+from conftest import app_module as app, mongo_repository, repair_request_payload, sqlite_repository
+from searchindex import TOKEN_FIELDS
+
+
+def old_requests(app, count):
+    """Repair requests as an older version stored them"""
+    docs = []
+    for number in range(count):
+        doc = app.build_repair_request(repair_request_payload(email=f'customer{number}@example.com'))
+        for field in TOKEN_FIELDS:
+            doc.pop(field, None)
+        docs.append(doc)
+    return docs
+
+
+def test_backfill_builds_what_an_older_version_lacks():
+    repository = mongo_repository()
+    repository.db.repair_requests.insert_many(old_requests(app, 3))
+
+    built = repository.backfill(app.workflow.initial)
+    assert built == ['status counts', 'facet counts', 'search keys of repair_requests']
+    assert repository.status_counts() == {'pending_quote': 3}
+    options, _ = repository.facet_options('brands')
+    assert [(option['value'], option['count']) for option in options] == [('Apple', 3)]
+    assert repository.count_requests({'customer_search': 'lovelace'}) == 3
+
+    # Nothing left to build, nothing counted twice
+    assert repository.backfill(app.workflow.initial) == []
+    assert repository.status_counts() == {'pending_quote': 3}
+    repository.record_facets(old_requests(app, 1))
+    options, _ = repository.facet_options('brands')
+    assert [(option['value'], option['count']) for option in options] == [('Apple', 4)]
+
+
+def test_backfill_waits_for_another_process():
+    repository = mongo_repository()
+    repository.db.repair_requests.insert_many(old_requests(app, 1))
+    repository.db.maintenance.insert_one({'_id': 'backfill', 'lockedUntil': datetime(2999, 1, 1)})
+    assert repository.backfill(app.workflow.initial) == []
+    assert repository.status_counts() == {}
+    assert repository.facet_options('brands') == ([], False)
+
+
+def test_sqlite_backfill_recounts_statuses(tmp_path):
+    repository = sqlite_repository(tmp_path / 'repair_shop.db')
+    assert repository.insert_requests(old_requests(app, 2)) == {}
+    with repository.connection() as conn:
+        conn.execute('DELETE FROM status_counts')
+    assert repository.backfill(app.workflow.initial) == ['status counts']
+    assert repository.status_counts() == {'pending_quote': 2}
+    assert repository.backfill(app.workflow.initial) == []
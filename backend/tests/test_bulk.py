@@ -0,0 +1,74 @@
+"""
+POST /requests/bulk: incremental JSON array decoding and per-item failures
+"""
+import io
+import json
+
+import pytest
+
+from app import iter_json_array
+from conftest import open_day, repair_request_payload
+
+
+def decode(body, read_bytes=3, max_item_bytes=1000):
+    stream = io.BytesIO(body.encode('utf-8'))
+    return list(iter_json_array(stream, read_bytes=read_bytes, max_item_bytes=max_item_bytes))
+
+
+def test_json_array_is_decoded_item_by_item():
+    items = [{'name': 'Jürgen', 'tags': ['a', 'b']}, 12345678, 'x,]', None, [1, [2]]]
+    body = ' \n' + json.dumps(items, ensure_ascii=False, indent=1) + '\n'
+    assert decode(body) == [(item, None) for item in items]
+    # Numbers and multi-byte characters cut off by a read
+    assert decode('[1234567, "ü€"]', read_bytes=2) == [(1234567, None), ('ü€', None)]
+    assert decode('[]') == []
+    assert decode('﻿[1]') == [(1, None)]
+
+
+def test_json_array_stops_at_the_first_broken_item():
+    decoded = decode('[{"a": 1}, {"b": }, {"c": 3}]')
+    assert decoded[0] == ({'a': 1}, None)
+    assert len(decoded) == 2 and decoded[1][0] is None and decoded[1][1].startswith('Invalid JSON')
+
+    assert decode('[1 2]')[1][1].startswith('Invalid JSON')
+    assert decode('[1,]')[1][1].startswith('Invalid JSON')
+    assert decode('[1')[1] == (None, 'Invalid JSON: the array is not closed')
+    assert decode('[1] [2]')[1] == (None, 'Invalid JSON: data after the array')
+    assert decode('["' + 'x' * 50 + '"]', max_item_bytes=20) == [(None, 'Item larger than 20 bytes')]
+
+
+def test_body_that_is_no_array_is_rejected():
+    for body in ['{"a": 1}', '', '  ']:
+        with pytest.raises(ValueError):
+            decode(body)
+
+
+def test_bulk_writes_the_items_before_a_broken_one(client, app):
+    valid = json.dumps(repair_request_payload())
+    body = f'[{valid}, {valid}, {{"customer": }}, {valid}]'
+    response = client.post('/requests/bulk', data=body, content_type='application/json')
+    assert response.status_code == 200
+    assert [result['status'] for result in response.get_json()['results']] == [201, 201, 400]
+    assert app.repository.count_requests({}) == 2
+
+    response = client.post('/requests/bulk', data='{"customer": {}}', content_type='application/json')
+    assert response.status_code == 400
+
+
+def test_item_failing_after_its_bench_reservation_gives_it_back(client, app, monkeypatch):
+    day = open_day()
+    payload = repair_request_payload(appointment={'date': day, 'timeSlot': '11:00'})
+    reserve_slots = app.repository.reserve_slots
+
+    def lost_connection(*args, **kwargs):
+        monkeypatch.setattr(app.repository, 'reserve_slots', reserve_slots)
+        raise ConnectionError('connection lost')
+
+    monkeypatch.setattr(app.repository, 'reserve_slots', lost_connection)
+    version = app.booking_version()
+    response = client.post('/requests/bulk', json=[payload, dict(payload, customer=dict(payload['customer']))])
+    results = response.get_json()['results']
+    assert [result['status'] for result in results] == [500, 201]
+    assert results[0]['error'] == 'connection lost'
+    # The booking is visible to the feed caches of every process
+    assert app.booking_version() != version
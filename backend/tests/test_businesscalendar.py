@@ -0,0 +1,66 @@
+"""
+Opening hours, holidays and closures compiled into per-year tables
+"""
+from datetime import date, datetime, time
+
+import pytest
+
+from businesscalendar import CLOSURE_REASON, HOLIDAY_REASON, BusinessCalendar, easter_sunday
+
+WORKING_HOURS = {
+    0: (time(9, 0), time(16, 0)),
+    1: (time(9, 0), time(16, 0)),
+    2: (time(9, 0), time(16, 0)),
+    3: (time(9, 0), time(16, 0)),
+    4: (time(9, 0), time(16, 0)),
+    5: (time(10, 0), time(15, 15)),
+    6: None
+}
+
+
+def new_calendar(**kwargs):
+    return BusinessCalendar(30, WORKING_HOURS, **kwargs)
+
+
+def test_easter_sunday():
+    assert easter_sunday(2024) == date(2024, 3, 31)
+    assert easter_sunday(2025) == date(2025, 4, 20)
+    assert easter_sunday(2026) == date(2026, 4, 5)
+
+
+def test_holidays_and_closures_close_whole_days():
+    calendar = new_calendar(
+        fixed_holidays=[(12, 25)],
+        easter_holidays=[-2, 1],
+        closures=[('2026-08-03', '2026-08-05', 'Summer vacation'), ('2026-12-31', '2027-01-02')]
+    )
+    assert calendar.closed_dates(date(2026, 4, 1), date(2026, 4, 10)) == [
+        (date(2026, 4, 3), HOLIDAY_REASON), (date(2026, 4, 6), HOLIDAY_REASON)
+    ]
+    assert calendar.closed_reason(date(2026, 8, 4)) == 'Summer vacation'
+    assert calendar.closed_reason(date(2026, 8, 6)) is None
+    assert calendar.is_closed_day(date(2026, 12, 25))
+    # A closure running into the next year closes the days of both tables
+    assert calendar.closed_reason(date(2026, 12, 31)) == CLOSURE_REASON
+    assert calendar.closed_reason(date(2027, 1, 2)) == CLOSURE_REASON
+    assert calendar.hours(date(2026, 8, 4)) is None
+    assert calendar.hours(date(2026, 8, 6)) == WORKING_HOURS[3]
+
+
+def test_slots_within_working_hours_are_open():
+    calendar = new_calendar()
+    monday, saturday, sunday = date(2026, 3, 2), date(2026, 3, 7), date(2026, 3, 8)
+    assert calendar.is_open(monday, 9 * 60, 16 * 60)
+    assert not calendar.is_open(monday, 8 * 60 + 30, 9 * 60 + 30)
+    assert not calendar.is_open(monday, 15 * 60 + 30, 16 * 60 + 30)
+    assert not calendar.is_open(sunday, 11 * 60, 11 * 60 + 30)
+    # A slot is open if any part of it lies within the working hours
+    assert calendar.is_open(saturday, 15 * 60, 15 * 60 + 30)
+    assert calendar.is_bookable(datetime(2026, 3, 7, 15, 10))
+    assert not calendar.is_bookable(datetime(2026, 3, 7, 15, 30))
+    assert calendar.closed_mask(sunday) == b'\x01' * 48
+
+
+def test_closure_must_not_end_before_it_starts():
+    with pytest.raises(ValueError):
+        new_calendar(closures=[('2026-08-05', '2026-08-03')])
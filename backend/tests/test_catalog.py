@@ -0,0 +1,128 @@
+"""
+Device and repair catalog: prefix and fuzzy model search, reloading
+"""
+import os
+
+import pytest
+
+from catalog import Catalog, CatalogSnapshot, typos
+from conftest import app_module
+
+MODELS_HEADER = 'Brand,Model,Screen Size,Release Date,Decommissioning Date,Market Share / Popularity\n'
+REPAIRS_HEADER = 'Repair type,Repair name,Description,Duration (minutes),Price in Euro\n'
+
+
+@pytest.fixture(scope='module')
+def shipped():
+    return Catalog(app_module.CATALOG_MODELS_CSV, app_module.CATALOG_REPAIRS_CSV)
+
+
+def names(results):
+    return [f"{model['brand']} {model['model']}" for model, _ in results]
+
+
+def test_typos():
+    assert typos('galxy', 'galaxy') == 1
+    assert typos('iphnoe', 'iphone') == 1
+    assert typos('pixle', 'pixel') == 1
+    assert typos('nokia', 'nokia') == 0
+    assert typos('abc', 'xyz') == 3
+
+
+def test_every_term_matches_a_word_prefix(shipped):
+    results = shipped.search_models('iph 15 pro', limit=50)
+    assert results and all(match == 'prefix' for _, match in results)
+    for name in names(results):
+        words = name.lower().split()
+        assert 'iphone' in words and '15' in words and any(word.startswith('pro') for word in words)
+    # Exact token matches first: 'iPhone 15 Pro' before 'iPhone 15 Pro Max'
+    assert names(shipped.search_models('iphone 15 pro', limit=2))[0] == 'Apple iPhone 15 Pro'
+
+
+def test_typos_match_fuzzily(shipped):
+    for query, word in [('galxy', 'galaxy'), ('iphnoe', 'iphone'), ('samsng galxy', 'galaxy')]:
+        results = shipped.search_models(query)
+        assert results, query
+        assert all(match == 'fuzzy' for _, match in results)
+        assert all(word in name.lower() for name in names(results))
+    assert shipped.search_models('xqzwv') == []
+
+
+def test_brand_limits_the_search(shipped):
+    results = shipped.search_models('', brand='samsung', limit=100)
+    assert results and {model['brand'] for model, _ in results} == {'Samsung'}
+    assert shipped.search_models('iphone', brand='Samsung') == []
+
+
+def test_find_model():
+    snapshot = CatalogSnapshot(
+        [{'brand': 'Apple', 'model': 'iPhone 14', 'popularity': 0},
+         {'brand': 'Samsung', 'model': 'Galaxy S23', 'popularity': 1}],
+        []
+    )
+    assert snapshot.find_model('iphone 14')['brand'] == 'Apple'
+    assert snapshot.find_model('Samsung  galaxy-s23')['model'] == 'Galaxy S23'
+    assert snapshot.find_model('Galaxy S23', brand='Apple') is None
+    assert snapshot.find_model('iPhone 99') is None
+
+
+def write_catalog(tmp_path, models, repairs):
+    models_path, repairs_path = tmp_path / 'models.csv', tmp_path / 'repairs.csv'
+    models_path.write_text(MODELS_HEADER + ''.join(f'{row}\n' for row in models), encoding='utf-8')
+    repairs_path.write_text(REPAIRS_HEADER + ''.join(f'{row}\n' for row in repairs), encoding='utf-8')
+    return str(models_path), str(repairs_path)
+
+
+def touch_later(path, seconds=10):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 10 ** 9))
+
+
+def test_catalog_reloads_when_a_file_changes(tmp_path):
+    models_path, repairs_path = write_catalog(
+        tmp_path, ['Apple,iPhone 14,6.1,2022-09-16,Active,High'], ['Screen,Screen,Broken,45,129.95']
+    )
+    catalog = Catalog(models_path, repairs_path, reload_seconds=0)
+    assert names(catalog.search_models('pixel')) == []
+    assert catalog.repair_durations() == {'screen': 45}
+
+    write_catalog(
+        tmp_path,
+        ['Apple,iPhone 14,6.1,2022-09-16,Active,High', 'Google,Pixel 8,6.2,2023-10-12,Active,Medium'],
+        ['Screen,Screen,Broken,60,129.95']
+    )
+    touch_later(models_path)
+    touch_later(repairs_path)
+    assert names(catalog.search_models('pixel')) == ['Google Pixel 8']
+    assert catalog.repair_durations() == {'screen': 60}
+
+
+def test_unchanged_files_are_not_read_again(tmp_path):
+    models_path, repairs_path = write_catalog(tmp_path, ['Apple,iPhone 14,6.1,2022-09-16,Active,High'], [])
+    catalog = Catalog(models_path, repairs_path, reload_seconds=0)
+    snapshot = catalog.snapshot()
+    assert catalog.snapshot() is snapshot
+
+
+def test_unreadable_file_keeps_the_previous_snapshot(tmp_path):
+    models_path, repairs_path = write_catalog(tmp_path, ['Apple,iPhone 14,6.1,2022-09-16,Active,High'], [])
+    catalog = Catalog(models_path, repairs_path, reload_seconds=0)
+    with open(models_path, 'wb') as f:
+        f.write(b'Brand,Model\n\xff\xfe broken\n')
+    touch_later(models_path)
+    assert names(catalog.search_models('iphone')) == ['Apple iPhone 14']
+
+
+def test_catalog_endpoints():
+    # The catalog does not depend on the storage backend
+    client = app_module.app.test_client()
+    body = client.get('/catalog/models', query_string={'q': 'galxy', 'limit': 3}).get_json()
+    assert body['count'] == 3
+    assert all(model['match'] == 'fuzzy' and 'popularity' not in model for model in body['models'])
+    assert client.get('/catalog/models', query_string={'limit': 0}).status_code == 400
+
+    repairs = client.get('/catalog/repairs', query_string={'model': 'iPhone 14'})
+    assert repairs.status_code == 200
+    assert repairs.get_json()['model']['brand'] == 'Apple'
+    assert client.get('/catalog/repairs', query_string={'model': 'iPhone 99'}).status_code == 404
+    assert client.get('/catalog/repairs').status_code == 400
@@ -0,0 +1,70 @@
+"""
+Response compression and its interplay with the feed cache validators
+"""
+import gzip
+import json
+
+from compression import compress_response, negotiate
+from conftest import open_day, repair_request_payload
+from test_ics import AUTH
+
+
+def test_negotiate():
+    assert negotiate(None) is None
+    assert negotiate('identity') is None
+    assert negotiate('gzip, deflate') == 'gzip'
+    assert negotiate('gzip;q=0') is None
+
+
+def book_many(client, count):
+    day = open_day(start_time='09:00', end_time='16:00')
+    for number in range(count):
+        time_slot = f'{9 + number:02d}:00'
+        payload = repair_request_payload(appointment={'date': day, 'timeSlot': time_slot},
+                                         email=f'customer{number}@example.com')
+        assert client.post('/request', json=payload).status_code == 201
+
+
+def test_large_json_is_gzipped(client):
+    book_many(client, 4)
+    plain = client.get('/requests')
+    assert 'Content-Encoding' not in plain.headers
+    assert len(plain.get_data()) >= 1024
+
+    response = client.get('/requests', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert len(response.get_data()) < len(plain.get_data())
+    unpacked = json.loads(gzip.decompress(response.get_data()))
+    assert unpacked['results'] == plain.get_json()['results']
+
+
+def test_small_bodies_are_sent_as_they_are(client):
+    response = client.get('/statuses', headers={'Accept-Encoding': 'gzip'})
+    assert len(response.get_data()) < 1024
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_compressed_feeds_have_weak_etags_that_still_match(client):
+    book_many(client, 6)
+    plain = client.get('/calendar', headers=AUTH)
+    assert not plain.headers['ETag'].startswith('W/')
+
+    response = client.get('/calendar', headers=dict(AUTH, **{'Accept-Encoding': 'gzip'}))
+    assert response.headers['Content-Encoding'] == 'gzip'
+    etag = response.headers['ETag']
+    assert etag == 'W/' + plain.headers['ETag']
+    assert gzip.decompress(response.get_data()) == plain.get_data()
+
+    # A poller sends back the weak ETag it got and still gets 304
+    repeat = client.get('/calendar', headers=dict(AUTH, **{'Accept-Encoding': 'gzip', 'If-None-Match': etag}))
+    assert repeat.status_code == 304
+    assert 'Content-Encoding' not in repeat.headers
+
+
+def test_streamed_and_other_responses_pass_unchanged(app):
+    with app.app.test_request_context():
+        streamed = app.app.response_class(iter([b'x' * 4096]), mimetype='application/json')
+        assert 'Content-Encoding' not in compress_response(streamed, 'gzip', 1024, ('application/json',)).headers
+        image = app.app.response_class(b'x' * 4096, mimetype='image/png')
+        assert 'Content-Encoding' not in compress_response(image, 'gzip', 1024, ('application/json',)).headers
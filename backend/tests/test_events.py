@@ -0,0 +1,40 @@
+"""
+Slot events a process publishes itself (no change stream)
+"""
+from conftest import open_day, repair_request_payload
+
+
+def published(app):
+    events, _ = app.slot_events.since(None)
+    return [(event.type, event.data['date'], event.data['time'], event.data['bookings']) for event in events]
+
+
+def test_multi_slot_booking_publishes_every_slot(client, app, monkeypatch):
+    monkeypatch.setattr(app, 'slot_events', app.EventBus())
+    day = open_day()
+    payload = repair_request_payload(appointment={'date': day, 'timeSlot': '11:00'}, repairs=['Screen', 'Battery'])
+    assert client.post('/request', json=payload).status_code == 201
+    assert published(app) == [('slot_booked', day, '11:00', 1), ('slot_booked', day, '11:30', 1)]
+
+
+def test_rolled_back_bulk_item_publishes_its_release(client, app, monkeypatch):
+    monkeypatch.setattr(app, 'slot_events', app.EventBus())
+    day = open_day()
+    monkeypatch.setattr(app.repository, 'insert_calendar_entries', lambda entries: {0: 'write failed'})
+    payload = repair_request_payload(appointment={'date': day, 'timeSlot': '11:00'}, repairs=['Screen', 'Battery'])
+    response = client.post('/requests/bulk', json=[payload])
+    assert [result['status'] for result in response.get_json()['results']] == [500]
+    assert published(app) == [('slot_released', day, '11:00', 0), ('slot_released', day, '11:30', 0)]
+    # The slots can be booked again
+    assert client.post('/request', json=payload).status_code == 201
+
+
+def test_cancelled_appointment_publishes_its_release(client, app, monkeypatch):
+    day = open_day()
+    payload = repair_request_payload(appointment={'date': day, 'timeSlot': '11:00'}, repairs=['Screen', 'Battery'])
+    request_id = client.post('/request', json=payload).get_json()['id']
+    monkeypatch.setattr(app, 'slot_events', app.EventBus())
+    for status in ['quoted', 'confirmed', 'cancelled']:
+        response = client.patch(f'/request/{request_id}/status', json={'status': status})
+        assert response.status_code == 200
+    assert published(app) == [('slot_released', day, '11:00', 0), ('slot_released', day, '11:30', 0)]
@@ -0,0 +1,94 @@
+"""
+Feed cache: validators, 304 Not Modified and invalidation by booking writes
+"""
+from datetime import datetime
+
+from bson import ObjectId
+
+from conftest import AUTH, open_day, repair_request_payload
+from feedcache import FeedCache
+
+
+def book(client, day, time_slot, email='ada@example.com'):
+    payload = repair_request_payload(appointment={'date': day, 'timeSlot': time_slot}, email=email)
+    response = client.post('/request', json=payload)
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def test_repeat_polls_get_304(client):
+    book(client, open_day(), '11:00')
+    first = client.get('/calendar', headers=AUTH)
+    assert first.status_code == 200
+    assert first.headers['ETag'] and first.headers['Last-Modified']
+    assert first.headers['Cache-Control'] == 'no-cache'
+
+    by_etag = client.get('/calendar', headers=dict(AUTH, **{'If-None-Match': first.headers['ETag']}))
+    assert by_etag.status_code == 304
+    by_date = client.get('/calendar', headers=dict(AUTH, **{'If-Modified-Since': first.headers['Last-Modified']}))
+    assert by_date.status_code == 304
+    assert client.get('/calendar', headers=AUTH).get_data() == first.get_data()
+
+
+def test_booking_invalidates_the_cached_feeds(client):
+    day = open_day()
+    book(client, day, '11:00')
+    first = client.get('/calendar', headers=AUTH)
+
+    book(client, day, '11:30', email='grace@example.com')
+    response = client.get('/calendar', headers=dict(AUTH, **{'If-None-Match': first.headers['ETag']}))
+    assert response.status_code == 200
+    assert response.headers['ETag'] != first.headers['ETag']
+    assert len(response.get_json()['events']) == 2
+
+
+def test_booking_of_another_process_invalidates_the_cached_feeds(client, app):
+    day = open_day()
+    book(client, day, '11:00')
+    first = client.get('/calendar', headers=AUTH)
+
+    # Written like another worker would, without this process's feed cache
+    repair_request = {'_id': ObjectId(), 'customer': {'email': 'grace@example.com'}, 'submittedAt': datetime.utcnow()}
+    entry = {'date': day, 'start_time': '11:30', 'end_time': '12:00',
+             'customer': {'request_id': str(repair_request['_id'])}}
+    app.repository.book(repair_request, entry, 1, 30)
+
+    response = client.get('/calendar', headers=dict(AUTH, **{'If-None-Match': first.headers['ETag']}))
+    assert response.status_code == 200
+    assert len(response.get_json()['events']) == 2
+
+
+def test_booking_version_counts_booking_writes(client, app):
+    assert app.booking_version() == 0
+    book(client, open_day(), '11:00')
+    assert app.booking_version() == 1
+    # Requests without an appointment leave it alone
+    assert client.post('/request', json=repair_request_payload()).status_code == 201
+    assert app.booking_version() == 1
+
+
+def test_booking_version_counts_releases(repository):
+    repair_request = {'_id': ObjectId(), 'customer': {'email': 'ada@example.com'}, 'submittedAt': datetime.utcnow()}
+    entry = {'date': open_day(), 'start_time': '11:00', 'end_time': '11:30',
+             'customer': {'request_id': str(repair_request['_id'])}}
+    repository.book(repair_request, entry, 1, 30)
+    assert repository.booking_version() == 1
+    repository.remove_request(repair_request, entry)
+    assert repository.booking_version() == 2
+
+
+def test_feed_cache_without_a_shared_version():
+    cache = FeedCache(max_age_seconds=60)
+    entry = cache.put('feed', b'body', 'text/plain', version=cache.version)
+    assert cache.get('feed') is entry
+    cache.bump()
+    assert cache.get('feed') is None
+
+
+def test_feed_cache_follows_the_shared_version():
+    shared = [0]
+    cache = FeedCache(max_age_seconds=60, shared_version=lambda: shared[0])
+    cache.put('feed', b'body', 'text/plain', version=cache.version)
+    assert cache.get('feed') is not None
+    shared[0] += 1
+    assert cache.get('feed') is None
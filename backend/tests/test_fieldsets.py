@@ -0,0 +1,78 @@
+"""
+Sparse fieldsets: fields= and view= on GET /requests and GET /request
+"""
+import pytest
+
+from conftest import open_day, repair_request_payload
+from fieldsets import MAX_FIELDS, VIEWS, parse_fields, select
+
+
+def test_parse_fields():
+    assert parse_fields() is None
+    assert parse_fields(view='detail') is None
+    assert parse_fields(view='list') == tuple(sorted(VIEWS['list']))
+    assert parse_fields(' customer.lastName, device ,device.model,_id,') == ('customer.lastName', 'device')
+    assert parse_fields('status', view='calendar') == tuple(sorted(VIEWS['calendar']))
+
+
+@pytest.mark.parametrize('fields, view', [
+    (None, 'cards'),
+    ('customer..lastName', None),
+    ('1customer', None),
+    ('customer.$where', None),
+    ('searchTokens', None),
+    ('searchTrigrams.x', None),
+    (','.join(f'field{number}' for number in range(MAX_FIELDS + 1)), None)
+])
+def test_parse_fields_rejects(fields, view):
+    with pytest.raises(ValueError):
+        parse_fields(fields, view)
+
+
+def test_select_follows_projection_rules():
+    doc = {'_id': 1, 'customer': {'lastName': 'Lovelace', 'email': 'ada@example.com'},
+           'repairs': [{'serviceName': 'Screen', 'quotedPrice': 1}, 'legacy'], 'status': 'quoted'}
+    assert select(doc, ('customer.lastName', 'repairs.serviceName', 'missing')) == {
+        '_id': 1, 'customer': {'lastName': 'Lovelace'}, 'repairs': [{'serviceName': 'Screen'}]
+    }
+
+
+@pytest.fixture
+def stored(client):
+    payload = repair_request_payload(appointment={'date': open_day(), 'timeSlot': '11:00'}, repairs=['Screen'])
+    payload['customer']['address'] = {'street': 'Main St 1', 'city': 'Berlin'}
+    payload['additionalNotes'] = 'Cracked in the corner'
+    response = client.post('/request', json=payload)
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def test_list_view_of_requests(client, stored):
+    result, = client.get('/requests', query_string={'view': 'list'}).get_json()['results']
+    assert set(result) == {'_id', 'status', 'submittedAt', 'serviceType', 'customer', 'device'}
+    assert set(result['customer']) == {'firstName', 'lastName', 'email', 'phoneNumber', 'address'}
+    assert result['customer']['address'] == {'street': 'Main St 1', 'city': 'Berlin'}
+    assert set(result['device']) == {'type', 'manufacturer', 'model'}
+
+
+def test_fields_of_requests(client, stored):
+    response = client.get('/requests', query_string={'fields': 'customer.lastName,repairs.serviceName'})
+    result, = response.get_json()['results']
+    assert result == {'_id': stored, 'customer': {'lastName': 'Lovelace'}, 'repairs': [{'serviceName': 'Screen'}]}
+
+
+def test_fields_of_one_request(client, stored):
+    response = client.get('/request', query_string={'id': stored, 'view': 'calendar'})
+    data = response.get_json()['data']
+    assert set(data) == {'_id', 'status', 'serviceType', 'appointment', 'customer', 'device'}
+    assert 'searchTokens' not in data
+
+    full = client.get('/request', query_string={'id': stored}).get_json()['data']
+    assert full['additionalNotes'] == 'Cracked in the corner'
+    assert 'searchTokens' not in full and 'searchTrigrams' not in full
+
+
+def test_invalid_fields_are_rejected(client, stored):
+    assert client.get('/requests', query_string={'view': 'cards'}).status_code == 400
+    assert client.get('/requests', query_string={'fields': 'searchTokens'}).status_code == 400
+    assert client.get('/request', query_string={'id': stored, 'fields': 'a..b'}).status_code == 400
@@ -0,0 +1,192 @@
+"""
+/calendar.ics and /slots.ics, streamed and built as one Calendar, against
+the writer they replaced (copied here from before the streaming writer)
+"""
+from datetime import datetime, time, timedelta
+
+from icalendar import Calendar, Event
+import pytest
+
+from conftest import AUTH, open_day, repair_request_payload
+from feedcache import FeedCache
+from icswriter import build_calendar, stream_calendar
+from recurrence import closed_hour_rules
+
+def old_non_working_blocks(app, start_date, end_date):
+    blocks = []
+    current_date = start_date.date()
+    end = end_date.date()
+    while current_date <= end:
+        working_hours = app.WORKING_HOURS.get(current_date.weekday())
+        if working_hours is None or (current_date.month, current_date.day) in app.FIXED_HOLIDAYS:
+            blocks.append((datetime.combine(current_date, time(0, 0)), datetime.combine(current_date, time(23, 59, 59))))
+        else:
+            work_start, work_end = working_hours
+            if work_start > time(0, 0):
+                blocks.append((datetime.combine(current_date, time(0, 0)), datetime.combine(current_date, work_start)))
+            if work_end < time(23, 59, 59):
+                blocks.append((datetime.combine(current_date, work_end), datetime.combine(current_date, time(23, 59, 59))))
+        current_date += timedelta(days=1)
+    return blocks
+
+
+def old_feed(app, public):
+    """The body the former calendar_full() (public=False) or slots_ics() (public=True) returned"""
+    cal = Calendar()
+    cal.add('prodid', '-//Repair Shop Calendar//EN')
+    cal.add('version', '2.0')
+    cal.add('calscale', 'GREGORIAN')
+    cal.add('x-wr-calname', 'Repair Shop - Availability' if public else 'Repair Shop - Full Details')
+    cal.add('x-wr-timezone', 'UTC')
+    if public:
+        cal.add('method', 'PUBLISH')
+
+    start_date = datetime.now()
+    end_date = start_date + timedelta(days=90)
+
+    for block_start, block_end in old_non_working_blocks(app, start_date, end_date):
+        event = Event()
+        event.add('summary', 'Unavailable' if public else 'Closed')
+        event.add('dtstart', block_start)
+        event.add('dtend', block_end)
+        event.add('transp', 'OPAQUE')
+        event.add('status', 'CONFIRMED')
+        if public:
+            event.add('class', 'PUBLIC')
+        elif (block_start.month, block_start.day) in app.FIXED_HOLIDAYS:
+            event.add('description', 'Holiday - Shop Closed')
+        elif app.WORKING_HOURS.get(block_start.weekday()) is None:
+            event.add('description', 'Weekend - Shop Closed')
+        else:
+            event.add('description', 'Non-working hours')
+        cal.add_component(event)
+
+    for appt in app.get_calendar_appointments(start_date, end_date):
+        event = Event()
+        if public:
+            event.add('summary', 'Busy')
+        else:
+            customer = appt.get('customer', {})
+            device = appt.get('device', {})
+            customer_name = f"{customer.get('first_name', '')} {customer.get('last_name', '')}".strip()
+            device_info = f"{device.get('brand', '')} {device.get('model', '')}".strip()
+            event.add('summary', f"Appointment: {customer_name}")
+            event.add('description', '\n'.join([
+                f"Customer: {customer_name}",
+                f"Phone: {customer.get('phone', 'N/A')}",
+                f"Email: {customer.get('email', 'N/A')}",
+                f"Device: {device_info}",
+                f"Device Type: {device.get('device_type', 'N/A')}"
+            ]))
+        appt_date = datetime.strptime(appt['date'], '%Y-%m-%d').date()
+        start_hour, start_minute = map(int, appt['start_time'].split(':'))
+        start_datetime = datetime.combine(appt_date, time(start_hour, start_minute))
+        event.add('dtstart', start_datetime)
+        if appt.get('end_time'):
+            end_hour, end_minute = map(int, appt['end_time'].split(':'))
+            event.add('dtend', datetime.combine(appt_date, time(end_hour, end_minute)))
+        else:
+            event.add('dtend', start_datetime + timedelta(minutes=app.SLOT_DURATION_MINUTES))
+        event.add('status', 'CONFIRMED')
+        event.add('transp', 'OPAQUE')
+        if public:
+            event.add('class', 'PUBLIC')
+            event.add('uid', f"slot-{appt['id']}@repairshop.local")
+        else:
+            event.add('uid', f"repair-{appt['id']}@repairshop.local")
+        cal.add_component(event)
+    return cal.to_ical()
+
+
+@pytest.fixture
+def booked(client):
+    """Appointments on three days, with text that needs escaping and folding"""
+    first = open_day()
+    second = open_day(after_days=9)
+    saturday = open_day(weekdays=[5])
+    for day, time_slot, last_name, repairs in (
+        (first, '09:00', 'Müller-Lüdenscheidt, Jr.; "the 2nd"', None),
+        (first, '11:00', 'Lovelace', ['Screen', 'Battery']),
+        (second, '15:30', 'Hopper ' * 20, None),
+        (saturday, '10:00', 'Turing', None)
+    ):
+        payload = repair_request_payload(appointment={'date': day, 'timeSlot': time_slot}, repairs=repairs,
+                                         last_name=last_name.strip(), email=f'{len(last_name)}@example.com')
+        assert client.post('/request', json=payload).status_code == 201
+
+
+def fetch(client, app, monkeypatch, url, streaming):
+    monkeypatch.setattr(app, 'ICS_STREAMING', streaming)
+    feed_cache = FeedCache(max_age_seconds=app.FEED_CACHE_SECONDS, shared_version=app.booking_version)
+    monkeypatch.setattr(app, 'feed_cache', feed_cache)
+    response = client.get(url, headers=AUTH)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/calendar'
+    return response.get_data()
+
+
+@pytest.mark.parametrize('streaming', [True, False])
+@pytest.mark.parametrize('url, public', [('/calendar.ics', False), ('/slots.ics', True)])
+def test_feeds_match_the_former_writer(client, app, monkeypatch, booked, url, public, streaming):
+    body = fetch(client, app, monkeypatch, url, streaming)
+    assert body == old_feed(app, public)
+    assert body.count(b'SUMMARY:Busy' if public else b'SUMMARY:Appointment') == 4
+
+
+@pytest.mark.parametrize('url', ['/calendar.ics?compact=1', '/slots.ics?compact=1'])
+def test_compact_feeds_stream_like_they_build(client, app, monkeypatch, booked, url):
+    streamed = fetch(client, app, monkeypatch, url, True)
+    assert streamed == fetch(client, app, monkeypatch, url, False)
+    assert b'RRULE:FREQ=WEEKLY' in streamed
+
+
+def test_closed_hour_rules_cover_the_closed_blocks(app):
+    start_date = datetime(2026, 3, 2)
+    expected = [block for block in old_non_working_blocks(app, start_date, start_date + timedelta(days=13))
+                if (block[0].month, block[0].day) not in app.FIXED_HOLIDAYS]
+    blocks = []
+    for offset in range(14):
+        day = (start_date + timedelta(days=offset)).date()
+        for rule in closed_hour_rules(app.WORKING_HOURS):
+            if day.weekday() in rule.weekdays:
+                blocks.append((datetime.combine(day, rule.start), datetime.combine(day, rule.end)))
+    assert sorted(blocks) == expected
+
+
+def test_calendar_feed_requires_authentication(client):
+    assert client.get('/calendar.ics').status_code == 401
+
+
+def test_stream_calendar_matches_build_calendar():
+    properties = [('prodid', '-//Repair Shop Calendar//EN'), ('version', '2.0'), ('x-wr-calname', 'Test, ä; ü')]
+
+    def events():
+        for number in range(3):
+            event = Event()
+            event.add('summary', f'Event {number}: ' + 'long text, with; separators ' * 5)
+            event.add('dtstart', datetime(2026, 3, 2, 9 + number))
+            event.add('dtend', datetime(2026, 3, 2, 10 + number))
+            event.add('rrule', {'freq': 'weekly', 'byday': ['MO', 'TU'], 'until': datetime(2026, 6, 1, 23, 59, 59)})
+            event.add('uid', f'event-{number}@repairshop.local')
+            yield event
+
+    assert b''.join(stream_calendar(properties, events())) == build_calendar(properties, events()).to_ical()
+    empty = b''.join(stream_calendar(properties, iter(())))
+    assert empty == build_calendar(properties, iter(())).to_ical()
+
+
+
+def test_calendar_entries_are_read_as_they_are_consumed(client, app):
+    day = open_day(end_time='13:00')
+    for time_slot, email in [('11:00', 'ada@example.com'), ('12:00', 'grace@example.com')]:
+        payload = repair_request_payload(appointment={'date': day, 'timeSlot': time_slot}, email=email)
+        assert client.post('/request', json=payload).status_code == 201
+
+    entries = app.repository.calendar_entries()
+    assert not isinstance(entries, list)
+    first = next(entries)
+    # The thread's connection can still write while the rows are read
+    payload = repair_request_payload(appointment={'date': day, 'timeSlot': '12:30'}, email='alan@example.com')
+    assert client.post('/request', json=payload).status_code == 201
+    assert first['start_time'] == '11:00'
+    assert [entry['start_time'] for entry in entries][0] == '12:00'
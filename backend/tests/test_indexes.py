@@ -0,0 +1,27 @@
+"""
+Index declarations and the query-plan check
+"""
+import subprocess
+import sys
+
+import mongomock
+
+from conftest import BACKEND
+from indexes import INDEXES, ensure_indexes, representative_queries
+
+
+def test_ensure_indexes_creates_every_declared_index():
+    db = mongomock.MongoClient()['repair_shop_test']
+    ensure_indexes(db)
+    ensure_indexes(db)
+    for collection, indexes in INDEXES.items():
+        names = set(db[collection].index_information())
+        assert {index.document['name'] for index in indexes} <= names
+
+
+def test_plan_check_does_not_import_app():
+    code = 'import sys, indexes; indexes.representative_queries(); print("app" in sys.modules)'
+    output = subprocess.run([sys.executable, '-c', code], cwd=BACKEND, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == 'False'
+    labels = [label for label, collection, command in representative_queries()]
+    assert len(labels) == len(set(labels))
@@ -0,0 +1,35 @@
+"""
+BSON types in JSON responses (jsonprovider.py)
+"""
+from datetime import datetime
+
+import bson
+from bson.decimal128 import Decimal128
+from bson.objectid import ObjectId
+from bson.raw_bson import RawBSONDocument
+
+from conftest import repair_request_payload
+
+
+def test_provider_writes_bson_types(app):
+    doc = {'_id': ObjectId('65f000000000000000000001'), 'price': Decimal128('89.90'),
+           'submittedAt': datetime(2026, 3, 2, 10, 30), 'repairs': [{'quotedPrice': Decimal128('10')}]}
+    expected = {'_id': '65f000000000000000000001', 'price': 89.9, 'submittedAt': '2026-03-02T10:30:00',
+                'repairs': [{'quotedPrice': 10.0}]}
+    with app.app.app_context():
+        assert app.app.json.loads(app.app.json.dumps(doc)) == expected
+        raw = RawBSONDocument(bson.encode(doc))
+        assert app.app.json.loads(app.app.json.dumps({'data': raw})) == {'data': expected}
+
+
+def test_get_request_returns_plain_json(client, app):
+    payload = repair_request_payload(repairs=['Screen'])
+    request_id = client.post('/request', json=payload).get_json()['id']
+
+    data = client.get(f'/request?id={request_id}').get_json()['data']
+    assert data['_id'] == request_id
+    # The server's Decimal128 price as a JSON number
+    assert isinstance(data['repairs'][0]['quotedPrice'], float)
+    assert data['totalQuotedPrice'] == data['repairs'][0]['quotedPrice']
+    assert 'searchTokens' not in data
+    datetime.fromisoformat(data['submittedAt'])
@@ -0,0 +1,61 @@
+"""
+Request logging through the background queue (requestlog.py)
+"""
+import json
+import logging
+import os
+
+import pytest
+
+from requestlog import REDACTED, redact, setup_logging, should_sample, stop_logging
+
+
+def test_redact_replaces_customer_fields_at_any_depth():
+    body = {'customer': {'email': 'ada@example.com'}, 'items': [{'Email': 'x', 'device': {'imeiNumber': '1'}}]}
+    assert redact(body) == {'customer': REDACTED, 'items': [{'Email': REDACTED, 'device': {'imeiNumber': REDACTED}}]}
+
+
+def test_sampling_bounds():
+    assert should_sample(1)
+    assert not any(should_sample(0) for _ in range(100))
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    filename = tmp_path / 'app.log'
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    logging.disable(logging.NOTSET)
+    listener = setup_logging(filename=str(filename))
+    yield filename, listener
+    stop_logging(listener)
+    logging.disable(logging.CRITICAL)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def records(filename):
+    return [json.loads(line) for line in filename.read_text(encoding='utf-8').splitlines()]
+
+
+def test_records_are_written_as_json_lines(log_file):
+    filename, listener = log_file
+    logging.getLogger('test').info('request', extra={'fields': {'status': 201}})
+    stop_logging(listener)
+    record, = records(filename)
+    assert (record['message'], record['status'], record['level']) == ('request', 201, 'INFO')
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+def test_forked_child_writes_its_records(log_file):
+    filename, listener = log_file
+    pid = os.fork()
+    if pid == 0:
+        logging.getLogger('test').info('from the child')
+        stop_logging(listener)
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert [record['message'] for record in records(filename)] == ['from the child']
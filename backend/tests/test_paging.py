@@ -0,0 +1,83 @@
+"""
+Keyset pagination of GET /requests
+"""
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+import pytest
+
+from conftest import repair_request_payload
+from repository import MongoRepository
+
+
+def insert_requests(app, count, submitted_at, last_name='Lovelace'):
+    """count repair requests submitted at the same moment; returns their ids"""
+    docs = []
+    for number in range(count):
+        doc = app.build_repair_request(repair_request_payload(
+            email=f'customer{number}@example.com', last_name=last_name
+        ))
+        doc['_id'] = ObjectId()
+        doc['submittedAt'] = submitted_at
+        docs.append(doc)
+    assert app.repository.insert_requests(docs) == {}
+    return {str(doc['_id']) for doc in docs}
+
+
+def result_ids(body):
+    return [result['_id'] for result in body['results']]
+
+
+def test_pages_are_stable_across_ties_and_new_requests(client, app):
+    moment = datetime(2026, 3, 2, 10, 0)
+    expected = insert_requests(app, 12, moment)
+    expected |= insert_requests(app, 5, moment - timedelta(hours=1))
+
+    seen = []
+    after = None
+    for page in range(10):
+        url = '/requests?limit=5&count=none' + (f'&after={after}' if after else '')
+        body = client.get(url).get_json()
+        seen += result_ids(body)
+        after = body['next_after']
+        if after is None:
+            break
+        # Requests arriving between pages sort before the position reached
+        insert_requests(app, 2, moment + timedelta(minutes=page + 1))
+        insert_requests(app, 1, moment)
+
+    assert len(seen) == len(set(seen))
+    assert set(seen) == expected
+
+
+def test_search_pages_are_stable_across_equal_scores(client, app):
+    if isinstance(app.repository, MongoRepository):
+        pytest.skip('mongomock does not implement $setIntersection')
+    moment = datetime(2026, 3, 2, 10, 0)
+    expected = insert_requests(app, 11, moment, last_name='Hopper')
+    insert_requests(app, 4, moment)
+
+    seen = []
+    after = None
+    while True:
+        url = '/requests?customer_search=hopper&limit=4&count=none' + (f'&after={after}' if after else '')
+        body = client.get(url).get_json()
+        seen += result_ids(body)
+        after = body['next_after']
+        if after is None:
+            break
+        insert_requests(app, 1, moment, last_name='Hopper')
+
+    assert len(seen) == len(set(seen))
+    assert expected <= set(seen)
+
+
+def test_count_modes(client, app):
+    insert_requests(app, 3, datetime(2026, 3, 2, 10, 0))
+    assert client.get('/requests?limit=2').get_json()['total_found'] == 3
+    assert client.get('/requests?limit=2&count=estimate').get_json()['total_found'] == 3
+    assert client.get('/requests?count=sometimes').status_code == 400
+
+
+def test_invalid_page_token_is_rejected(client):
+    assert client.get('/requests?after=not-a-token').status_code == 400
@@ -0,0 +1,70 @@
+"""
+Server-side prices: POST /request, POST /quotes/batch and re-quoting
+"""
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+
+from conftest import repair_request_payload
+from pricing import quote_json, requote
+
+
+def stored_request(client):
+    return client.get('/requests?limit=1').get_json()['results'][0]
+
+
+def test_request_is_priced_by_the_server(client, app):
+    payload = repair_request_payload(repairs=['Screen', 'Battery'])
+    payload['repairs'][0]['quotedPrice'] = 1
+    payload['totalQuotedPrice'] = 1
+    assert client.post('/request', json=payload).status_code == 201
+
+    quote = quote_json(app.pricing.quote('iPhone 14', ['Screen', 'Battery'], brand='Apple'))
+    stored = stored_request(client)
+    assert [repair['quotedPrice'] for repair in stored['repairs']] == [line['quotedPrice'] for line in quote['repairs']]
+    assert stored['totalQuotedPrice'] == quote['totalQuotedPrice']
+
+
+def test_client_prices_are_dropped_when_the_catalog_cannot_price(client):
+    payload = repair_request_payload(repairs=['Screen', 'Polishing'])
+    payload['repairs'][0]['quotedPrice'] = 1
+    payload['totalQuotedPrice'] = 1
+    assert client.post('/request', json=payload).status_code == 201
+
+    stored = stored_request(client)
+    assert all('quotedPrice' not in repair for repair in stored['repairs'])
+    assert 'totalQuotedPrice' not in stored
+
+
+def test_batch_quotes_each_item(client, app):
+    items = [
+        {'brand': 'Apple', 'model': 'iPhone 14', 'repairs': ['Screen', 'Battery']},
+        {'model': 'Phone 3000', 'repairs': ['Screen']},
+        {'brand': 'Apple', 'model': 'iPhone 14', 'repairs': 'Screen'},
+        {'brand': 'Apple', 'model': 'iPhone 14', 'repairs': ['Screen', 'Battery']}
+    ]
+    body = client.post('/quotes/batch', json=items).get_json()
+    assert [result['success'] for result in body['results']] == [True, False, False, True]
+    assert body['quoted'] == 2 and body['failed'] == 2
+    expected = quote_json(app.pricing.quote('iPhone 14', ['Screen', 'Battery'], brand='Apple'))
+    assert body['results'][0]['quote'] == expected
+    assert client.post('/quotes/batch', json={'model': 'iPhone 14'}).status_code == 400
+
+
+def test_requote_updates_only_the_requests_waiting_for_a_quote(app, repository):
+    docs = []
+    for status in ['pending_quote', 'pending_quote', 'quoted']:
+        doc = app.build_repair_request(repair_request_payload(repairs=['Screen']))
+        doc.update(_id=ObjectId(), status=status, totalQuotedPrice=Decimal128('1'))
+        doc['repairs'][0]['quotedPrice'] = Decimal128('1')
+        docs.append(doc)
+    assert repository.insert_requests(docs) == {}
+
+    assert requote(repository, app.pricing, 'pending_quote') == (2, 2)
+    # Up to date now, nothing left to change
+    assert requote(repository, app.pricing, 'pending_quote') == (2, 0)
+    quote = quote_json(app.pricing.quote('iPhone 14', ['Screen'], brand='Apple'))
+    totals = {str(doc['_id']): doc['totalQuotedPrice'] for doc in repository.requests_in_status('pending_quote')}
+    assert set(totals) == {str(doc['_id']) for doc in docs[:2]}
+    assert {float(str(total)) for total in totals.values()} == {quote['totalQuotedPrice']}
+    quoted, = repository.requests_in_status('quoted')
+    assert quoted['totalQuotedPrice'] == Decimal128('1')
@@ -0,0 +1,190 @@
+"""
+Slot booking: capacity, 409 responses, the appointment's start time and
+appointments covering several slots
+"""
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+import pytest
+
+from conftest import mongo_repository, new_occupancy, new_scheduler, open_day, repair_request_payload
+from reservations import SlotUnavailable, book as book_slot, release_orphans, reserve, slot_times
+
+
+def book(client, day, time_slot, repairs=None, email='ada@example.com', key='timeSlot'):
+    return client.post('/request', json=repair_request_payload(
+        appointment={'date': day, key: time_slot}, repairs=repairs, email=email
+    ))
+
+
+def calendar_entry(repair_request, day, start_time, end_time):
+    return {
+        'date': day,
+        'start_time': start_time,
+        'end_time': end_time,
+        'customer': {'request_id': str(repair_request['_id'])}
+    }
+
+
+def new_request(email='ada@example.com'):
+    return {'_id': ObjectId(), 'customer': {'email': email}, 'status': 'pending_quote',
+            'submittedAt': datetime.utcnow()}
+
+
+def test_slot_times():
+    assert slot_times('11:00', '12:00', 30) == ['11:00', '11:30']
+    assert slot_times('11:00', '11:30', 30) == ['11:00']
+    assert slot_times('11:00', '11:00', 30) == ['11:00']
+
+
+def test_second_booking_of_a_full_slot_is_rejected(client, app):
+    day = open_day()
+    first = book(client, day, '11:00')
+    assert first.status_code == 201
+
+    second = book(client, day, '11:00', email='grace@example.com')
+    assert second.status_code == 409
+    body = second.get_json()
+    assert body['success'] is False
+    assert body['alternatives'] and {'date': day, 'timeSlot': '11:00'} not in body['alternatives']
+
+    # The rejected request was not stored
+    assert app.repository.count_requests({}) == 1
+    assert book(client, day, '11:30', email='grace@example.com').status_code == 201
+
+
+def test_full_slot_is_rejected_when_the_in_process_indexes_are_stale(client, app, monkeypatch):
+    """Another worker's booking is only in the database, not in this process's indexes"""
+    day = open_day()
+    # Built before the booking below, like the indexes of another worker
+    stale_occupancy = new_occupancy()
+    stale_scheduler = new_scheduler()
+    stale_occupancy.ensure_fresh()
+    stale_scheduler.ensure_fresh()
+    assert book(client, day, '11:00').status_code == 201
+
+    monkeypatch.setattr(app, 'occupancy', stale_occupancy)
+    monkeypatch.setattr(app, 'scheduler', stale_scheduler)
+    assert book(client, day, '11:00', email='grace@example.com').status_code == 409
+    assert app.repository.count_requests({}) == 1
+
+
+def test_booking_reads_time_and_time_slot(client, app):
+    saturday = open_day(weekdays=[5])
+    response = book(client, saturday, '11:00', key='time')
+    assert response.status_code == 201
+
+    stored, = client.get('/requests').get_json()['results']
+    assert stored['appointment']['timeSlot'] == '11:00'
+    entries = app.repository.calendar_entries()
+    assert [(entry['date'], entry['start_time']) for entry in entries] == [(saturday, '11:00')]
+
+    # The same slot once more, now as timeSlot
+    assert book(client, saturday, '11:00').status_code == 409
+
+
+def test_booking_without_a_time_is_rejected(client, app):
+    response = client.post('/request', json=repair_request_payload(appointment={'date': open_day()}))
+    assert response.status_code == 400
+    assert book(client, open_day(), 'noon').status_code == 400
+    assert app.repository.count_requests({}) == 0
+
+
+def test_booking_outside_opening_hours_is_rejected(client):
+    assert book(client, open_day(), '07:00').status_code == 409
+
+
+def test_multi_slot_appointment_claims_every_slot(client, app):
+    day = open_day()
+    # Two 30 minute repairs: 11:00 to 12:00
+    first = book(client, day, '11:00', repairs=['Screen', 'Battery'])
+    assert first.status_code == 201
+    entry, = app.repository.calendar_entries()
+    assert (entry['start_time'], entry['end_time']) == ('11:00', '12:00')
+
+    # The second half of the appointment is taken as well
+    assert book(client, day, '11:30', email='grace@example.com').status_code == 409
+    # An appointment overlapping its start is rejected, the slot after it is free
+    assert book(client, day, '10:30', repairs=['Screen', 'Battery'], email='grace@example.com').status_code == 409
+    assert book(client, day, '10:30', email='grace@example.com').status_code == 201
+    assert book(client, day, '12:00', email='alan@example.com').status_code == 201
+
+
+def test_repository_book_claims_every_slot(repository):
+    day = open_day()
+    first = new_request()
+    repository.book(first, calendar_entry(first, day, '11:00', '12:00'), 1, 30)
+
+    assert not repository.reserve_slots(day, ['11:30'], ObjectId(), 'grace@example.com', 1)
+    second = new_request('grace@example.com')
+    with pytest.raises(SlotUnavailable):
+        repository.book(second, calendar_entry(second, day, '10:30', '11:30'), 1, 30)
+    assert repository.count_requests({}) == 1
+
+
+def test_failed_reservation_releases_the_slots_it_claimed(repository):
+    day = open_day()
+    assert repository.reserve_slots(day, ['11:30'], ObjectId(), 'ada@example.com', 1)
+
+    # 11:00 is claimed before 11:30 turns out to be full, and given back
+    assert not repository.reserve_slots(day, ['11:00', '11:30'], ObjectId(), 'grace@example.com', 1)
+    assert repository.reserve_slots(day, ['11:00'], ObjectId(), 'alan@example.com', 1)
+
+
+def test_capacity_above_one(repository):
+    day = open_day()
+    assert repository.reserve_slots(day, ['11:00'], ObjectId(), 'ada@example.com', 2)
+    assert repository.reserve_slots(day, ['11:00'], ObjectId(), 'grace@example.com', 2)
+    assert not repository.reserve_slots(day, ['11:00'], ObjectId(), 'alan@example.com', 2)
+
+
+def test_removing_a_request_frees_all_its_slots(repository):
+    day = open_day()
+    repair_request = new_request()
+    entry = calendar_entry(repair_request, day, '11:00', '12:00')
+    repository.book(repair_request, entry, 1, 30)
+
+    repository.remove_request(repair_request, entry)
+    assert repository.count_requests({}) == 0
+    assert repository.reserve_slots(day, ['11:00', '11:30'], ObjectId(), 'grace@example.com', 1)
+
+
+def test_bulk_multi_slot_appointment_claims_every_slot(client):
+    day = open_day()
+    items = [
+        repair_request_payload(appointment={'date': day, 'timeSlot': '11:00'}, repairs=['Screen', 'Battery']),
+        repair_request_payload(appointment={'date': day, 'timeSlot': '11:30'}, email='grace@example.com'),
+        repair_request_payload(appointment={'date': day, 'timeSlot': '12:00'}, email='alan@example.com')
+    ]
+    response = client.post('/requests/bulk', json=items)
+    statuses = [result['status'] for result in response.get_json()['results']]
+    assert statuses == [201, 409, 201]
+
+
+def test_failed_insert_gives_the_slot_back(monkeypatch):
+    db = mongo_repository().db
+    day = open_day()
+    repair_request = {'_id': ObjectId(), 'customer': {'email': 'ada@example.com'}}
+    entry = {'date': day, 'start_time': '11:00', 'end_time': '11:30'}
+
+    def fail(document):
+        raise RuntimeError('calendar is down')
+    with monkeypatch.context() as patch:
+        patch.setattr(db.calendar, 'insert_one', fail)
+        with pytest.raises(RuntimeError):
+            book_slot(db, repair_request, entry, 1, 30)
+    assert db.repair_requests.count_documents({}) == 0
+
+    # The slot is free again, and full after the next booking
+    book_slot(db, repair_request, entry, 1, 30)
+    with pytest.raises(SlotUnavailable):
+        book_slot(db, dict(repair_request, _id=ObjectId()), entry, 1, 30)
+
+
+def test_orphaned_reservations_are_released():
+    db = mongo_repository().db
+    day = open_day()
+    assert reserve(db, day, '11:00', ObjectId(), 'ada@example.com', 1)
+    db.appointment_slots.update_many({}, {'$set': {'bookedBy.0.bookedAt': datetime.utcnow() - timedelta(hours=1)}})
+    assert release_orphans(db) == 1
+    assert reserve(db, day, '11:00', ObjectId(), 'grace@example.com', 1)
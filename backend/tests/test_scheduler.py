@@ -0,0 +1,33 @@
+"""
+Bench time of repairs and appointments booked for it
+"""
+from conftest import open_day, repair_request_payload
+from scheduler import bench_minutes
+
+DURATIONS = {'screen': 45, 'battery': 30}
+
+
+def test_bench_minutes_come_from_the_catalog():
+    assert bench_minutes([{'serviceName': 'Screen'}, {'serviceName': ' battery '}], DURATIONS, 30) == 75
+    # Unknown repairs and requests without repairs take one slot
+    assert bench_minutes([{'serviceName': 'Camera'}], DURATIONS, 30) == 30
+    assert bench_minutes([], DURATIONS, 30) == 30
+    assert bench_minutes(None, DURATIONS, 30) == 30
+
+
+def test_bench_minutes_ignore_the_client_estimate():
+    repairs = [{'serviceName': 'Screen', 'estimatedDuration': 1}, {'serviceName': 'Camera', 'estimatedDuration': 0}]
+    assert bench_minutes(repairs, DURATIONS, 30) == 75
+
+
+def test_short_client_estimate_books_the_whole_repair(client, app):
+    day = open_day()
+    payload = repair_request_payload(appointment={'date': day, 'timeSlot': '11:00'}, repairs=['Screen', 'Battery'])
+    for repair in payload['repairs']:
+        repair['estimatedDuration'] = 1
+    assert client.post('/request', json=payload).status_code == 201
+
+    entry, = app.repository.calendar_entries()
+    assert (entry['start_time'], entry['end_time']) == ('11:00', '12:00')
+    other = repair_request_payload(appointment={'date': day, 'timeSlot': '11:30'}, email='grace@example.com')
+    assert client.post('/request', json=other).status_code == 409
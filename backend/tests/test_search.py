@@ -0,0 +1,42 @@
+"""
+customer_search over the write-time search keys
+"""
+from conftest import repair_request_payload
+from searchindex import build_search_filter, search_terms
+
+
+def insert_customers(app, repository, *customers):
+    docs = []
+    for first_name, last_name, phone in customers:
+        payload = repair_request_payload(email=f'{first_name.lower()}@example.com', last_name=last_name)
+        payload['customer'].update(firstName=first_name, phoneNumber=phone)
+        docs.append(app.build_repair_request(payload))
+    assert repository.insert_requests(docs) == {}
+
+
+def found(repository, text):
+    return repository.count_requests({'customer_search': text})
+
+
+def test_search_terms_join_consecutive_numbers():
+    assert search_terms('+49 30 1234') == ['49301234']
+    assert search_terms('Anna 030/12 34') == ['0301234', 'anna']
+    assert build_search_filter('?!') is None
+
+
+def test_terms_must_occur_within_one_token(app, repository):
+    insert_customers(app, repository, ('Hannes', 'Donna', '+49 30 7654321'), ('Anna', 'Schmidt', '+49 40 1111111'))
+    # 'ann' and 'nna' come from different tokens of Hannes Donna
+    assert found(repository, 'anna') == 1
+    assert found(repository, 'hannes') == 1
+    assert found(repository, 'onn') == 1
+    assert found(repository, 'nn') == 0
+
+
+def test_formatted_phone_numbers_are_found(app, repository):
+    insert_customers(app, repository, ('Ada', 'Lovelace', '+49 30 1234567'), ('Grace', 'Hopper', '+49 40 7654321'))
+    assert found(repository, '+49 30 1234') == 1
+    assert found(repository, '30 1234567') == 1
+    assert found(repository, '030-1234567') == 0
+    assert found(repository, '1234567 Lovelace') == 1
+    assert found(repository, '49') == 2
@@ -0,0 +1,150 @@
+"""
+Workflow compiled from flow.bpmn and PATCH /request/<id>/status
+"""
+from bson import ObjectId
+import pytest
+
+from conftest import open_day, repair_request_payload
+from workflow import InvalidStatus, Workflow, compile_bpmn
+
+BPMN = """<?xml version="1.0" encoding="UTF-8"?>
+<definitions xmlns="http://www.omg.org/spec/BPMN/20100524/MODEL">
+  <process id="repair">
+    <startEvent id="start"/>
+    <task id="t1" name="received"/>
+    <exclusiveGateway id="g1"/>
+    <task id="t2" name="repaired"/>
+    <task id="t3" name="Returned unrepaired"/>
+    <endEvent id="end" name="closed"/>
+    <sequenceFlow id="f1" sourceRef="start" targetRef="t1"/>
+    <sequenceFlow id="f2" sourceRef="t1" targetRef="g1"/>
+    <sequenceFlow id="f3" sourceRef="g1" targetRef="t2"/>
+    <sequenceFlow id="f4" sourceRef="g1" targetRef="t3"/>
+    <sequenceFlow id="f5" sourceRef="t2" targetRef="end"/>
+    <sequenceFlow id="f6" sourceRef="t3" targetRef="end"/>
+  </process>
+</definitions>
+"""
+
+
+def test_compile_bpmn_follows_flows_through_gateways(tmp_path):
+    path = tmp_path / 'flow.bpmn'
+    path.write_text(BPMN, encoding='utf-8')
+    workflow = compile_bpmn(str(path), extra_transitions=[('repaired', 'received')])
+
+    assert workflow.initial == 'received'
+    assert workflow.states == ('received', 'repaired', 'closed')
+    # 'Returned unrepaired' is no status name, the flow passes through it
+    assert workflow.next_states('received') == ['repaired', 'closed']
+    assert workflow.next_states('repaired') == ['received', 'closed']
+    assert workflow.next_states('closed') == []
+    assert workflow.sources['closed'] == {'received', 'repaired'}
+
+
+def test_shipped_workflow():
+    workflow = compile_bpmn()
+    assert workflow.initial == 'pending_quote'
+    assert workflow.next_states('pending_quote') == ['quoted']
+    assert workflow.allowed('quoted', 'rejected')
+    assert not workflow.allowed('pending_quote', 'collected')
+    assert workflow.allowed('in_progress', 'on_hold') and workflow.allowed('on_hold', 'in_progress')
+    assert workflow.sources['archived'] == {'feedback_received', 'cancelled', 'rejected'}
+    with pytest.raises(InvalidStatus):
+        workflow.validate('completed')
+
+
+def test_initial_status_must_be_a_state():
+    with pytest.raises(ValueError):
+        Workflow({'a': {'b'}}, 'c')
+
+
+def create_request(client):
+    response = client.post('/request', json=repair_request_payload())
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def change_status(client, request_id, status, **extra):
+    return client.patch(f'/request/{request_id}/status', json=dict(extra, status=status))
+
+
+def test_status_changes_follow_the_workflow(client, app):
+    request_id = create_request(client)
+    path = ['quoted', 'confirmed', 'scheduled', 'diagnosing', 'in_progress', 'on_hold', 'in_progress',
+            'ready_for_pickup', 'collected', 'feedback_received', 'archived']
+    previous = 'pending_quote'
+    for status in path:
+        response = change_status(client, request_id, status)
+        assert response.status_code == 200, (previous, status)
+        body = response.get_json()
+        assert (body['previousStatus'], body['status']) == (previous, status)
+        assert body['allowed'] == app.workflow.next_states(status)
+        previous = status
+
+    counts = {status: count for status, count in app.repository.status_counts().items() if count}
+    assert counts == {'archived': 1}
+
+
+def test_status_change_not_in_the_workflow_is_a_conflict(client, app):
+    request_id = create_request(client)
+    response = change_status(client, request_id, 'collected')
+    assert response.status_code == 409
+    assert response.get_json()['status'] == 'pending_quote'
+    assert response.get_json()['allowed'] == ['quoted']
+    assert app.repository.status_counts().get('pending_quote') == 1
+
+
+def test_status_change_from_an_outdated_status_is_a_conflict(client):
+    request_id = create_request(client)
+    assert change_status(client, request_id, 'quoted').status_code == 200
+    # Someone else already moved it on to confirmed
+    assert change_status(client, request_id, 'confirmed', **{'from': 'quoted'}).status_code == 200
+    response = change_status(client, request_id, 'rejected', **{'from': 'quoted'})
+    assert response.status_code == 409
+    assert response.get_json()['status'] == 'confirmed'
+
+
+def test_invalid_status_changes(client):
+    request_id = create_request(client)
+    assert change_status(client, request_id, 'completed').status_code == 400
+    assert change_status(client, 'not-an-id', 'quoted').status_code == 400
+    assert change_status(client, str(ObjectId()), 'quoted').status_code == 404
+
+
+def test_new_requests_start_in_the_initial_status(client, app):
+    payload = repair_request_payload()
+    assert client.post('/request', json=dict(payload, status='collected')).status_code == 400
+    assert client.post('/request', json=dict(payload, status='pending_quote')).status_code == 201
+
+    response = client.post('/requests/bulk', json=[dict(payload, status='archived'), payload])
+    assert [result['status'] for result in response.get_json()['results']] == [400, 201]
+    counts = {status: count for status, count in app.repository.status_counts().items() if count}
+    assert counts == {'pending_quote': 2}
+
+
+def test_cancelling_frees_the_appointment(client, app):
+    day = open_day()
+    appointment = {'date': day, 'timeSlot': '11:00'}
+    payload = repair_request_payload(appointment=appointment, repairs=['Screen', 'Battery'])
+    response = client.post('/request', json=payload)
+    assert response.status_code == 201
+    request_id = response.get_json()['id']
+    other = repair_request_payload(appointment={'date': day, 'timeSlot': '11:30'}, email='grace@example.com')
+    assert client.post('/request', json=other).status_code == 409
+
+    for status in ['quoted', 'confirmed', 'cancelled']:
+        assert change_status(client, request_id, status).status_code == 200
+    assert list(app.repository.calendar_entries()) == []
+    # Both slots, the bench and the in-process occupancy are free again
+    assert client.post('/request', json=other).status_code == 201
+    assert client.post('/request', json=repair_request_payload(appointment=appointment)).status_code == 201
+
+
+def test_rejecting_a_quote_frees_the_appointment(client, app):
+    appointment = {'date': open_day(), 'timeSlot': '11:00'}
+    response = client.post('/request', json=repair_request_payload(appointment=appointment))
+    request_id = response.get_json()['id']
+    assert change_status(client, request_id, 'quoted').status_code == 200
+    assert change_status(client, request_id, 'rejected').status_code == 200
+    other = repair_request_payload(appointment=appointment, email='grace@example.com')
+    assert client.post('/request', json=other).status_code == 201
@@ -0,0 +1,156 @@
+"""
+Repair workflow compiled from flow.bpmn.
+
+The BPMN process in ../flow.bpmn defines the repair states and the moves
+between them. compile_bpmn() reads it once when the app starts: every task
+named like a status (pending_quote, in_transit, ...) and the 'archived' end
+event become states, while gateways ('Accept quote?'), helper tasks
+('waiting for feedback') and nodes that are only referenced ('pickup') are
+followed through, so quoted -> Accept quote? -> rejected turns into the
+transition quoted -> rejected. The compiled Workflow holds plain dicts in
+both directions: the states a status can move to, and the states a status
+can be reached from. PATCH /request/<id>/status uses the latter to apply a
+transition with a single conditional update ("only if the current status is
+one of these").
+
+Per-status counters are kept next to the repair requests (status_counts)
+and moved in the same write as the status itself, see repository.py. They
+can be rebuilt, after filling in the initial status on older requests that
+have none, with:
+    python workflow.py --rebuild-counts
+Without arguments the compiled transition table is printed.
+"""
+import argparse
+import os
+import re
+import xml.etree.ElementTree as ET
+
+BPMN_NAMESPACE = '{http://www.omg.org/spec/BPMN/20100524/MODEL}'
+DEFAULT_BPMN = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'flow.bpmn')
+
+# Node types that can carry a status
+STATE_NODES = ('task', 'userTask', 'manualTask', 'serviceTask', 'endEvent', 'intermediateThrowEvent')
+# Status names are snake_case identifiers, other task names describe activities
+STATE_NAME = re.compile(r'^[a-z]+(_[a-z]+)*$')
+
+# Transitions the diagram does not model yet: on_hold (paused by the
+# customer) is part of the README and state_flow.mmd, but not of flow.bpmn
+EXTRA_TRANSITIONS = [('in_progress', 'on_hold'), ('on_hold', 'in_progress')]
+
+
+class InvalidStatus(ValueError):
+    """A status that is not part of the workflow"""
+
+
+class Workflow:
+    """
+    Compiled transition table
+    transitions: {state: set of states it can move to}; initial: status of new requests
+    order: states in display order (others follow alphabetically)
+    """
+
+    def __init__(self, transitions, initial, order=()):
+        self.transitions = {state: frozenset(targets) for state, targets in transitions.items()}
+        for targets in transitions.values():
+            for target in targets:
+                self.transitions.setdefault(target, frozenset())
+        if initial not in self.transitions:
+            raise ValueError(f"Initial status '{initial}' is not a workflow state")
+        self.initial = initial
+        self.sources = {state: set() for state in self.transitions}
+        for state, targets in self.transitions.items():
+            for target in targets:
+                self.sources[target].add(state)
+        self.sources = {state: frozenset(sources) for state, sources in self.sources.items()}
+        order = [self.initial] + [state for state in order if state in self.transitions and state != self.initial]
+        self.states = tuple(order + sorted(set(self.transitions) - set(order)))
+
+    def is_state(self, status):
+        return status in self.transitions
+
+    def validate(self, status):
+        """status if it is a workflow state; raises InvalidStatus"""
+        if not isinstance(status, str) or status not in self.transitions:
+            raise InvalidStatus(f"Unknown status '{status}', expected one of: {', '.join(self.states)}")
+        return status
+
+    def allowed(self, current, target):
+        return target in self.transitions.get(current, ())
+
+    def next_states(self, status):
+        """States status can move to, in workflow order"""
+        targets = self.transitions.get(status, ())
+        return [state for state in self.states if state in targets]
+
+
+def compile_bpmn(path=DEFAULT_BPMN, extra_transitions=EXTRA_TRANSITIONS):
+    """
+    Workflow of the process in a BPMN file, plus (from, to) pairs that the
+    diagram does not model
+    """
+    process = ET.parse(path).getroot().find(BPMN_NAMESPACE + 'process')
+    if process is None:
+        raise ValueError(f'No BPMN process in {path}')
+
+    states = {}  # node id -> status
+    starts = []
+    flows = {}  # node id -> ids of the nodes its sequence flows lead to
+    targets = []  # flow targets in document order, for the display order
+    for node in process:
+        kind = node.tag[len(BPMN_NAMESPACE):]
+        if kind == 'startEvent':
+            starts.append(node.get('id'))
+        elif kind in STATE_NODES and STATE_NAME.match(node.get('name') or ''):
+            states[node.get('id')] = node.get('name')
+        elif kind == 'sequenceFlow':
+            flows.setdefault(node.get('sourceRef'), set()).add(node.get('targetRef'))
+            targets.append(node.get('targetRef'))
+
+    def reachable_states(node_id):
+        """States the flows of a node lead to, passing through non-state nodes"""
+        found, seen = set(), set()
+        pending = list(flows.get(node_id, ()))
+        while pending:
+            target = pending.pop()
+            if target in seen:
+                continue
+            seen.add(target)
+            if target in states:
+                found.add(states[target])
+            else:
+                pending.extend(flows.get(target, ()))
+        return found
+
+    transitions = {name: reachable_states(node_id) for node_id, name in states.items()}
+    for source, target in extra_transitions:
+        transitions.setdefault(source, set()).add(target)
+
+    initial = set()
+    for start in starts:
+        initial |= reachable_states(start)
+    if len(initial) != 1:
+        raise ValueError(f'Expected the start event of {path} to lead to one state, got {sorted(initial)}')
+    order = []
+    for node_id in targets:
+        if node_id in states and states[node_id] not in order:
+            order.append(states[node_id])
+    order += [target for _, target in extra_transitions if target not in order]
+    return Workflow(transitions, initial.pop(), order)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Print the compiled workflow or rebuild the per-status counters')
+    parser.add_argument('--rebuild-counts', action='store_true',
+                        help="set the initial status where it is missing and recount (uses app.py's storage backend)")
+    args = parser.parse_args()
+
+    if args.rebuild_counts:
+        import app
+
+        app.repository.rebuild_status_counts(app.workflow.initial)
+        for status, count in sorted(app.repository.status_counts().items()):
+            print(f"{status:<20} {count:>8}")
+    else:
+        workflow = compile_bpmn()
+        for state in workflow.states:
+            print(f"{state:<20} -> {', '.join(workflow.next_states(state)) or '(final)'}")